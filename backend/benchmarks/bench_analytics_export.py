@@ -0,0 +1,99 @@
+"""
+Benchmark the analytics export against pulling a table for each report.
+
+Uses the configured DATA_BACKEND (the tables need ``updated_at``, see
+deposits/services/analytics_export.py). Times, for one table:
+
+- a report the old way: page through the whole table, as JSON (size of
+  the JSON reported), and aggregate in Python
+- the first export into a scratch directory, and an incremental run
+  with nothing changed
+- the same report from the Parquet files (size on disk reported)
+
+Run from backend folder: python benchmarks/bench_analytics_export.py [--table transactions]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+
+def pull_report(repository, table, page_size):
+    from deposits.fast_json import dumps
+
+    totals = defaultdict(int)
+    json_bytes = 0
+    after = None
+    while True:
+        rows = repository.fetch_changed_rows(table, after, page_size)
+        json_bytes += len(dumps(rows))
+        for row in rows:
+            totals[row.get('status')] += 1
+        if len(rows) < page_size:
+            return dict(totals), json_bytes
+        after = (rows[-1]['updated_at'], rows[-1]['id'])
+
+
+def parquet_report(directory, table):
+    from deposits.services.analytics_export import read_table
+
+    counts = read_table(directory, table, columns=['status']).group_by('status').aggregate([('status', 'count')])
+    return dict(zip(counts['status'].to_pylist(), counts['status_count'].to_pylist()))
+
+
+def disk_size(path):
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path) for name in names
+    )
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--table', default='transactions', help="Table with a status column")
+    parser.add_argument('--page-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    import django
+
+    django.setup()
+    from deposits.services.analytics_export import AnalyticsExporter
+    from deposits.services.repositories import AnalyticsRepository, get_repository
+
+    repository = get_repository(AnalyticsRepository)
+    directory = tempfile.mkdtemp()
+    try:
+        (pulled, json_bytes), pull_s = timed(pull_report, repository, args.table, args.page_size)
+        exporter = AnalyticsExporter(directory, repository, page_size=args.page_size)
+        first, first_s = timed(exporter.export, args.table)
+        again, again_s = timed(exporter.export, args.table)
+        report, report_s = timed(parquet_report, directory, args.table)
+        assert report == pulled, (report, pulled)
+        parquet_bytes = disk_size(os.path.join(directory, args.table))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    print(f"{args.table}: {first['rows']} rows, {first['partitions']} day partitions")
+    print(f"{'step':<36}{'seconds':>9}{'MB':>9}")
+    print(f"{'report from database (JSON pull)':<36}{pull_s:>9.2f}{json_bytes / 2**20:>9.1f}")
+    print(f"{'first export':<36}{first_s:>9.2f}")
+    print(f"{'incremental export, no changes':<36}{again_s:>9.2f}  ({again['rows']} rows re-read)")
+    print(f"{'report from Parquet':<36}{report_s:>9.3f}{parquet_bytes / 2**20:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmark worker cold start for each settings profile.
+
+Each run starts a fresh interpreter that builds the WSGI application and
+serves one GET /api/deposits/health/ request in-process. Reported are
+the median wall time from process spawn to the first response and the
+peak RSS of the worker at that point.
+
+Run from backend folder: python benchmarks/bench_cold_start.py [runs]
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROFILES = ['core.settings', 'core.settings_production']
+
+WORKER = r"""
+import io, json, resource, sys, time
+from django.core.wsgi import get_wsgi_application
+
+application = get_wsgi_application()
+status = []
+environ = {
+    'REQUEST_METHOD': 'GET', 'PATH_INFO': '/api/deposits/health/',
+    'SERVER_NAME': 'localhost', 'SERVER_PORT': '8000', 'HTTP_HOST': 'localhost',
+    'wsgi.input': io.BytesIO(), 'wsgi.url_scheme': 'http', 'wsgi.errors': sys.stderr,
+}
+body = b''.join(application(environ, lambda s, h: status.append(s)))
+print(json.dumps({
+    'status': status[0],
+    'rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'modules': len(sys.modules),
+    'heavy': sorted(m for m in ('boto3', 'jwt', 'dotenv', 'django.contrib.sessions.middleware') if m in sys.modules),
+}))
+"""
+
+
+def run_once(profile):
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=profile, ALLOWED_HOSTS='localhost')
+    start = time.perf_counter()
+    out = subprocess.run(
+        [sys.executable, '-c', WORKER],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    elapsed = time.perf_counter() - start
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result['elapsed_ms'] = elapsed * 1000
+    return result
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 7
+    print(f"{'profile':<28} {'first response':>15} {'peak RSS':>10} {'modules':>8}  heavy imports")
+    for profile in PROFILES:
+        results = [run_once(profile) for _ in range(runs)]
+        assert all(r['status'].startswith('200') for r in results), results[0]
+        elapsed = statistics.median(r['elapsed_ms'] for r in results)
+        rss = statistics.median(r['rss_kb'] for r in results) / 1024
+        print(
+            f"{profile:<28} {elapsed:12.0f} ms {rss:7.1f} MB {results[0]['modules']:>8}  "
+            f"{', '.join(results[0]['heavy']) or '-'}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Benchmark the data backends on the upload path's database pattern.
+
+Each simulated upload resolves a user by Clerk ID (get-or-create) and
+inserts one transaction, as DepositUploadView does. The pattern is run
+sequentially (latency) and from --threads threads (throughput), and
+bulk loads of --batch rows are timed separately (COPY vs multi-row
+INSERT ... RETURNING).
+
+Needs a local Postgres. --setup creates minimal ``users`` and
+``transactions`` tables (use a scratch database). The PostgREST backend
+is included when --postgrest-url points at a PostgREST server for the
+same database.
+
+Run from backend folder:
+    python benchmarks/bench_data_backend.py --dsn postgresql://localhost/bench --setup
+        [--postgrest-url http://localhost:3000 --postgrest-key <jwt>]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    clerk_id text NOT NULL UNIQUE,
+    created_at timestamptz NOT NULL DEFAULT now()
+);
+CREATE TABLE IF NOT EXISTS transactions (
+    id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    user_id uuid NOT NULL REFERENCES users (id),
+    r2_object_key text NOT NULL,
+    detected_confidence double precision,
+    status text NOT NULL DEFAULT 'pending',
+    created_at timestamptz NOT NULL DEFAULT now()
+);
+"""
+
+
+def setup_schema(dsn):
+    import psycopg
+
+    with psycopg.connect(dsn, autocommit=True) as conn:
+        conn.execute(SCHEMA)
+
+
+def upload(backend, clerk_id):
+    user = backend.create_user_if_not_exists(clerk_id)
+    backend.insert_transaction(
+        user_id=user['id'],
+        r2_object_key=f"deposits/bench/{uuid.uuid4()}.jpg",
+        status="pending",
+    )
+
+
+def run_sequential(backend, clerk_ids, requests):
+    latencies = []
+    for i in range(requests):
+        start = time.perf_counter()
+        upload(backend, clerk_ids[i % len(clerk_ids)])
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return statistics.median(latencies) * 1000, latencies[int(len(latencies) * 0.99) - 1] * 1000
+
+
+def run_concurrent(backend, clerk_ids, requests, threads):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(lambda i: upload(backend, clerk_ids[i % len(clerk_ids)]), range(requests)))
+    return requests / (time.perf_counter() - start)
+
+
+def run_bulk(backend, user_id, batch, rounds, with_ids):
+    from datetime import datetime, timezone
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        rows = []
+        for _ in range(batch):
+            row = {
+                "user_id": user_id,
+                "r2_object_key": f"deposits/bench/{uuid.uuid4()}.jpg",
+                "status": "pending",
+                "created_at": datetime.now(timezone.utc),
+                "detected_confidence": None,
+            }
+            if with_ids:
+                row["id"] = str(uuid.uuid4())
+            rows.append(row)
+        backend.insert_transactions(rows)
+    return batch * rounds / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dsn', default=os.getenv('POSTGRES_DSN'))
+    parser.add_argument('--setup', action='store_true')
+    parser.add_argument('--postgrest-url')
+    parser.add_argument('--postgrest-key', default='bench')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--batch', type=int, default=100)
+    parser.add_argument('--rounds', type=int, default=50)
+    args = parser.parse_args()
+    if not args.dsn:
+        parser.error("--dsn (or POSTGRES_DSN) is required")
+
+    if args.setup:
+        setup_schema(args.dsn)
+
+    os.environ['SUPABASE_DB_URL'] = args.dsn
+    os.environ['POSTGRES_POOL_MAX_SIZE'] = str(args.threads)
+    if args.postgrest_url:
+        os.environ['SUPABASE_URL'] = args.postgrest_url
+        os.environ['SUPABASE_SERVICE_ROLE_KEY'] = args.postgrest_key
+        os.environ['SUPABASE_HTTP_MAX_CONNECTIONS'] = str(args.threads)
+
+    import django
+
+    django.setup()
+    from deposits.services.data_backend import PostgRESTBackend
+    from deposits.services.postgres_backend import PostgresBackend
+
+    backends = [("postgres", PostgresBackend())]
+    if args.postgrest_url:
+        backends.insert(0, ("postgrest", PostgRESTBackend()))
+
+    run_id = uuid.uuid4().hex[:8]
+    print(
+        f"{args.requests} uploads (get-or-create user + insert), "
+        f"{args.users} distinct users, {args.threads} threads"
+    )
+    print(f"{'backend':<10} {'p50 ms':>8} {'p99 ms':>8} {'uploads/s':>10}")
+    for name, backend in backends:
+        backend.warm_up()
+        # The first pass creates the users; later passes resolve them
+        clerk_ids = [f"bench_{run_id}_{name}_{i}" for i in range(args.users)]
+        run_concurrent(backend, clerk_ids, len(clerk_ids), args.threads)
+        p50, p99 = run_sequential(backend, clerk_ids, args.requests)
+        throughput = run_concurrent(backend, clerk_ids, args.requests, args.threads)
+        print(f"{name:<10} {p50:8.2f} {p99:8.2f} {throughput:10.0f}")
+
+    print(f"\nbulk insert, {args.rounds} x {args.batch} rows")
+    print(f"{'path':<30} {'rows/s':>10}")
+    for name, backend in backends:
+        user_id = backend.create_user_if_not_exists(f"bench_{run_id}_{name}_bulk")['id']
+        paths = [("array insert", True)] if name == "postgrest" else [
+            ("COPY (client ids)", True),
+            ("INSERT RETURNING", False),
+        ]
+        for label, with_ids in paths:
+            rate = run_bulk(backend, user_id, args.batch, args.rounds, with_ids)
+            print(f"{name + ' ' + label:<30} {rate:10.0f}")
+
+    for _, backend in backends:
+        backend.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Benchmark near-duplicate lookups: linear scan vs the duplicate index.
+
+Indexes --images random 64-bit hashes spread over --users users, then
+looks up perturbed copies of indexed hashes (near-duplicates) and fresh
+random hashes (the common, non-duplicate case), both with a linear
+Hamming scan and with deposits.services.duplicates.DuplicateIndex.
+Also measures dHash of a JPEG phone photo.
+
+Run from backend folder: python benchmarks/bench_duplicates.py [--images 200000]
+"""
+
+import argparse
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+
+def per_op_us(fn, args_list):
+    start = time.perf_counter()
+    for args in args_list:
+        fn(*args)
+    return (time.perf_counter() - start) / len(args_list) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--images', type=int, default=200000)
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    import django
+
+    django.setup()
+    from django.conf import settings
+    from PIL import Image
+    from deposits.services.duplicates import DuplicateIndex
+    from deposits.services.image_hash import dhash
+
+    user_distance = settings.DUPLICATE_USER_MAX_DISTANCE
+    global_distance = settings.DUPLICATE_GLOBAL_MAX_DISTANCE
+    rng = random.Random(0)
+    entries = [
+        (rng.getrandbits(64), f"user_{rng.randrange(args.users)}", f"deposits/x/{i}.jpg")
+        for i in range(args.images)
+    ]
+
+    start = time.perf_counter()
+    index = DuplicateIndex(user_distance, global_distance)
+    for entry in entries:
+        index.add(*entry)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    def perturb(value):
+        flips = rng.sample(range(64), rng.randrange(1, user_distance + 1))
+        return value ^ sum(1 << bit for bit in flips)
+
+    near = [(perturb(h), user) for h, user, _ in rng.sample(entries, args.queries)]
+    fresh = [(rng.getrandbits(64), f"user_{rng.randrange(args.users)}") for _ in range(args.queries)]
+
+    def scan(image_hash, user):
+        best = None
+        for other, owner, key in entries:
+            distance = (other ^ image_hash).bit_count()
+            limit = user_distance if owner == user else global_distance
+            if distance <= limit and (best is None or distance < best[0]):
+                best = (distance, key)
+        return best
+
+    def lookup(image_hash, user):
+        return index.find(image_hash, user)
+
+    print(f"{args.images} images / {args.users} users, index built in {build_ms:.0f} ms "
+          f"(max distance user {user_distance}, global {global_distance})")
+    print(f"{'query':<16} {'scan µs':>10} {'index µs':>10}")
+    for name, queries in (("near-duplicate", near), ("no match", fresh)):
+        scan_us = per_op_us(scan, queries[:20])
+        index_us = per_op_us(lookup, queries)
+        print(f"{name:<16} {scan_us:10.0f} {index_us:10.1f}")
+
+    photo = Image.effect_mandelbrot((4032, 3024), (-2.0, -1.2, 1.0, 1.2), 100).convert('RGB')
+    buffer = io.BytesIO()
+    photo.save(buffer, 'JPEG', quality=85)
+    data = buffer.getvalue()
+    dhash_us = per_op_us(dhash, [(data,)] * 20)
+    print(f"dHash of a 4032x3024 JPEG ({len(data) // 1024} KiB): {dhash_us / 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
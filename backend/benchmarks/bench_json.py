@@ -0,0 +1,79 @@
+"""
+Benchmark JSON serialization throughput on list-sized payloads.
+
+Compares DRF's default JSONRenderer/JSONParser with the fast_json
+renderer/parser on a list of transaction rows shaped like the PostgREST
+responses (UUIDs, timestamps, floats, nullable fields).
+
+Run from backend folder: python benchmarks/bench_json.py
+"""
+
+import io
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from rest_framework.parsers import JSONParser  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from deposits.fast_json import FastJSONParser, FastJSONRenderer, orjson  # noqa: E402
+
+
+ROWS = 500
+ROUNDS = 200
+
+
+def make_rows(count):
+    now = datetime.now(timezone.utc)
+    return [
+        {
+            "id": uuid.uuid4(),
+            "user_id": uuid.uuid4(),
+            "bin_id": None if i % 3 else uuid.uuid4(),
+            "item_type": "Keyboard" if i % 2 else "Mobile Phone",
+            "weight": 100.0 + i,
+            "points_earned": 10 + i % 90,
+            "co2_saved": 20.5 + i,
+            "detected_confidence": 0.5 + (i % 50) / 100,
+            "r2_object_key": f"deposits/user_{i % 40}/{uuid.uuid4()}.jpg",
+            "status": "completed",
+            "created_at": now - timedelta(minutes=i),
+        }
+        for i in range(count)
+    ]
+
+
+def bench(label, fn):
+    fn()
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<36} {ROWS * ROUNDS / elapsed:12,.0f} rows/s")
+
+
+def main():
+    rows = make_rows(ROWS)
+    body = FastJSONRenderer().render(rows)
+    print(f"backend: {'orjson' if orjson else 'stdlib json'}, payload {len(body) / 1024:.0f} KiB, {ROWS} rows")
+
+    drf_renderer, fast_renderer = JSONRenderer(), FastJSONRenderer()
+    bench("render  DRF JSONRenderer", lambda: drf_renderer.render(rows))
+    bench("render  FastJSONRenderer", lambda: fast_renderer.render(rows))
+
+    drf_parser, fast_parser = JSONParser(), FastJSONParser()
+    bench("parse   DRF JSONParser", lambda: drf_parser.parse(io.BytesIO(body)))
+    bench("parse   FastJSONParser", lambda: fast_parser.parse(io.BytesIO(body)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark leaderboard queries: sort-per-view vs the ranked index.
+
+Builds --users users with random points, then measures top-10, a
+user's rank and the neighbourhood around a user, answered by sorting
+all users (what ordering the users table per view amounts to) and by
+deposits.services.leaderboard.Leaderboard. Also measures the cost of an
+incremental points change.
+
+Run from backend folder: python benchmarks/bench_leaderboard.py [--users 100000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+
+def per_op_us(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args()
+
+    import django
+
+    django.setup()
+    from deposits.services.leaderboard import Leaderboard
+
+    points = {f"user-{i}": random.randint(0, 50000) for i in range(args.users)}
+    user_ids = list(points)
+
+    def sorted_users():
+        return sorted(points.items(), key=lambda item: (-item[1], item[0]))
+
+    def sort_top():
+        return sorted_users()[:10]
+
+    def sort_rank():
+        user_id = random.choice(user_ids)
+        return 1 + sum(1 for value in points.values() if value > points[user_id])
+
+    def sort_around():
+        user_id = random.choice(user_ids)
+        ranked = sorted_users()
+        position = next(i for i, (uid, _) in enumerate(ranked) if uid == user_id)
+        return ranked[max(position - 5, 0):position + 6]
+
+    start = time.perf_counter()
+    board = Leaderboard(points)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    index_ops = {
+        "top 10": lambda: board.top(10),
+        "rank": lambda: board.rank(random.choice(user_ids)),
+        "around (±5)": lambda: board.around(random.choice(user_ids), 5),
+        "add points": lambda: board.add_points(random.choice(user_ids), random.randint(1, 100)),
+    }
+    sort_ops = {
+        "top 10": sort_top,
+        "rank": sort_rank,
+        "around (±5)": sort_around,
+    }
+
+    print(f"{args.users} users, index built in {build_ms:.0f} ms")
+    print(f"{'query':<14} {'sort/scan µs':>14} {'index µs':>10}")
+    for name, fn in index_ops.items():
+        sort_us = per_op_us(sort_ops[name], args.iterations) if name in sort_ops else None
+        index_us = per_op_us(fn, args.iterations * 100)
+        sort_text = f"{sort_us:14.0f}" if sort_us is not None else f"{'-':>14}"
+        print(f"{name:<14} {sort_text} {index_us:10.1f}")
+
+
+if __name__ == "__main__":
+    main()
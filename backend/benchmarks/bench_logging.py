@@ -0,0 +1,117 @@
+"""
+Benchmark the per-request cost of logging on the upload path.
+
+Compares the old style (print() plus eagerly formatted f-strings on a
+synchronous handler) with the structured queue-backed handler, with and
+without INFO sampling. Only time spent on the request thread is counted.
+
+Run from backend folder: python benchmarks/bench_logging.py
+"""
+
+import contextlib
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from deposits.logging_utils import (  # noqa: E402
+    AsyncJSONHandler,
+    SamplingFilter,
+    begin_request_sampling,
+    request_id_var,
+)
+
+
+REQUESTS = 20000
+CLERK_ID = "user_2abcDEFghiJKLmnoPQRstu"
+OBJECT_KEY = f"deposits/{CLERK_ID}/6f1c1d2e-8d1b-4b8e-9a57-1d0e2c3b4a59.jpg"
+TX_ID = "0b7f0c2e-5d4a-4f1e-8f3a-2a9c7e6d5b41"
+
+
+def old_style_request(logger):
+    """Mirror of the pre-change upload path's log statements."""
+    print("\n[UPLOAD] POST request received!")
+    logger.info(f"Processing upload for user: {CLERK_ID}")
+    logger.info(f"Uploading image to R2: photo.jpg")
+    logger.info(f"Uploading to R2: {OBJECT_KEY} (image/jpeg)")
+    logger.info(f"Successfully uploaded: {OBJECT_KEY}")
+    logger.info(f"Image uploaded successfully: {OBJECT_KEY}")
+    logger.info(f"Looking up/creating Supabase user for: {CLERK_ID}")
+    print(f"\n[SUPABASE] create_user_if_not_exists called for: {CLERK_ID}")
+    logger.info(f"Looking up user by clerk_id: {CLERK_ID}")
+    logger.info(f"Found user: {TX_ID}")
+    print(f"[SUPABASE] Found existing user: {TX_ID}")
+    logger.info(f"Supabase user ID: {TX_ID}")
+    logger.info("Creating transaction record")
+    logger.info(f"Inserting transaction for user: {TX_ID}")
+    logger.info(f"Created transaction: {TX_ID}")
+    logger.info(f"Transaction created: {TX_ID}")
+
+
+def new_style_request(logger):
+    """Mirror of the current upload path's log statements."""
+    logger.info("Processing upload for user: %s", CLERK_ID)
+    logger.debug("Uploading image to R2: %s", "photo.jpg")
+    logger.info("Uploading to R2: %s (%s)", OBJECT_KEY, "image/jpeg")
+    logger.info("Successfully uploaded: %s", OBJECT_KEY)
+    logger.debug("Image uploaded successfully: %s", OBJECT_KEY)
+    logger.debug("Looking up/creating Supabase user for: %s", CLERK_ID)
+    logger.info("Looking up user by clerk_id: %s", CLERK_ID)
+    logger.info("Found user: %s", TX_ID)
+    logger.debug("Supabase user ID: %s", TX_ID)
+    logger.debug("Creating transaction record")
+    logger.info("Inserting transaction for user: %s", TX_ID)
+    logger.info("Created transaction: %s", TX_ID)
+    logger.info(
+        "Transaction created: %s", TX_ID,
+        extra={"clerk_user_id": CLERK_ID, "r2_object_key": OBJECT_KEY},
+    )
+
+
+def run(name, logger, request_fn, sample_rate=None):
+    start = time.perf_counter()
+    for i in range(REQUESTS):
+        token = request_id_var.set(f"req-{i}")
+        if sample_rate is not None:
+            begin_request_sampling(sample_rate)
+        request_fn(logger)
+        request_id_var.reset(token)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<34} {elapsed / REQUESTS * 1e6:8.1f} us/request", file=sys.__stderr__)
+
+
+def make_logger(name, handler):
+    logger = logging.getLogger(name)
+    logger.handlers[:] = [handler]
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    return logger
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        sink = open(os.path.join(tmp, "log.txt"), "w")
+
+        sync = logging.StreamHandler(sink)
+        sync.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+        old_logger = make_logger("bench.old", sync)
+        with contextlib.redirect_stdout(sink):
+            run("print + f-string, sync handler", old_logger, old_style_request)
+
+        handler = AsyncJSONHandler(stream=sink, queue_size=REQUESTS * 20)
+        handler.addFilter(SamplingFilter())
+        new_logger = make_logger("bench.new", handler)
+        run("lazy, async JSON, no sampling", new_logger, new_style_request, 1.0)
+        handler.stop()
+        handler.start()
+        run("lazy, async JSON, 10% sampling", new_logger, new_style_request, 0.1)
+        handler.stop()
+
+        sink.close()
+
+
+if __name__ == "__main__":
+    main()
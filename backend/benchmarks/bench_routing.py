@@ -0,0 +1,75 @@
+"""
+Benchmark the collection route planner.
+
+Scatters --bins random bins with random loads over a --radius km square
+around the default depot and compares the capacitated nearest-neighbour
+construction alone against the full plan (2-opt + Or-opt), for total
+distance and planning time.
+
+Run from backend folder: python benchmarks/bench_routing.py [--bins 100 300 500]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bins', type=int, nargs='+', default=[100, 300, 500])
+    parser.add_argument('--capacity', type=float, default=20, help="Full-bin equivalents")
+    parser.add_argument('--radius', type=float, default=10, help="km")
+    args = parser.parse_args()
+
+    import django
+
+    django.setup()
+    import numpy as np
+    from django.conf import settings
+    from deposits.services.routing import (
+        haversine_matrix,
+        nearest_neighbor_routes,
+        plan_routes,
+        route_length,
+    )
+
+    depot = (settings.ROUTE_DEPOT_LATITUDE, settings.ROUTE_DEPOT_LONGITUDE)
+    spread = args.radius / 111.0
+
+    print(f"{'bins':>6} {'routes':>7} {'NN km':>9} {'planned km':>11} {'saved':>7} {'NN ms':>7} {'plan ms':>8}")
+    for count in args.bins:
+        stops = [
+            {
+                "latitude": depot[0] + random.uniform(-spread, spread),
+                "longitude": depot[1] + random.uniform(-spread, spread),
+                "load": random.uniform(50, 100),
+            }
+            for _ in range(count)
+        ]
+
+        start = time.perf_counter()
+        distances = haversine_matrix(
+            [depot[0], *(stop["latitude"] for stop in stops)],
+            [depot[1], *(stop["longitude"] for stop in stops)],
+        )
+        demand = np.array([0.0, *(stop["load"] for stop in stops)])
+        routes = nearest_neighbor_routes(distances, demand, args.capacity * 100)
+        nn_ms = (time.perf_counter() - start) * 1000
+        nn_km = sum(route_length(distances, [0, *route, 0]) for route in routes)
+
+        plan = plan_routes(depot, stops, args.capacity)
+        planned_km = plan["total_distance_km"]
+        print(
+            f"{count:6d} {len(plan['routes']):7d} {nn_km:9.1f} {planned_km:11.1f}"
+            f" {(1 - planned_km / nn_km) * 100:6.1f}% {nn_ms:7.1f} {plan['planning_ms']:8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
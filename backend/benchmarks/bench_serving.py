@@ -0,0 +1,218 @@
+"""
+Benchmark per-host serving throughput and memory of the production runner.
+
+Starts ``python -m core.serve`` for each interface (ASGI, WSGI) with and
+without preloading, drives GET requests over keep-alive connections from
+separate client processes for a fixed time, then reports requests/s and
+the summed RSS and PSS of the master and its workers. PSS divides shared
+pages between the processes mapping them, so it shows what preloading
+saves; RSS counts shared pages once per process.
+
+A second part measures the shared-memory cache: lookups from several
+processes of entries written by another.
+
+Run from backend folder: python benchmarks/bench_serving.py [--workers 4]
+"""
+
+import argparse
+import http.client
+import multiprocessing
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+from core.serve import available_cpus  # noqa: E402
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(port, path, deadline):
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', path)
+            if conn.getresponse().status == 200:
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def client(args):
+    port, path, duration = args
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    count = errors = 0
+    latencies = []
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        start = time.perf_counter()
+        try:
+            conn.request('GET', path)
+            response = conn.getresponse()
+            response.read()
+            if response.status == 200:
+                count += 1
+            else:
+                errors += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        latencies.append(time.perf_counter() - start)
+    return count, errors, latencies
+
+
+def process_tree(pid):
+    pids = [pid]
+    for child in pids:
+        try:
+            with open(f'/proc/{child}/task/{child}/children') as f:
+                pids.extend(int(p) for p in f.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+def memory_kb(pids):
+    rss = pss = 0
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/smaps_rollup') as f:
+                for line in f:
+                    if line.startswith('Rss:'):
+                        rss += int(line.split()[1])
+                    elif line.startswith('Pss:'):
+                        pss += int(line.split()[1])
+        except OSError:
+            pass
+    return rss, pss
+
+
+def run_server(interface, preload, workers, connections, duration, path):
+    port = free_port()
+    env = {
+        **os.environ,
+        'PYTHONPATH': BACKEND_DIR,
+        'SERVER_INTERFACE': interface,
+        'SERVER_PRELOAD': str(preload),
+        'SERVER_WORKERS': str(workers),
+        'SERVER_BIND': f'127.0.0.1:{port}',
+        # Warm up against closed ports: each worker imports and builds
+        # what it would for real traffic (boto3, PyJWT, Pillow), and the
+        # network steps fail fast
+        'WARMUP_MODE': 'post_fork',
+        'R2_ACCESS_KEY_ID': 'bench',
+        'R2_SECRET_ACCESS_KEY': 'bench',
+        'R2_ENDPOINT_URL': 'http://127.0.0.1:9',
+        'R2_BUCKET_NAME': 'bench',
+        'CLERK_JWKS_URL': 'http://127.0.0.1:9/jwks',
+        'SUPABASE_URL': 'http://127.0.0.1:9',
+        'SUPABASE_SERVICE_ROLE_KEY': 'bench',
+        'DUPLICATE_DETECTION_ENABLED': 'False',
+    }
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'core.serve'], cwd=BACKEND_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        if not wait_ready(port, path, time.monotonic() + 30):
+            raise RuntimeError(f"{interface} server did not start")
+        # Let every worker load, warm up and serve before measuring
+        with multiprocessing.Pool(connections) as pool:
+            pool.map(client, [(port, path, 3.0)] * connections)
+            start = time.monotonic()
+            results = pool.map(client, [(port, path, duration)] * connections)
+            elapsed = time.monotonic() - start
+        pids = process_tree(server.pid)
+        rss, pss = memory_kb(pids)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    count = sum(r[0] for r in results)
+    latencies = sorted(latency for r in results for latency in r[2])
+    return {
+        'rps': count / elapsed,
+        'errors': sum(r[1] for r in results),
+        'p50_ms': statistics.median(latencies) * 1000 if latencies else 0.0,
+        'p99_ms': latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0.0,
+        'processes': len(pids),
+        'rss_mb': rss / 1024,
+        'pss_mb': pss / 1024,
+    }
+
+
+def cache_reader(args):
+    path, keys, rounds = args
+    from deposits.services.shared_cache import SharedCache
+
+    cache = SharedCache(path, 8192, 2048)
+    hits = 0
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for key in keys:
+            hits += cache.get(key) is not None
+    return hits, time.perf_counter() - start
+
+
+def bench_shared_cache(readers):
+    import django
+    django.setup()
+    from deposits.services.shared_cache import SharedCache
+
+    path = os.path.join(tempfile.mkdtemp(), 'shared-cache')
+    cache = SharedCache(path, 8192, 2048)
+    keys = [f'url:3600:deposits/user_{i % 50}/{i}.jpg' for i in range(4000)]
+    url = b'https://account.r2.cloudflarestorage.com/bucket/deposits/x.jpg?' + b'X' * 400
+    start = time.perf_counter()
+    for key in keys:
+        cache.set(key, url, 3600)
+    write_us = (time.perf_counter() - start) / len(keys) * 1e6
+
+    rounds = 25
+    with multiprocessing.get_context('spawn').Pool(readers) as pool:
+        results = pool.map(cache_reader, [(path, keys, rounds)] * readers)
+    lookups = len(keys) * rounds
+    hit_rate = sum(r[0] for r in results) / (lookups * readers)
+    read_us = statistics.mean(r[1] for r in results) / lookups * 1e6
+    print(f"\nShared cache ({len(keys)} presigned URLs, 8192 slots): "
+          f"write {write_us:.1f} us, read {read_us:.1f} us from {readers} processes, "
+          f"hit rate {hit_rate:.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=available_cpus())
+    parser.add_argument('--connections', type=int, help="Client processes (default 2 x workers)")
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--path', default='/api/deposits/health/live/')
+    args = parser.parse_args()
+    connections = args.connections or 2 * args.workers
+
+    print(f"{args.workers} workers, {connections} connections, {args.duration:.0f}s, GET {args.path}")
+    print(f"{'interface':<10}{'preload':<9}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}"
+          f"{'procs':>7}{'RSS MB':>9}{'PSS MB':>9}")
+    for interface in ('asgi', 'wsgi'):
+        for preload in (True, False):
+            r = run_server(interface, preload, args.workers, connections, args.duration, args.path)
+            print(f"{interface:<10}{str(preload):<9}{r['rps']:>9.0f}{r['p50_ms']:>9.2f}{r['p99_ms']:>9.2f}"
+                  f"{r['processes']:>7}{r['rss_mb']:>9.1f}{r['pss_mb']:>9.1f}"
+                  + (f"  ({r['errors']} errors)" if r['errors'] else ""))
+
+    bench_shared_cache(min(4, connections))
+
+
+if __name__ == '__main__':
+    main()
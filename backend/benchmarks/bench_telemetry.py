@@ -0,0 +1,86 @@
+"""
+Benchmark bin telemetry decoding and coalescing.
+
+Encodes --readings readings from --bins bins as NDJSON and as binary
+column arrays, then measures decoding (deposits.services.telemetry) and
+merging into the coalescing buffer. The flush interval is set high so
+nothing is written.
+
+Run from backend folder: python benchmarks/bench_telemetry.py [--readings 20000]
+"""
+
+import argparse
+import json
+import os
+import random
+import struct
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+
+def best_ms(fn, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--readings', type=int, default=20000)
+    parser.add_argument('--bins', type=int, default=2000)
+    args = parser.parse_args()
+
+    import django
+
+    django.setup()
+    from deposits.services.telemetry import (
+        BINARY_MAGIC,
+        TelemetryBuffer,
+        parse_binary,
+        parse_ndjson,
+    )
+
+    bins = [uuid.uuid4() for _ in range(args.bins)]
+    now = time.time()
+    readings = [
+        (random.choice(bins), now - random.uniform(0, 60), random.uniform(0, 100))
+        for _ in range(args.readings)
+    ]
+    ndjson = "\n".join(
+        json.dumps({"bin_id": str(bin_id), "fill_level": round(fill, 1), "ts": ts})
+        for bin_id, ts, fill in readings
+    ).encode()
+    count = len(readings)
+    binary = (
+        struct.pack('<4sI', BINARY_MAGIC, count)
+        + b"".join(bin_id.bytes for bin_id, _, _ in readings)
+        + struct.pack(f'<{count}d', *(ts for _, ts, _ in readings))
+        + struct.pack(f'<{count}f', *(fill for _, _, fill in readings))
+    )
+
+    buffer = TelemetryBuffer(interval=3600)
+    decoded, _ = parse_binary(binary)
+
+    print(f"{count} readings from {args.bins} bins")
+    print(f"{'step':<18} {'bytes':>10} {'ms':>8} {'readings/s':>12}")
+    for name, body, fn in (
+        ("decode NDJSON", ndjson, lambda: parse_ndjson(ndjson)),
+        ("decode binary", binary, lambda: parse_binary(binary)),
+        ("coalesce", None, lambda: buffer.add(decoded)),
+    ):
+        ms = best_ms(fn)
+        size = f"{len(body):10d}" if body is not None else f"{'-':>10}"
+        print(f"{name:<18} {size} {ms:8.1f} {count / ms * 1000:12.0f}")
+    print(f"{buffer.pending()} bins pending after coalescing")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Benchmark what rejected uploads cost: Django's stock upload handling vs
+the streaming limits of deposits/upload_limits.py.
+
+Posts multipart bodies to /api/deposits/upload/ through Django's WSGI
+handler, reading from an input stream that counts the bytes taken from
+it, once with Django's memory/temporary file handlers and without
+UploadLimitMiddleware (rejection by the serializer) and once with the
+project's settings. For each case it reports the response status, the
+body bytes read and the CPU time per request. Cases: an image over the
+size limit, a non-image file with an image name, and a valid photo
+(which then fails at R2, unconfigured here, in both runs).
+
+Run from backend folder: python benchmarks/bench_uploads.py [--repeat 5]
+"""
+
+import argparse
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+os.environ.setdefault('LOG_LEVEL', 'CRITICAL')
+
+BOUNDARY = 'BenchBoundary7d3f'
+
+
+class CountingStream(io.BytesIO):
+    """A request body that counts the bytes the server reads from it."""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.taken = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.taken += len(data)
+        return data
+
+    def readline(self, size=-1):
+        data = super().readline(size)
+        self.taken += len(data)
+        return data
+
+
+def multipart(filename, content):
+    return (
+        f'--{BOUNDARY}\r\n'
+        f'Content-Disposition: form-data; name="image"; filename="{filename}"\r\n'
+        f'Content-Type: image/jpeg\r\n\r\n'
+    ).encode() + content + f'\r\n--{BOUNDARY}--\r\n'.encode()
+
+
+def photo(width, height, quality):
+    from PIL import Image
+
+    rng = random.Random(0)
+    image = Image.frombytes('RGB', (width, height), rng.randbytes(width * height * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+def post(handler, body):
+    stream = CountingStream(body)
+    environ = {
+        'REQUEST_METHOD': 'POST',
+        'PATH_INFO': '/api/deposits/upload/',
+        'SERVER_NAME': 'testserver',
+        'SERVER_PORT': '80',
+        'HTTP_HOST': 'testserver',
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': stream,
+        'CONTENT_TYPE': f'multipart/form-data; boundary={BOUNDARY}',
+        'CONTENT_LENGTH': str(len(body)),
+    }
+    statuses = []
+    start = time.thread_time()
+    response = handler(environ, lambda status, headers: statuses.append(status))
+    b''.join(response)
+    response.close()
+    return statuses[0].split()[0], stream.taken, time.thread_time() - start
+
+
+def run(cases, repeat):
+    from django.core.handlers.wsgi import WSGIHandler
+
+    handler = WSGIHandler()
+    results = {}
+    for name, body in cases:
+        samples = [post(handler, body) for _ in range(repeat)]
+        status_code, taken, _ = samples[-1]
+        cpu_ms = min(sample[2] for sample in samples) * 1000
+        results[name] = (status_code, taken, cpu_ms)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    import django
+
+    django.setup()
+    from django.conf import settings
+    from django.test import override_settings
+
+    large = photo(4000, 3000, 97)
+    cases = [
+        (f'oversized photo ({len(large) / 2**20:.1f} MB)', multipart('big.jpg', large)),
+        ('not an image (8.0 MB)', multipart('scan.jpg', b'%PDF-1.7\n' + random.Random(1).randbytes(8 * 2**20))),
+        ('valid photo', multipart('photo.jpg', photo(1600, 1200, 85))),
+    ]
+    cases[2] = (f'valid photo ({len(cases[2][1]) / 2**20:.1f} MB)', cases[2][1])
+
+    stock = override_settings(
+        MIDDLEWARE=[m for m in settings.MIDDLEWARE if m != 'deposits.middleware.UploadLimitMiddleware'],
+        FILE_UPLOAD_HANDLERS=[
+            'django.core.files.uploadhandler.MemoryFileUploadHandler',
+            'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+        ],
+        DUPLICATE_DETECTION_ENABLED=False,
+        ALLOWED_HOSTS=['testserver'],
+    )
+    with stock:
+        before = run(cases, args.repeat)
+    with override_settings(DUPLICATE_DETECTION_ENABLED=False, ALLOWED_HOSTS=['testserver']):
+        after = run(cases, args.repeat)
+
+    print(f"{'case':<28}{'handling':<10}{'status':>7}{'read MB':>10}{'CPU ms':>9}")
+    for name, _ in cases:
+        for label, results in (('stock', before), ('streaming', after)):
+            status_code, taken, cpu_ms = results[name]
+            print(f"{name:<28}{label:<10}{status_code:>7}{taken / 2**20:>10.2f}{cpu_ms:>9.2f}")
+
+    from deposits.upload_limits import get_upload_stats
+
+    print("\nUpload stats (streaming runs):", get_upload_stats().stats())
+
+
+if __name__ == '__main__':
+    main()
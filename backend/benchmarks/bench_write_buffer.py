@@ -0,0 +1,128 @@
+"""
+Benchmark transaction inserts at a fixed arrival rate.
+
+Drives the PostgREST backend's insert_transaction() at a constant rate
+(default 500 rps) against a local stub PostgREST server, once per row
+and once through the write-behind buffer, and reports achieved
+throughput, latency and the number of upstream requests.
+
+The stub models a database behind a small connection pool: each request
+costs a fixed round trip plus a per-row cost, and at most --db-conns
+requests are served concurrently.
+
+Run from backend folder: python benchmarks/bench_write_buffer.py [--rps 500]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+
+class StubPostgREST(BaseHTTPRequestHandler):
+    round_trip = 0.010
+    per_row = 0.00005
+    pool: threading.Semaphore
+    requests = 0
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        rows = body if isinstance(body, list) else [body]
+        with self.pool:
+            time.sleep(self.round_trip + self.per_row * len(rows))
+        StubPostgREST.requests += 1
+        for row in rows:
+            row.setdefault('id', str(uuid.uuid4()))
+        payload = json.dumps(rows).encode()
+        self.send_response(201)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def drive(insert, rps, duration, workers):
+    latencies = []
+    lock = threading.Lock()
+
+    def one(scheduled):
+        insert(user_id=str(uuid.uuid4()), r2_object_key=f"deposits/bench/{uuid.uuid4()}.jpg")
+        with lock:
+            latencies.append(time.perf_counter() - scheduled)
+
+    total = int(rps * duration)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for i in range(total):
+            scheduled = start + i / rps
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(one, scheduled)
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "throughput": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rps', type=float, default=500)
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--workers', type=int, default=256)
+    parser.add_argument('--db-conns', type=int, default=4)
+    args = parser.parse_args()
+
+    StubPostgREST.pool = threading.Semaphore(args.db_conns)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubPostgREST)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    os.environ['SUPABASE_URL'] = f"http://127.0.0.1:{server.server_port}"
+    os.environ['SUPABASE_SERVICE_ROLE_KEY'] = 'bench'
+    os.environ['SUPABASE_HTTP_MAX_CONNECTIONS'] = str(args.workers)
+    os.environ['DATA_BACKEND'] = 'deposits.services.data_backend.PostgRESTBackend'
+
+    import django
+
+    django.setup()
+    from django.conf import settings
+    from deposits.services.data_backend import get_data_backend
+    from deposits.services.write_buffer import drain_write_buffer
+
+    print(
+        f"{args.rps:.0f} rps for {args.duration:.0f}s, stub: "
+        f"{StubPostgREST.round_trip * 1000:.0f}ms/request + "
+        f"{StubPostgREST.per_row * 1000:.2f}ms/row, {args.db_conns} db connections"
+    )
+    print(f"{'path':<16} {'achieved rps':>12} {'p50 ms':>9} {'p99 ms':>9} {'upstream reqs':>14}")
+    for name, buffered in (("per-row", False), ("write-behind", True)):
+        settings.TRANSACTION_WRITE_BUFFER_ENABLED = buffered
+        StubPostgREST.requests = 0
+        result = drive(get_data_backend().insert_transaction, args.rps, args.duration, args.workers)
+        print(
+            f"{name:<16} {result['throughput']:12.0f} {result['p50_ms']:9.1f} "
+            f"{result['p99_ms']:9.1f} {StubPostgREST.requests:14d}"
+        )
+    drain_write_buffer()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,10 @@
 ASGI config for core project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Transaction status push (server-sent events and WebSocket, see
+deposits/push.py) is served here, in front of Django, and request bodies
+are checked against their route's limits as they arrive (see
+deposits/upload_limits.py).
 
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
@@ -13,4 +17,13 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up
+from deposits.push import PushApplication  # noqa: E402
+from deposits.upload_limits import UploadGuard  # noqa: E402
+from deposits.warmup import start_server_warm_up  # noqa: E402
+
+application = PushApplication(UploadGuard(django_application))
+
+start_server_warm_up()
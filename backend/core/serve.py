@@ -0,0 +1,146 @@
+"""
+Production server.
+
+Runs the API under gunicorn with one worker set sized to the host::
+
+    python -m core.serve                        # ASGI: API + push endpoints
+    SERVER_INTERFACE=wsgi python -m core.serve  # WSGI: threaded workers, no push
+
+or with gunicorn directly, using this module as its config file::
+
+    gunicorn -c python:core.serve core.asgi:application
+
+The application is preloaded in the master before the workers are
+forked, so Django, the URL conf, the views and their heavy dependencies
+(boto3, PyJWT, Pillow's plugins) are imported once and shared
+copy-on-write. ``gc.freeze()`` before each fork keeps the collector in
+the workers from writing to (and so copying) those shared pages.
+Clients and connection pools are still created per worker after fork
+(``deposits.warmup``); values worth sharing at run time go through the
+host's shared-memory cache (``deposits/services/shared_cache.py``).
+
+Environment (server only; the app is configured in ``core/settings.py``):
+
+- ``SERVER_BIND``: address (default ``0.0.0.0:$PORT``, port 8000)
+- ``SERVER_INTERFACE``: ``asgi`` (uvicorn workers, default) or ``wsgi``
+  (gthread workers)
+- ``SERVER_WORKERS``: worker processes (default: CPUs available to the
+  process, honouring a cgroup CPU quota)
+- ``SERVER_THREADS``: threads per WSGI worker (default 4)
+- ``SERVER_PRELOAD``: preload the app in the master (default true)
+- ``SERVER_TIMEOUT``, ``SERVER_KEEPALIVE``: seconds (default 30, 5)
+- ``SERVER_MAX_REQUESTS``: recycle a worker after this many requests,
+  with 10% jitter (default 0, never)
+
+``WARMUP_MODE`` defaults to ``post_fork`` here. Requires gunicorn, and
+uvicorn for ASGI.
+"""
+
+import gc
+import importlib.util
+import math
+import os
+import sys
+
+
+def available_cpus() -> int:
+    """CPUs this process may use: affinity, capped by a cgroup v2 quota."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+def _flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() == 'true'
+
+
+interface = os.getenv('SERVER_INTERFACE', 'asgi').lower()
+
+# gunicorn settings (module-level names are read as the config)
+bind = os.getenv('SERVER_BIND', f"0.0.0.0:{os.getenv('PORT', '8000')}")
+workers = int(os.getenv('SERVER_WORKERS', '0')) or available_cpus()
+preload_app = _flag('SERVER_PRELOAD', 'True')
+timeout = int(os.getenv('SERVER_TIMEOUT', '30'))
+graceful_timeout = timeout
+keepalive = int(os.getenv('SERVER_KEEPALIVE', '5'))
+max_requests = int(os.getenv('SERVER_MAX_REQUESTS', '0'))
+max_requests_jitter = max_requests // 10
+accesslog = None
+errorlog = '-'
+
+if interface == 'asgi':
+    # The standalone package replaces uvicorn's bundled worker
+    worker_class = (
+        'uvicorn_worker.UvicornWorker' if importlib.util.find_spec('uvicorn_worker')
+        else 'uvicorn.workers.UvicornWorker'
+    )
+    wsgi_app = 'core.asgi:application'
+elif interface == 'wsgi':
+    worker_class = 'gthread'
+    threads = int(os.getenv('SERVER_THREADS', '4'))
+    wsgi_app = 'core.wsgi:application'
+else:
+    raise ValueError(f"SERVER_INTERFACE must be 'asgi' or 'wsgi', not {interface!r}")
+
+# Read by core/settings.py while the app is preloaded
+os.environ.setdefault('WARMUP_MODE', 'post_fork')
+
+
+def _import_dependencies() -> None:
+    """Import what workers would otherwise import lazily, before fork."""
+    import boto3  # noqa: F401
+    import botocore.client  # noqa: F401
+    import jwt.algorithms  # noqa: F401 (loads the crypto backend)
+    from PIL import Image
+
+    Image.init()
+
+
+def when_ready(server) -> None:
+    if preload_app:
+        try:
+            _import_dependencies()
+        except ImportError as e:
+            server.log.warning("Not preloading optional dependency: %s", e)
+
+
+def pre_fork(server, worker) -> None:
+    # Objects that exist now are shared with the worker; keep them out of
+    # its collections
+    gc.freeze()
+
+
+def post_fork(server, worker) -> None:
+    if os.environ.get('WARMUP_MODE') == 'post_fork':
+        from deposits.warmup import post_fork as warm_up_worker
+
+        warm_up_worker(server, worker)
+
+
+def worker_exit(server, worker) -> None:
+    from django.apps import apps
+
+    if apps.ready:
+        from deposits.services.write_buffer import drain_write_buffer
+
+        drain_write_buffer()
+
+
+def main() -> None:
+    from gunicorn.app.wsgiapp import run
+
+    sys.argv = [sys.argv[0], '-c', 'python:core.serve', *sys.argv[1:]]
+    run()
+
+
+if __name__ == '__main__':
+    main()
@@ -11,11 +11,15 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
 import os
+import tempfile
 from pathlib import Path
-from dotenv import load_dotenv
 
-# Load environment variables from .env file
-load_dotenv()
+# Load environment variables from .env file. Skipped when this module is
+# used as the base of another profile (e.g. core.settings_production),
+# which reads its configuration from the real environment.
+if os.getenv('DJANGO_SETTINGS_MODULE', 'core.settings') == 'core.settings':
+    from dotenv import load_dotenv
+    load_dotenv()
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -50,6 +54,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Request ID first so every later log record can be correlated
+    'deposits.middleware.RequestIDMiddleware',
+    'deposits.middleware.TracingMiddleware',
+    'deposits.middleware.ProfilingMiddleware',
     # CORS middleware must be placed before CommonMiddleware
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
@@ -59,6 +67,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'deposits.middleware.UploadLimitMiddleware',
 ]
 
 # CORS Configuration
@@ -80,6 +89,13 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    'x-request-id',
+    'traceparent',
+]
+
+CORS_EXPOSE_HEADERS = [
+    'x-request-id',
+    'traceparent',
 ]
 
 # Django REST Framework Configuration
@@ -90,10 +106,13 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'deposits.fast_json.FastJSONRenderer',
+    ] + (['rest_framework.renderers.BrowsableAPIRenderer'] if DEBUG else []),
     'DEFAULT_PARSER_CLASSES': [
         'rest_framework.parsers.MultiPartParser',
         'rest_framework.parsers.FormParser',
-        'rest_framework.parsers.JSONParser',
+        'deposits.fast_json.FastJSONParser',
     ],
     'EXCEPTION_HANDLER': 'deposits.exception_handler.custom_exception_handler',
 }
@@ -166,6 +185,62 @@ USE_TZ = True
 STATIC_URL = 'static/'
 
 
+# Logging
+# Records are written as JSON lines from a background thread; see
+# deposits/logging_utils.py. INFO-and-below records are kept for a
+# LOG_INFO_SAMPLE_RATE fraction of requests; warnings and errors always.
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_INFO_SAMPLE_RATE = float(os.getenv('LOG_INFO_SAMPLE_RATE', '1.0'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'sampling': {
+            '()': 'deposits.logging_utils.SamplingFilter',
+        },
+    },
+    'handlers': {
+        'async_json': {
+            '()': 'deposits.logging_utils.AsyncJSONHandler',
+            'filters': ['sampling'],
+        },
+    },
+    'root': {
+        'handlers': ['async_json'],
+        'level': LOG_LEVEL,
+    },
+    'loggers': {
+        'django': {
+            'handlers': ['async_json'],
+            'level': LOG_LEVEL,
+            'propagate': False,
+        },
+    },
+}
+
+
+# Tracing
+# Per-stage spans for auth, R2 and Supabase calls; see deposits/tracing.py.
+# TRACING_EXPORTER is 'none' (no-op), 'file' (JSON lines) or 'otlp'
+# (OTLP/HTTP JSON to a collector on localhost).
+
+TRACING_EXPORTER = os.getenv('TRACING_EXPORTER', 'none').lower()
+TRACING_SAMPLE_RATE = float(os.getenv('TRACING_SAMPLE_RATE', '0.1'))
+TRACING_FILE_PATH = os.getenv('TRACING_FILE_PATH', str(BASE_DIR / 'traces.jsonl'))
+TRACING_OTLP_ENDPOINT = os.getenv('TRACING_OTLP_ENDPOINT', 'http://localhost:4318/v1/traces')
+
+
+# Sampling profiler
+# Started/stopped at runtime through /api/deposits/admin/profiler/.
+
+PROFILER_INTERVAL_MS = float(os.getenv('PROFILER_INTERVAL_MS', '5'))
+PROFILER_MAX_STACKS = int(os.getenv('PROFILER_MAX_STACKS', '5000'))
+PROFILER_MAX_DEPTH = int(os.getenv('PROFILER_MAX_DEPTH', '64'))
+PROFILER_MAX_DURATION = int(os.getenv('PROFILER_MAX_DURATION', '3600'))
+
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/6.0/ref/settings/#default-auto-field
 
@@ -187,8 +262,179 @@ R2_REGION = os.getenv("R2_REGION", "auto")
 SUPABASE_URL = os.getenv('SUPABASE_URL')
 SUPABASE_SERVICE_ROLE_KEY = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
 
+# Shared PostgREST HTTP client (keep-alive connection pool)
+SUPABASE_HTTP_TIMEOUT = float(os.getenv('SUPABASE_HTTP_TIMEOUT', '5'))
+SUPABASE_HTTP_MAX_CONNECTIONS = int(os.getenv('SUPABASE_HTTP_MAX_CONNECTIONS', '20'))
+
+# Data access backend (see deposits/services/data_backend.py): PostgREST
+# over HTTP by default, or a direct pooled Postgres connection with
+# deposits.services.postgres_backend.PostgresBackend
+DATA_BACKEND = os.getenv('DATA_BACKEND', 'deposits.services.data_backend.PostgRESTBackend')
+
+# Direct Postgres connection (PostgresBackend only)
+SUPABASE_DB_URL = os.getenv('SUPABASE_DB_URL')
+POSTGRES_POOL_MIN_SIZE = int(os.getenv('POSTGRES_POOL_MIN_SIZE', '2'))
+POSTGRES_POOL_MAX_SIZE = int(os.getenv('POSTGRES_POOL_MAX_SIZE', '10'))
+POSTGRES_POOL_TIMEOUT = float(os.getenv('POSTGRES_POOL_TIMEOUT', '5'))
+# Executions of a statement on a connection before it is prepared
+# server-side; 'none' disables prepared statements (required behind a
+# transaction-mode pooler such as Supavisor on port 6543)
+_prepare_threshold = os.getenv('POSTGRES_PREPARE_THRESHOLD', '0').lower()
+POSTGRES_PREPARE_THRESHOLD = None if _prepare_threshold == 'none' else int(_prepare_threshold)
+
+# Write-behind batching of transaction inserts (opt-in, see
+# deposits/services/write_buffer.py)
+TRANSACTION_WRITE_BUFFER_ENABLED = os.getenv('TRANSACTION_WRITE_BUFFER_ENABLED', 'False').lower() == 'true'
+TRANSACTION_WRITE_BUFFER_MAX_BATCH = int(os.getenv('TRANSACTION_WRITE_BUFFER_MAX_BATCH', '100'))
+TRANSACTION_WRITE_BUFFER_MAX_DELAY_MS = float(os.getenv('TRANSACTION_WRITE_BUFFER_MAX_DELAY_MS', '20'))
+TRANSACTION_WRITE_BUFFER_RESULT_TIMEOUT = float(os.getenv('TRANSACTION_WRITE_BUFFER_RESULT_TIMEOUT', '10'))
+
+# Hosted e-waste image classifier (see deposits/services/classifier.py)
+ML_API_URL = os.getenv('ML_API_URL', 'https://adii-2685-e-waste-api.hf.space/predict')
+ML_API_TIMEOUT = float(os.getenv('ML_API_TIMEOUT', '30'))
+
 # Clerk Configuration
 CLERK_JWKS_URL = os.getenv('CLERK_JWKS_URL')
 
+# Clerk user IDs granted access to admin-only endpoints (comma-separated)
+ADMIN_CLERK_USER_IDS = [
+    user_id for user_id in os.getenv('ADMIN_CLERK_USER_IDS', '').split(',') if user_id
+]
+
+# Other admins have users.role = 'admin'; roles are cached per process for
+# this many seconds (a demotion takes effect within it)
+ADMIN_ROLE_CACHE_TTL = float(os.getenv('ADMIN_ROLE_CACHE_TTL', '60'))
+
 # Signed URL expiration (in seconds) - default 1 hour
 R2_SIGNED_URL_EXPIRATION = int(os.getenv('R2_SIGNED_URL_EXPIRATION', '3600'))
+
+# Signed URLs are memoized until this many seconds before they expire
+R2_SIGNED_URL_REFRESH_MARGIN = int(os.getenv('R2_SIGNED_URL_REFRESH_MARGIN', '300'))
+
+# Maximum number of memoized signed URLs per process
+R2_SIGNED_URL_CACHE_SIZE = int(os.getenv('R2_SIGNED_URL_CACHE_SIZE', '10000'))
+
+# Host-wide shared-memory cache (see deposits/services/shared_cache.py)
+# for presigned URLs, users.id lookups and the JWKS; 8192 x 2 KiB = 16 MiB.
+# Off by default here, on in settings_production. An empty path means
+# /dev/shm/ewaste-shared-cache-<hash of SUPABASE_URL and R2_BUCKET_NAME>
+SHARED_CACHE_ENABLED = os.getenv('SHARED_CACHE_ENABLED', 'False').lower() == 'true'
+SHARED_CACHE_PATH = os.getenv('SHARED_CACHE_PATH', '')
+SHARED_CACHE_SLOTS = int(os.getenv('SHARED_CACHE_SLOTS', '8192'))
+SHARED_CACHE_SLOT_SIZE = int(os.getenv('SHARED_CACHE_SLOT_SIZE', '2048'))
+SHARED_CACHE_USER_TTL = float(os.getenv('SHARED_CACHE_USER_TTL', '86400'))
+SHARED_CACHE_JWKS_TTL = float(os.getenv('SHARED_CACHE_JWKS_TTL', '300'))
+
+# Leaderboard (see deposits/services/leaderboard.py): boards are rebuilt
+# from a database snapshot in the background at this interval (seconds)
+LEADERBOARD_REFRESH_INTERVAL = float(os.getenv('LEADERBOARD_REFRESH_INTERVAL', '300'))
+
+# Per-user stats counters (see deposits/services/user_stats.py). Create the
+# user_stats table and run `manage.py rebuild_user_stats` before enabling;
+# retries bound optimistic writes over PostgREST under contention. Counter
+# updates are applied in the background every flush interval (seconds)
+USER_STATS_ENABLED = os.getenv('USER_STATS_ENABLED', 'False').lower() == 'true'
+USER_STATS_MAX_RETRIES = int(os.getenv('USER_STATS_MAX_RETRIES', '5'))
+USER_STATS_FLUSH_INTERVAL = float(os.getenv('USER_STATS_FLUSH_INTERVAL', '1'))
+
+# Reward rules (see deposits/services/rewards.py) are re-checked against
+# system_settings.updated_at at most this often (seconds)
+REWARD_RULES_CHECK_INTERVAL = float(os.getenv('REWARD_RULES_CHECK_INTERVAL', '30'))
+
+# Batch uploads (POST /api/deposits/upload/batch/): images per request and
+# concurrent R2 uploads per worker process (see deposits/services/batch_upload.py)
+BATCH_UPLOAD_MAX_IMAGES = int(os.getenv('BATCH_UPLOAD_MAX_IMAGES', '20'))
+BATCH_UPLOAD_WORKERS = int(os.getenv('BATCH_UPLOAD_WORKERS', '8'))
+
+# Resumable uploads (see deposits/services/resumable_upload.py): staging
+# directory, chunk size sent per request, R2 multipart part size (at least
+# 5 MiB and a multiple of the chunk size) and session lifetime in seconds.
+# Chunks must fit in DATA_UPLOAD_MAX_MEMORY_SIZE (2.5 MB by default).
+UPLOAD_SESSION_DIR = os.getenv('UPLOAD_SESSION_DIR', str(BASE_DIR / 'upload_sessions'))
+UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', str(512 * 1024)))
+UPLOAD_PART_SIZE = int(os.getenv('UPLOAD_PART_SIZE', str(5 * 1024 * 1024)))
+UPLOAD_SESSION_TTL = int(os.getenv('UPLOAD_SESSION_TTL', '86400'))
+
+# Request body limits (see deposits/upload_limits.py): bodies of routes
+# without an upload limit of their own, and the allowance for multipart
+# framing on top of the image size limit. Uploaded files stay in memory
+# up to FILE_UPLOAD_MAX_MEMORY_SIZE each while a request's files fit in
+# UPLOAD_MEMORY_BUDGET; the rest are spooled to temporary files.
+REQUEST_BODY_MAX_SIZE = int(os.getenv('REQUEST_BODY_MAX_SIZE', str(2621440)))
+UPLOAD_MULTIPART_OVERHEAD = int(os.getenv('UPLOAD_MULTIPART_OVERHEAD', str(64 * 1024)))
+FILE_UPLOAD_MAX_MEMORY_SIZE = int(os.getenv('FILE_UPLOAD_MAX_MEMORY_SIZE', str(2621440)))
+UPLOAD_MEMORY_BUDGET = int(os.getenv('UPLOAD_MEMORY_BUDGET', str(16 * 1024 * 1024)))
+FILE_UPLOAD_HANDLERS = ['deposits.upload_limits.ImageUploadHandler']
+
+# Tiered image cache for R2 reads (see deposits/services/image_cache.py):
+# originals on disk, LRU by bytes; thumbnails in memory, per worker
+IMAGE_CACHE_DIR = os.getenv('IMAGE_CACHE_DIR', str(BASE_DIR / 'image_cache'))
+IMAGE_CACHE_DISK_BYTES = int(os.getenv('IMAGE_CACHE_DISK_BYTES', str(2 * 1024 ** 3)))
+IMAGE_CACHE_MEMORY_BYTES = int(os.getenv('IMAGE_CACHE_MEMORY_BYTES', str(64 * 1024 ** 2)))
+IMAGE_CACHE_THUMBNAIL_SIZE = int(os.getenv('IMAGE_CACHE_THUMBNAIL_SIZE', '256'))
+
+# Near-duplicate detection (see deposits/services/duplicates.py): uploads
+# whose perceptual hash is within these Hamming distances (of 64 bits) of
+# an earlier image of the same user / of any user are flagged
+DUPLICATE_DETECTION_ENABLED = os.getenv('DUPLICATE_DETECTION_ENABLED', 'True').lower() == 'true'
+DUPLICATE_INDEX_PATH = os.getenv('DUPLICATE_INDEX_PATH', str(BASE_DIR / 'duplicate_index.txt'))
+DUPLICATE_USER_MAX_DISTANCE = int(os.getenv('DUPLICATE_USER_MAX_DISTANCE', '10'))
+DUPLICATE_GLOBAL_MAX_DISTANCE = int(os.getenv('DUPLICATE_GLOBAL_MAX_DISTANCE', '4'))
+
+# Bin telemetry ingestion (see deposits/services/telemetry.py): device
+# tokens accepted from smart bins (comma-separated), the interval at which
+# coalesced readings are written to the bins table, and the directory of
+# the fill history segments (see deposits/services/fill_history.py)
+BIN_TELEMETRY_TOKENS = [
+    token for token in os.getenv('BIN_TELEMETRY_TOKENS', '').split(',') if token
+]
+BIN_TELEMETRY_FLUSH_INTERVAL = float(os.getenv('BIN_TELEMETRY_FLUSH_INTERVAL', '10'))
+BIN_FILL_HISTORY_DIR = os.getenv('BIN_FILL_HISTORY_DIR', str(BASE_DIR / 'fill_history'))
+
+# Fill history compaction (manage.py compact_fill_history): days older than
+# RAW_DAYS are downsampled to DOWNSAMPLE_SECONDS buckets, days older than
+# RETENTION_DAYS are deleted
+BIN_FILL_HISTORY_RAW_DAYS = int(os.getenv('BIN_FILL_HISTORY_RAW_DAYS', '7'))
+BIN_FILL_HISTORY_DOWNSAMPLE_SECONDS = int(os.getenv('BIN_FILL_HISTORY_DOWNSAMPLE_SECONDS', '900'))
+BIN_FILL_HISTORY_RETENTION_DAYS = int(os.getenv('BIN_FILL_HISTORY_RETENTION_DAYS', '400'))
+
+# Analytics export (manage.py export_analytics, see
+# deposits/services/analytics_export.py): day-partitioned Parquet files of
+# transactions, bins and users; each run re-reads OVERLAP seconds before
+# the last watermark to catch rows committed late
+ANALYTICS_EXPORT_DIR = os.getenv('ANALYTICS_EXPORT_DIR', str(BASE_DIR / 'analytics_export'))
+ANALYTICS_EXPORT_OVERLAP = int(os.getenv('ANALYTICS_EXPORT_OVERLAP', '300'))
+
+# Collection route planning (see deposits/services/routing.py): default
+# depot (BIT Sindri) and vehicle capacity in full-bin equivalents
+ROUTE_DEPOT_LATITUDE = float(os.getenv('ROUTE_DEPOT_LATITUDE', '23.6693'))
+ROUTE_DEPOT_LONGITUDE = float(os.getenv('ROUTE_DEPOT_LONGITUDE', '86.8947'))
+ROUTE_VEHICLE_CAPACITY = float(os.getenv('ROUTE_VEHICLE_CAPACITY', '20'))
+
+# Transaction status push over SSE/WebSocket (see deposits/push.py, ASGI
+# only). Workers on one host exchange events through Unix datagram
+# sockets in this directory; use one directory per deployment.
+TRANSACTION_EVENTS_SOCKET_DIR = os.getenv(
+    'TRANSACTION_EVENTS_SOCKET_DIR',
+    os.path.join(tempfile.gettempdir(), 'deposits-transaction-events'),
+)
+TRANSACTION_EVENTS_HEARTBEAT = float(os.getenv('TRANSACTION_EVENTS_HEARTBEAT', '25'))
+TRANSACTION_EVENTS_MAX_SUBSCRIPTIONS = int(os.getenv('TRANSACTION_EVENTS_MAX_SUBSCRIPTIONS', '100'))
+
+# Worker warm-up (see deposits/warmup.py): 'off', 'ready' (when core/wsgi.py or
+# core/asgi.py loads the app) or 'post_fork' (from the gunicorn post_fork hook)
+WARMUP_MODE = os.getenv('WARMUP_MODE', 'off').lower()
+
+# Readiness probes (see deposits/health.py). Results are refreshed in the
+# background every HEALTH_PROBE_INTERVAL seconds; a probe turns unhealthy
+# after FAILURE_THRESHOLD consecutive failures and healthy again after
+# SUCCESS_THRESHOLD consecutive successes.
+HEALTH_PROBES = [
+    probe for probe in os.getenv('HEALTH_PROBES', 'r2,postgrest,jwks').split(',') if probe
+]
+HEALTH_PROBE_INTERVAL = float(os.getenv('HEALTH_PROBE_INTERVAL', '15'))
+HEALTH_PROBE_FAILURE_THRESHOLD = int(os.getenv('HEALTH_PROBE_FAILURE_THRESHOLD', '3'))
+HEALTH_PROBE_SUCCESS_THRESHOLD = int(os.getenv('HEALTH_PROBE_SUCCESS_THRESHOLD', '1'))
+HEALTH_PROBE_STALE_AFTER = float(
+    os.getenv('HEALTH_PROBE_STALE_AFTER', str(HEALTH_PROBE_INTERVAL * 4))
+)
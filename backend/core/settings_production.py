@@ -0,0 +1,63 @@
+"""
+Slim production settings for the Deposits API.
+
+Select with ``DJANGO_SETTINGS_MODULE=core.settings_production``.
+
+The deposits API is stateless and authenticates every request with a
+Clerk JWT, so this profile drops everything that only serves the Django
+admin or browser sessions: admin, auth, sessions, messages, static
+files, CSRF, templates and the SQLite database. Configuration comes from
+the real environment; no ``.env`` file is read.
+
+See benchmarks/bench_cold_start.py for time-to-first-response and RSS
+of this profile compared with the default one.
+"""
+
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import REST_FRAMEWORK
+
+
+DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
+
+INSTALLED_APPS = [
+    'rest_framework',
+    'corsheaders',
+    'deposits',
+]
+
+MIDDLEWARE = [
+    'deposits.middleware.RequestIDMiddleware',
+    'deposits.middleware.TracingMiddleware',
+    'deposits.middleware.ProfilingMiddleware',
+    # CORS middleware must be placed before CommonMiddleware
+    'corsheaders.middleware.CorsMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'deposits.middleware.UploadLimitMiddleware',
+]
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    'DEFAULT_RENDERER_CLASSES': [
+        'deposits.fast_json.FastJSONRenderer',
+    ],
+    # Without django.contrib.auth there is no AnonymousUser model;
+    # unauthenticated requests get request.user = None instead.
+    'UNAUTHENTICATED_USER': None,
+}
+
+TEMPLATES = []
+
+DATABASES = {}
+
+AUTH_PASSWORD_VALIDATORS = []
+
+USE_I18N = False
+
+WARMUP_MODE = os.getenv('WARMUP_MODE', 'ready').lower()
+
+# Share presigned URLs, users.id lookups and the JWKS between the
+# workers of a host (see deposits/services/shared_cache.py)
+SHARED_CACHE_ENABLED = os.getenv('SHARED_CACHE_ENABLED', 'True').lower() == 'true'
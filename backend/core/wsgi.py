@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
 application = get_wsgi_application()
+
+# Imported after Django is set up
+from deposits.warmup import start_server_warm_up  # noqa: E402
+
+start_server_warm_up()
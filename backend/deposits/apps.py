@@ -1,5 +1,15 @@
+import os
+
 from django.apps import AppConfig
 
 
 class DepositsConfig(AppConfig):
     name = 'deposits'
+
+    def ready(self):
+        from . import warmup
+
+        # Workers forked from a preloaded app must not reuse the parent's
+        # clients and connection pools
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=warmup.reset_after_fork)
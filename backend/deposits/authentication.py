@@ -6,16 +6,19 @@ It extracts the Clerk user ID (sub claim) for identifying users.
 """
 
 import logging
-from typing import Any, Tuple, Optional
+from typing import Any, Tuple, Optional, TYPE_CHECKING
 from functools import lru_cache
 
-import jwt
-from jwt import PyJWKClient
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.request import Request
 from django.conf import settings
 
+from .tracing import traced, get_tracer
+
+if TYPE_CHECKING:
+    from jwt import PyJWKClient
+
 
 logger = logging.getLogger(__name__)
 
@@ -40,18 +43,56 @@ class ClerkUser:
 
 
 @lru_cache(maxsize=1)
-def get_jwks_client() -> PyJWKClient:
+def get_jwks_client() -> 'PyJWKClient':
     """
     Get a cached JWKS client for Clerk JWT verification.
     
     The JWKS client fetches and caches the public keys from Clerk's
-    JWKS endpoint, which are used to verify JWT signatures.
+    JWKS endpoint, which are used to verify JWT signatures. PyJWT and
+    its crypto backend are imported on first use to keep startup lean.
+    
+    Fetched key sets are also put in the host's shared cache, so one
+    worker's fetch serves the others. A forced refresh (a token signed
+    with an unknown key, i.e. a key rotation) skips and replaces the
+    shared copy.
     """
+    from jwt import PyJWKClient
+    from .fast_json import dumps, loads
+    from .services.shared_cache import get_shared_cache
+    
     jwks_url = settings.CLERK_JWKS_URL
     if not jwks_url:
         raise AuthenticationFailed("CLERK_JWKS_URL is not configured")
     
-    return PyJWKClient(jwks_url)
+    cache_key = f"jwks:{jwks_url}"
+    
+    class SharedJWKClient(PyJWKClient):
+        def get_jwk_set(self, refresh: bool = False):
+            cache = get_shared_cache()
+            if refresh and cache is not None:
+                cache.delete(cache_key)
+            return super().get_jwk_set(refresh)
+        
+        def fetch_data(self) -> Any:
+            cache = get_shared_cache()
+            if cache is not None:
+                data = cache.get(cache_key)
+                if data is not None:
+                    return loads(data)
+            data = super().fetch_data()
+            if cache is not None:
+                cache.set(cache_key, dumps(data), settings.SHARED_CACHE_JWKS_TTL)
+            return data
+        
+        def probe(self) -> None:
+            """
+            Fetch the key set from Clerk, for health checks. The shared
+            copy is neither read nor evicted.
+            """
+            if not PyJWKClient.fetch_data(self).get("keys"):
+                raise AuthenticationFailed("JWKS endpoint returned no keys")
+    
+    return SharedJWKClient(jwks_url)
 
 
 class ClerkJWTAuthentication(BaseAuthentication):
@@ -67,6 +108,7 @@ class ClerkJWTAuthentication(BaseAuthentication):
     
     keyword = 'Bearer'
     
+    @traced("auth.clerk_jwt")
     def authenticate(self, request: Request) -> Optional[Tuple[ClerkUser, str]]:
         """
         Authenticate the request and return a (user, token) tuple.
@@ -97,16 +139,15 @@ class ClerkJWTAuthentication(BaseAuthentication):
         """
         Verify the JWT token and extract user information.
         """
+        import jwt
+        
         try:
-            print(f"\n[AUTH] Starting token verification...")
-            print(f"[AUTH] Token (first 50 chars): {token[:50]}...")
-            
             # Get the signing key from Clerk's JWKS
-            jwks_client = get_jwks_client()
-            print(f"[AUTH] Got JWKS client, fetching signing key...")
-            
-            signing_key = jwks_client.get_signing_key_from_jwt(token)
-            print(f"[AUTH] Got signing key: {signing_key.key_id}")
+            tracer = get_tracer()
+            with tracer.start_as_current_span("auth.jwks_signing_key"):
+                jwks_client = get_jwks_client()
+                signing_key = jwks_client.get_signing_key_from_jwt(token)
+            logger.debug("Got JWKS signing key: %s", signing_key.key_id)
             
             # Decode and verify the token
             # Clerk tokens typically use RS256 algorithm
@@ -121,8 +162,6 @@ class ClerkJWTAuthentication(BaseAuthentication):
                     "require": ["sub", "exp", "iat"],
                 }
             )
-            print(f"[AUTH] Token decoded successfully!")
-            print(f"[AUTH] Payload keys: {list(payload.keys())}")
             
             # Extract the Clerk user ID from the 'sub' claim
             clerk_user_id = payload.get("sub")
@@ -132,26 +171,23 @@ class ClerkJWTAuthentication(BaseAuthentication):
             # Optionally extract email if present
             email = payload.get("email")
             
-            print(f"[AUTH] Successfully authenticated: {clerk_user_id}")
-            logger.info(f"Successfully authenticated Clerk user: {clerk_user_id}")
+            logger.info("Authenticated Clerk user: %s", clerk_user_id)
             
             return (ClerkUser(clerk_user_id, email, payload), token)
             
         except jwt.ExpiredSignatureError:
-            print(f"[AUTH] ERROR: Token has expired")
             logger.warning("JWT token has expired")
             raise AuthenticationFailed("Token has expired")
         
         except jwt.InvalidTokenError as e:
-            print(f"[AUTH] ERROR: Invalid token - {e}")
-            logger.warning(f"Invalid JWT token: {e}")
+            logger.warning("Invalid JWT token: %s", e)
             raise AuthenticationFailed(f"Invalid token: {str(e)}")
         
-        except Exception as e:
-            print(f"[AUTH] ERROR: Unexpected error - {type(e).__name__}: {e}")
-            import traceback
-            print(f"[AUTH] Traceback:\n{traceback.format_exc()}")
-            logger.error(f"Unexpected authentication error: {e}")
+        except AuthenticationFailed:
+            raise
+        
+        except Exception:
+            logger.exception("Unexpected authentication error")
             raise AuthenticationFailed("Authentication failed")
     
     def authenticate_header(self, request: Request) -> str:
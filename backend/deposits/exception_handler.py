@@ -8,6 +8,8 @@ from rest_framework import status
 import logging
 import traceback
 
+from .upload_limits import UploadRejected
+
 logger = logging.getLogger(__name__)
 
 
@@ -18,12 +20,10 @@ def custom_exception_handler(exc, context):
     This catches exceptions that occur during authentication and
     other processing that happens before the view is called.
     """
-    # Print to console for debugging
-    print(f"\n{'='*60}")
-    print(f"EXCEPTION TYPE: {type(exc).__name__}")
-    print(f"EXCEPTION: {exc}")
-    print(f"TRACEBACK:\n{traceback.format_exc()}")
-    print(f"{'='*60}\n")
+    # Upload limits raised while the body is parsed, answered like the
+    # same rejection made before the view (deposits/upload_limits.py)
+    if isinstance(exc, UploadRejected):
+        return Response(exc.as_body(), status=exc.status_code)
     
     # Call REST framework's default exception handler first
     response = exception_handler(exc, context)
@@ -31,7 +31,10 @@ def custom_exception_handler(exc, context):
     # If response is None, DRF didn't handle the exception
     # so we handle it ourselves to ensure JSON response
     if response is None:
-        logger.exception(f"Unhandled exception: {exc}")
+        logger.error(
+            "Unhandled exception: %s", type(exc).__name__,
+            exc_info=(type(exc), exc, exc.__traceback__),
+        )
         return Response(
             {
                 "success": False,
@@ -0,0 +1,117 @@
+"""
+Fast JSON encoding/decoding for DRF and PostgREST payloads.
+
+Uses orjson when it is installed and falls back to the standard library
+otherwise, so the API keeps working in minimal environments. Both paths
+serialize UUIDs and datetimes natively, and ``loads`` accepts bytes so
+HTTP bodies can be decoded without an intermediate ``str``.
+
+The DRF renderer and parser are registered in ``REST_FRAMEWORK`` in
+``core/settings.py``.
+"""
+
+import datetime
+import decimal
+import json
+import uuid
+from typing import Any, Union
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - exercised only without orjson
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    """
+    Encode types neither orjson nor json handle natively.
+
+    Falls back to DRF's encoder for Decimal, lazy strings, timedeltas,
+    querysets and similar.
+    """
+    from rest_framework.utils.encoders import JSONEncoder
+
+    return JSONEncoder().default(obj)
+
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj: Any, indent: bool = False) -> bytes:
+        """Serialize ``obj`` to UTF-8 JSON bytes."""
+        options = _OPTIONS | orjson.OPT_INDENT_2 if indent else _OPTIONS
+        return orjson.dumps(obj, default=_default, option=options)
+
+    def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+        """Deserialize JSON from bytes or str."""
+        return orjson.loads(data)
+
+    JSONDecodeError = orjson.JSONDecodeError
+
+else:
+    def _stdlib_default(obj: Any) -> Any:
+        if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+            return obj.isoformat()
+        if isinstance(obj, uuid.UUID):
+            return str(obj)
+        if isinstance(obj, decimal.Decimal):
+            return float(obj)
+        return _default(obj)
+
+    def dumps(obj: Any, indent: bool = False) -> bytes:
+        """Serialize ``obj`` to UTF-8 JSON bytes."""
+        return json.dumps(
+            obj,
+            default=_stdlib_default,
+            ensure_ascii=False,
+            separators=None if indent else (',', ':'),
+            indent=2 if indent else None,
+        ).encode('utf-8')
+
+    def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+        """Deserialize JSON from bytes or str."""
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        return json.loads(data)
+
+    JSONDecodeError = json.JSONDecodeError
+
+
+class FastJSONRenderer(BaseRenderer):
+    """
+    DRF renderer that serializes responses with ``fast_json.dumps``.
+    """
+
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None) -> bytes:
+        if data is None:
+            return b''
+
+        renderer_context = renderer_context or {}
+        indent = bool(renderer_context.get('indent'))
+        if not indent and accepted_media_type:
+            # Honour "Accept: application/json; indent=4" like JSONRenderer
+            indent = 'indent=' in accepted_media_type
+
+        return dumps(data, indent=indent)
+
+
+class FastJSONParser(BaseParser):
+    """
+    DRF parser that decodes JSON request bodies from bytes.
+    """
+
+    media_type = 'application/json'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return loads(stream.read())
+        except (JSONDecodeError, ValueError) as e:
+            raise ParseError(f"JSON parse error - {str(e)}")
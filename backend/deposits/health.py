@@ -0,0 +1,192 @@
+"""
+Cached upstream health probes for readiness checks.
+
+A background thread probes R2, PostgREST and the Clerk JWKS endpoint
+every ``HEALTH_PROBE_INTERVAL`` seconds and keeps the latest results in
+memory. Readiness requests only read that snapshot, so load balancer
+polling never causes upstream calls.
+
+Each probe flips to unhealthy after ``HEALTH_PROBE_FAILURE_THRESHOLD``
+consecutive failures and back to healthy after
+``HEALTH_PROBE_SUCCESS_THRESHOLD`` consecutive successes, so a single
+slow call does not take a node out of rotation. A snapshot older than
+``HEALTH_PROBE_STALE_AFTER`` seconds (e.g. the probe thread died) counts
+as unhealthy.
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class Probe:
+    """
+    A named upstream check with hysteresis.
+    """
+
+    def __init__(self, name: str, check: Callable[[], None],
+                 failure_threshold: int, success_threshold: int):
+        self.name = name
+        self.check = check
+        self.failure_threshold = failure_threshold
+        self.success_threshold = success_threshold
+
+        # Unknown until the first check completes
+        self.healthy: Optional[bool] = None
+        self.consecutive_failures = 0
+        self.consecutive_successes = 0
+        self.last_checked: Optional[float] = None
+        self.last_latency_ms: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def run(self) -> None:
+        start = time.perf_counter()
+        try:
+            self.check()
+        except Exception as e:
+            self.consecutive_failures += 1
+            self.consecutive_successes = 0
+            self.last_error = f"{type(e).__name__}: {e}"
+            if self.healthy is None or (
+                self.healthy and self.consecutive_failures >= self.failure_threshold
+            ):
+                if self.healthy:
+                    logger.warning("Probe %s is now unhealthy: %s", self.name, self.last_error)
+                self.healthy = False
+        else:
+            self.consecutive_successes += 1
+            self.consecutive_failures = 0
+            self.last_error = None
+            if not self.healthy and (
+                self.healthy is None or self.consecutive_successes >= self.success_threshold
+            ):
+                if self.healthy is False:
+                    logger.info("Probe %s recovered", self.name)
+                self.healthy = True
+        finally:
+            self.last_latency_ms = round((time.perf_counter() - start) * 1000, 1)
+            self.last_checked = time.time()
+
+    def snapshot(self, stale_after: float) -> Dict[str, Any]:
+        stale = self.last_checked is None or time.time() - self.last_checked > stale_after
+        return {
+            "healthy": bool(self.healthy) and not stale,
+            "stale": stale,
+            "last_checked": self.last_checked,
+            "latency_ms": self.last_latency_ms,
+            "consecutive_failures": self.consecutive_failures,
+            "error": self.last_error,
+        }
+
+
+def _check_r2() -> None:
+    from .services.r2_upload import get_r2_client
+
+    get_r2_client().head_bucket(Bucket=settings.R2_BUCKET_NAME)
+
+
+def _check_postgrest() -> None:
+    from .services.supabase_client import (
+        get_http_client,
+        get_supabase_headers,
+        get_supabase_url,
+    )
+
+    response = get_http_client().get(
+        get_supabase_url("users"),
+        headers=get_supabase_headers(),
+        params={"select": "id", "limit": "1"},
+    )
+    response.raise_for_status()
+
+
+def _check_jwks() -> None:
+    from .authentication import get_jwks_client
+
+    # Reaches Clerk on every run, but leaves the host-wide key set that
+    # requests verify against alone
+    get_jwks_client().probe()
+
+
+class ProbeMonitor:
+    """
+    Runs probes on a background thread and serves cached snapshots.
+    """
+
+    def __init__(self, probes: List[Probe], interval: float, stale_after: float):
+        self.probes = probes
+        self.interval = interval
+        self.stale_after = stale_after
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def ensure_started(self) -> None:
+        """Start the probe thread if it is not running (idempotent)."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name='health-probes', daemon=True
+            )
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            for probe in self.probes:
+                probe.run()
+            self._stop.wait(self.interval)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the cached probe results and overall readiness."""
+        probes = {probe.name: probe.snapshot(self.stale_after) for probe in self.probes}
+        return {
+            "ready": all(result["healthy"] for result in probes.values()),
+            "probes": probes,
+        }
+
+
+_monitor: Optional[ProbeMonitor] = None
+_monitor_lock = threading.Lock()
+
+
+def get_monitor() -> ProbeMonitor:
+    """Get the process-wide probe monitor configured from settings."""
+    global _monitor
+    if _monitor is None:
+        with _monitor_lock:
+            if _monitor is None:
+                failure_threshold = settings.HEALTH_PROBE_FAILURE_THRESHOLD
+                success_threshold = settings.HEALTH_PROBE_SUCCESS_THRESHOLD
+                checks = {
+                    "r2": _check_r2,
+                    "postgrest": _check_postgrest,
+                    "jwks": _check_jwks,
+                }
+                _monitor = ProbeMonitor(
+                    probes=[
+                        Probe(name, checks[name], failure_threshold, success_threshold)
+                        for name in settings.HEALTH_PROBES
+                        if name in checks
+                    ],
+                    interval=settings.HEALTH_PROBE_INTERVAL,
+                    stale_after=settings.HEALTH_PROBE_STALE_AFTER,
+                )
+    return _monitor
+
+
+def reset_monitor() -> None:
+    """Forget the monitor (its thread does not survive fork)."""
+    global _monitor, _monitor_lock
+    _monitor = None
+    _monitor_lock = threading.Lock()
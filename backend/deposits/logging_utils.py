@@ -0,0 +1,154 @@
+"""
+Structured, asynchronous logging for the Deposits API.
+
+Log records are emitted as one JSON object per line. The request thread
+only builds the record and puts it on an in-memory queue; JSON encoding
+and the write to the stream happen on a background ``QueueListener``
+thread, so slow stdout/stderr never blocks a request.
+
+Every record carries the current request ID (set by
+``deposits.middleware.RequestIDMiddleware``), and INFO-and-below records
+can be sampled per request to keep high-volume events cheap.
+
+This module deliberately does not import Django so it can be configured
+from ``settings.LOGGING`` and used from standalone scripts.
+"""
+
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+
+# Correlation ID of the request being handled on this thread/task
+request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    'request_id', default=None
+)
+
+# Whether INFO-level records of the current request are kept
+log_sampled_var: contextvars.ContextVar[bool] = contextvars.ContextVar(
+    'log_sampled', default=True
+)
+
+# Attributes present on every LogRecord; anything else came from ``extra``
+_RESERVED_ATTRS = frozenset(
+    vars(logging.LogRecord('', 0, '', 0, '', (), None)).keys()
+) | {'message', 'asctime', 'request_id'}
+
+
+def begin_request_sampling(rate: float) -> bool:
+    """
+    Decide whether low-level logs of the current request are kept.
+
+    The decision is made once per request so a sampled request keeps
+    all of its records and can be followed end to end.
+    """
+    sampled = rate >= 1.0 or random.random() < rate
+    log_sampled_var.set(sampled)
+    return sampled
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Drop INFO/DEBUG records of requests that were not sampled.
+
+    WARNING and above always pass.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or log_sampled_var.get()
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    Format a log record as a single-line JSON object.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        request_id = getattr(record, 'request_id', None)
+        if request_id:
+            data["request_id"] = request_id
+
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS:
+                data[key] = value
+
+        if record.exc_text:
+            data["exc_info"] = record.exc_text
+        elif record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+
+        return json.dumps(data, default=str)
+
+
+_exc_formatter = logging.Formatter()
+
+
+class AsyncJSONHandler(QueueHandler):
+    """
+    Queue-backed handler that writes JSON lines from a listener thread.
+
+    Only the cheap parts of record preparation happen on the calling
+    thread: attaching the request ID and rendering any traceback (frames
+    cannot safely cross threads). Message interpolation, JSON encoding
+    and I/O are left to the listener, so arguments passed to log calls
+    must not be mutated afterwards.
+    """
+
+    def __init__(self, stream=None, queue_size: int = 10000):
+        super().__init__(queue.SimpleQueue())
+        self.queue_size = queue_size
+        target = logging.StreamHandler(stream or sys.stderr)
+        target.setFormatter(JSONFormatter())
+        self.target = target
+        self.listener = QueueListener(self.queue, target, respect_handler_level=False)
+        self._lock_start = threading.Lock()
+        self.start()
+        atexit.register(self.stop)
+        if hasattr(os, 'register_at_fork'):
+            # Threads do not survive fork(); restart the listener in workers
+            os.register_at_fork(after_in_child=self._restart_after_fork)
+
+    def start(self) -> None:
+        with self._lock_start:
+            if self.listener._thread is None:
+                self.listener.start()
+
+    def stop(self) -> None:
+        """Flush queued records and stop the listener thread."""
+        with self._lock_start:
+            if self.listener._thread is not None:
+                self.listener.stop()
+
+    def _restart_after_fork(self) -> None:
+        self.listener._thread = None
+        self._lock_start = threading.Lock()
+        self.start()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.request_id = request_id_var.get()
+        if record.exc_info:
+            record = copy.copy(record)
+            record.exc_text = _exc_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        # Shed log load rather than block or grow without bound
+        if self.queue.qsize() < self.queue_size:
+            self.queue.put_nowait(record)
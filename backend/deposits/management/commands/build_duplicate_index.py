@@ -0,0 +1,117 @@
+"""
+Build the near-duplicate index from the images already in R2.
+
+Lists ``deposits/{clerk_user_id}/...`` objects, downloads and hashes
+them on a thread pool (downloads dominate; Pillow releases the GIL while
+decoding), and writes a fresh index file that replaces
+``DUPLICATE_INDEX_PATH`` atomically. Running workers notice the new file
+and reload it on their next lookup.
+
+With ``--update`` the entries of the existing file are kept and only
+objects missing from it are hashed.
+
+Examples::
+
+    python manage.py build_duplicate_index
+    python manage.py build_duplicate_index --update --workers 32
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from deposits.services.duplicates import format_index_line, parse_index_line
+from deposits.services.image_hash import ImageHashError, dhash
+from deposits.services.r2_upload import R2UploadError, get_r2_client
+
+
+def _owner(object_key):
+    # deposits/{clerk_user_id}/{uuid}.{ext}
+    parts = object_key.split('/')
+    return parts[1] if len(parts) == 3 and parts[1] else None
+
+
+class Command(BaseCommand):
+    help = "Hash deposited images in R2 and rebuild the near-duplicate index."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prefix', default='deposits/')
+        parser.add_argument('--workers', type=int, default=16)
+        parser.add_argument('--output', default=settings.DUPLICATE_INDEX_PATH)
+        parser.add_argument('--update', action='store_true',
+                            help="Keep existing entries and only hash new objects")
+        parser.add_argument('--limit', type=int, help="Stop after hashing this many objects")
+
+    def handle(self, *args, **options):
+        output = options['output']
+        known = {}
+        if options['update'] and os.path.exists(output):
+            with open(output, encoding='utf-8') as f:
+                for line in f:
+                    entry = parse_index_line(line)
+                    if entry is not None:
+                        known[entry[2]] = entry
+
+        try:
+            client = get_r2_client()
+        except R2UploadError as e:
+            raise CommandError(str(e))
+        bucket = settings.R2_BUCKET_NAME
+        if not bucket:
+            raise CommandError("R2_BUCKET_NAME is not configured")
+
+        def hash_object(object_key):
+            body = client.get_object(Bucket=bucket, Key=object_key)['Body'].read()
+            return dhash(body)
+
+        def pending_keys():
+            count = 0
+            paginator = client.get_paginator('list_objects_v2')
+            for page in paginator.paginate(Bucket=bucket, Prefix=options['prefix']):
+                for item in page.get('Contents', []):
+                    key = item['Key']
+                    if key in known or _owner(key) is None:
+                        continue
+                    if options['limit'] is not None and count >= options['limit']:
+                        return
+                    count += 1
+                    yield key
+
+        tmp_path = f"{output}.tmp"
+        hashed = failed = 0
+        start = time.monotonic()
+        with open(tmp_path, 'w', encoding='utf-8') as out, \
+                ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            for entry in known.values():
+                out.write(format_index_line(*entry))
+
+            # Bounded submission keeps at most a few batches of bodies in memory
+            keys = pending_keys()
+            while True:
+                batch = [key for _, key in zip(range(options['workers'] * 4), keys)]
+                if not batch:
+                    break
+                futures = [(key, executor.submit(hash_object, key)) for key in batch]
+                for key, future in futures:
+                    try:
+                        image_hash = future.result()
+                    except ImageHashError as e:
+                        failed += 1
+                        self.stderr.write(f"{key}: {e}")
+                        continue
+                    except Exception as e:
+                        os.unlink(tmp_path)
+                        raise CommandError(f"Download of {key} failed: {e}")
+                    out.write(format_index_line(image_hash, _owner(key), key))
+                    hashed += 1
+                elapsed = time.monotonic() - start
+                self.stdout.write(f"{hashed} hashed ({hashed / elapsed:.0f}/s), {failed} undecodable")
+
+        os.replace(tmp_path, output)
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {len(known) + hashed} images to {output} "
+            f"({hashed} hashed, {len(known)} kept, {failed} undecodable)"
+        ))
@@ -0,0 +1,31 @@
+"""
+Compact the local bin fill history.
+
+Converts closed days from append-only raw segments to sorted column
+files, downsamples days older than ``BIN_FILL_HISTORY_RAW_DAYS`` and
+deletes days older than ``BIN_FILL_HISTORY_RETENTION_DAYS`` (see
+``deposits/services/fill_history.py``). Meant to run daily from cron on
+every host that keeps a history directory.
+
+Example::
+
+    python manage.py compact_fill_history
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from deposits.services.fill_history import FillHistoryError, get_fill_history
+
+
+class Command(BaseCommand):
+    help = "Compact, downsample and expire the bin fill history."
+
+    def handle(self, *args, **options):
+        try:
+            result = get_fill_history().compact()
+        except FillHistoryError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f"{result['compacted']} days compacted, {result['downsampled']} downsampled, "
+            f"{result['deleted']} deleted"
+        ))
@@ -0,0 +1,25 @@
+"""
+Remove expired resumable upload sessions.
+
+Deletes the staged chunks and state of sessions older than
+``UPLOAD_SESSION_TTL``, aborts their R2 multipart uploads and deletes
+stored objects whose transaction was never written (see
+``deposits/services/resumable_upload.py``). Meant to run hourly from
+cron on every host that serves uploads.
+
+Example::
+
+    python manage.py purge_upload_sessions
+"""
+
+from django.core.management.base import BaseCommand
+
+from deposits.services.resumable_upload import get_upload_sessions
+
+
+class Command(BaseCommand):
+    help = "Remove expired resumable upload sessions."
+
+    def handle(self, *args, **options):
+        removed = get_upload_sessions().purge()
+        self.stdout.write(self.style.SUCCESS(f"{removed} expired upload sessions removed"))
@@ -0,0 +1,83 @@
+"""
+Rebuild every user's stats counters from their transactions.
+
+The counters in ``user_stats`` are maintained incrementally as
+transactions are written (see ``deposits/services/user_stats.py``).
+This reconciles them: it streams all transactions in ``id`` order
+(keyset pagination), recomputes each user's counters, including exact
+streaks, and overwrites the rows in batches. Users without transactions
+get empty counters.
+
+Run it once after creating the table, after bulk changes such as
+``rescore_transactions``, and periodically to repair drift. Counter
+updates made by requests while it runs may be overwritten with the
+state it read; the next run picks them up.
+
+Examples::
+
+    python manage.py rebuild_user_stats
+    python manage.py rebuild_user_stats --dry-run
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from deposits.services.data_backend import get_data_backend
+from deposits.services.repositories import LeaderboardRepository, UserStatsRepository, get_repository
+from deposits.services.supabase_client import SupabaseError
+from deposits.services.user_stats import build_all, empty_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute the per-user stats counters from transaction history."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=1000,
+                            help="Transactions read per request")
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Users written per request")
+        parser.add_argument('--dry-run', action='store_true', help="Compute but do not write")
+
+    def handle(self, *args, **options):
+        backend = get_data_backend()
+        repository = get_repository(UserStatsRepository)
+        start = time.monotonic()
+        self.read = 0
+        try:
+            stats_by_user = build_all(self._history(backend, options['page_size']))
+            for user in get_repository(LeaderboardRepository).iter_users():
+                stats_by_user.setdefault(str(user['id']), empty_stats())
+        except SupabaseError as e:
+            raise CommandError(f"Could not read history: {e}")
+
+        self.stdout.write(f"Read {self.read} transactions of {len(stats_by_user)} users")
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS("Done (dry run, nothing written)"))
+            return
+
+        written = 0
+        batch = {}
+        try:
+            for user_id, stats in stats_by_user.items():
+                batch[user_id] = stats
+                if len(batch) >= options['batch_size']:
+                    written += repository.replace_user_stats(batch)
+                    batch = {}
+            written += repository.replace_user_stats(batch)
+        except SupabaseError as e:
+            raise CommandError(f"Stopped after writing {written} users: {e}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote stats of {written} users in {time.monotonic() - start:.1f}s"
+        ))
+
+    def _history(self, backend, page_size):
+        after_id = None
+        while True:
+            rows = backend.fetch_transactions(after_id, page_size)
+            yield from rows
+            self.read += len(rows)
+            if len(rows) < page_size:
+                return
+            after_id = rows[-1]['id']
@@ -0,0 +1,198 @@
+"""
+Re-score historical transactions after a model or reward rule change.
+
+Only completed transactions are re-scored (see ``rescoring``); pending
+and failed ones keep their points. Streams them in ``id`` order (keyset
+pagination), fans chunks out to a process pool for inference and
+scoring, and writes changed rows back with one bulk upsert per chunk.
+At most ``--max-in-flight`` chunks are held in memory at a time.
+
+Progress is checkpointed to ``--checkpoint`` after every chunk: the
+saved ``last_id`` only advances past chunks that are fully written, so
+an interrupted run resumes where it left off without skipping rows.
+
+Users' ``total_points``/``total_co2_saved`` are not adjusted, and neither
+are the per-user stats counters: run ``rebuild_user_stats`` afterwards.
+
+Examples::
+
+    python manage.py rescore_transactions --dry-run
+    python manage.py rescore_transactions --inference api --workers 8
+    python manage.py rescore_transactions --inference stub --chunk-size 1000
+
+To run against local stubs, point ``DATA_BACKEND``/``SUPABASE_DB_URL`` at
+a local Postgres and use ``--inference stub`` (or ``--inference api``
+with ``ML_API_URL`` set to a local server).
+"""
+
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.core.management.base import BaseCommand, CommandError
+
+from deposits.services.data_backend import get_data_backend
+from deposits.services.rescoring import INFERENCE_MODES, RESCORE_STATUS, init_worker, rescore_chunk
+from deposits.services.rewards import get_reward_rules
+from deposits.services.supabase_client import SupabaseError
+
+
+class Command(BaseCommand):
+    help = "Recompute classification, points and CO2 for historical transactions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--inference', choices=INFERENCE_MODES, default='none',
+                            help="Re-classify images ('api', 'stub') or only re-apply rules ('none')")
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--max-in-flight', type=int,
+                            help="Chunks queued or running at once (default: 2 x workers)")
+        parser.add_argument('--checkpoint', default='rescore_checkpoint.json',
+                            help="Progress file used to resume an interrupted run")
+        parser.add_argument('--restart', action='store_true',
+                            help="Ignore an existing checkpoint and start from the beginning")
+        parser.add_argument('--limit', type=int, help="Stop after reading this many rows")
+        parser.add_argument('--dry-run', action='store_true', help="Score but do not write")
+        parser.add_argument('--report-every', type=float, default=5.0,
+                            help="Seconds between progress lines")
+
+    def handle(self, *args, **options):
+        self.options = options
+        backend = get_data_backend()
+        try:
+            rules = get_reward_rules()
+        except SupabaseError as e:
+            raise CommandError(f"Could not load reward rules: {e}")
+
+        state = self._load_checkpoint()
+        max_in_flight = options['max_in_flight'] or 2 * options['workers']
+        self.stdout.write(
+            f"Re-scoring (inference={options['inference']}, rules version={rules.version}, "
+            f"workers={options['workers']}, chunk={options['chunk_size']}) "
+            f"from {state['last_id'] or 'the beginning'}"
+        )
+
+        # Next id to read; may run ahead of the checkpointed last_id
+        after_id = state['last_id']
+        read = 0
+        exhausted = False
+        reached_end = False
+        next_seq = 0
+        next_to_commit = 0
+        pending = {}
+        completed = {}
+        start = last_report = time.monotonic()
+        rows_at_start = state['rows']
+
+        executor = ProcessPoolExecutor(
+            max_workers=options['workers'],
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_worker,
+            initargs=(rules, options['inference']),
+        )
+        try:
+            while True:
+                while not exhausted and len(pending) < max_in_flight:
+                    limit = options['chunk_size']
+                    if options['limit'] is not None:
+                        limit = min(limit, options['limit'] - read)
+                    if limit <= 0:
+                        # Stopped by --limit; the checkpoint stays resumable
+                        exhausted = True
+                        break
+                    rows = backend.fetch_transactions(after_id, limit, RESCORE_STATUS)
+                    if not rows:
+                        reached_end = True
+                        exhausted = True
+                        break
+                    after_id = rows[-1]['id']
+                    read += len(rows)
+                    pending[executor.submit(rescore_chunk, rows)] = (next_seq, after_id, len(rows))
+                    next_seq += 1
+
+                if not pending:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    seq, last_id, count = pending.pop(future)
+                    try:
+                        changed, failures = future.result()
+                    except Exception as e:
+                        raise CommandError(
+                            f"Re-scoring stopped at {state['last_id']}: chunk failed: {e}"
+                        )
+                    if changed and not options['dry_run']:
+                        backend.upsert_transactions(changed)
+                    completed[seq] = (last_id, count, len(changed), failures)
+
+                # Advance the checkpoint over contiguous finished chunks only
+                while next_to_commit in completed:
+                    last_id, count, changed, failures = completed.pop(next_to_commit)
+                    state['last_id'] = last_id
+                    state['rows'] += count
+                    state['changed'] += changed
+                    state['failures'] += failures
+                    next_to_commit += 1
+                self._save_checkpoint(state)
+
+                now = time.monotonic()
+                if now - last_report >= options['report_every']:
+                    last_report = now
+                    self._report(state, rows_at_start, now - start)
+        except SupabaseError as e:
+            raise CommandError(f"Re-scoring stopped at {state['last_id']}: {e}")
+        finally:
+            executor.shutdown(cancel_futures=True)
+
+        state['finished'] = reached_end
+        self._save_checkpoint(state)
+        self._report(state, rows_at_start, time.monotonic() - start)
+        self.stdout.write(self.style.SUCCESS(
+            "Done" + (" (dry run, nothing written)" if options['dry_run'] else "")
+        ))
+
+    def _load_checkpoint(self):
+        path = self.options['checkpoint']
+        fresh = {
+            "last_id": None,
+            "rows": 0,
+            "changed": 0,
+            "failures": 0,
+            "inference": self.options['inference'],
+            "status": RESCORE_STATUS,
+            "finished": False,
+        }
+        if self.options['restart'] or self.options['dry_run'] or not os.path.exists(path):
+            return fresh
+
+        with open(path) as f:
+            state = json.load(f)
+        if state.get('finished'):
+            self.stdout.write(f"Checkpoint {path} is from a finished run; starting over")
+            return fresh
+        if (state.get('inference'), state.get('status')) != (fresh['inference'], fresh['status']):
+            raise CommandError(
+                f"Checkpoint {path} was written with inference={state.get('inference')}, "
+                f"status={state.get('status')}; pass --restart to discard it"
+            )
+        return {**fresh, **state}
+
+    def _save_checkpoint(self, state):
+        if self.options['dry_run']:
+            return
+        path = self.options['checkpoint']
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+
+    def _report(self, state, rows_at_start, elapsed):
+        rows = state['rows'] - rows_at_start
+        rate = rows / elapsed if elapsed > 0 else 0.0
+        self.stdout.write(
+            f"{state['rows']} rows ({rate:.0f} rows/s), {state['changed']} changed, "
+            f"{state['failures']} inference failures, last id {state['last_id']}"
+        )
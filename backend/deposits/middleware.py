@@ -0,0 +1,157 @@
+"""
+Middleware for the Deposits API.
+"""
+
+import re
+import uuid
+
+from django.conf import settings
+from django.http import HttpResponse
+
+from .logging_utils import request_id_var, begin_request_sampling
+from .tracing import get_tracer, SpanContext
+from .profiling import get_profiler
+from .fast_json import dumps
+from .upload_limits import (
+    BODY_METHODS,
+    check_headers,
+    get_upload_stats,
+    parse_content_length,
+    route_limit,
+)
+
+
+# Accept caller-supplied IDs only if they look like a sane token
+_REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9._\-]{1,128}$')
+
+
+class RequestIDMiddleware:
+    """
+    Assign a correlation ID to every request.
+
+    The ID is taken from the ``X-Request-ID`` header when present (so it
+    can be correlated with the frontend or a load balancer), otherwise a
+    new one is generated. It is attached to every log record emitted
+    while handling the request and echoed back in the response.
+    """
+
+    header = 'X-Request-ID'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = settings.LOG_INFO_SAMPLE_RATE
+
+    def __call__(self, request):
+        request_id = request.headers.get(self.header)
+        if not request_id or not _REQUEST_ID_RE.match(request_id):
+            request_id = uuid.uuid4().hex
+
+        request.request_id = request_id
+        token = request_id_var.set(request_id)
+        begin_request_sampling(self.sample_rate)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_id_var.reset(token)
+
+        response[self.header] = request_id
+        return response
+
+
+class TracingMiddleware:
+    """
+    Wrap each request in a root span.
+
+    An incoming W3C ``traceparent`` header is honoured so traces started
+    by the frontend or a proxy continue here. When tracing is disabled
+    this adds a single attribute check per request.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        tracer = get_tracer()
+        if not tracer.enabled:
+            return self.get_response(request)
+
+        parent = SpanContext.from_traceparent(request.headers.get('traceparent'))
+        attributes = {
+            "http.method": request.method,
+            "http.target": request.path,
+        }
+        request_id = getattr(request, 'request_id', None)
+        if request_id:
+            attributes["request.id"] = request_id
+
+        with tracer.start_as_current_span(
+            f"HTTP {request.method} {request.path}",
+            attributes=attributes,
+            context=parent,
+        ) as span:
+            response = self.get_response(request)
+            span.set_attribute("http.status_code", response.status_code)
+            if response.status_code >= 500:
+                span.set_status('ERROR')
+            if span.context is not None:
+                response['traceparent'] = span.context.to_traceparent()
+            return response
+
+
+class ProfilingMiddleware:
+    """
+    Register request threads with the sampling profiler.
+
+    Costs a single attribute check per request while the profiler is
+    disabled.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.profiler = get_profiler()
+
+    def __call__(self, request):
+        profiler = self.profiler
+        if not profiler.enabled or not profiler.should_profile():
+            return self.get_response(request)
+
+        ident = profiler.begin()
+        try:
+            return self.get_response(request)
+        finally:
+            profiler.end(ident)
+
+
+class UploadLimitMiddleware:
+    """
+    Reject request bodies over their route's limit, or image uploads that
+    are not multipart, from the headers before the view reads the body.
+
+    Under ASGI ``UploadGuard`` has already checked this before Django
+    received the body; under WSGI this is the first check. See
+    ``deposits/upload_limits.py``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in BODY_METHODS:
+            return None
+        declared = parse_content_length(request.META.get('CONTENT_LENGTH'))
+        rejection = check_headers(
+            route_limit(request.resolver_match.view_name),
+            request.META.get('CONTENT_TYPE', ''),
+            declared,
+        )
+        if rejection is None:
+            return None
+        get_upload_stats().record_rejected(rejection, 0, declared)
+        return HttpResponse(
+            dumps(rejection.as_body()),
+            content_type='application/json',
+            status=rejection.status_code,
+        )
@@ -0,0 +1,93 @@
+"""
+Permission classes for the Deposits API.
+"""
+
+import hmac
+import logging
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from rest_framework.permissions import BasePermission
+
+from .services.data_backend import get_data_backend
+from .services.supabase_client import SupabaseError
+
+
+logger = logging.getLogger(__name__)
+
+
+# Clerk ID -> (users.role, monotonic expiry)
+_roles: Dict[str, Tuple[Optional[str], float]] = {}
+_roles_lock = threading.Lock()
+
+
+def get_user_role(clerk_user_id: str) -> Optional[str]:
+    """
+    Return the user's ``users.role``, cached for ``ADMIN_ROLE_CACHE_TTL``
+    seconds so admin endpoints do not query the database on every call.
+
+    Raises:
+        SupabaseError: If the lookup fails
+    """
+    now = time.monotonic()
+    with _roles_lock:
+        entry = _roles.get(clerk_user_id)
+    if entry is not None and now < entry[1]:
+        return entry[0]
+    role = get_data_backend().get_user_role(clerk_user_id)
+    with _roles_lock:
+        _roles[clerk_user_id] = (role, now + settings.ADMIN_ROLE_CACHE_TTL)
+    return role
+
+
+class IsAdmin(BasePermission):
+    """
+    Allow access only to Clerk users with the admin role.
+
+    A user is an admin if their Clerk ID is listed in
+    ``ADMIN_CLERK_USER_IDS`` or their ``users.role`` is ``admin``, the
+    same source of truth as the Next.js admin pages. Token claims are not
+    trusted for this: depending on the Clerk session template they may
+    carry user-writable metadata.
+    """
+
+    message = "Admin access required"
+
+    def has_permission(self, request, view) -> bool:
+        user = request.user
+        clerk_user_id = getattr(user, 'clerk_user_id', None)
+        if not clerk_user_id:
+            return False
+
+        if clerk_user_id in settings.ADMIN_CLERK_USER_IDS:
+            return True
+
+        try:
+            return get_user_role(clerk_user_id) == 'admin'
+        except SupabaseError as e:
+            logger.error("Admin role lookup failed: %s", e)
+            return False
+
+
+class HasBinTelemetryToken(BasePermission):
+    """
+    Allow smart bins presenting a device token.
+
+    Bins have no Clerk session; they send ``Authorization: Bearer <token>``
+    with one of the tokens in ``BIN_TELEMETRY_TOKENS``.
+    """
+
+    message = "Valid bin telemetry token required"
+
+    def has_permission(self, request, view) -> bool:
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+        scheme, _, token = header.partition(' ')
+        if scheme.lower() != 'bearer' or not token:
+            return False
+        token = token.strip().encode()
+        return any(
+            hmac.compare_digest(token, allowed.encode())
+            for allowed in settings.BIN_TELEMETRY_TOKENS
+        )
@@ -0,0 +1,202 @@
+"""
+Statistical request profiler.
+
+When enabled (via the admin-only profiler endpoint), a background thread
+periodically samples the Python stacks of threads that are handling a
+profiled request and aggregates them in memory as collapsed stacks -
+the ``frame;frame;frame count`` text format consumed by flamegraph.pl,
+speedscope and similar tools.
+
+A request is profiled with probability ``fraction`` while the profiling
+window is open. When the profiler is disabled, ``ProfilingMiddleware``
+costs a single attribute check per request and no sampler thread runs.
+"""
+
+import logging
+import random
+import sys
+import threading
+import time
+from typing import Dict, Optional, Set
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+# Stacks beyond the capacity are counted under this key
+OVERFLOW_STACK = '[other stacks]'
+
+
+class SamplingProfiler:
+    """
+    Bounded, in-memory sampling profiler for request threads.
+    """
+
+    def __init__(self, interval: float, max_stacks: int, max_depth: int):
+        self.interval = interval
+        self.max_stacks = max_stacks
+        self.max_depth = max_depth
+
+        self.enabled = False
+        self.fraction = 0.0
+        self.deadline: Optional[float] = None
+        self.started_at: Optional[float] = None
+
+        self._threads: Set[int] = set()
+        self._stacks: Dict[str, int] = {}
+        self._labels: Dict[object, str] = {}
+        self._samples = 0
+        self._requests = 0
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    # -- control ---------------------------------------------------------
+
+    def start(self, fraction: float = 1.0, duration: Optional[float] = None) -> None:
+        """
+        Open a profiling window.
+
+        Args:
+            fraction: Probability that a given request is profiled (0-1]
+            duration: Window length in seconds; ``None`` keeps it open
+                until ``stop()`` is called
+        """
+        with self._lock:
+            self.fraction = fraction
+            self.started_at = time.time()
+            self.deadline = time.monotonic() + duration if duration else None
+            self.enabled = True
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='request-profiler', daemon=True
+                )
+                self._thread.start()
+        logger.info("Profiler started: fraction=%s duration=%s", fraction, duration)
+
+    def stop(self) -> None:
+        """Close the profiling window; collected stacks are kept."""
+        self.enabled = False
+        logger.info("Profiler stopped after %d samples", self._samples)
+
+    def reset(self) -> None:
+        """Discard all collected stacks."""
+        with self._lock:
+            self._stacks.clear()
+            self._labels.clear()
+            self._samples = 0
+            self._requests = 0
+
+    # -- request hooks ---------------------------------------------------
+
+    def should_profile(self) -> bool:
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.enabled = False
+            return False
+        return self.fraction >= 1.0 or random.random() < self.fraction
+
+    def begin(self) -> int:
+        ident = threading.get_ident()
+        with self._lock:
+            self._threads.add(ident)
+            self._requests += 1
+        return ident
+
+    def end(self, ident: int) -> None:
+        with self._lock:
+            self._threads.discard(ident)
+
+    # -- sampling --------------------------------------------------------
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            filename = code.co_filename
+            for marker in ('site-packages/', 'backend/'):
+                index = filename.rfind(marker)
+                if index != -1:
+                    filename = filename[index + len(marker):]
+                    break
+            label = f"{code.co_name} ({filename}:{code.co_firstlineno})"
+            self._labels[code] = label
+        return label
+
+    def _collapse(self, frame) -> str:
+        parts = []
+        depth = 0
+        while frame is not None and depth < self.max_depth:
+            parts.append(self._label(frame.f_code))
+            frame = frame.f_back
+            depth += 1
+        parts.reverse()
+        return ';'.join(parts)
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            if self.deadline is not None and time.monotonic() >= self.deadline:
+                self.enabled = False
+            with self._lock:
+                # Checked under the lock so a concurrent start() either
+                # sees this thread alive or starts a new one
+                if not self.enabled:
+                    self._thread = None
+                    return
+                threads = tuple(self._threads)
+            if not threads:
+                continue
+            frames = sys._current_frames()
+            with self._lock:
+                for ident in threads:
+                    frame = frames.get(ident)
+                    if frame is None:
+                        continue
+                    stack = self._collapse(frame)
+                    if stack not in self._stacks and len(self._stacks) >= self.max_stacks:
+                        stack = OVERFLOW_STACK
+                    self._stacks[stack] = self._stacks.get(stack, 0) + 1
+                    self._samples += 1
+            del frames
+
+    # -- export ----------------------------------------------------------
+
+    def collapsed(self) -> str:
+        """Return collected samples in collapsed-stack format."""
+        with self._lock:
+            items = sorted(self._stacks.items(), key=lambda item: -item[1])
+        return ''.join(f"{stack} {count}\n" for stack, count in items)
+
+    def status(self) -> Dict[str, object]:
+        remaining = None
+        if self.enabled and self.deadline is not None:
+            remaining = max(0.0, self.deadline - time.monotonic())
+        return {
+            "enabled": self.enabled,
+            "fraction": self.fraction,
+            "started_at": self.started_at,
+            "remaining_seconds": remaining,
+            "interval_ms": self.interval * 1000,
+            "profiled_requests": self._requests,
+            "samples": self._samples,
+            "distinct_stacks": len(self._stacks),
+            "max_stacks": self.max_stacks,
+        }
+
+
+_profiler: Optional[SamplingProfiler] = None
+_profiler_lock = threading.Lock()
+
+
+def get_profiler() -> SamplingProfiler:
+    """Get the process-wide profiler configured from settings."""
+    global _profiler
+    if _profiler is None:
+        with _profiler_lock:
+            if _profiler is None:
+                _profiler = SamplingProfiler(
+                    interval=settings.PROFILER_INTERVAL_MS / 1000,
+                    max_stacks=settings.PROFILER_MAX_STACKS,
+                    max_depth=settings.PROFILER_MAX_DEPTH,
+                )
+    return _profiler
@@ -0,0 +1,344 @@
+"""
+Transaction Status Push (ASGI).
+
+Two endpoints, served by ``PushApplication`` in ``core/asgi.py`` in
+front of Django:
+
+- ``GET /api/deposits/transactions/events/?ids=<id>,<id>``: server-sent
+  events, for ``EventSource``
+- ``/api/deposits/transactions/ws/``: WebSocket. The client sends
+  ``{"subscribe": [<id>, ...]}`` and ``{"unsubscribe": [<id>, ...]}``
+  and receives ``{"event": "transaction", "data": {...}}`` messages
+
+Both authenticate with the Clerk JWT from the ``Authorization`` header
+or the ``token`` query parameter (browsers cannot set headers on
+EventSource or WebSocket). On subscribe the client first receives the
+current state of each of its transactions, then one event per change::
+
+    {"id": "...", "status": "completed", "item_type": "...",
+     "detected_confidence": 0.93, "points_earned": 40, "co2_saved": 1.2}
+
+Only the owner's transactions are sent; other ids are ignored.
+
+The endpoints bypass Django's request handling, so an idle connection
+costs a coroutine and a ``Subscriber`` rather than a thread. They need
+an ASGI server (e.g. ``uvicorn core.asgi:application``); under WSGI
+they are not routed.
+"""
+
+import asyncio
+import logging
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from rest_framework.exceptions import AuthenticationFailed
+
+from .authentication import ClerkJWTAuthentication
+from .fast_json import dumps, loads
+from .services.supabase_client import SupabaseError
+from .services.transaction_events import (
+    Subscriber,
+    close_event_hub,
+    get_event_hub,
+    to_event,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+SSE_PATH = "/api/deposits/transactions/events/"
+WEBSOCKET_PATH = "/api/deposits/transactions/ws/"
+
+# Reconnection delay suggested to EventSource clients (ms)
+SSE_RETRY_MS = 5000
+
+
+class SubscriptionError(Exception):
+    """Custom exception for invalid subscription requests."""
+    pass
+
+
+def _parse_ids(values: Any) -> List[str]:
+    if not isinstance(values, list):
+        raise SubscriptionError("Expected a list of transaction ids")
+    if len(values) > settings.TRANSACTION_EVENTS_MAX_SUBSCRIPTIONS:
+        raise SubscriptionError(
+            f"At most {settings.TRANSACTION_EVENTS_MAX_SUBSCRIPTIONS} transactions per connection"
+        )
+    try:
+        return list(dict.fromkeys(str(uuid.UUID(str(value))) for value in values))
+    except ValueError:
+        raise SubscriptionError("Transaction ids must be UUIDs")
+
+
+def _token(scope: Dict[str, Any], query: Dict[str, List[str]]) -> Optional[str]:
+    for name, value in scope.get("headers", ()):
+        if name == b"authorization":
+            parts = value.decode("latin-1").split()
+            if len(parts) == 2 and parts[0] == ClerkJWTAuthentication.keyword:
+                return parts[1]
+    tokens = query.get("token")
+    return tokens[0] if tokens else None
+
+
+def _origin(scope: Dict[str, Any]) -> Optional[str]:
+    for name, value in scope.get("headers", ()):
+        if name == b"origin":
+            return value.decode("latin-1")
+    return None
+
+
+def _authenticate(token: Optional[str]) -> Optional[str]:
+    """
+    Verify the Clerk JWT and return the user's ``users.id``, or None if
+    the user has no row yet (and therefore no transactions).
+
+    Raises:
+        AuthenticationFailed: If the token is missing or invalid
+        SupabaseError: If the user cannot be looked up
+    """
+    from .services.data_backend import get_data_backend
+
+    if not token:
+        raise AuthenticationFailed("Authentication credentials were not provided.")
+    user, _ = ClerkJWTAuthentication()._authenticate_token(token)
+    return get_data_backend().get_user_id(user.clerk_user_id)
+
+
+def _snapshot(user_id: Optional[str], ids: List[str]) -> List[Dict[str, Any]]:
+    """Current state of the user's transactions among ``ids``."""
+    from .services.data_backend import get_data_backend
+
+    if user_id is None or not ids:
+        return []
+    return [
+        to_event(row) for row in get_data_backend().get_transactions(ids)
+        if row.get("user_id") == user_id
+    ]
+
+
+async def _push_snapshot(subscriber: Subscriber, ids: List[str]) -> None:
+    """Queue the current state of ``ids`` unless a newer event arrived."""
+    snapshot = await sync_to_async(_snapshot, thread_sensitive=False)(subscriber.user_id, ids)
+    for event in snapshot:
+        if event["id"] not in subscriber.pending:
+            subscriber.push(event)
+
+
+def _public(event: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in event.items() if key != "user_id"}
+
+
+async def _watch_disconnect(receive, subscriber: Subscriber, disconnect_type: str) -> None:
+    while True:
+        message = await receive()
+        if message["type"] == disconnect_type:
+            subscriber.close()
+            return
+
+
+async def _json_response(send, status: int, body: Dict[str, Any],
+                         headers: List[Tuple[bytes, bytes]]) -> None:
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), *headers],
+    })
+    await send({"type": "http.response.body", "body": dumps(body)})
+
+
+def _cors_headers(scope: Dict[str, Any]) -> List[Tuple[bytes, bytes]]:
+    origin = _origin(scope)
+    if origin is None or origin not in settings.CORS_ALLOWED_ORIGINS:
+        return []
+    return [
+        (b"access-control-allow-origin", origin.encode("latin-1")),
+        (b"access-control-allow-credentials", b"true"),
+        (b"vary", b"Origin"),
+    ]
+
+
+def _sse_message(event: Dict[str, Any]) -> bytes:
+    return b"event: transaction\ndata: " + dumps(_public(event)) + b"\n\n"
+
+
+async def serve_events(scope, receive, send) -> None:
+    """Server-sent events endpoint."""
+    cors = _cors_headers(scope)
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    hub = get_event_hub()
+    subscriber = None
+    try:
+        ids = _parse_ids([value for raw in query.get("ids", ()) for value in raw.split(",") if value])
+        user_id = await sync_to_async(_authenticate, thread_sensitive=False)(_token(scope, query))
+        # Subscribe before reading the current state so no change is missed
+        subscriber = Subscriber(user_id)
+        hub.register(subscriber)
+        hub.subscribe(subscriber, ids)
+        await _push_snapshot(subscriber, ids)
+    except (SubscriptionError, AuthenticationFailed, SupabaseError) as e:
+        if subscriber is not None:
+            hub.unregister(subscriber)
+        if isinstance(e, SubscriptionError):
+            status, error, detail = 400, "Invalid subscription", str(e)
+        elif isinstance(e, AuthenticationFailed):
+            status, error, detail = 401, "Authentication failed", str(e.detail)
+        else:
+            status, error, detail = 503, "Database operation failed", str(e)
+        await _json_response(send, status, {"success": False, "error": error, "detail": detail}, cors)
+        return
+
+    watcher = asyncio.ensure_future(_watch_disconnect(receive, subscriber, "http.disconnect"))
+    try:
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream"),
+                (b"cache-control", b"no-cache"),
+                # Stop nginx from buffering the stream
+                (b"x-accel-buffering", b"no"),
+                *cors,
+            ],
+        })
+        await send({
+            "type": "http.response.body",
+            "body": f"retry: {SSE_RETRY_MS}\n\n".encode(),
+            "more_body": True,
+        })
+
+        while True:
+            await subscriber.ready.wait()
+            if subscriber.closed:
+                break
+            ping = subscriber.ping
+            events = subscriber.take()
+            if events:
+                body = b"".join(map(_sse_message, events))
+            elif ping:
+                body = b": ping\n\n"
+            else:
+                continue
+            await send({"type": "http.response.body", "body": body, "more_body": True})
+    except OSError:
+        # Client went away mid-send
+        pass
+    finally:
+        hub.unregister(subscriber)
+        watcher.cancel()
+
+
+async def _websocket_reader(receive, subscriber: Subscriber) -> None:
+    hub = get_event_hub()
+    while True:
+        message = await receive()
+        if message["type"] == "websocket.disconnect":
+            subscriber.close()
+            return
+        if message["type"] != "websocket.receive":
+            continue
+        try:
+            request = loads(message.get("text") or message.get("bytes") or b"")
+            if not isinstance(request, dict):
+                raise SubscriptionError("Expected a JSON object")
+            if "unsubscribe" in request:
+                hub.unsubscribe(subscriber, _parse_ids(request["unsubscribe"]))
+            if "subscribe" in request:
+                ids = [i for i in _parse_ids(request["subscribe"]) if i not in subscriber.ids]
+                if len(subscriber.ids) + len(ids) > settings.TRANSACTION_EVENTS_MAX_SUBSCRIPTIONS:
+                    raise SubscriptionError(
+                        f"At most {settings.TRANSACTION_EVENTS_MAX_SUBSCRIPTIONS} transactions per connection"
+                    )
+                hub.subscribe(subscriber, ids)
+                await _push_snapshot(subscriber, ids)
+        except ValueError:
+            subscriber.notify({"event": "error", "detail": "Invalid JSON"})
+        except SubscriptionError as e:
+            subscriber.notify({"event": "error", "detail": str(e)})
+        except SupabaseError as e:
+            logger.warning("Transaction snapshot failed: %s", e)
+            subscriber.notify({"event": "error", "detail": "Current state unavailable"})
+
+
+async def serve_websocket(scope, receive, send) -> None:
+    """WebSocket endpoint."""
+    message = await receive()
+    if message["type"] != "websocket.connect":
+        return
+    origin = _origin(scope)
+    if origin is not None and origin not in settings.CORS_ALLOWED_ORIGINS:
+        await send({"type": "websocket.close", "code": 4403})
+        return
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    try:
+        user_id = await sync_to_async(_authenticate, thread_sensitive=False)(_token(scope, query))
+    except AuthenticationFailed:
+        await send({"type": "websocket.close", "code": 4401})
+        return
+    except SupabaseError as e:
+        logger.warning("WebSocket user lookup failed: %s", e)
+        await send({"type": "websocket.close", "code": 1011})
+        return
+    await send({"type": "websocket.accept"})
+
+    hub = get_event_hub()
+    subscriber = Subscriber(user_id)
+    hub.register(subscriber)
+    reader = asyncio.ensure_future(_websocket_reader(receive, subscriber))
+    try:
+        while True:
+            await subscriber.ready.wait()
+            if subscriber.closed:
+                break
+            notices = list(subscriber.notices)
+            subscriber.notices.clear()
+            # Keep-alives are left to the server's protocol-level pings
+            for event in subscriber.take():
+                await send({"type": "websocket.send", "text": dumps(
+                    {"event": "transaction", "data": _public(event)}
+                ).decode()})
+            for notice in notices:
+                await send({"type": "websocket.send", "text": dumps(notice).decode()})
+    except OSError:
+        pass
+    finally:
+        hub.unregister(subscriber)
+        reader.cancel()
+
+
+async def _lifespan(receive, send) -> None:
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            close_event_hub()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+class PushApplication:
+    """
+    ASGI application serving the push endpoints and passing everything
+    else to ``application`` (Django). Handles lifespan itself, which
+    Django does not, to remove the worker's event socket on shutdown.
+    """
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] == SSE_PATH and scope["method"] == "GET":
+            return await serve_events(scope, receive, send)
+        if scope["type"] == "lifespan":
+            return await _lifespan(receive, send)
+        if scope["type"] == "websocket":
+            if scope["path"] == WEBSOCKET_PATH:
+                return await serve_websocket(scope, receive, send)
+            await receive()
+            return await send({"type": "websocket.close", "code": 1000})
+        return await self.application(scope, receive, send)
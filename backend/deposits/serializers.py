@@ -4,9 +4,23 @@ Serializers for the Deposits API.
 These handle request validation and response formatting.
 """
 
+from django.conf import settings
 from rest_framework import serializers
 
 
+MAX_IMAGE_SIZE = 10 * 1024 * 1024  # 10MB
+
+ALLOWED_IMAGE_EXTENSIONS = ['jpg', 'jpeg', 'png', 'webp', 'gif']
+
+
+def _validate_image_extension(filename):
+    ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if ext not in ALLOWED_IMAGE_EXTENSIONS:
+        raise serializers.ValidationError(
+            f"Invalid file type. Allowed: {', '.join(ALLOWED_IMAGE_EXTENSIONS)}"
+        )
+
+
 class UploadRequestSerializer(serializers.Serializer):
     """
     Validates the image upload request.
@@ -23,23 +37,38 @@ class UploadRequestSerializer(serializers.Serializer):
         Additional validation for the uploaded image.
         """
         # Check file size (max 10MB)
-        max_size = 10 * 1024 * 1024  # 10MB
-        if value.size > max_size:
+        if value.size > MAX_IMAGE_SIZE:
             raise serializers.ValidationError(
-                f"Image file too large. Maximum size is {max_size // (1024*1024)}MB."
+                f"Image file too large. Maximum size is {MAX_IMAGE_SIZE // (1024*1024)}MB."
             )
         
         # Check file extension
-        allowed_extensions = ['jpg', 'jpeg', 'png', 'webp', 'gif']
-        ext = value.name.rsplit('.', 1)[-1].lower() if '.' in value.name else ''
-        if ext not in allowed_extensions:
-            raise serializers.ValidationError(
-                f"Invalid file type. Allowed: {', '.join(allowed_extensions)}"
-            )
+        _validate_image_extension(value.name)
         
         return value
 
 
+class ResumableUploadCreateSerializer(serializers.Serializer):
+    """
+    Validates the start of a resumable upload.
+    
+    The image itself is sent afterwards in chunks; the same size and
+    type limits as ``UploadRequestSerializer`` apply.
+    """
+    filename = serializers.CharField(max_length=255)
+    size = serializers.IntegerField(
+        min_value=1,
+        max_value=MAX_IMAGE_SIZE,
+        error_messages={
+            'max_value': f"Image file too large. Maximum size is {MAX_IMAGE_SIZE // (1024*1024)}MB.",
+        },
+    )
+    
+    def validate_filename(self, value):
+        _validate_image_extension(value)
+        return value
+
+
 class UploadResponseSerializer(serializers.Serializer):
     """
     Formats the successful upload response.
@@ -58,3 +87,136 @@ class ErrorResponseSerializer(serializers.Serializer):
     success = serializers.BooleanField(default=False)
     error = serializers.CharField()
     detail = serializers.CharField(required=False)
+
+
+class ProfilerControlSerializer(serializers.Serializer):
+    """
+    Validates profiler control requests.
+    """
+    action = serializers.ChoiceField(choices=['start', 'stop', 'reset'])
+    fraction = serializers.FloatField(
+        required=False,
+        default=1.0,
+        min_value=0.0001,
+        max_value=1.0,
+        help_text="Fraction of requests to profile",
+    )
+    duration = serializers.IntegerField(
+        required=False,
+        min_value=1,
+        help_text="Profiling window in seconds",
+    )
+    
+    def validate_duration(self, value):
+        if value > settings.PROFILER_MAX_DURATION:
+            raise serializers.ValidationError(
+                f"Duration cannot exceed {settings.PROFILER_MAX_DURATION} seconds."
+            )
+        return value
+
+
+class LeaderboardQuerySerializer(serializers.Serializer):
+    """
+    Validates leaderboard query parameters.
+    """
+    window = serializers.ChoiceField(
+        choices=['all', 'week', 'month'],
+        required=False,
+        default='all',
+    )
+    limit = serializers.IntegerField(
+        required=False,
+        default=10,
+        min_value=1,
+        max_value=100,
+        help_text="Number of top entries to return",
+    )
+    radius = serializers.IntegerField(
+        required=False,
+        default=5,
+        min_value=0,
+        max_value=50,
+        help_text="Entries to return either side of the user",
+    )
+
+
+class TransactionListQuerySerializer(serializers.Serializer):
+    """
+    Validates transaction list query parameters.
+    """
+    limit = serializers.IntegerField(
+        required=False,
+        default=20,
+        min_value=1,
+        max_value=100,
+        help_text="Number of most recent transactions to return",
+    )
+
+
+class TransactionReviewSerializer(serializers.Serializer):
+    """
+    Validates admin transaction status changes.
+    """
+    status = serializers.ChoiceField(choices=['pending', 'completed', 'failed'])
+    points_earned = serializers.IntegerField(required=False, min_value=0)
+    item_type = serializers.CharField(required=False, max_length=100)
+    co2_saved = serializers.FloatField(required=False, min_value=0)
+
+
+class FillHistoryQuerySerializer(serializers.Serializer):
+    """
+    Validates bin fill history query parameters.
+    """
+    days = serializers.IntegerField(
+        required=False,
+        default=30,
+        min_value=1,
+        max_value=366,
+        help_text="Length of the range ending now, in days",
+    )
+    step = serializers.IntegerField(
+        required=False,
+        default=3600,
+        min_value=0,
+        max_value=86400,
+        help_text="Downsampling bucket in seconds (0 for raw readings)",
+    )
+    agg = serializers.ChoiceField(
+        choices=['mean', 'min', 'max', 'last'],
+        required=False,
+        default='mean',
+    )
+
+
+class RoutePlanRequestSerializer(serializers.Serializer):
+    """
+    Validates a collection route planning request.
+    
+    The depot defaults to ``ROUTE_DEPOT_LATITUDE``/``ROUTE_DEPOT_LONGITUDE``.
+    """
+    depot_latitude = serializers.FloatField(required=False, min_value=-90, max_value=90)
+    depot_longitude = serializers.FloatField(required=False, min_value=-180, max_value=180)
+    horizon_hours = serializers.FloatField(
+        required=False,
+        default=24,
+        min_value=0,
+        max_value=24 * 14,
+        help_text="Collect bins predicted to reach the threshold within this many hours",
+    )
+    threshold = serializers.FloatField(
+        required=False,
+        default=90,
+        min_value=0,
+        max_value=100,
+        help_text="Predicted fill level (%) at which a bin is collected",
+    )
+    vehicle_capacity = serializers.FloatField(
+        required=False,
+        min_value=1,
+        help_text="Vehicle capacity in full-bin equivalents",
+    )
+    vehicles = serializers.IntegerField(
+        required=False,
+        min_value=1,
+        help_text="Maximum number of routes; remaining bins are returned as unserved",
+    )
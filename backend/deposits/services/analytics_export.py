@@ -0,0 +1,458 @@
+"""
+Analytics Export.
+
+Incremental extract of ``transactions``, ``bins`` and ``users`` into
+Parquet files under ``ANALYTICS_EXPORT_DIR``, so reports read compact
+local columnar files instead of pulling whole tables through PostgREST
+as JSON::
+
+    manifest.json
+    transactions/date=2026-10-18/part.parquet
+    transactions/date=2026-10-19/part.parquet
+    bins/date=.../part.parquet
+    users/date=.../part.parquet
+
+Rows are partitioned by the UTC day of ``created_at``, one file per day
+holding the latest exported version of each row, so the tree is a
+snapshot of each table as of its watermark. Read it with ``read_table``,
+``pyarrow.dataset``, pandas or DuckDB
+(``read_parquet('transactions/*/*.parquet', hive_partitioning = true)``).
+
+Each run reads the rows changed since the table's watermark, the largest
+``(updated_at, id)`` exported, in keyset-paginated chunks. Rows are
+buffered per day and merged into that day's file (replacing earlier
+versions of the same ``id``) whenever the buffer fills and at the end.
+The watermark in ``manifest.json`` only advances once the files are
+written, so an interrupted run is simply repeated. Runs start
+``ANALYTICS_EXPORT_OVERLAP`` seconds before the watermark, to pick up
+rows committed late with an earlier ``updated_at``; the rows read again
+merge idempotently.
+
+Every exported table needs a non-null, indexed ``updated_at`` set on
+every write. For each of ``transactions``, ``users`` and ``bins``
+(where the column exists but may be NULL)::
+
+    ALTER TABLE transactions ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ;
+    UPDATE transactions SET updated_at = COALESCE(created_at, now()) WHERE updated_at IS NULL;
+    ALTER TABLE transactions ALTER COLUMN updated_at SET DEFAULT now(),
+        ALTER COLUMN updated_at SET NOT NULL;
+    CREATE INDEX transactions_updated_at_id ON transactions (updated_at, id);
+    CREATE EXTENSION IF NOT EXISTS moddatetime;
+    CREATE TRIGGER transactions_updated_at BEFORE UPDATE ON transactions
+        FOR EACH ROW EXECUTE FUNCTION moddatetime(updated_at);
+
+The Arrow schema is inferred from the rows of the first export and kept
+in the manifest. PostgREST returns timestamps as strings: string columns
+whose values are all ISO timestamps (or dates) become timestamp (date)
+columns, integers mixed with floats become float64, and JSON objects are
+stored as JSON text. A column first seen later is added, and a value
+that no longer fits its column widens it (int64 to float64, otherwise to
+string); either change rewrites the table's existing files, so all of a
+table's files share one schema.
+
+Deleted rows are not seen; ``full=True`` re-exports a table from scratch.
+Requires pyarrow.
+"""
+
+import base64
+import fcntl
+import logging
+import os
+import re
+import shutil
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+
+from ..fast_json import dumps, loads
+from ..tracing import traced
+from .repositories import AnalyticsRepository, get_repository
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - exercised only without pyarrow
+    pa = None
+
+
+logger = logging.getLogger(__name__)
+
+
+EXPORT_TABLES = ("transactions", "bins", "users")
+
+WATERMARK_COLUMN = "updated_at"
+PARTITION_COLUMN = "created_at"
+
+MANIFEST = "manifest.json"
+PART_FILE = "part.parquet"
+
+# Partition of rows without a created_at (Hive's convention)
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+_TIMESTAMP_RE = re.compile(
+    r"^\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}(:\d{2}(\.\d{1,6})?)?(Z|[+-]\d{2}(:?\d{2})?)?$"
+)
+_DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+class AnalyticsExportError(Exception):
+    """Custom exception for analytics export failures."""
+    pass
+
+
+def _require_pyarrow() -> None:
+    if pa is None:
+        raise AnalyticsExportError("pyarrow is required for the analytics export")
+
+
+def _timestamp_type():
+    return pa.timestamp("us", tz="UTC")
+
+
+def _value_type(value: Any):
+    """The Arrow type of one non-null value."""
+    if isinstance(value, bool):
+        return pa.bool_()
+    if isinstance(value, int):
+        return pa.int64()
+    if isinstance(value, (float, Decimal)):
+        return pa.float64()
+    if isinstance(value, datetime):
+        return _timestamp_type()
+    if isinstance(value, date):
+        return pa.date32()
+    if isinstance(value, str):
+        if _TIMESTAMP_RE.match(value):
+            return _timestamp_type()
+        if _DATE_RE.match(value):
+            return pa.date32()
+        return pa.string()
+    if isinstance(value, (list, tuple)):
+        element = pa.null()
+        for item in value:
+            if item is not None:
+                element = _widen(element, _value_type(item))
+        return pa.list_(element)
+    return pa.string()
+
+
+def _widen(current, new):
+    """The narrowest type holding values of both ``current`` and ``new``."""
+    if current == new or pa.types.is_null(new):
+        return current
+    if pa.types.is_null(current):
+        return new
+    if {current, new} == {pa.int64(), pa.float64()}:
+        return pa.float64()
+    if pa.types.is_list(current) and pa.types.is_list(new):
+        return pa.list_(_widen(current.value_type, new.value_type))
+    return pa.string()
+
+
+def infer_schema(rows: List[Dict[str, Any]], schema=None):
+    """
+    Infer the Arrow schema of ``rows``, extending ``schema`` (columns
+    keep their position; new ones are appended).
+    """
+    types = {field.name: field.type for field in schema} if schema is not None else {}
+    for name in (rows[0] if rows else ()):
+        types.setdefault(name, pa.null())
+    for name, current in types.items():
+        # Strings hold anything; other columns only widen on a new kind of value
+        seen = set()
+        for row in rows:
+            if pa.types.is_string(current):
+                break
+            value = row.get(name)
+            if value is None or (type(value) in seen and not isinstance(value, (str, list))):
+                continue
+            seen.add(type(value))
+            current = _widen(current, _value_type(value))
+        types[name] = current
+    return pa.schema(list(types.items()))
+
+
+def _to_datetime(value: Any) -> datetime:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    elif not isinstance(value, datetime):
+        value = datetime.combine(value, datetime.min.time())
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _convert(value: Any, arrow_type) -> Any:
+    """``value`` as the Python value Arrow stores in a column of ``arrow_type``."""
+    if value is None or pa.types.is_null(arrow_type):
+        return None
+    if pa.types.is_timestamp(arrow_type):
+        return _to_datetime(value)
+    if pa.types.is_date(arrow_type):
+        if isinstance(value, datetime):
+            return value.date()
+        return date.fromisoformat(value) if isinstance(value, str) else value
+    if pa.types.is_floating(arrow_type):
+        return float(value)
+    if pa.types.is_list(arrow_type):
+        return [_convert(item, arrow_type.value_type) for item in value]
+    if pa.types.is_string(arrow_type):
+        if isinstance(value, (dict, list, tuple)):
+            return dumps(value).decode()
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        return str(value)
+    return value
+
+
+def _column(values: List[Any], arrow_type) -> List[Any]:
+    if pa.types.is_integer(arrow_type) or pa.types.is_boolean(arrow_type):
+        return values
+    if pa.types.is_string(arrow_type) and all(type(v) is str or v is None for v in values):
+        return values
+    return [_convert(value, arrow_type) for value in values]
+
+
+def to_table(rows: List[Dict[str, Any]], schema):
+    """Build an Arrow table of ``rows`` with ``schema``."""
+    columns = {
+        field.name: _column([row.get(field.name) for row in rows], field.type)
+        for field in schema
+    }
+    return pa.Table.from_pydict(columns, schema=schema)
+
+
+def _conform(table, schema):
+    """``table`` converted to ``schema`` (added columns are null)."""
+    if table.schema == schema:
+        return table
+    return to_table(table.to_pylist(), schema)
+
+
+def _keep_latest(table):
+    """Drop all but the last row of each ``id``."""
+    last: Dict[Any, int] = {}
+    for index, row_id in enumerate(table.column("id").to_pylist()):
+        last[row_id] = index
+    if len(last) == table.num_rows:
+        return table
+    return table.take(sorted(last.values()))
+
+
+def _partition(value: Any) -> str:
+    if value is None:
+        return NULL_PARTITION
+    return _to_datetime(value).date().isoformat()
+
+
+def _encode_schema(schema) -> str:
+    return base64.b64encode(schema.serialize().to_pybytes()).decode("ascii")
+
+
+def _decode_schema(encoded: Optional[str]):
+    if not encoded:
+        return None
+    return pa.ipc.read_schema(pa.py_buffer(base64.b64decode(encoded)))
+
+
+def _write_atomic(table, path: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    pq.write_table(table, tmp_path, compression="zstd")
+    os.replace(tmp_path, path)
+
+
+class AnalyticsExporter:
+    """
+    Exports tables from the database into ``directory``.
+
+    Args:
+        directory: Export root, holding ``manifest.json`` and a folder
+            per table
+        repository: The ``AnalyticsRepository`` to read from
+        page_size: Rows read per request
+        buffer_rows: Rows held in memory before they are merged into the
+            day files
+        overlap: Seconds re-read before each table's watermark
+    """
+
+    def __init__(self, directory: str, repository: AnalyticsRepository, page_size: int = 1000,
+                 buffer_rows: int = 50000, overlap: float = 300):
+        _require_pyarrow()
+        self.directory = directory
+        self.repository = repository
+        self.page_size = page_size
+        self.buffer_rows = buffer_rows
+        self.overlap = overlap
+
+    @contextmanager
+    def _locked(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, ".lock"), "w") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise AnalyticsExportError(f"Another export is running in {self.directory}")
+            yield
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        try:
+            with open(os.path.join(self.directory, MANIFEST), "rb") as f:
+                return loads(f.read())
+        except FileNotFoundError:
+            return {}
+
+    def _write_manifest(self, manifest: Dict[str, Any]) -> None:
+        path = os.path.join(self.directory, MANIFEST)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(dumps(manifest, indent=True))
+        os.replace(tmp_path, path)
+
+    def _pages(self, table: str, after: Optional[Tuple[Any, str]]) -> Iterator[List[Dict[str, Any]]]:
+        while True:
+            rows = self.repository.fetch_changed_rows(table, after, self.page_size)
+            if rows:
+                yield rows
+            if len(rows) < self.page_size:
+                return
+            after = (rows[-1][WATERMARK_COLUMN], rows[-1]["id"])
+
+    def _part_paths(self, table_dir: str) -> List[str]:
+        if not os.path.isdir(table_dir):
+            return []
+        return sorted(
+            os.path.join(table_dir, name, PART_FILE)
+            for name in os.listdir(table_dir)
+            if name.startswith("date=") and os.path.exists(os.path.join(table_dir, name, PART_FILE))
+        )
+
+    def _merge(self, table_dir: str, pending: Dict[str, List[Dict[str, Any]]], schema) -> None:
+        for day, rows in pending.items():
+            path = os.path.join(table_dir, f"date={day}", PART_FILE)
+            merged = to_table(rows, schema)
+            if os.path.exists(path):
+                existing = _conform(pq.read_table(path), schema)
+                merged = pa.concat_tables([existing, merged])
+            _write_atomic(_keep_latest(merged), path)
+
+    @traced("analytics_export.export")
+    def export(self, table: str, full: bool = False) -> Dict[str, Any]:
+        """
+        Export the rows of ``table`` changed since the last run (or all of
+        them with ``full``) and advance its watermark.
+
+        Returns:
+            Dict with ``rows`` read, ``partitions`` written, the new
+            ``watermark`` and ``seconds`` taken
+
+        Raises:
+            AnalyticsExportError: If another export is running
+            SupabaseError: If reading the table fails
+        """
+        if table not in EXPORT_TABLES:
+            raise AnalyticsExportError(f"Unknown table: {table}")
+        start = time.monotonic()
+        with self._locked():
+            manifest = self._read_manifest()
+            state = manifest.get(table, {})
+            table_dir = os.path.join(self.directory, table)
+            after = None
+            schema = None
+            if full:
+                # Build next to the old tree and swap at the end
+                target_dir = f"{table_dir}.{uuid.uuid4().hex}.tmp"
+            else:
+                target_dir = table_dir
+                schema = _decode_schema(state.get("schema"))
+                if state.get("watermark"):
+                    since = _to_datetime(state["watermark"][0]) - timedelta(seconds=self.overlap)
+                    after = (since.isoformat(), "00000000-0000-0000-0000-000000000000")
+
+            rows_read = 0
+            partitions = set()
+            watermark = state.get("watermark") if not full else None
+            pending: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+            buffered = 0
+            try:
+                for rows in self._pages(table, after):
+                    new_schema = infer_schema(rows, schema)
+                    if schema is not None and new_schema != schema:
+                        logger.info("Schema of %s changed; rewriting its files", table)
+                        for path in self._part_paths(target_dir):
+                            _write_atomic(_conform(pq.read_table(path), new_schema), path)
+                    schema = new_schema
+                    for row in rows:
+                        day = _partition(row.get(PARTITION_COLUMN))
+                        pending[day].append(row)
+                        partitions.add(day)
+                    rows_read += len(rows)
+                    buffered += len(rows)
+                    last = rows[-1]
+                    watermark = [_to_datetime(last[WATERMARK_COLUMN]).isoformat(), str(last["id"])]
+                    if buffered >= self.buffer_rows:
+                        self._merge(target_dir, pending, schema)
+                        pending.clear()
+                        buffered = 0
+                self._merge(target_dir, pending, schema)
+                if full:
+                    os.makedirs(target_dir, exist_ok=True)
+                    old_dir = f"{table_dir}.{uuid.uuid4().hex}.old"
+                    if os.path.exists(table_dir):
+                        os.rename(table_dir, old_dir)
+                    os.rename(target_dir, table_dir)
+                    shutil.rmtree(old_dir, ignore_errors=True)
+            finally:
+                if full and os.path.exists(target_dir):
+                    shutil.rmtree(target_dir, ignore_errors=True)
+
+            manifest[table] = {
+                "watermark": watermark,
+                "schema": _encode_schema(schema) if schema is not None else state.get("schema"),
+                "exported_at": datetime.now(timezone.utc).isoformat(),
+                "last_run_rows": rows_read,
+            }
+            self._write_manifest(manifest)
+
+        seconds = time.monotonic() - start
+        logger.info("Exported %d rows of %s into %d partitions in %.1fs",
+                    rows_read, table, len(partitions), seconds)
+        return {
+            "rows": rows_read,
+            "partitions": len(partitions),
+            "watermark": watermark,
+            "seconds": seconds,
+        }
+
+
+def read_table(directory: str, table: str, columns: Optional[List[str]] = None):
+    """
+    Read an exported table as one Arrow table (with the ``date``
+    partition column), optionally only some ``columns``.
+
+    Raises:
+        AnalyticsExportError: If pyarrow is missing or the table was never exported
+    """
+    _require_pyarrow()
+    import pyarrow.dataset as ds
+
+    path = os.path.join(directory, table)
+    if not os.path.isdir(path):
+        raise AnalyticsExportError(f"{table} has not been exported to {directory}")
+    return ds.dataset(path, format="parquet", partitioning="hive").to_table(columns=columns)
+
+
+def get_exporter(directory: Optional[str] = None, **options) -> AnalyticsExporter:
+    """An exporter writing to ``directory`` (default ``ANALYTICS_EXPORT_DIR``)."""
+    return AnalyticsExporter(
+        directory or settings.ANALYTICS_EXPORT_DIR,
+        get_repository(AnalyticsRepository),
+        overlap=settings.ANALYTICS_EXPORT_OVERLAP,
+        **options,
+    )
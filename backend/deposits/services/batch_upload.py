@@ -0,0 +1,64 @@
+"""
+Batch Deposit Uploads.
+
+The per-image work of a batch upload (perceptual hash and R2 upload)
+runs on one bounded thread pool per process. A batch's images are
+uploaded concurrently, while the number of R2 uploads in flight per
+worker stays at ``BATCH_UPLOAD_WORKERS`` however many batches arrive at
+once.
+"""
+
+import atexit
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+
+from ..tracing import traced
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_upload_executor() -> ThreadPoolExecutor:
+    """Get the process-wide upload thread pool, creating it on first use."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.BATCH_UPLOAD_WORKERS,
+                    thread_name_prefix='batch-upload',
+                )
+                atexit.register(_executor.shutdown)
+    return _executor
+
+
+@traced("deposits.batch_map")
+def map_concurrently(fn: Callable[..., Any], items: Iterable[Tuple]) -> List[Tuple[Any, Optional[Exception]]]:
+    """
+    Call ``fn(*item)`` for every item on the upload pool, each in a copy
+    of the caller's context so the request ID and trace carry over.
+
+    Returns:
+        ``(result, None)`` or ``(None, exception)`` per item, in order
+    """
+    executor = get_upload_executor()
+    futures = [executor.submit(contextvars.copy_context().run, fn, *item) for item in items]
+    results = []
+    for future in futures:
+        try:
+            results.append((future.result(), None))
+        except Exception as e:
+            results.append((None, e))
+    return results
+
+
+def reset_after_fork() -> None:
+    """Forget the parent's pool; its threads do not survive fork."""
+    global _executor, _executor_lock
+    _executor = None
+    _executor_lock = threading.Lock()
@@ -0,0 +1,72 @@
+"""
+E-Waste Classifier Client.
+
+Calls the hosted image classifier (``ML_API_URL``) with a pre-signed
+image URL. The API answers with a list of ``{label, score}``
+predictions (or a single prediction object); the top prediction is
+returned, as in the Next.js upload route.
+"""
+
+import logging
+from functools import lru_cache
+from typing import Optional, Tuple
+
+import httpx
+from django.conf import settings
+
+from ..fast_json import dumps, loads
+from ..tracing import traced, inject_trace_headers
+
+
+logger = logging.getLogger(__name__)
+
+
+class ClassifierError(Exception):
+    """Custom exception for classifier failures."""
+    pass
+
+
+@lru_cache(maxsize=1)
+def get_classifier_client() -> httpx.Client:
+    """Get a shared HTTP client for classifier requests."""
+    return httpx.Client(timeout=settings.ML_API_TIMEOUT)
+
+
+@traced("ml.classify")
+def classify_image_url(image_url: str) -> Tuple[str, float]:
+    """
+    Classify the image at ``image_url``.
+
+    Returns:
+        Tuple of (label, score) for the top prediction
+
+    Raises:
+        ClassifierError: If the request fails or the response has no prediction
+    """
+    try:
+        response = get_classifier_client().post(
+            settings.ML_API_URL,
+            headers=inject_trace_headers({"Content-Type": "application/json"}),
+            content=dumps({"image_url": image_url}),
+        )
+        response.raise_for_status()
+        data = loads(response.content)
+    except httpx.HTTPError as e:
+        logger.warning("Classifier request failed: %s", e)
+        raise ClassifierError(f"Classifier request failed: {str(e)}")
+    except ValueError as e:
+        raise ClassifierError(f"Invalid classifier response: {str(e)}")
+
+    prediction = _top_prediction(data)
+    if prediction is None:
+        raise ClassifierError("Classifier returned no prediction")
+    return prediction
+
+
+def _top_prediction(data) -> Optional[Tuple[str, float]]:
+    if isinstance(data, list) and data:
+        best = max(data, key=lambda item: item.get("score", 0))
+        return best.get("label"), float(best.get("score", 0))
+    if isinstance(data, dict) and data.get("label") and data.get("score"):
+        return data["label"], float(data["score"])
+    return None
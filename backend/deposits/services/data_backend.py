@@ -0,0 +1,321 @@
+"""
+Data Access Backends.
+
+The upload path needs a handful of database operations: resolve a user
+by Clerk ID (creating it if needed) and insert/update transactions.
+``DataBackend`` defines those operations; tables of other features go
+through the repositories of ``repositories``. ``DATA_BACKEND`` in
+settings selects the implementation by dotted path:
+
+- ``deposits.services.data_backend.PostgRESTBackend`` (default): the
+  Supabase REST API over HTTP, via ``supabase_client``
+- ``deposits.services.postgres_backend.PostgresBackend``: a direct,
+  pooled psycopg connection to the Supabase Postgres database
+
+Both raise ``SupabaseError`` on failure so callers handle errors the
+same way regardless of backend.
+"""
+
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from . import supabase_client
+from .shared_cache import get_shared_cache
+from .leaderboard import record_transaction_changes, tracks_changes
+from .transaction_events import publish_transaction_updates
+from .user_stats import STATS_COLUMNS, record_inserts, record_updates
+
+
+# Columns read when scanning transactions in bulk (e.g. re-scoring)
+TRANSACTION_SCAN_COLUMNS = (
+    "id", "user_id", "r2_object_key", "status", "created_at", "item_type",
+    "weight", "detected_confidence", "points_earned", "co2_saved",
+)
+
+
+def build_transaction_row(
+    user_id: str,
+    r2_object_key: str,
+    status: str = "pending",
+    detected_confidence: Optional[float] = None,
+    image_url: Optional[str] = None,
+    near_duplicate: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Build a transaction row as stored in the ``transactions`` table.
+
+    ``image_url`` is the signed URL handed out at upload time. It expires,
+    so readers should sign ``r2_object_key`` instead (``GET
+    /api/deposits/transactions/me/``); it is still stored for clients that
+    read the table directly.
+
+    ``near_duplicate`` is the near-duplicate match found at upload time
+    (``duplicates.describe_match``), stored in the nullable ``jsonb``
+    column of the same name so reviewers can filter flagged deposits (see
+    ``supabase/migrations``). Like ``detected_confidence`` it is only
+    included when set, so unflagged uploads do not depend on the column.
+    """
+    row = {
+        "user_id": user_id,
+        "r2_object_key": r2_object_key,
+        "image_url": image_url,
+        "status": status,
+        "created_at": datetime.now(timezone.utc),
+    }
+
+    # Only include detected_confidence if provided
+    if detected_confidence is not None:
+        row["detected_confidence"] = detected_confidence
+
+    if near_duplicate is not None:
+        row["near_duplicate"] = near_duplicate
+
+    return row
+
+
+def align_rows(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Give every row the keys of all rows (missing ones as None), as bulk
+    inserts need one column list. Rows from ``build_transaction_row``
+    differ in their optional columns.
+    """
+    columns = dict.fromkeys(column for row in rows for column in row)
+    if all(len(row) == len(columns) for row in rows):
+        return rows
+    return [{column: row.get(column) for column in columns} for row in rows]
+
+
+class DataBackend:
+    """
+    Interface for the user and transaction operations used by the
+    deposits API. Tables of single features are behind the narrower
+    interfaces of the ``repositories`` module; a backend names its
+    implementations in its ``repositories`` attribute.
+    """
+
+    # Dotted paths of this backend's feature repositories, by interface
+    # name; imported on first use
+    repositories: Dict[str, str] = {}
+
+    def repository(self, interface: type) -> Any:
+        """Return this backend's implementation of a repository interface."""
+        cache = self.__dict__.setdefault("_repositories", {})
+        repository = cache.get(interface)
+        if repository is None:
+            path = self.repositories.get(interface.__name__)
+            if path is None:
+                raise NotImplementedError(f"{type(self).__name__} has no {interface.__name__}")
+            repository = cache.setdefault(interface, import_string(path)(self))
+        return repository
+
+    def warm_up(self) -> None:
+        """Open connections ahead of the first request (optional)."""
+
+    def close(self) -> None:
+        """Release connections (optional)."""
+
+    def get_user_by_clerk_id(self, clerk_id: str) -> Optional[Dict[str, Any]]:
+        """Return the user with this Clerk ID, or None."""
+        raise NotImplementedError
+
+    def create_user_if_not_exists(self, clerk_id: str) -> Dict[str, Any]:
+        """Return the user with this Clerk ID, creating it if needed."""
+        raise NotImplementedError
+
+    def get_user_role(self, clerk_id: str) -> Optional[str]:
+        """Return ``users.role`` for a Clerk ID, or None if there is no such user."""
+        raise NotImplementedError
+
+    def get_user_id(self, clerk_id: str, create: bool = False) -> Optional[str]:
+        """
+        Return the ``users.id`` for a Clerk ID (creating the user if
+        ``create``), or None if there is no such user.
+
+        IDs never change, so they are kept in the host's shared cache
+        and each user is looked up once per host rather than per request.
+        """
+        cache = get_shared_cache()
+        key = f"user:{clerk_id}"
+        if cache is not None:
+            user_id = cache.get(key)
+            if user_id is not None:
+                return user_id.decode()
+        user = self.create_user_if_not_exists(clerk_id) if create else self.get_user_by_clerk_id(clerk_id)
+        if user is None:
+            return None
+        if cache is not None:
+            cache.set(key, str(user["id"]).encode(), settings.SHARED_CACHE_USER_TTL)
+        return user["id"]
+
+    def insert_transaction(
+        self,
+        user_id: str,
+        r2_object_key: str,
+        status: str = "pending",
+        detected_confidence: Optional[float] = None,
+        image_url: Optional[str] = None,
+        near_duplicate: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Insert one transaction and return the stored row.
+
+        Goes through the write-behind buffer when
+        ``TRANSACTION_WRITE_BUFFER_ENABLED`` is set.
+
+        Inserts and updates are counted in the user's stats (see
+        ``user_stats``).
+        """
+        row = build_transaction_row(
+            user_id, r2_object_key, status, detected_confidence, image_url, near_duplicate,
+        )
+        if settings.TRANSACTION_WRITE_BUFFER_ENABLED:
+            from .write_buffer import insert_buffered
+            return insert_buffered(row)
+        return self.insert_transaction_row(row)
+
+    def insert_transaction_row(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        """Insert one prepared transaction row and return the stored row."""
+        raise NotImplementedError
+
+    def insert_transactions(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Insert many prepared transaction rows in one round trip."""
+        raise NotImplementedError
+
+    def update_transaction(self, transaction_id: str, **fields) -> Optional[Dict[str, Any]]:
+        """
+        Update a transaction and return it, or None if not found.
+
+        The change is pushed to clients watching the transaction (see
+        ``transaction_events``) and applied to the user's stats and the
+        leaderboards.
+        """
+        raise NotImplementedError
+
+    def fetch_transactions(self, after_id: Optional[str], limit: int,
+                           status: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Return up to ``limit`` transactions with ``id`` greater than
+        ``after_id`` in ``id`` order, with ``TRANSACTION_SCAN_COLUMNS``.
+        """
+        raise NotImplementedError
+
+    def list_user_transactions(self, user_id: str, limit: int) -> List[Dict[str, Any]]:
+        """Return the user's ``limit`` most recent transactions (all columns), newest first."""
+        raise NotImplementedError
+
+    def get_transactions(self, transaction_ids: List[str]) -> List[Dict[str, Any]]:
+        """
+        Return the transactions with these ids (valid UUIDs), with
+        ``TRANSACTION_SCAN_COLUMNS``; missing ids are skipped.
+        """
+        raise NotImplementedError
+
+    def upsert_transactions(self, rows: List[Dict[str, Any]]) -> int:
+        """
+        Write many existing transactions back, matched on ``id``.
+
+        Rows must carry the table's required columns. They are pushed to
+        clients watching them (see ``transaction_events``). Returns the
+        number of rows written.
+        """
+        raise NotImplementedError
+
+
+class PostgRESTBackend(DataBackend):
+    """
+    Backend using the Supabase REST API (PostgREST) over HTTP.
+    """
+
+    repositories = {
+        "LeaderboardRepository": "deposits.services.postgrest_repositories.PostgRESTLeaderboardRepository",
+        "UserStatsRepository": "deposits.services.postgrest_repositories.PostgRESTUserStatsRepository",
+        "SettingsRepository": "deposits.services.postgrest_repositories.PostgRESTSettingsRepository",
+        "BinRepository": "deposits.services.postgrest_repositories.PostgRESTBinRepository",
+        "AnalyticsRepository": "deposits.services.postgrest_repositories.PostgRESTAnalyticsRepository",
+    }
+
+    def get_user_by_clerk_id(self, clerk_id: str) -> Optional[Dict[str, Any]]:
+        return supabase_client.get_user_by_clerk_id(clerk_id)
+
+    def create_user_if_not_exists(self, clerk_id: str) -> Dict[str, Any]:
+        return supabase_client.create_user_if_not_exists(clerk_id)
+
+    def get_user_role(self, clerk_id: str) -> Optional[str]:
+        users = supabase_client.fetch_page("users", "id,role", None, 1, {"clerk_id": f"eq.{clerk_id}"})
+        return users[0]["role"] if users else None
+
+    def insert_transaction_row(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        return self.insert_transactions([row])[0]
+
+    def insert_transactions(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        transactions = supabase_client.insert_transactions(align_rows(rows))
+        record_inserts(transactions)
+        record_transaction_changes((None, transaction) for transaction in transactions)
+        return transactions
+
+    def update_transaction(self, transaction_id: str, **fields) -> Optional[Dict[str, Any]]:
+        # PostgREST returns only the new row; read the old one if the
+        # user's stats or points may change and something keeps them
+        # (racy, repaired by the rebuilds)
+        before = None
+        if not fields.keys().isdisjoint(STATS_COLUMNS) and (settings.USER_STATS_ENABLED or tracks_changes()):
+            before = next(iter(self.get_transactions([transaction_id])), None)
+        transaction = supabase_client.update_transaction(transaction_id, **fields)
+        publish_transaction_updates([transaction])
+        if before is not None:
+            record_updates([(before, transaction)])
+            record_transaction_changes([(before, transaction)])
+        return transaction
+
+    def fetch_transactions(self, after_id: Optional[str], limit: int,
+                           status: Optional[str] = None) -> List[Dict[str, Any]]:
+        filters = {"status": f"eq.{status}"} if status else None
+        return supabase_client.fetch_page(
+            "transactions", ",".join(TRANSACTION_SCAN_COLUMNS), after_id, limit, filters
+        )
+
+    def list_user_transactions(self, user_id: str, limit: int) -> List[Dict[str, Any]]:
+        return supabase_client.fetch_page(
+            "transactions", "*", None, limit, {"user_id": f"eq.{user_id}"}, order="created_at.desc",
+        )
+
+    def get_transactions(self, transaction_ids: List[str]) -> List[Dict[str, Any]]:
+        if not transaction_ids:
+            return []
+        return supabase_client.fetch_page(
+            "transactions", ",".join(TRANSACTION_SCAN_COLUMNS), None, len(transaction_ids),
+            {"id": f"in.({','.join(transaction_ids)})"},
+        )
+
+    def upsert_transactions(self, rows: List[Dict[str, Any]]) -> int:
+        count = supabase_client.upsert_transactions(rows)
+        publish_transaction_updates(rows)
+        return count
+
+
+_inherited: List[DataBackend] = []
+
+
+@lru_cache(maxsize=1)
+def get_data_backend() -> DataBackend:
+    """
+    Get the data backend selected by ``settings.DATA_BACKEND``.
+    """
+    return import_string(settings.DATA_BACKEND)()
+
+
+def reset_after_fork() -> None:
+    """
+    Forget the parent's backend so the child builds its own.
+
+    The inherited instance is kept referenced rather than closed or
+    garbage collected: closing its pooled connections from the child
+    would terminate the parent's sessions on the shared sockets.
+    """
+    if get_data_backend.cache_info().currsize:
+        _inherited.append(get_data_backend())
+    get_data_backend.cache_clear()
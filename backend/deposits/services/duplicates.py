@@ -0,0 +1,323 @@
+"""
+Near-Duplicate Deposit Detection.
+
+Flags uploads whose perceptual hash (see ``image_hash``) is within a
+small Hamming distance of an image deposited before, which catches the
+same device photographed again from a slightly different angle.
+
+Two indexes are consulted:
+
+- per user, a BK-tree searched within ``DUPLICATE_USER_MAX_DISTANCE``.
+  A lookup only descends into children whose edge distance lies within
+  the search radius of the query's distance to the node (triangle
+  inequality). Users have few images, so this stays cheap even with the
+  loose radius needed for re-photographed devices.
+- globally, a multi-index hash searched within the tighter
+  ``DUPLICATE_GLOBAL_MAX_DISTANCE`` (catches the same photo deposited by
+  another account). The 64 bits are split into ``max_distance + 1``
+  chunks; by the pigeonhole principle any hash within ``max_distance``
+  agrees exactly with the query on at least one chunk, so a lookup is
+  one dict probe per chunk plus a popcount per candidate. A BK-tree
+  over all images degrades towards a linear scan for queries without a
+  match, which is the common case.
+
+The index is persisted as an append-only text file
+(``DUPLICATE_INDEX_PATH``), one ``<hash> <clerk_user_id> <object_key>``
+line per image. Every worker appends the images it accepts and, before
+each lookup, reads lines appended by other workers since its last look.
+``manage.py build_duplicate_index`` rebuilds the file from the images
+already in R2; workers notice the replaced file and reload it.
+"""
+
+import logging
+import os
+import threading
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+
+from .image_hash import HASH_BITS, format_hash, parse_hash
+from ..tracing import traced
+
+
+logger = logging.getLogger(__name__)
+
+
+class Match(NamedTuple):
+    object_key: str
+    clerk_user_id: str
+    distance: int
+    scope: str  # 'user' or 'global'
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over 64-bit hashes with Hamming distance.
+
+    Nodes are ``[hash, values, children]`` lists, where ``children``
+    maps an edge distance to a child node. Images with identical hashes
+    share a node.
+    """
+
+    def __init__(self):
+        self.root: Optional[list] = None
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def add(self, value: int, item) -> None:
+        self.size += 1
+        if self.root is None:
+            self.root = [value, [item], {}]
+            return
+        node = self.root
+        while True:
+            distance = (node[0] ^ value).bit_count()
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [item], {}]
+                return
+            node = child
+
+    def nearest(self, value: int, max_distance: int) -> Optional[Tuple[int, list]]:
+        """
+        Return ``(distance, items)`` of the closest stored hash within
+        ``max_distance``, or None.
+        """
+        if self.root is None:
+            return None
+        best: Optional[Tuple[int, list]] = None
+        limit = max_distance
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            distance = (node[0] ^ value).bit_count()
+            if distance <= limit:
+                best = (distance, node[1])
+                if distance == 0:
+                    break
+                # Only strictly closer hashes can improve on this match
+                limit = distance - 1
+            low = distance - limit
+            high = distance + limit
+            for edge, child in node[2].items():
+                if low <= edge <= high:
+                    stack.append(child)
+        return best
+
+
+class MultiIndexHash:
+    """
+    Hashes indexed by ``max_distance + 1`` disjoint bit chunks.
+
+    ``nearest`` is exact for any radius up to the ``max_distance`` the
+    index was built with.
+    """
+
+    def __init__(self, max_distance: int, bits: int = HASH_BITS):
+        chunks = max(1, min(max_distance + 1, bits))
+        self.max_distance = max_distance
+        self.chunks: List[Tuple[int, int]] = []
+        shift = 0
+        for i in range(chunks):
+            width = bits // chunks + (1 if i < bits % chunks else 0)
+            self.chunks.append((shift, (1 << width) - 1))
+            shift += width
+        self.tables: List[Dict[int, List[int]]] = [{} for _ in self.chunks]
+        self.items: Dict[int, list] = {}
+
+    def __len__(self) -> int:
+        return sum(len(items) for items in self.items.values())
+
+    def add(self, value: int, item) -> None:
+        items = self.items.get(value)
+        if items is not None:
+            items.append(item)
+            return
+        self.items[value] = [item]
+        for table, (shift, mask) in zip(self.tables, self.chunks):
+            table.setdefault((value >> shift) & mask, []).append(value)
+
+    def nearest(self, value: int, max_distance: int) -> Optional[Tuple[int, list]]:
+        """
+        Return ``(distance, items)`` of the closest stored hash within
+        ``max_distance``, or None.
+        """
+        if max_distance > self.max_distance:
+            raise ValueError(f"Index only supports distances up to {self.max_distance}")
+        best = None
+        limit = max_distance
+        for table, (shift, mask) in zip(self.tables, self.chunks):
+            for candidate in table.get((value >> shift) & mask, ()):
+                distance = (candidate ^ value).bit_count()
+                if distance <= limit:
+                    best = candidate
+                    if distance == 0:
+                        return 0, self.items[candidate]
+                    limit = distance - 1
+        if best is None:
+            return None
+        return (best ^ value).bit_count(), self.items[best]
+
+
+class DuplicateIndex:
+    """
+    In-memory per-user BK-trees and a global multi-index hash.
+    """
+
+    def __init__(self, user_max_distance: int, global_max_distance: int):
+        self.user_max_distance = user_max_distance
+        self.global_max_distance = global_max_distance
+        self.global_index = MultiIndexHash(global_max_distance)
+        self.user_trees: Dict[str, BKTree] = {}
+        self.object_keys = set()
+
+    def __len__(self) -> int:
+        return len(self.object_keys)
+
+    def add(self, image_hash: int, clerk_user_id: str, object_key: str) -> bool:
+        """Index an image; returns False if ``object_key`` is already indexed."""
+        if object_key in self.object_keys:
+            return False
+        self.object_keys.add(object_key)
+        entry = (clerk_user_id, object_key)
+        self.global_index.add(image_hash, entry)
+        tree = self.user_trees.get(clerk_user_id)
+        if tree is None:
+            tree = self.user_trees[clerk_user_id] = BKTree()
+        tree.add(image_hash, entry)
+        return True
+
+    def find(self, image_hash: int, clerk_user_id: str) -> Optional[Match]:
+        """Closest earlier image of this user, else of anyone."""
+        tree = self.user_trees.get(clerk_user_id)
+        if tree is not None:
+            found = tree.nearest(image_hash, self.user_max_distance)
+            if found is not None:
+                distance, entries = found
+                return Match(entries[0][1], clerk_user_id, distance, 'user')
+
+        found = self.global_index.nearest(image_hash, self.global_max_distance)
+        if found is not None:
+            distance, entries = found
+            owner, object_key = entries[0]
+            return Match(object_key, owner, distance, 'user' if owner == clerk_user_id else 'global')
+        return None
+
+
+def parse_index_line(line: str) -> Optional[Tuple[int, str, str]]:
+    parts = line.split()
+    if len(parts) != 3:
+        return None
+    image_hash = parse_hash(parts[0])
+    if image_hash is None:
+        return None
+    return image_hash, parts[1], parts[2]
+
+
+def format_index_line(image_hash: int, clerk_user_id: str, object_key: str) -> str:
+    return f"{format_hash(image_hash)} {clerk_user_id} {object_key}\n"
+
+
+class DuplicateDetector:
+    """
+    ``DuplicateIndex`` kept in sync with the shared index file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.index = self._new_index()
+        self._file_id: Optional[Tuple[int, int]] = None
+        self._offset = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _new_index() -> DuplicateIndex:
+        return DuplicateIndex(
+            settings.DUPLICATE_USER_MAX_DISTANCE, settings.DUPLICATE_GLOBAL_MAX_DISTANCE
+        )
+
+    def sync(self) -> None:
+        """Read lines appended to the index file since the last sync."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        file_id = (stat.st_dev, stat.st_ino)
+        if file_id == self._file_id and stat.st_size == self._offset:
+            return
+
+        with self._lock, open(self.path, 'rb') as f:
+            # The file may have been replaced since the stat above
+            stat = os.fstat(f.fileno())
+            file_id = (stat.st_dev, stat.st_ino)
+            if file_id != self._file_id or stat.st_size < self._offset:
+                # Rebuilt (or truncated) file: start over
+                self.index = self._new_index()
+                self._file_id = file_id
+                self._offset = 0
+            f.seek(self._offset)
+            data = f.read()
+            # A partially written last line is picked up next time
+            end = data.rfind(b'\n') + 1
+            added = 0
+            for line in data[:end].decode('utf-8', 'replace').splitlines():
+                entry = parse_index_line(line)
+                if entry is not None and self.index.add(*entry):
+                    added += 1
+            self._offset += end
+        if added:
+            logger.debug("Duplicate index: %d images added, %d total", added, len(self.index))
+
+    @traced("duplicates.check")
+    def check(self, image_hash: int, clerk_user_id: str) -> Optional[Match]:
+        """Return the closest earlier image within the configured distances."""
+        self.sync()
+        return self.index.find(image_hash, clerk_user_id)
+
+    def record(self, image_hash: int, clerk_user_id: str, object_key: str) -> None:
+        """Index an accepted upload and append it to the shared file."""
+        with self._lock:
+            self.index.add(image_hash, clerk_user_id, object_key)
+        # One small O_APPEND write per line, so concurrent workers do not
+        # interleave; this worker reads the line back on its next sync and
+        # skips it as already indexed.
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(format_index_line(image_hash, clerk_user_id, object_key))
+
+
+_detector: Optional[DuplicateDetector] = None
+_detector_lock = threading.Lock()
+
+
+def get_duplicate_detector() -> DuplicateDetector:
+    """Get the process-wide duplicate detector."""
+    global _detector
+    if _detector is None:
+        with _detector_lock:
+            if _detector is None:
+                _detector = DuplicateDetector(settings.DUPLICATE_INDEX_PATH)
+    return _detector
+
+
+def reset_after_fork() -> None:
+    """Forget the parent's index; the child reads the file on first use."""
+    global _detector, _detector_lock
+    _detector = None
+    _detector_lock = threading.Lock()
+
+
+def describe_match(match: Optional[Match]) -> Optional[Dict[str, object]]:
+    """API representation of a match; other users' keys are not exposed."""
+    if match is None:
+        return None
+    return {
+        "object_key": match.object_key if match.scope == 'user' else None,
+        "distance": match.distance,
+        "scope": match.scope,
+    }
+
@@ -0,0 +1,468 @@
+"""
+Bin Fill History.
+
+Local time-series store of bin fill readings, so fill curves and fill
+rates can be answered without touching Supabase. Data lives under
+``BIN_FILL_HISTORY_DIR``, one segment per UTC day, in two layouts:
+
+- raw (``YYYY-MM-DD.seg``): append-only packed 28-byte little-endian
+  records, written by the telemetry flush (see ``telemetry``)::
+
+      bin id (16 bytes, UUID) | timestamp (float64, Unix seconds) | fill level (float32, %)
+
+  Each append is a single ``write`` to a file opened in append mode, so
+  workers can share the directory.
+- compacted (``YYYY-MM-DD/``): column files ``bins.npy`` (distinct bin
+  ids, sorted), ``offsets.npy``, ``ts.npy`` and ``fill.npy``, with each
+  bin's readings stored contiguously in time order. One bin's day is a
+  binary search and a slice.
+
+Both layouts are opened as NumPy memory maps, so a query touches only
+the pages it reads and a reading costs 28 bytes (12 once compacted, as
+the bin id is stored once per day), not the several hundred bytes of a
+row dict. Reads require NumPy.
+
+``compact()`` (``manage.py compact_fill_history``) turns closed days into
+the compacted layout, downsamples days older than
+``BIN_FILL_HISTORY_RAW_DAYS`` to ``BIN_FILL_HISTORY_DOWNSAMPLE_SECONDS``
+buckets and deletes days beyond ``BIN_FILL_HISTORY_RETENTION_DAYS``.
+"""
+
+import json
+import os
+import shutil
+import struct
+import threading
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from itertools import groupby
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised only without numpy
+    np = None
+
+
+RECORD = struct.Struct('<16sdf')
+
+SEGMENT_SUFFIX = '.seg'
+
+AGGREGATES = ('mean', 'min', 'max', 'last')
+
+# A reading this many points below the previous one means the bin was emptied
+EMPTIED_DROP = 20.0
+
+if np is not None:
+    # The bin id is read as two little-endian words for vectorised compares
+    RECORD_DTYPE = np.dtype([('bin', '<u8', (2,)), ('ts', '<f8'), ('fill', '<f4')])
+
+
+class FillHistoryError(Exception):
+    """Custom exception for fill history failures."""
+    pass
+
+
+_EPOCH = date(1970, 1, 1)
+
+
+def segment_name(timestamp: float) -> str:
+    day = _EPOCH + timedelta(days=int(timestamp // 86400))
+    return f"{day.isoformat()}{SEGMENT_SUFFIX}"
+
+
+def _bin_key(bin_id: str):
+    return np.frombuffer(uuid.UUID(bin_id).bytes, dtype='<u8')
+
+
+def downsample(ts, fill, step: float, agg: str = 'mean'):
+    """
+    Aggregate a time-ordered series into ``step``-second buckets
+    (aligned to the Unix epoch).
+
+    Returns:
+        Tuple of (bucket start times, aggregated fill levels)
+    """
+    if agg not in AGGREGATES:
+        raise ValueError(f"Unknown aggregate {agg!r}")
+    if len(ts) == 0:
+        return ts, fill
+    buckets = np.floor(ts / step)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    bucket_ts = buckets[starts] * step
+    if agg == 'last':
+        return bucket_ts, fill[np.r_[starts[1:], len(ts)] - 1]
+    if agg == 'mean':
+        sums = np.add.reduceat(fill.astype(np.float64), starts)
+        counts = np.diff(np.r_[starts, len(ts)])
+        return bucket_ts, (sums / counts).astype(np.float32)
+    reduce = np.minimum if agg == 'min' else np.maximum
+    return bucket_ts, reduce.reduceat(fill, starts)
+
+
+def _fill_rate(ts, fill) -> Optional[float]:
+    """Slope (points per hour) of a series after its last emptying."""
+    drops = np.flatnonzero(np.diff(fill) <= -EMPTIED_DROP)
+    if len(drops):
+        ts, fill = ts[drops[-1] + 1:], fill[drops[-1] + 1:]
+    if len(ts) < 2 or ts[-1] <= ts[0]:
+        return None
+    hours = (ts - ts[0]) / 3600
+    slope = np.polyfit(hours, fill.astype(np.float64), 1)[0]
+    return max(float(slope), 0.0)
+
+
+class FillHistoryStore:
+    """
+    Day-segmented store of ``(bin id, timestamp, fill level)`` readings.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        # Compacted days are immutable until the next compaction replaces
+        # the directory, so their maps are kept per directory inode
+        self._column_maps: Dict[date, Tuple[int, Dict[str, object]]] = {}
+
+    def append(self, readings: Iterable[Tuple[str, float, float]]) -> int:
+        """
+        Append ``(bin_id, timestamp, fill_level)`` readings.
+
+        Returns:
+            Number of readings written
+        """
+        readings = sorted(readings, key=lambda reading: reading[1])
+        if not readings:
+            return 0
+        os.makedirs(self.path, exist_ok=True)
+        written = 0
+        with self._lock:
+            for day, day_readings in groupby(readings, key=lambda reading: int(reading[1] // 86400)):
+                data = b''.join(
+                    RECORD.pack(uuid.UUID(bin_id).bytes, timestamp, fill_level)
+                    for bin_id, timestamp, fill_level in day_readings
+                )
+                with open(os.path.join(self.path, segment_name(day * 86400)), 'ab') as f:
+                    f.write(data)
+                written += len(data) // RECORD.size
+        return written
+
+    def days(self) -> List[date]:
+        """Days with stored readings, oldest first."""
+        if not os.path.isdir(self.path):
+            return []
+        found = set()
+        for name in os.listdir(self.path):
+            stem = name[:-len(SEGMENT_SUFFIX)] if name.endswith(SEGMENT_SUFFIX) else name
+            try:
+                found.add(date.fromisoformat(stem))
+            except ValueError:
+                continue
+        return sorted(found)
+
+    def _require_numpy(self) -> None:
+        if np is None:
+            raise FillHistoryError("NumPy is required to read the fill history")
+
+    def _raw(self, day: date):
+        path = os.path.join(self.path, f"{day.isoformat()}{SEGMENT_SUFFIX}")
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            return None
+        # Ignores a record still being written
+        count = size // RECORD_DTYPE.itemsize
+        if count == 0:
+            return None
+        return np.memmap(path, dtype=RECORD_DTYPE, mode='r', shape=(count,))
+
+    def _columns(self, day: date) -> Optional[Dict[str, object]]:
+        path = os.path.join(self.path, day.isoformat())
+        try:
+            inode = os.stat(path).st_ino
+        except FileNotFoundError:
+            self._column_maps.pop(day, None)
+            return None
+        cached = self._column_maps.get(day)
+        if cached is not None and cached[0] == inode:
+            return cached[1]
+        columns = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r')
+            for name in ('bins', 'offsets', 'ts', 'fill')
+        }
+        self._column_maps[day] = (inode, columns)
+        return columns
+
+    def _day_series(self, day: date, key) -> Tuple[object, object]:
+        """One bin's readings on one day, in time order."""
+        parts_ts = []
+        parts_fill = []
+        columns = self._columns(day)
+        if columns is not None:
+            bins = columns['bins']
+            # Rows are sorted by (word 0, word 1)
+            low = np.searchsorted(bins[:, 0], key[0])
+            high = np.searchsorted(bins[:, 0], key[0], side='right')
+            for row in range(low, high):
+                if bins[row, 1] == key[1]:
+                    start, end = columns['offsets'][row], columns['offsets'][row + 1]
+                    parts_ts.append(np.asarray(columns['ts'][start:end]))
+                    parts_fill.append(np.asarray(columns['fill'][start:end]))
+                    break
+
+        raw = self._raw(day)
+        if raw is not None:
+            bins = raw['bin']
+            mask = (bins[:, 0] == key[0]) & (bins[:, 1] == key[1])
+            if mask.any():
+                selected = raw[mask]
+                parts_ts.append(selected['ts'])
+                parts_fill.append(selected['fill'])
+
+        if not parts_ts:
+            return np.empty(0, np.float64), np.empty(0, np.float32)
+        ts = np.concatenate(parts_ts)
+        fill = np.concatenate(parts_fill)
+        if np.any(ts[1:] < ts[:-1]):
+            order = np.argsort(ts, kind='stable')
+            ts, fill = ts[order], fill[order]
+        return ts, fill
+
+    def query(self, bin_id: str, start: float, end: float,
+              step: Optional[float] = None, agg: str = 'mean') -> Tuple[object, object]:
+        """
+        Readings of one bin with ``start <= ts < end``.
+
+        Args:
+            bin_id: Bin UUID
+            start: Range start, Unix seconds
+            end: Range end (exclusive), Unix seconds
+            step: Downsample to buckets of this many seconds (optional)
+            agg: Bucket aggregate, one of ``AGGREGATES``
+
+        Returns:
+            Tuple of (timestamps, fill levels) NumPy arrays
+
+        Raises:
+            FillHistoryError: If NumPy is not installed
+        """
+        self._require_numpy()
+        key = _bin_key(bin_id)
+        first = datetime.fromtimestamp(start, timezone.utc).date()
+        last = datetime.fromtimestamp(max(end, start), timezone.utc).date()
+        parts_ts = []
+        parts_fill = []
+        for day in self.days():
+            if day < first or day > last:
+                continue
+            ts, fill = self._day_series(day, key)
+            low, high = np.searchsorted(ts, [start, end])
+            parts_ts.append(ts[low:high])
+            parts_fill.append(fill[low:high])
+        if parts_ts:
+            ts, fill = np.concatenate(parts_ts), np.concatenate(parts_fill)
+        else:
+            ts, fill = np.empty(0, np.float64), np.empty(0, np.float32)
+        if step:
+            ts, fill = downsample(ts, fill, step, agg)
+        return ts, fill
+
+    def fill_rate(self, bin_id: str, now: float, lookback: float = 3 * 86400) -> Optional[float]:
+        """
+        Fill rate in percentage points per hour since the bin was last
+        emptied (least-squares slope), or None without enough readings.
+        """
+        ts, fill = self.query(bin_id, now - lookback, now + 1)
+        return _fill_rate(ts, fill)
+
+    def fill_rates(self, bin_ids: Iterable[str], now: float,
+                   lookback: float = 3 * 86400) -> Dict[str, float]:
+        """
+        ``fill_rate`` for many bins, reading each day segment once.
+
+        Bins without enough readings are left out.
+        """
+        self._require_numpy()
+        wanted = {}
+        for bin_id in bin_ids:
+            key = _bin_key(bin_id)
+            wanted[(int(key[0]), int(key[1]))] = bin_id
+        start, end = now - lookback, now + 1
+        first = datetime.fromtimestamp(start, timezone.utc).date()
+        last = datetime.fromtimestamp(end, timezone.utc).date()
+
+        bins_parts = []
+        ts_parts = []
+        fill_parts = []
+        for day in self.days():
+            if day < first or day > last:
+                continue
+            columns = self._columns(day)
+            if columns is not None:
+                counts = np.diff(columns['offsets'])
+                bins_parts.append(np.repeat(np.asarray(columns['bins']), counts, axis=0))
+                ts_parts.append(np.asarray(columns['ts']))
+                fill_parts.append(np.asarray(columns['fill']))
+            raw = self._raw(day)
+            if raw is not None:
+                bins_parts.append(np.asarray(raw['bin']))
+                ts_parts.append(np.asarray(raw['ts']))
+                fill_parts.append(np.asarray(raw['fill']))
+        if not ts_parts:
+            return {}
+
+        bins = np.concatenate(bins_parts)
+        ts = np.concatenate(ts_parts)
+        fill = np.concatenate(fill_parts)
+        in_range = (ts >= start) & (ts < end)
+        bins, ts, fill = bins[in_range], ts[in_range], fill[in_range]
+        order = np.lexsort((ts, bins[:, 1], bins[:, 0]))
+        bins, ts, fill = bins[order], ts[order], fill[order]
+
+        starts = np.r_[0, np.flatnonzero(np.any(bins[1:] != bins[:-1], axis=1)) + 1]
+        ends = np.r_[starts[1:], len(ts)]
+        rates = {}
+        for begin, stop in zip(starts.tolist(), ends.tolist()):
+            if begin == stop:
+                continue
+            bin_id = wanted.get((int(bins[begin, 0]), int(bins[begin, 1])))
+            if bin_id is None:
+                continue
+            rate = _fill_rate(ts[begin:stop], fill[begin:stop])
+            if rate is not None:
+                rates[bin_id] = rate
+        return rates
+
+    def compact(self, today: Optional[date] = None) -> Dict[str, int]:
+        """
+        Compact closed days, downsample old days and apply retention.
+
+        Only days at least two days old are compacted, so no telemetry
+        flush is still appending to them. Late readings that arrive for a
+        compacted day land in a new raw segment and are merged on the
+        next run.
+
+        Returns:
+            Counts of compacted, downsampled and deleted days
+        """
+        self._require_numpy()
+        today = today or datetime.now(timezone.utc).date()
+        raw_cutoff = today - timedelta(days=settings.BIN_FILL_HISTORY_RAW_DAYS)
+        retention_cutoff = today - timedelta(days=settings.BIN_FILL_HISTORY_RETENTION_DAYS)
+        step = settings.BIN_FILL_HISTORY_DOWNSAMPLE_SECONDS
+        result = {"compacted": 0, "downsampled": 0, "deleted": 0}
+
+        for day in self.days():
+            directory = os.path.join(self.path, day.isoformat())
+            segment = directory + SEGMENT_SUFFIX
+            if day < retention_cutoff:
+                shutil.rmtree(directory, ignore_errors=True)
+                if os.path.exists(segment):
+                    os.unlink(segment)
+                result["deleted"] += 1
+                continue
+            if day > today - timedelta(days=2):
+                continue
+
+            day_step = step if day < raw_cutoff else None
+            current_step = self._read_meta(directory).get("step")
+            has_raw = os.path.exists(segment)
+            needs_downsample = day_step is not None and current_step != day_step
+            if not has_raw and not needs_downsample:
+                continue
+            self._compact_day(day, day_step if day_step is not None else current_step)
+            result["compacted"] += has_raw
+            result["downsampled"] += needs_downsample
+        return result
+
+    @staticmethod
+    def _read_meta(directory: str) -> Dict[str, object]:
+        try:
+            with open(os.path.join(directory, 'meta.json')) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _compact_day(self, day: date, step: Optional[float]) -> None:
+        """Merge a day's raw segment and columns into new sorted columns."""
+        directory = os.path.join(self.path, day.isoformat())
+        segment = directory + SEGMENT_SUFFIX
+
+        bins_parts = []
+        ts_parts = []
+        fill_parts = []
+        columns = self._columns(day)
+        if columns is not None:
+            counts = np.diff(columns['offsets'])
+            bins_parts.append(np.repeat(np.asarray(columns['bins']), counts, axis=0))
+            ts_parts.append(np.asarray(columns['ts']))
+            fill_parts.append(np.asarray(columns['fill']))
+        raw = self._raw(day)
+        has_raw = raw is not None
+        if has_raw:
+            bins_parts.append(np.array(raw['bin']))
+            ts_parts.append(np.array(raw['ts']))
+            fill_parts.append(np.array(raw['fill']))
+        del raw, columns
+
+        bins = np.concatenate(bins_parts)
+        ts = np.concatenate(ts_parts)
+        fill = np.concatenate(fill_parts)
+        order = np.lexsort((ts, bins[:, 1], bins[:, 0]))
+        bins, ts, fill = bins[order], ts[order], fill[order]
+
+        starts = np.r_[0, np.flatnonzero(np.any(bins[1:] != bins[:-1], axis=1)) + 1]
+        ends = np.r_[starts[1:], len(ts)]
+        distinct = bins[starts]
+        if step is not None:
+            series = [
+                downsample(ts[begin:stop], fill[begin:stop], step, 'last')
+                for begin, stop in zip(starts, ends)
+            ]
+            lengths = [len(series_ts) for series_ts, _ in series]
+            ts = np.concatenate([series_ts for series_ts, _ in series])
+            fill = np.concatenate([series_fill for _, series_fill in series])
+        else:
+            lengths = ends - starts
+        offsets = np.r_[0, np.cumsum(lengths)].astype('<i8')
+
+        tmp = f"{directory}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        np.save(os.path.join(tmp, 'bins.npy'), np.ascontiguousarray(distinct, dtype='<u8'))
+        np.save(os.path.join(tmp, 'offsets.npy'), offsets)
+        np.save(os.path.join(tmp, 'ts.npy'), np.ascontiguousarray(ts, dtype='<f8'))
+        np.save(os.path.join(tmp, 'fill.npy'), np.ascontiguousarray(fill, dtype='<f4'))
+        with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+            json.dump({"readings": int(offsets[-1]), "bins": len(distinct), "step": step}, f)
+
+        # Swap directories; readers holding the old maps keep their inodes
+        old = f"{directory}.old"
+        if os.path.isdir(directory):
+            os.replace(directory, old)
+        os.replace(tmp, directory)
+        shutil.rmtree(old, ignore_errors=True)
+        if has_raw:
+            os.unlink(segment)
+
+
+_store: Optional[FillHistoryStore] = None
+_store_lock = threading.Lock()
+
+
+def get_fill_history() -> FillHistoryStore:
+    """Get the process-wide fill history store."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = FillHistoryStore(settings.BIN_FILL_HISTORY_DIR)
+    return _store
+
+
+def iter_series(ts, fill) -> Iterator[Tuple[str, float]]:
+    """``(ISO timestamp, fill level)`` pairs for API responses."""
+    for timestamp, level in zip(ts.tolist(), fill.tolist()):
+        yield datetime.fromtimestamp(timestamp, timezone.utc).isoformat(), round(level, 2)
@@ -0,0 +1,366 @@
+"""
+Tiered Image Cache.
+
+Read-through cache for deposit images read back from R2 (admin review,
+inference), so repeated reads of the same image do not each pay an R2
+round trip and egress:
+
+- memory tier: an LRU of thumbnails bounded by total bytes
+  (``IMAGE_CACHE_MEMORY_BYTES``), for review grids
+- disk tier: original images under ``IMAGE_CACHE_DIR``, LRU by bytes up
+  to ``IMAGE_CACHE_DISK_BYTES``. Files are handed out as open files
+  (served by ``FileResponse``, which the WSGI server sends with
+  ``sendfile`` without copying through Python) or memory-mapped for
+  in-process readers.
+
+The disk tier is shared by the workers on a host. Each worker keeps its
+own LRU index, rescanned from file modification times (refreshed on
+every hit) when it believes the tier is full or its index is older than
+``_RESCAN_INTERVAL``, so the size bound holds approximately across
+workers. A file evicted by another worker is simply fetched again.
+
+Concurrent misses for the same image in one process share one R2 fetch.
+"""
+
+import hashlib
+import io
+import logging
+import mmap
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import BinaryIO, Dict, Optional, Tuple
+
+from django.conf import settings
+
+from ..tracing import traced
+from .r2_upload import get_object_bytes
+
+
+logger = logging.getLogger(__name__)
+
+
+# Seconds after which a worker rescans the shared disk tier on write
+_RESCAN_INTERVAL = 60.0
+
+_TMP_SUFFIX = ".tmp"
+
+
+class ByteLRU:
+    """
+    Thread-safe LRU of byte strings, bounded by their total size.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: "OrderedDict[object, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Optional[bytes]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value: bytes) -> int:
+        """Store a value; returns the number of entries evicted."""
+        if len(value) > self.max_bytes:
+            return 0
+        evicted = 0
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._entries[key] = value
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                _, dropped = self._entries.popitem(last=False)
+                self.size -= len(dropped)
+                evicted += 1
+        return evicted
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class DiskTier:
+    """
+    Directory of cached objects, LRU by bytes.
+
+    Args:
+        directory: Cache directory, shared by the workers on this host
+        max_bytes: Size bound for all cached files
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._scanned_at = 0.0
+        os.makedirs(directory, exist_ok=True)
+        self._rescan()
+
+    def path(self, object_key: str) -> str:
+        # Hashed names: object keys contain slashes and user input
+        digest = hashlib.sha256(object_key.encode()).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def _rescan(self) -> None:
+        """Rebuild the index from the files on disk, oldest first."""
+        # Modification times are only as fine as the kernel clock tick;
+        # files touched within one keep this worker's order
+        known = {path: position for position, path in enumerate(self._entries)}
+        found = []
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(_TMP_SUFFIX):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                found.append((stat.st_mtime_ns, known.get(entry.path, -1), entry.path, stat.st_size))
+        found.sort()
+        self._entries = OrderedDict((path, size) for _, _, path, size in found)
+        self.size = sum(self._entries.values())
+        self._scanned_at = time.monotonic()
+
+    def open(self, object_key: str) -> Optional[Tuple[BinaryIO, int]]:
+        """Open a cached file and mark it used; None on a miss."""
+        path = self.path(object_key)
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            with self._lock:
+                size = self._entries.pop(path, None)
+                if size is not None:
+                    self.size -= size
+            return None
+        size = os.fstat(f.fileno()).st_size
+        try:
+            # Recency for the other workers' rescans
+            os.utime(f.fileno())
+        except OSError:
+            pass
+        with self._lock:
+            if path in self._entries:
+                self._entries.move_to_end(path)
+            else:
+                self._entries[path] = size
+                self.size += size
+        return f, size
+
+    def put(self, object_key: str, data: bytes) -> int:
+        """Store an object; returns the number of files evicted."""
+        if len(data) > self.max_bytes:
+            return 0
+        path = self.path(object_key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}{_TMP_SUFFIX}"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        evicted = 0
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self.size -= old
+            self._entries[path] = len(data)
+            self.size += len(data)
+            stale = time.monotonic() - self._scanned_at > _RESCAN_INTERVAL
+            if self.size > self.max_bytes or stale:
+                # Account for files written by the other workers
+                self._rescan()
+            while self.size > self.max_bytes and self._entries:
+                victim, size = self._entries.popitem(last=False)
+                self.size -= size
+                try:
+                    os.unlink(victim)
+                    evicted += 1
+                except FileNotFoundError:
+                    pass
+        return evicted
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class ImageCache:
+    """
+    Read-through cache of R2 images with a thumbnail memory tier and an
+    original-image disk tier.
+
+    Args:
+        directory: Disk tier directory
+        disk_bytes: Disk tier size bound
+        memory_bytes: Thumbnail tier size bound
+        thumbnail_size: Longest side of thumbnails, in pixels
+    """
+
+    def __init__(self, directory: str, disk_bytes: int, memory_bytes: int, thumbnail_size: int):
+        self.disk = DiskTier(directory, disk_bytes)
+        self.memory = ByteLRU(memory_bytes)
+        self.thumbnail_size = thumbnail_size
+        self._inflight: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self._counters = {
+            "memory_hits": 0,
+            "memory_misses": 0,
+            "disk_hits": 0,
+            "disk_misses": 0,
+            "r2_bytes": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+        }
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += amount
+
+    @traced("image_cache.open")
+    def open(self, object_key: str) -> Tuple[BinaryIO, int]:
+        """
+        Open the original image, fetching it from R2 on a miss.
+
+        Returns:
+            Tuple of (open binary file, size in bytes); the caller closes it
+
+        Raises:
+            R2ObjectNotFound: If the object does not exist
+            R2UploadError: If the R2 fetch fails
+        """
+        while True:
+            cached = self.disk.open(object_key)
+            if cached is not None:
+                self._count("disk_hits")
+                return cached
+
+            with self._lock:
+                event = self._inflight.get(object_key)
+                leader = event is None
+                if leader:
+                    event = self._inflight[object_key] = threading.Event()
+            if not leader:
+                # Another thread is fetching this image; then read its file
+                event.wait()
+                continue
+
+            try:
+                self._count("disk_misses")
+                data = get_object_bytes(object_key)
+                self._count("r2_bytes", len(data))
+                try:
+                    self._count("disk_evictions", self.disk.put(object_key, data))
+                    cached = self.disk.open(object_key)
+                except OSError as e:
+                    logger.warning("Could not cache %s on disk: %s", object_key, e)
+                    cached = None
+                # Too large for the tier, or already evicted by another worker
+                return cached or (io.BytesIO(data), len(data))
+            finally:
+                with self._lock:
+                    del self._inflight[object_key]
+                event.set()
+
+    def read(self, object_key: str) -> mmap.mmap:
+        """
+        Memory-map the original image (read-only), e.g. to decode it
+        without copying the file into Python bytes.
+
+        Raises:
+            R2ObjectNotFound: If the object does not exist
+            R2UploadError: If the R2 fetch fails
+        """
+        f, _ = self.open(object_key)
+        with f:
+            if isinstance(f, io.BytesIO):
+                # Not cached on disk; map an anonymous copy
+                with f.getbuffer() as data:
+                    mapped = mmap.mmap(-1, len(data))
+                    mapped.write(data)
+                mapped.seek(0)
+                return mapped
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @traced("image_cache.thumbnail")
+    def thumbnail(self, object_key: str) -> bytes:
+        """
+        JPEG thumbnail of the image, from the memory tier or built from
+        the original.
+
+        Raises:
+            R2ObjectNotFound: If the object does not exist
+            R2UploadError: If the R2 fetch fails
+            OSError: If the image cannot be decoded
+        """
+        cache_key = (object_key, self.thumbnail_size)
+        thumbnail = self.memory.get(cache_key)
+        if thumbnail is not None:
+            self._count("memory_hits")
+            return thumbnail
+        self._count("memory_misses")
+
+        from PIL import Image
+
+        with self.read(object_key) as mapped, Image.open(mapped) as image:
+            # JPEG: decode at reduced scale instead of full size
+            image.draft('RGB', (self.thumbnail_size, self.thumbnail_size))
+            image = image.convert('RGB')
+            image.thumbnail((self.thumbnail_size, self.thumbnail_size))
+            out = io.BytesIO()
+            image.save(out, 'JPEG', quality=80)
+        thumbnail = out.getvalue()
+        self._count("memory_evictions", self.memory.put(cache_key, thumbnail))
+        return thumbnail
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            counters = dict(self._counters)
+
+        def rate(hits: int, misses: int) -> Optional[float]:
+            total = hits + misses
+            return round(hits / total, 4) if total else None
+
+        return {
+            **counters,
+            "memory_hit_rate": rate(counters["memory_hits"], counters["memory_misses"]),
+            "disk_hit_rate": rate(counters["disk_hits"], counters["disk_misses"]),
+            "memory_entries": len(self.memory),
+            "memory_bytes": self.memory.size,
+            "disk_entries": len(self.disk),
+            "disk_bytes": self.disk.size,
+        }
+
+
+_cache: Optional[ImageCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_image_cache() -> ImageCache:
+    """Get the process-wide image cache, creating it on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ImageCache(
+                    settings.IMAGE_CACHE_DIR,
+                    settings.IMAGE_CACHE_DISK_BYTES,
+                    settings.IMAGE_CACHE_MEMORY_BYTES,
+                    settings.IMAGE_CACHE_THUMBNAIL_SIZE,
+                )
+    return _cache
+
+
+def reset_after_fork() -> None:
+    """Forget the parent's cache; its locks may be held by dead threads."""
+    global _cache, _cache_lock
+    _cache = None
+    _cache_lock = threading.Lock()
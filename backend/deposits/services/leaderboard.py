@@ -0,0 +1,503 @@
+"""
+Leaderboard Service.
+
+Ranks users by points without sorting the ``users`` table per request.
+Each board keeps users in an indexable skiplist ordered by
+``(-points, user_id)``, so a points change is an O(log n) remove and
+insert, and top-N, a user's rank and the neighbourhood around a user are
+O(log n) lookups (plus the size of the returned slice).
+
+Boards:
+
+- ``all``: lifetime points of completed transactions
+- ``week`` / ``month``: points earned in the current ISO week / calendar
+  month (UTC)
+
+All boards are built from rollups of completed transactions, the same
+points ``record_transaction_changes`` applies in between, so a rebuild
+agrees with the in-process updates (``users.total_points`` is kept by
+the Next.js routes and is not used).
+
+``get_leaderboard()`` builds the boards from a bulk snapshot through the
+data backend on first use (or from the warm-up) and rebuilds them in the
+background every ``LEADERBOARD_REFRESH_INTERVAL`` seconds, which picks
+up points awarded by other workers or by the Next.js routes. Points
+awarded in this process are applied immediately with ``record_points``.
+
+Ranks are competition ranks: users with equal points share a rank and
+the next rank skips accordingly (1, 2, 2, 4).
+"""
+
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+
+from ..tracing import traced
+from .repositories import LeaderboardRepository, get_repository
+
+
+logger = logging.getLogger(__name__)
+
+
+WINDOWS = ('all', 'week', 'month')
+
+
+class _Node:
+    __slots__ = ('key', 'next', 'width')
+
+    def __init__(self, key, levels: int):
+        self.key = key
+        self.next: List[Optional['_Node']] = [None] * levels
+        # Number of positions between this node and next[level]
+        self.width: List[int] = [1] * levels
+
+
+class IndexableSkipList:
+    """
+    Sorted collection of unique, comparable keys with positional access.
+
+    ``insert``, ``remove``, ``bisect_left`` and ``node_at`` are O(log n)
+    expected; iterating k keys from a position is O(log n + k).
+    """
+
+    MAX_LEVELS = 32
+
+    def __init__(self):
+        self.head = _Node(None, self.MAX_LEVELS)
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    @classmethod
+    def from_sorted(cls, keys: Iterable[Any]) -> 'IndexableSkipList':
+        """Build from keys already in ascending order, in O(n)."""
+        skiplist = cls()
+        last = [skiplist.head] * cls.MAX_LEVELS
+        last_position = [0] * cls.MAX_LEVELS
+        position = 0
+        for key in keys:
+            position += 1
+            node = _Node(key, cls._random_level())
+            for level in range(len(node.next)):
+                last[level].next[level] = node
+                last[level].width[level] = position - last_position[level]
+                last[level] = node
+                last_position[level] = position
+        # Widths of the final links point one past the end
+        for level in range(cls.MAX_LEVELS):
+            last[level].width[level] = position + 1 - last_position[level]
+        skiplist.size = position
+        return skiplist
+
+    @classmethod
+    def _random_level(cls) -> int:
+        # Geometric distribution with p = 1/2
+        level = 1
+        while level < cls.MAX_LEVELS and random.getrandbits(1):
+            level += 1
+        return level
+
+    def insert(self, key) -> None:
+        chain: List[_Node] = [self.head] * self.MAX_LEVELS
+        steps_at_level = [0] * self.MAX_LEVELS
+        node = self.head
+        for level in reversed(range(self.MAX_LEVELS)):
+            while node.next[level] is not None and node.next[level].key < key:
+                steps_at_level[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+
+        levels = self._random_level()
+        new = _Node(key, levels)
+        steps = 0
+        for level in range(levels):
+            prev = chain[level]
+            new.next[level] = prev.next[level]
+            prev.next[level] = new
+            new.width[level] = prev.width[level] - steps
+            prev.width[level] = steps + 1
+            steps += steps_at_level[level]
+        for level in range(levels, self.MAX_LEVELS):
+            chain[level].width[level] += 1
+        self.size += 1
+
+    def remove(self, key) -> None:
+        """Remove ``key``; raises KeyError if it is not present."""
+        chain: List[_Node] = [self.head] * self.MAX_LEVELS
+        node = self.head
+        for level in reversed(range(self.MAX_LEVELS)):
+            while node.next[level] is not None and node.next[level].key < key:
+                node = node.next[level]
+            chain[level] = node
+
+        target = chain[0].next[0]
+        if target is None or target.key != key:
+            raise KeyError(key)
+
+        for level in range(len(target.next)):
+            prev = chain[level]
+            prev.width[level] += target.width[level] - 1
+            prev.next[level] = target.next[level]
+        for level in range(len(target.next), self.MAX_LEVELS):
+            chain[level].width[level] -= 1
+        self.size -= 1
+
+    def bisect_left(self, key) -> int:
+        """Return the number of keys less than ``key``."""
+        position = 0
+        node = self.head
+        for level in reversed(range(self.MAX_LEVELS)):
+            while node.next[level] is not None and node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+        return position
+
+    def node_at(self, index: int) -> _Node:
+        """Return the node at 0-based position ``index``."""
+        if not 0 <= index < self.size:
+            raise IndexError(index)
+        remaining = index + 1
+        node = self.head
+        for level in reversed(range(self.MAX_LEVELS)):
+            while node.next[level] is not None and node.width[level] <= remaining:
+                remaining -= node.width[level]
+                node = node.next[level]
+        return node
+
+    def islice(self, start: int, stop: int) -> Iterable[Any]:
+        """Yield the keys at positions ``start`` to ``stop - 1``."""
+        start = max(start, 0)
+        stop = min(stop, self.size)
+        if start >= stop:
+            return
+        node = self.node_at(start)
+        for _ in range(stop - start):
+            yield node.key
+            node = node.next[0]
+
+
+class Leaderboard:
+    """
+    Users ranked by points, updated incrementally.
+    """
+
+    def __init__(self, points: Optional[Dict[Hashable, float]] = None):
+        self._points: Dict[Hashable, float] = dict(points or {})
+        self._index = IndexableSkipList.from_sorted(
+            sorted((-value, user_id) for user_id, value in self._points.items())
+        )
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def set_points(self, user_id: Hashable, points: float) -> None:
+        with self._lock:
+            self._set(user_id, points)
+
+    def add_points(self, user_id: Hashable, delta: float) -> float:
+        """Add ``delta`` to the user's points and return the new total."""
+        with self._lock:
+            total = self._points.get(user_id, 0) + delta
+            self._set(user_id, total)
+            return total
+
+    def _set(self, user_id: Hashable, points: float) -> None:
+        current = self._points.get(user_id)
+        if current == points:
+            return
+        if current is not None:
+            self._index.remove((-current, user_id))
+        self._points[user_id] = points
+        self._index.insert((-points, user_id))
+
+    def discard(self, user_id: Hashable) -> None:
+        with self._lock:
+            current = self._points.pop(user_id, None)
+            if current is not None:
+                self._index.remove((-current, user_id))
+
+    def points(self, user_id: Hashable) -> Optional[float]:
+        return self._points.get(user_id)
+
+    def _rank_for(self, points: float) -> int:
+        # (-points,) sorts before every (-points, user_id) key
+        return self._index.bisect_left((-points,)) + 1
+
+    def rank(self, user_id: Hashable) -> Optional[int]:
+        """Return the user's competition rank (1-based), or None."""
+        with self._lock:
+            points = self._points.get(user_id)
+            if points is None:
+                return None
+            return self._rank_for(points)
+
+    def _entries(self, start: int, stop: int) -> List[Dict[str, Any]]:
+        entries = []
+        previous_points = None
+        rank = 0
+        for offset, (negative_points, user_id) in enumerate(self._index.islice(start, stop)):
+            points = -negative_points
+            if previous_points is None:
+                rank = self._rank_for(points)
+            elif points != previous_points:
+                rank = start + offset + 1
+            previous_points = points
+            entries.append({"rank": rank, "user_id": user_id, "points": points})
+        return entries
+
+    def top(self, n: int) -> List[Dict[str, Any]]:
+        """Return the first ``n`` entries."""
+        with self._lock:
+            return self._entries(0, n)
+
+    def around(self, user_id: Hashable, radius: int) -> List[Dict[str, Any]]:
+        """
+        Return up to ``radius`` entries either side of the user, plus the
+        user's own entry. Empty if the user is not ranked.
+        """
+        with self._lock:
+            points = self._points.get(user_id)
+            if points is None:
+                return []
+            position = self._index.bisect_left((-points, user_id))
+            return self._entries(position - radius, position + radius + 1)
+
+
+def period_start(window: str, day: date) -> date:
+    """Return the first day of the ``week``/``month`` period containing ``day``."""
+    if window == 'week':
+        return day - timedelta(days=day.weekday())
+    if window == 'month':
+        return day.replace(day=1)
+    raise ValueError(f"Unknown window: {window}")
+
+
+class LeaderboardService:
+    """
+    All-time and current-period leaderboards plus display names.
+    """
+
+    def __init__(self):
+        self.boards: Dict[Tuple[str, Optional[date]], Leaderboard] = {('all', None): Leaderboard()}
+        self.names: Dict[Hashable, Optional[str]] = {}
+        self.user_ids: Dict[str, Hashable] = {}
+        self.built_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._rebuilding = False
+
+    @staticmethod
+    def _key(window: str, day: date) -> Tuple[str, Optional[date]]:
+        if window == 'all':
+            return ('all', None)
+        return (window, period_start(window, day))
+
+    def board(self, window: str, at: Optional[datetime] = None) -> Leaderboard:
+        """Return the board for ``window`` in the period containing ``at`` (default now)."""
+        if window not in WINDOWS:
+            raise ValueError(f"Unknown window: {window}")
+        today = datetime.now(timezone.utc).date()
+        day = at.astimezone(timezone.utc).date() if at else today
+        key = self._key(window, day)
+        board = self.boards.get(key)
+        if board is None:
+            with self._lock:
+                board = self.boards.setdefault(key, Leaderboard())
+                # A past period no longer kept gets a throwaway board
+                self._prune(max(day, today))
+        return board
+
+    def _prune(self, today: date) -> None:
+        # Keep the current and previous period of each window
+        keep = {('all', None)}
+        for window in ('week', 'month'):
+            current = period_start(window, today)
+            keep.add((window, current))
+            keep.add((window, period_start(window, current - timedelta(days=1))))
+        for key in [key for key in self.boards if key not in keep]:
+            del self.boards[key]
+
+    def resolve_user(self, clerk_id: str) -> Optional[Hashable]:
+        """Return the Supabase user ID for a Clerk ID, looking it up if unknown."""
+        user_id = self.user_ids.get(clerk_id)
+        if user_id is None:
+            from .data_backend import get_data_backend
+
+            user_id = get_data_backend().get_user_id(clerk_id)
+            if user_id is None:
+                return None
+            self.user_ids[clerk_id] = user_id
+        return user_id
+
+    def record_points(self, user_id: Hashable, delta: float,
+                      at: Optional[datetime] = None, name: Optional[str] = None) -> None:
+        """
+        Apply a points change to every board it belongs to.
+
+        Call whenever points are awarded or revoked in this process.
+        """
+        if name is not None:
+            self.names[user_id] = name
+        for window in WINDOWS:
+            self.board(window, at).add_points(user_id, delta)
+
+    def entries_with_names(self, entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        for entry in entries:
+            entry["username"] = self.names.get(entry["user_id"])
+        return entries
+
+    @traced("leaderboard.rebuild")
+    def rebuild(self, users: Iterable[Dict[str, Any]],
+                total_points: Iterable[Tuple[Hashable, float]],
+                daily_points: Iterable[Tuple[Hashable, date, float]],
+                today: Optional[date] = None) -> None:
+        """
+        Replace every board from a bulk snapshot.
+
+        Args:
+            users: Rows with ``id``, ``clerk_id`` and ``username``
+            total_points: ``(user_id, points)`` lifetime rollups
+            daily_points: ``(user_id, day, points)`` rollups covering at
+                least the current week and month
+            today: Reference day for the current periods (default: today, UTC)
+        """
+        today = today or datetime.now(timezone.utc).date()
+        names = {}
+        user_ids = {}
+        totals = {}
+        for user in users:
+            names[user["id"]] = user.get("username")
+            user_ids[user.get("clerk_id")] = user["id"]
+            totals[user["id"]] = 0
+        for user_id, points in total_points:
+            totals[user_id] = totals.get(user_id, 0) + points
+
+        periods: Dict[Tuple[str, date], Dict[Hashable, float]] = defaultdict(lambda: defaultdict(int))
+        for user_id, day, points in daily_points:
+            for window in ('week', 'month'):
+                periods[(window, period_start(window, day))][user_id] += points
+
+        boards: Dict[Tuple[str, Optional[date]], Leaderboard] = {('all', None): Leaderboard(totals)}
+        for key, points in periods.items():
+            boards[key] = Leaderboard(dict(points))
+
+        with self._lock:
+            self.boards = boards
+            self.names = names
+            self.user_ids = user_ids
+            self.built_at = time.monotonic()
+            self._prune(today)
+        logger.info("Leaderboard rebuilt: %d users", len(totals))
+
+    def load_snapshot(self) -> None:
+        """Rebuild from the database."""
+        today = datetime.now(timezone.utc).date()
+        # Earliest day of the previous week or month
+        since = min(
+            period_start(window, period_start(window, today) - timedelta(days=1))
+            for window in ('week', 'month')
+        )
+        repository = get_repository(LeaderboardRepository)
+        self.rebuild(repository.iter_users(), repository.iter_total_points(),
+                     repository.iter_daily_points(since), today)
+
+    def ensure_fresh(self) -> None:
+        """
+        Load the boards if they were never built; refresh them in the
+        background once they are older than ``LEADERBOARD_REFRESH_INTERVAL``.
+        """
+        if self.built_at is None:
+            with self._load_lock:
+                if self.built_at is None:
+                    self.load_snapshot()
+            return
+
+        if time.monotonic() - self.built_at < settings.LEADERBOARD_REFRESH_INTERVAL:
+            return
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(target=self._refresh, name='leaderboard-refresh', daemon=True).start()
+
+    def _refresh(self) -> None:
+        try:
+            self.load_snapshot()
+        except Exception as e:
+            logger.warning("Leaderboard refresh failed: %s", e)
+        finally:
+            self._rebuilding = False
+
+
+_service: Optional[LeaderboardService] = None
+_service_lock = threading.Lock()
+
+
+def get_leaderboard() -> LeaderboardService:
+    """Get the process-wide leaderboard service."""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = LeaderboardService()
+    return _service
+
+
+def _completed_points(row: Optional[Dict[str, Any]]) -> float:
+    if row is None or row.get("user_id") is None or row.get("status") != "completed":
+        return 0
+    return row.get("points_earned") or 0
+
+
+def _created_at(row: Dict[str, Any]) -> Optional[datetime]:
+    created_at = row.get("created_at")
+    if isinstance(created_at, str):
+        created_at = datetime.fromisoformat(created_at.replace("Z", "+00:00"))
+    if created_at is not None and created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return created_at
+
+
+def tracks_changes() -> bool:
+    """Whether ``record_transaction_changes`` applies changes (the boards are loaded)."""
+    service = _service
+    return service is not None and service.built_at is not None
+
+
+def record_transaction_changes(
+        changes: Iterable[Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]]) -> None:
+    """
+    Apply the completed points of transaction writes, given as
+    ``(before, after)`` rows, to this process's boards.
+
+    Called by the data backends next to the user stats hooks. Does nothing
+    until the boards are loaded, and a change that lands while a rebuild
+    is running is only picked up by the next rebuild.
+    """
+    service = _service
+    if service is None or service.built_at is None:
+        return
+    deltas: Dict[Tuple[str, Optional[datetime]], float] = defaultdict(int)
+    for before, after in changes:
+        for row, sign in ((after, 1), (before, -1)):
+            points = _completed_points(row)
+            if points:
+                deltas[(str(row["user_id"]), _created_at(row))] += sign * points
+    for (user_id, at), delta in deltas.items():
+        if delta:
+            service.record_points(user_id, delta, at=at)
+
+
+def reset_after_fork() -> None:
+    """Forget the parent's boards; the child loads its own snapshot."""
+    global _service, _service_lock
+    _service = None
+    _service_lock = threading.Lock()
@@ -0,0 +1,209 @@
+"""
+Feature repositories over the pooled Postgres connection of
+``PostgresBackend``. See ``repositories``.
+
+Requires ``psycopg[binary,pool]``.
+"""
+
+import logging
+from datetime import date, datetime, time, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import psycopg
+from psycopg import sql
+from psycopg.types.json import Jsonb
+
+from ..tracing import traced
+from .postgres_backend import _to_dict
+from .repositories import (
+    BIN_COLUMNS,
+    AnalyticsRepository,
+    BinRepository,
+    LeaderboardRepository,
+    SettingsRepository,
+    UserStatsRepository,
+)
+from .supabase_client import SupabaseError
+
+
+logger = logging.getLogger(__name__)
+
+
+SELECT_USERS = sql.SQL("SELECT id, clerk_id, username FROM users")
+
+SELECT_TOTAL_POINTS = sql.SQL(
+    "SELECT user_id, sum(points_earned) AS points FROM transactions "
+    "WHERE status = 'completed' GROUP BY 1"
+)
+
+SELECT_DAILY_POINTS = sql.SQL(
+    "SELECT user_id, (created_at AT TIME ZONE 'UTC')::date AS day, sum(points_earned) AS points "
+    "FROM transactions WHERE status = 'completed' AND created_at >= %s "
+    "GROUP BY 1, 2"
+)
+
+SELECT_USER_STATS = sql.SQL("SELECT stats FROM user_stats WHERE user_id = %s")
+
+LOCK_USER_STATS = sql.SQL(
+    "INSERT INTO user_stats (user_id, stats) VALUES (%s, 'null') ON CONFLICT (user_id) DO NOTHING"
+)
+
+SELECT_USER_STATS_FOR_UPDATE = sql.SQL("SELECT stats FROM user_stats WHERE user_id = %s FOR UPDATE")
+
+UPDATE_USER_STATS = sql.SQL(
+    "UPDATE user_stats SET stats = %s, version = version + 1, updated_at = now() WHERE user_id = %s"
+)
+
+UPSERT_USER_STATS = sql.SQL(
+    "INSERT INTO user_stats (user_id, stats, updated_at) "
+    "SELECT *, now() FROM unnest(%s::uuid[], %s::jsonb[]) "
+    "ON CONFLICT (user_id) DO UPDATE SET stats = EXCLUDED.stats, "
+    "version = user_stats.version + 1, updated_at = EXCLUDED.updated_at"
+)
+
+SELECT_SETTING = sql.SQL("SELECT key, value, updated_at FROM system_settings WHERE key = %s")
+
+SELECT_BINS = sql.SQL("SELECT {} FROM bins").format(
+    sql.SQL(", ").join(map(sql.Identifier, BIN_COLUMNS))
+)
+
+UPDATE_BIN_FILL_LEVELS = sql.SQL(
+    "UPDATE bins b SET fill_level = r.fill_level, updated_at = r.updated_at "
+    "FROM unnest(%s::uuid[], %s::int[], %s::timestamptz[]) AS r(id, fill_level, updated_at) "
+    "WHERE b.id = r.id AND (b.updated_at IS NULL OR b.updated_at < r.updated_at)"
+)
+
+# Keyset scans over (updated_at, id), for the analytics export
+SELECT_CHANGED = sql.SQL("SELECT * FROM {} ORDER BY updated_at, id LIMIT %s")
+SELECT_CHANGED_AFTER = sql.SQL(
+    "SELECT * FROM {} WHERE (updated_at, id) > (%s::timestamptz, %s::uuid) "
+    "ORDER BY updated_at, id LIMIT %s"
+)
+
+
+class PostgresLeaderboardRepository(LeaderboardRepository):
+    def iter_users(self) -> Iterator[Dict[str, Any]]:
+        try:
+            with self.backend.pool.connection() as conn:
+                for user in conn.cursor().stream(SELECT_USERS):
+                    yield _to_dict(user)
+        except psycopg.Error as e:
+            logger.error("Failed to read users: %s", e)
+            raise SupabaseError(f"Failed to read users: {str(e)}")
+
+    def iter_total_points(self) -> Iterator[Tuple[str, float]]:
+        try:
+            with self.backend.pool.connection() as conn:
+                for row in conn.cursor().stream(SELECT_TOTAL_POINTS):
+                    yield str(row["user_id"]), row["points"] or 0
+        except psycopg.Error as e:
+            logger.error("Failed to read total points: %s", e)
+            raise SupabaseError(f"Failed to read total points: {str(e)}")
+
+    def iter_daily_points(self, since: date) -> Iterator[Tuple[str, date, float]]:
+        start = datetime.combine(since, time.min, tzinfo=timezone.utc)
+        try:
+            with self.backend.pool.connection() as conn:
+                for row in conn.cursor().stream(SELECT_DAILY_POINTS, (start,)):
+                    yield str(row["user_id"]), row["day"], row["points"] or 0
+        except psycopg.Error as e:
+            logger.error("Failed to read daily points: %s", e)
+            raise SupabaseError(f"Failed to read daily points: {str(e)}")
+
+
+class PostgresUserStatsRepository(UserStatsRepository):
+    def get_user_stats(self, user_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with self.backend.pool.connection() as conn:
+                row = conn.execute(SELECT_USER_STATS, (user_id,)).fetchone()
+        except psycopg.Error as e:
+            logger.error("Failed to read stats of user %s: %s", user_id, e)
+            raise SupabaseError(f"Failed to read user stats: {str(e)}")
+        return row["stats"] if row else None
+
+    @traced("postgres.update_user_stats")
+    def update_user_stats(self, user_id: str,
+                          update: Callable[[Optional[Dict[str, Any]]], Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Lock the user's row (creating it first, so concurrent first
+        writes serialize too) and rewrite it in one transaction.
+        """
+        try:
+            with self.backend.pool.connection() as conn, conn.transaction():
+                conn.execute(LOCK_USER_STATS, (user_id,))
+                row = conn.execute(SELECT_USER_STATS_FOR_UPDATE, (user_id,)).fetchone()
+                stats = update(row["stats"])
+                conn.execute(UPDATE_USER_STATS, (Jsonb(stats), user_id))
+                return stats
+        except psycopg.Error as e:
+            logger.error("Failed to update stats of user %s: %s", user_id, e)
+            raise SupabaseError(f"Failed to update user stats: {str(e)}")
+
+    @traced("postgres.replace_user_stats")
+    def replace_user_stats(self, stats_by_user: Dict[str, Dict[str, Any]]) -> int:
+        if not stats_by_user:
+            return 0
+        params = (list(stats_by_user), [Jsonb(stats) for stats in stats_by_user.values()])
+        try:
+            with self.backend.pool.connection() as conn:
+                return conn.execute(UPSERT_USER_STATS, params).rowcount
+        except psycopg.Error as e:
+            logger.error("Failed to write user stats: %s", e)
+            raise SupabaseError(f"Failed to write user stats: {str(e)}")
+
+
+class PostgresSettingsRepository(SettingsRepository):
+    @traced("postgres.get_setting")
+    def get_setting(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with self.backend.pool.connection() as conn:
+                return conn.execute(SELECT_SETTING, (key,)).fetchone()
+        except psycopg.errors.UndefinedTable:
+            return None
+        except psycopg.Error as e:
+            logger.error("Failed to read setting %s: %s", key, e)
+            raise SupabaseError(f"Failed to read setting {key}: {str(e)}")
+
+
+class PostgresBinRepository(BinRepository):
+    def iter_bins(self) -> Iterator[Dict[str, Any]]:
+        try:
+            with self.backend.pool.connection() as conn:
+                for row in conn.cursor().stream(SELECT_BINS):
+                    yield _to_dict(row)
+        except psycopg.Error as e:
+            logger.error("Failed to read bins: %s", e)
+            raise SupabaseError(f"Failed to read bins: {str(e)}")
+
+    @traced("postgres.update_bin_fill_levels")
+    def update_bin_fill_levels(self, readings: List[Dict[str, Any]]) -> int:
+        if not readings:
+            return 0
+        params = (
+            [reading["id"] for reading in readings],
+            [round(reading["fill_level"]) for reading in readings],
+            [reading["updated_at"] for reading in readings],
+        )
+        try:
+            with self.backend.pool.connection() as conn:
+                return conn.execute(UPDATE_BIN_FILL_LEVELS, params).rowcount
+        except psycopg.Error as e:
+            logger.error("Failed to update bin fill levels: %s", e)
+            raise SupabaseError(f"Failed to update bins: {str(e)}")
+
+
+class PostgresAnalyticsRepository(AnalyticsRepository):
+    def fetch_changed_rows(self, table: str, after: Optional[Tuple[Any, str]],
+                           limit: int) -> List[Dict[str, Any]]:
+        if after is None:
+            query = SELECT_CHANGED.format(sql.Identifier(table))
+            params: List[Any] = [limit]
+        else:
+            query = SELECT_CHANGED_AFTER.format(sql.Identifier(table))
+            params = [after[0], after[1], limit]
+        try:
+            with self.backend.pool.connection() as conn:
+                return [_to_dict(row) for row in conn.execute(query, params)]
+        except psycopg.Error as e:
+            logger.error("Failed to read %s: %s", table, e)
+            raise SupabaseError(f"Failed to read {table}: {str(e)}")
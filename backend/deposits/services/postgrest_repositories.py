@@ -0,0 +1,87 @@
+"""
+Feature repositories over the Supabase REST API (PostgREST), for
+``PostgRESTBackend``. See ``repositories``.
+"""
+
+from collections import defaultdict
+from datetime import date, datetime, time, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from . import supabase_client
+from .repositories import (
+    BIN_COLUMNS,
+    AnalyticsRepository,
+    BinRepository,
+    LeaderboardRepository,
+    SettingsRepository,
+    UserStatsRepository,
+)
+
+
+class PostgRESTLeaderboardRepository(LeaderboardRepository):
+    def iter_users(self) -> Iterator[Dict[str, Any]]:
+        return supabase_client.iter_rows("users", "id,clerk_id,username")
+
+    def iter_total_points(self) -> Iterator[Tuple[str, float]]:
+        totals: Dict[str, float] = defaultdict(int)
+        rows = supabase_client.iter_rows(
+            "transactions", "id,user_id,points_earned", {"status": "eq.completed"}
+        )
+        for row in rows:
+            totals[row["user_id"]] += row["points_earned"] or 0
+        return iter(totals.items())
+
+    def iter_daily_points(self, since: date) -> Iterator[Tuple[str, date, float]]:
+        # PostgREST has no GROUP BY here; roll up the raw rows
+        start = datetime.combine(since, time.min, tzinfo=timezone.utc)
+        totals: Dict[Tuple[str, date], float] = defaultdict(int)
+        rows = supabase_client.iter_rows(
+            "transactions",
+            "id,user_id,points_earned,created_at",
+            {"status": "eq.completed", "created_at": f"gte.{start.isoformat()}"},
+        )
+        for row in rows:
+            day = datetime.fromisoformat(row["created_at"]).astimezone(timezone.utc).date()
+            totals[(row["user_id"], day)] += row["points_earned"] or 0
+        for (user_id, day), points in totals.items():
+            yield user_id, day, points
+
+
+class PostgRESTUserStatsRepository(UserStatsRepository):
+    def get_user_stats(self, user_id: str) -> Optional[Dict[str, Any]]:
+        row = supabase_client.get_user_stats(user_id)
+        return row["stats"] if row else None
+
+    def update_user_stats(self, user_id: str,
+                          update: Callable[[Optional[Dict[str, Any]]], Dict[str, Any]]) -> Dict[str, Any]:
+        return supabase_client.update_user_stats(user_id, update)
+
+    def replace_user_stats(self, stats_by_user: Dict[str, Dict[str, Any]]) -> int:
+        return supabase_client.upsert_user_stats(stats_by_user)
+
+
+class PostgRESTSettingsRepository(SettingsRepository):
+    def get_setting(self, key: str) -> Optional[Dict[str, Any]]:
+        return supabase_client.get_system_setting(key)
+
+
+class PostgRESTBinRepository(BinRepository):
+    def iter_bins(self) -> Iterator[Dict[str, Any]]:
+        return supabase_client.iter_rows("bins", ",".join(BIN_COLUMNS))
+
+    def update_bin_fill_levels(self, readings: List[Dict[str, Any]]) -> int:
+        return supabase_client.update_bin_fill_levels(readings)
+
+
+class PostgRESTAnalyticsRepository(AnalyticsRepository):
+    def fetch_changed_rows(self, table: str, after: Optional[Tuple[Any, str]],
+                           limit: int) -> List[Dict[str, Any]]:
+        filters = None
+        if after is not None:
+            changed_at, row_id = after
+            if isinstance(changed_at, datetime):
+                changed_at = changed_at.isoformat()
+            filters = {
+                "or": f'(updated_at.gt."{changed_at}",and(updated_at.eq."{changed_at}",id.gt.{row_id}))',
+            }
+        return supabase_client.fetch_page(table, "*", None, limit, filters, order="updated_at,id")
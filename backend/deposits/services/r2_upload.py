@@ -5,16 +5,17 @@ This module handles image uploads to Cloudflare R2 (S3-compatible storage).
 It provides both public URLs and signed URLs for secure ML model access.
 """
 
+import base64
 import logging
 import uuid
 import mimetypes
-from typing import Tuple, Optional
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple, Optional
 
-import boto3
-from botocore.exceptions import ClientError, BotoCoreError
-from botocore.config import Config
 from django.conf import settings
 
+from ..tracing import traced, get_tracer, instrument_boto_client
+
 
 logger = logging.getLogger(__name__)
 
@@ -24,12 +25,23 @@ class R2UploadError(Exception):
     pass
 
 
+class R2ObjectNotFound(R2UploadError):
+    """Raised when a requested object does not exist."""
+    pass
+
+
+@lru_cache(maxsize=1)
+@traced("r2.create_client")
 def get_r2_client():
     """
-    Create and return a boto3 S3 client configured for Cloudflare R2.
+    Get a cached boto3 S3 client configured for Cloudflare R2.
     
     R2 is fully S3-compatible, so we use boto3's S3 client with
-    the R2 endpoint URL.
+    the R2 endpoint URL. boto3 clients are thread-safe, so a single
+    instance is shared instead of being rebuilt on every call.
+    
+    boto3 is imported here rather than at module level; it is the
+    heaviest import in the API and is only needed once R2 is used.
     """
     if not all([
         settings.R2_ACCESS_KEY_ID,
@@ -38,7 +50,10 @@ def get_r2_client():
     ]):
         raise R2UploadError("R2 credentials are not fully configured")
     
-    return boto3.client(
+    import boto3
+    from botocore.config import Config
+    
+    client = boto3.client(
         's3',
         endpoint_url=settings.R2_ENDPOINT_URL,
         aws_access_key_id=settings.R2_ACCESS_KEY_ID,
@@ -51,6 +66,8 @@ def get_r2_client():
         ),
         region_name='auto',  # R2 uses 'auto' for region
     )
+    instrument_boto_client(client)
+    return client
 
 
 def get_content_type(filename: str) -> str:
@@ -72,10 +89,22 @@ def get_file_extension(filename: str) -> str:
     return 'jpg'
 
 
+def build_object_key(original_filename: str, clerk_user_id: str) -> str:
+    """
+    Generate a unique object key for a deposit image.
+    
+    Format: deposits/{clerk_user_id}/{uuid}.{ext}
+    """
+    extension = get_file_extension(original_filename)
+    return f"deposits/{clerk_user_id}/{uuid.uuid4()}.{extension}"
+
+
+@traced("r2.upload_image")
 def upload_image_to_r2(
     file_data: bytes,
     original_filename: str,
     clerk_user_id: str,
+    checksum_sha256: Optional[bytes] = None,
 ) -> Tuple[str, str]:
     """
     Upload an image to Cloudflare R2.
@@ -84,6 +113,9 @@ def upload_image_to_r2(
         file_data: Raw bytes of the image file
         original_filename: Original filename (used for content type detection)
         clerk_user_id: Clerk user ID (used in the object key for organization)
+        checksum_sha256: SHA-256 digest of ``file_data``, if already known
+            (computed as the upload streamed in). R2 verifies it, and
+            botocore then skips checksumming the body itself.
     
     Returns:
         Tuple of (object_key, signed_url)
@@ -93,6 +125,8 @@ def upload_image_to_r2(
     Raises:
         R2UploadError: If the upload fails for any reason
     """
+    from botocore.exceptions import ClientError, BotoCoreError
+    
     try:
         client = get_r2_client()
         bucket_name = settings.R2_BUCKET_NAME
@@ -100,48 +134,194 @@ def upload_image_to_r2(
         if not bucket_name:
             raise R2UploadError("R2_BUCKET_NAME is not configured")
         
-        # Generate a unique object key
-        # Format: deposits/{clerk_user_id}/{uuid}.{ext}
-        extension = get_file_extension(original_filename)
-        unique_id = str(uuid.uuid4())
-        object_key = f"deposits/{clerk_user_id}/{unique_id}.{extension}"
+        object_key = build_object_key(original_filename, clerk_user_id)
         
         content_type = get_content_type(original_filename)
         
-        logger.info(f"Uploading to R2: {object_key} ({content_type})")
+        logger.info("Uploading to R2: %s (%s)", object_key, content_type)
+        
+        checksum = {}
+        if checksum_sha256 is not None:
+            checksum['ChecksumSHA256'] = base64.b64encode(checksum_sha256).decode('ascii')
         
         # Upload the file
-        client.put_object(
-            Bucket=bucket_name,
-            Key=object_key,
-            Body=file_data,
-            ContentType=content_type,
-        )
+        with get_tracer().start_as_current_span(
+            "r2.put_object", {"r2.object_key": object_key, "r2.bytes": len(file_data)}
+        ):
+            client.put_object(
+                Bucket=bucket_name,
+                Key=object_key,
+                Body=file_data,
+                ContentType=content_type,
+                **checksum,
+            )
         
-        logger.info(f"Successfully uploaded: {object_key}")
+        logger.info("Successfully uploaded: %s", object_key)
         
-        # Generate a signed URL for secure access
-        # This URL is time-limited and can be regenerated later if needed
-        signed_url = generate_signed_url(object_key)
+        # Generate a signed URL for the response. Only the object key is
+        # persisted; later reads re-sign through the signed URL service.
+        from .signed_urls import get_signed_url
+        signed_url = get_signed_url(object_key)
         
         return object_key, signed_url
         
     except (ClientError, BotoCoreError) as e:
-        logger.error(f"R2 upload failed: {e}")
+        logger.error("R2 upload failed: %s", e)
         raise R2UploadError(f"Failed to upload image: {str(e)}")
     except Exception as e:
-        logger.error(f"Unexpected error during R2 upload: {e}")
+        logger.error("Unexpected error during R2 upload: %s", e)
         raise R2UploadError(f"Upload failed: {str(e)}")
 
 
+@traced("r2.put_object")
+def put_object(object_key: str, file_data: bytes, content_type: str) -> None:
+    """
+    Store bytes under an existing object key.
+    
+    Raises:
+        R2UploadError: If the upload fails
+    """
+    try:
+        get_r2_client().put_object(
+            Bucket=settings.R2_BUCKET_NAME,
+            Key=object_key,
+            Body=file_data,
+            ContentType=content_type,
+        )
+    except R2UploadError:
+        raise
+    except Exception as e:
+        logger.error("R2 upload of %s failed: %s", object_key, e)
+        raise R2UploadError(f"Failed to upload image: {str(e)}")
+
+
+# Multipart uploads, used by resumable uploads (see resumable_upload.py).
+# Parts are numbered from 1; every part except the last must be at least
+# 5 MiB, and R2 requires those parts to all have the same size.
+
+@traced("r2.create_multipart_upload")
+def create_multipart_upload(object_key: str, content_type: str) -> str:
+    """
+    Start a multipart upload and return its upload ID.
+    
+    Raises:
+        R2UploadError: If the request fails
+    """
+    try:
+        response = get_r2_client().create_multipart_upload(
+            Bucket=settings.R2_BUCKET_NAME,
+            Key=object_key,
+            ContentType=content_type,
+        )
+        return response["UploadId"]
+    except R2UploadError:
+        raise
+    except Exception as e:
+        logger.error("Failed to start multipart upload of %s: %s", object_key, e)
+        raise R2UploadError(f"Failed to start multipart upload: {str(e)}")
+
+
+@traced("r2.upload_part")
+def upload_part(object_key: str, upload_id: str, part_number: int, data: bytes) -> str:
+    """
+    Upload one part and return its ETag.
+    
+    Raises:
+        R2UploadError: If the request fails
+    """
+    try:
+        response = get_r2_client().upload_part(
+            Bucket=settings.R2_BUCKET_NAME,
+            Key=object_key,
+            UploadId=upload_id,
+            PartNumber=part_number,
+            Body=data,
+        )
+        return response["ETag"]
+    except R2UploadError:
+        raise
+    except Exception as e:
+        logger.error("Failed to upload part %d of %s: %s", part_number, object_key, e)
+        raise R2UploadError(f"Failed to upload part {part_number}: {str(e)}")
+
+
+@traced("r2.complete_multipart_upload")
+def complete_multipart_upload(object_key: str, upload_id: str, parts: List[Dict[str, Any]]) -> None:
+    """
+    Assemble the uploaded parts (``PartNumber`` and ``ETag``, in order)
+    into the object.
+    
+    Raises:
+        R2UploadError: If the request fails
+    """
+    try:
+        get_r2_client().complete_multipart_upload(
+            Bucket=settings.R2_BUCKET_NAME,
+            Key=object_key,
+            UploadId=upload_id,
+            MultipartUpload={"Parts": parts},
+        )
+    except R2UploadError:
+        raise
+    except Exception as e:
+        logger.error("Failed to complete multipart upload of %s: %s", object_key, e)
+        raise R2UploadError(f"Failed to complete multipart upload: {str(e)}")
+
+
+@traced("r2.abort_multipart_upload")
+def abort_multipart_upload(object_key: str, upload_id: str) -> bool:
+    """
+    Abort a multipart upload and discard its parts.
+    
+    Returns:
+        True if the abort succeeded, False otherwise
+    """
+    try:
+        get_r2_client().abort_multipart_upload(
+            Bucket=settings.R2_BUCKET_NAME,
+            Key=object_key,
+            UploadId=upload_id,
+        )
+        return True
+    except Exception as e:
+        logger.error("Failed to abort multipart upload of %s: %s", object_key, e)
+        return False
+
+
+@traced("r2.get_object")
+def get_object_bytes(object_key: str) -> bytes:
+    """
+    Download an object.
+    
+    Raises:
+        R2ObjectNotFound: If there is no object under ``object_key``
+        R2UploadError: If the download fails
+    """
+    from botocore.exceptions import ClientError
+    
+    try:
+        response = get_r2_client().get_object(Bucket=settings.R2_BUCKET_NAME, Key=object_key)
+        return response['Body'].read()
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+            raise R2ObjectNotFound(f"No object {object_key}")
+        logger.error("R2 download of %s failed: %s", object_key, e)
+        raise R2UploadError(f"Failed to download image: {str(e)}")
+    except R2UploadError:
+        raise
+    except Exception as e:
+        logger.error("R2 download of %s failed: %s", object_key, e)
+        raise R2UploadError(f"Failed to download image: {str(e)}")
+
+
+@traced("r2.generate_signed_url")
 def generate_signed_url(object_key: str, expiration: Optional[int] = None) -> str:
     """
     Generate a pre-signed URL for accessing an object in R2.
     
-    This is useful for:
-    - Secure access to images without making the bucket public
-    - Time-limited access for ML model inference
-    - Regenerating URLs when old ones expire
+    This always signs a fresh URL. Read paths should prefer
+    ``signed_urls.get_signed_url``, which memoizes URLs until shortly
+    before they expire.
     
     Args:
         object_key: The S3/R2 object key
@@ -175,10 +355,11 @@ def generate_signed_url(object_key: str, expiration: Optional[int] = None) -> st
         return signed_url
         
     except Exception as e:
-        logger.error(f"Failed to generate signed URL: {e}")
+        logger.error("Failed to generate signed URL: %s", e)
         raise R2UploadError(f"Failed to generate signed URL: {str(e)}")
 
 
+@traced("r2.delete_image")
 def delete_image_from_r2(object_key: str) -> bool:
     """
     Delete an image from R2.
@@ -201,9 +382,9 @@ def delete_image_from_r2(object_key: str) -> bool:
             Key=object_key,
         )
         
-        logger.info(f"Deleted object from R2: {object_key}")
+        logger.info("Deleted object from R2: %s", object_key)
         return True
         
     except Exception as e:
-        logger.error(f"Failed to delete object from R2: {e}")
+        logger.error("Failed to delete object from R2: %s", e)
         return False
@@ -0,0 +1,130 @@
+"""
+Feature Repositories.
+
+``DataBackend`` covers what the upload path needs: users and
+transactions. Tables used by a single feature are read and written
+through narrower interfaces defined here, so each feature's queries sit
+together and a backend only implements the features it serves:
+
+- ``LeaderboardRepository``: users and their completed points
+- ``UserStatsRepository``: the per-user counters in ``user_stats``
+- ``SettingsRepository``: ``system_settings`` rows (reward rules)
+- ``BinRepository``: bins for route planning and telemetry writes
+- ``AnalyticsRepository``: keyset scans of changed rows for the export
+
+Each backend lists its implementations in ``DataBackend.repositories``
+(``deposits.services.postgrest_repositories`` and
+``deposits.services.postgres_repositories``).
+``get_repository(LeaderboardRepository)`` returns the implementation
+for the configured backend. Like the backend methods, every method
+raises ``SupabaseError`` on failure.
+"""
+
+from datetime import date
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Type, TypeVar
+
+
+# Columns read for route planning
+BIN_COLUMNS = (
+    "id", "bin_code", "name", "latitude", "longitude", "fill_level", "status",
+    "is_operational", "last_emptied_at", "created_at",
+)
+
+
+class Repository:
+    """
+    Base class of the repository implementations; ``backend`` is the
+    ``DataBackend`` whose connections they share.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+
+class LeaderboardRepository(Repository):
+    """Reads behind the leaderboards (see ``leaderboard``)."""
+
+    def iter_users(self) -> Iterator[Dict[str, Any]]:
+        """Yield ``id``, ``clerk_id`` and ``username`` of every user."""
+        raise NotImplementedError
+
+    def iter_total_points(self) -> Iterator[Tuple[str, float]]:
+        """Yield ``(user_id, points)``: lifetime points from completed transactions."""
+        raise NotImplementedError
+
+    def iter_daily_points(self, since: date) -> Iterator[Tuple[str, date, float]]:
+        """
+        Yield ``(user_id, day, points)``: points earned per user per UTC
+        day from completed transactions, starting at ``since``.
+        """
+        raise NotImplementedError
+
+
+class UserStatsRepository(Repository):
+    """The ``user_stats`` counters (see ``user_stats``)."""
+
+    def get_user_stats(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Return the user's ``user_stats`` counters, or None."""
+        raise NotImplementedError
+
+    def update_user_stats(self, user_id: str,
+                          update: Callable[[Optional[Dict[str, Any]]], Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Atomically replace a user's counters with ``update(current)``
+        (``current`` is None if the user has none) and return them.
+        ``update`` may be called more than once.
+        """
+        raise NotImplementedError
+
+    def replace_user_stats(self, stats_by_user: Dict[str, Dict[str, Any]]) -> int:
+        """Overwrite many users' counters; returns the number written."""
+        raise NotImplementedError
+
+
+class SettingsRepository(Repository):
+    """``system_settings`` rows (see ``rewards``)."""
+
+    def get_setting(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the ``system_settings`` row (key, value, updated_at), or None."""
+        raise NotImplementedError
+
+
+class BinRepository(Repository):
+    """The ``bins`` table (see ``routing`` and ``telemetry``)."""
+
+    def iter_bins(self) -> Iterator[Dict[str, Any]]:
+        """Yield every bin with ``BIN_COLUMNS``."""
+        raise NotImplementedError
+
+    def update_bin_fill_levels(self, readings: List[Dict[str, Any]]) -> int:
+        """
+        Apply many bin readings (``id``, ``fill_level``, ``updated_at``)
+        in one round trip.
+
+        A reading only replaces a bin's fill level if it is newer than the
+        bin's ``updated_at``. Returns the number of bins updated.
+        """
+        raise NotImplementedError
+
+
+class AnalyticsRepository(Repository):
+    """Incremental table scans (see ``analytics_export``)."""
+
+    def fetch_changed_rows(self, table: str, after: Optional[Tuple[Any, str]],
+                           limit: int) -> List[Dict[str, Any]]:
+        """
+        Return up to ``limit`` rows of ``table`` (all columns) ordered by
+        ``(updated_at, id)``, starting after the ``(updated_at, id)``
+        position ``after`` (None for the beginning).
+        """
+        raise NotImplementedError
+
+
+R = TypeVar("R", bound=Repository)
+
+
+def get_repository(interface: Type[R]) -> R:
+    """Return the configured backend's implementation of ``interface``."""
+    from .data_backend import get_data_backend
+
+    return get_data_backend().repository(interface)
@@ -0,0 +1,124 @@
+"""
+Transaction Re-Scoring Workers.
+
+Per-chunk work for the ``rescore_transactions`` management command:
+optionally re-run the classifier on each transaction's image, then
+recompute points and CO2 with the reward rules. Functions here run in
+worker processes; the command streams chunks to them and writes the
+results back.
+
+Inference modes:
+
+- ``none``: keep the stored ``item_type``/``detected_confidence`` and
+  only re-apply the reward rules
+- ``api``: re-classify each image through ``ML_API_URL``
+- ``stub``: deterministic fake classifier (derived from the object key),
+  for dry runs and benchmarks without network access
+
+Only completed transactions are re-scored: pending ones have not been
+reviewed and failed ones earn nothing, so both keep their stored values.
+"""
+
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from .rewards import CompiledRules
+
+
+logger = logging.getLogger(__name__)
+
+
+INFERENCE_MODES = ('none', 'api', 'stub')
+
+# The only transactions whose points and CO2 are re-computed
+RESCORE_STATUS = 'completed'
+
+# Weight used for transactions without one, as in the Next.js upload route
+DEFAULT_WEIGHT_GRAMS = 100
+
+# Written back for every changed row: the key, the table's NOT NULL
+# columns (required by PostgREST upserts) and the re-scored fields
+WRITE_COLUMNS = (
+    "id", "user_id", "r2_object_key", "status",
+    "item_type", "detected_confidence", "points_earned", "co2_saved",
+)
+
+
+_rules: Optional[CompiledRules] = None
+_inference = 'none'
+
+
+def init_worker(rules: CompiledRules, inference: str) -> None:
+    """Process pool initializer: set up Django and the shared rules."""
+    global _rules, _inference
+    import django
+
+    django.setup()
+    _rules = rules
+    _inference = inference
+
+
+def _stub_classify(rules: CompiledRules, object_key: str) -> Tuple[str, float]:
+    digest = hashlib.blake2b(object_key.encode(), digest_size=8).digest()
+    categories = rules.categories[1:] or rules.categories
+    category = categories[digest[0] % len(categories)].category
+    return category, round(0.3 + (digest[1] / 255) * 0.7, 4)
+
+
+def _classify(rows: List[Dict[str, Any]]) -> Tuple[List[Tuple[Optional[str], Optional[float]]], int]:
+    """Return ``(label, confidence)`` per row and the number of failures."""
+    if _inference == 'none':
+        return [(row.get("item_type"), row.get("detected_confidence")) for row in rows], 0
+
+    if _inference == 'stub':
+        return [_stub_classify(_rules, row["r2_object_key"]) for row in rows], 0
+
+    from .classifier import ClassifierError, classify_image_url
+    from .signed_urls import get_signed_urls
+
+    urls = get_signed_urls([row["r2_object_key"] for row in rows])
+    predictions = []
+    failures = 0
+    for row in rows:
+        try:
+            predictions.append(classify_image_url(urls[row["r2_object_key"]]))
+        except ClassifierError as e:
+            # Keep the stored classification for this row
+            logger.warning("Re-classifying transaction %s failed: %s", row["id"], e)
+            predictions.append((row.get("item_type"), row.get("detected_confidence")))
+            failures += 1
+    return predictions, failures
+
+
+def rescore_chunk(rows: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Re-classify and re-score a chunk of transactions. Rows not in
+    ``RESCORE_STATUS`` are left unchanged.
+
+    Returns:
+        Tuple of (changed rows with ``WRITE_COLUMNS``, inference failures)
+    """
+    rows = [row for row in rows if row.get("status") == RESCORE_STATUS]
+    if not rows:
+        return [], 0
+    predictions, failures = _classify(rows)
+    scores = _rules.score_batch(
+        [label for label, _ in predictions],
+        [row.get("weight") or DEFAULT_WEIGHT_GRAMS for row in rows],
+        [confidence for _, confidence in predictions],
+    )
+
+    changed = []
+    for i, row in enumerate(rows):
+        label, confidence = predictions[i]
+        new = {
+            **row,
+            "item_type": label,
+            "detected_confidence": confidence,
+            "points_earned": scores["points"][i],
+            "co2_saved": scores["co2_saved"][i],
+        }
+        if any(new[column] != row.get(column) for column in WRITE_COLUMNS):
+            changed.append({column: new[column] for column in WRITE_COLUMNS})
+    return changed, failures
@@ -0,0 +1,410 @@
+"""
+Resumable Chunked Uploads.
+
+A deposit image can be uploaded in numbered chunks over several
+requests, so a dropped connection only costs the chunk in flight rather
+than the whole image:
+
+1. ``create``: the client announces the filename and size and gets an
+   upload id, the chunk size and the chunk count
+2. ``write_chunk``: chunks are sent in any order, any number of times;
+   the session records which indexes have arrived
+3. ``get``: after a reconnect, lists the chunks still missing
+4. ``finish``: writes the R2 object and marks the session
+   ``finalizing`` with a transaction id; the view then creates the
+   transaction under that id as for a single-request upload and marks
+   the session ``complete``. While one call is finalizing, others get an
+   error (409) instead of creating a second transaction, and a call that
+   takes over after a failure reuses the transaction if it was written
+
+Chunks are staged in a per-session file under ``UPLOAD_SESSION_DIR``.
+R2 multipart parts must be at least 5 MiB and, except the last, all the
+same size, which is too coarse to retry over a weak mobile connection.
+Chunks are therefore small (``UPLOAD_CHUNK_SIZE``), and whenever a full
+``UPLOAD_PART_SIZE`` range of chunks has arrived it is sent to R2 as the
+next multipart part, so finishing only uploads the tail. Images no
+larger than one part skip multipart and are stored with one
+``put_object`` when finished.
+
+Session state is a JSON file next to the staged data, updated under an
+exclusive ``flock``. Any worker on the host can therefore serve any
+request of a session; with several hosts, upload requests must be routed
+to one host per session. Sessions expire ``UPLOAD_SESSION_TTL`` seconds
+after they start (see the ``purge_upload_sessions`` command).
+"""
+
+import fcntl
+import logging
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from django.conf import settings
+
+from ..fast_json import dumps, loads
+from ..tracing import traced
+from . import r2_upload
+from .supabase_client import SupabaseError
+
+
+logger = logging.getLogger(__name__)
+
+
+STATE_SUFFIX = ".json"
+DATA_SUFFIX = ".part"
+
+# R2 rejects smaller multipart parts (except the last)
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+# Seconds after which a ``finalizing`` session is assumed abandoned (the
+# worker died) and another call may take it over
+FINALIZE_TIMEOUT = 120
+
+
+class UploadSessionError(Exception):
+    """Custom exception for invalid resumable upload requests."""
+    pass
+
+
+class UploadSessionNotFound(UploadSessionError):
+    """Raised for unknown, expired or foreign upload sessions."""
+    pass
+
+
+class InvalidUploadError(UploadSessionError):
+    """Raised when a completed upload fails validation; the session is discarded."""
+    pass
+
+
+class UploadSessionStore:
+    """
+    Resumable upload sessions staged in ``directory``.
+
+    Args:
+        directory: Staging directory, shared by the workers on this host
+        chunk_size: Bytes per chunk (the last chunk may be shorter)
+        part_size: Bytes per R2 multipart part; a multiple of ``chunk_size``
+        ttl: Seconds a session may stay open
+    """
+
+    def __init__(self, directory: str, chunk_size: int, part_size: int, ttl: int):
+        if part_size < MIN_PART_SIZE or part_size % chunk_size:
+            raise ValueError(
+                f"UPLOAD_PART_SIZE must be at least {MIN_PART_SIZE} and a multiple of UPLOAD_CHUNK_SIZE"
+            )
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.part_size = part_size
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, upload_id: str, suffix: str) -> str:
+        return os.path.join(self.directory, upload_id + suffix)
+
+    @contextmanager
+    def _locked(self, upload_id: str, clerk_user_id: str) -> Iterator[Dict[str, Any]]:
+        """
+        Yield the session state under an exclusive lock. Changes made to
+        it are saved on exit, also when an error is raised, so R2 parts
+        uploaded before a failure are not uploaded again.
+        """
+        try:
+            # Ids are hex UUIDs; anything else cannot name a session file
+            upload_id = uuid.UUID(hex=upload_id).hex
+        except ValueError:
+            raise UploadSessionNotFound("Upload not found")
+        try:
+            fd = os.open(self._path(upload_id, STATE_SUFFIX), os.O_RDWR)
+        except FileNotFoundError:
+            raise UploadSessionNotFound("Upload not found")
+        with os.fdopen(fd, 'r+b') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            state = loads(f.read())
+            if state["clerk_user_id"] != clerk_user_id:
+                raise UploadSessionNotFound("Upload not found")
+            if state["status"] == "open" and state["created_at"] + self.ttl < time.time():
+                raise UploadSessionNotFound("Upload expired")
+            before = dict(state)
+            try:
+                yield state
+            finally:
+                if state != before:
+                    f.seek(0)
+                    f.truncate()
+                    f.write(dumps(state))
+
+    def describe(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Public view of a session."""
+        received = set(state["received"])
+        return {
+            "upload_id": state["id"],
+            "status": state["status"],
+            "size": state["size"],
+            "chunk_size": state["chunk_size"],
+            "chunk_count": state["chunk_count"],
+            "received": len(received),
+            "missing": [i for i in range(state["chunk_count"]) if i not in received],
+            "expires_at": state["created_at"] + self.ttl,
+        }
+
+    def create(self, clerk_user_id: str, filename: str, size: int) -> Dict[str, Any]:
+        """Start a session; returns its public view."""
+        upload_id = uuid.uuid4().hex
+        state = {
+            "id": upload_id,
+            "clerk_user_id": clerk_user_id,
+            "filename": filename,
+            "size": size,
+            "chunk_size": self.chunk_size,
+            "chunk_count": -(-size // self.chunk_size),
+            "part_size": self.part_size,
+            "object_key": r2_upload.build_object_key(filename, clerk_user_id),
+            "r2_upload_id": None,
+            "parts": [],
+            "received": [],
+            "status": "open",
+            "created_at": time.time(),
+            "transaction_id": None,
+            "attempts": 0,
+            "finalizing_at": None,
+            "result": None,
+        }
+        with open(self._path(upload_id, DATA_SUFFIX), 'wb') as f:
+            f.truncate(size)
+        with open(self._path(upload_id, STATE_SUFFIX), 'xb') as f:
+            f.write(dumps(state))
+        logger.info("Started resumable upload %s (%d bytes)", upload_id, size,
+                    extra={"clerk_user_id": clerk_user_id})
+        return self.describe(state)
+
+    def get(self, upload_id: str, clerk_user_id: str) -> Dict[str, Any]:
+        with self._locked(upload_id, clerk_user_id) as state:
+            return self.describe(state)
+
+    @traced("uploads.write_chunk")
+    def write_chunk(self, upload_id: str, clerk_user_id: str, index: int, data: bytes) -> Dict[str, Any]:
+        """
+        Store one chunk and upload any R2 part it completes.
+
+        A failed part upload does not fail the chunk; the part is retried
+        with the next chunk or on finish.
+
+        Raises:
+            UploadSessionError: If the index or chunk length is wrong
+            UploadSessionNotFound: If the session does not exist
+        """
+        with self._locked(upload_id, clerk_user_id) as state:
+            if state["status"] != "open":
+                raise UploadSessionError("Upload already completed")
+            if not 0 <= index < state["chunk_count"]:
+                raise UploadSessionError(f"Chunk index must be between 0 and {state['chunk_count'] - 1}")
+            offset = index * state["chunk_size"]
+            expected = min(state["chunk_size"], state["size"] - offset)
+            if len(data) != expected:
+                raise UploadSessionError(f"Chunk {index} must be {expected} bytes, got {len(data)}")
+
+            fd = os.open(self._path(state["id"], DATA_SUFFIX), os.O_WRONLY)
+            try:
+                os.pwrite(fd, data, offset)
+            finally:
+                os.close(fd)
+            if index not in state["received"]:
+                state["received"] = sorted([*state["received"], index])
+                try:
+                    self._upload_ready_parts(state)
+                except r2_upload.R2UploadError as e:
+                    logger.warning("Deferring part upload of %s: %s", state["id"], e)
+            return self.describe(state)
+
+    def _upload_ready_parts(self, state: Dict[str, Any]) -> None:
+        """Upload every full part whose chunks have all arrived, in order."""
+        if state["size"] <= self.part_size:
+            return
+        received = set(state["received"])
+        per_part = state["part_size"] // state["chunk_size"]
+        full_parts = state["size"] // state["part_size"]
+        # The final full part is held back when it is also the last part,
+        # so there is always a tail for finish() to complete with
+        if state["size"] % state["part_size"] == 0:
+            full_parts -= 1
+        while len(state["parts"]) < full_parts:
+            number = len(state["parts"]) + 1
+            first = (number - 1) * per_part
+            if any(i not in received for i in range(first, first + per_part)):
+                return
+            if state["r2_upload_id"] is None:
+                state["r2_upload_id"] = r2_upload.create_multipart_upload(
+                    state["object_key"], r2_upload.get_content_type(state["filename"])
+                )
+            data = self._read(state, (number - 1) * state["part_size"], state["part_size"])
+            etag = r2_upload.upload_part(state["object_key"], state["r2_upload_id"], number, data)
+            state["parts"] = [*state["parts"], {"PartNumber": number, "ETag": etag}]
+
+    def _read(self, state: Dict[str, Any], offset: int, length: int) -> bytes:
+        with open(self._path(state["id"], DATA_SUFFIX), 'rb') as f:
+            f.seek(offset)
+            return f.read(length)
+
+    @traced("uploads.finish")
+    def finish(self, upload_id: str, clerk_user_id: str,
+               validate: Optional[Callable[[bytes], bool]] = None) -> Tuple[Dict[str, Any], Optional[bytes]]:
+        """
+        Validate the complete image, write it to R2 and mark the session
+        ``finalizing``.
+
+        The caller must then create the transaction with the session's
+        ``transaction_id`` and call ``mark_complete``, or ``release`` if
+        that fails. If ``attempts`` is above 1 an earlier call may already
+        have written the transaction.
+
+        Returns:
+            Tuple of (state, image bytes). The bytes are None if the
+            session was already completed by an earlier call; its
+            ``result`` then holds the response of that call.
+
+        Raises:
+            InvalidUploadError: If ``validate`` rejects the image
+            UploadSessionError: If chunks are missing or another call is
+                finalizing the session
+            UploadSessionNotFound: If the session does not exist
+            R2UploadError: If the R2 upload fails; the call can be retried
+        """
+        with self._locked(upload_id, clerk_user_id) as state:
+            if state["status"] == "complete":
+                return state, None
+            if state["status"] == "open":
+                data = self._store(state, validate)
+            elif (state["status"] == "finalizing"
+                  and state["finalizing_at"] + FINALIZE_TIMEOUT > time.time()):
+                raise UploadSessionError("Upload is being completed")
+            else:
+                # Stored by an earlier call that failed or died
+                data = self._read(state, 0, state["size"])
+            state["status"] = "finalizing"
+            state["finalizing_at"] = time.time()
+            state["attempts"] = state.get("attempts", 0) + 1
+            if state.get("transaction_id") is None:
+                state["transaction_id"] = str(uuid.uuid4())
+            return state, data
+
+    def _store(self, state: Dict[str, Any], validate: Optional[Callable[[bytes], bool]]) -> bytes:
+        """Validate the staged image and write it to R2; returns its bytes."""
+        missing = state["chunk_count"] - len(state["received"])
+        if missing:
+            raise UploadSessionError(f"{missing} chunks are missing")
+
+        data = self._read(state, 0, state["size"])
+        if validate is not None and not validate(data):
+            self._discard(state)
+            raise InvalidUploadError("Upload a valid image.")
+        if state["size"] <= self.part_size:
+            r2_upload.put_object(
+                state["object_key"], data, r2_upload.get_content_type(state["filename"])
+            )
+        else:
+            self._upload_ready_parts(state)
+            number = len(state["parts"]) + 1
+            tail = data[(number - 1) * state["part_size"]:]
+            etag = r2_upload.upload_part(state["object_key"], state["r2_upload_id"], number, tail)
+            parts = [*state["parts"], {"PartNumber": number, "ETag": etag}]
+            r2_upload.complete_multipart_upload(state["object_key"], state["r2_upload_id"], parts)
+            state["parts"] = parts
+        return data
+
+    def mark_complete(self, upload_id: str, clerk_user_id: str, result: Dict[str, Any]) -> None:
+        """
+        Record the finished upload's response for retried ``finish`` calls
+        and drop the staged data.
+        """
+        with self._locked(upload_id, clerk_user_id) as state:
+            state["status"] = "complete"
+            state["result"] = result
+        self._remove(upload_id, DATA_SUFFIX)
+
+    def release(self, upload_id: str, clerk_user_id: str) -> None:
+        """
+        Return a finalizing session to ``uploaded`` after the transaction
+        could not be created, so ``finish`` can be retried at once. The R2
+        object and transaction id are kept: the failed insert may still
+        have been written.
+        """
+        with self._locked(upload_id, clerk_user_id) as state:
+            if state["status"] == "finalizing":
+                state["status"] = "uploaded"
+
+    def abort(self, upload_id: str, clerk_user_id: str) -> None:
+        """Cancel a session and discard its parts."""
+        with self._locked(upload_id, clerk_user_id) as state:
+            if state["status"] != "open":
+                raise UploadSessionError("Upload already completed")
+            self._discard(state)
+
+    def _discard(self, state: Dict[str, Any]) -> None:
+        if state["r2_upload_id"] is not None and state["status"] == "open":
+            r2_upload.abort_multipart_upload(state["object_key"], state["r2_upload_id"])
+        self._remove(state["id"], DATA_SUFFIX)
+        self._remove(state["id"], STATE_SUFFIX)
+
+    def _delete_orphaned_object(self, state: Dict[str, Any]) -> None:
+        if state.get("transaction_id") is None:
+            return
+        from .data_backend import get_data_backend
+
+        if not get_data_backend().get_transactions([state["transaction_id"]]):
+            logger.info("Deleting object of abandoned upload %s: %s", state["id"], state["object_key"])
+            r2_upload.delete_image_from_r2(state["object_key"])
+
+    def _remove(self, upload_id: str, suffix: str) -> None:
+        try:
+            os.unlink(self._path(upload_id, suffix))
+        except FileNotFoundError:
+            pass
+
+    def purge(self, now: Optional[float] = None) -> int:
+        """
+        Remove sessions older than the TTL, aborting their R2 multipart
+        uploads. Stored objects of sessions that were never completed are
+        deleted unless their transaction was written. Returns the number
+        removed.
+        """
+        now = time.time() if now is None else now
+        removed = 0
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(STATE_SUFFIX):
+                continue
+            with open(entry.path, 'rb') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    state = loads(f.read())
+                except ValueError:
+                    logger.warning("Removing unreadable upload session %s", entry.name)
+                    state = {"id": entry.name[:-len(STATE_SUFFIX)], "r2_upload_id": None,
+                             "status": "open", "created_at": 0}
+                if state["created_at"] + self.ttl >= now:
+                    continue
+                if state["status"] == "finalizing" and state["finalizing_at"] + FINALIZE_TIMEOUT >= now:
+                    continue
+                if state["status"] in ("uploaded", "finalizing"):
+                    try:
+                        self._delete_orphaned_object(state)
+                    except SupabaseError as e:
+                        logger.warning("Keeping upload session %s: %s", state["id"], e)
+                        continue
+                self._discard(state)
+                removed += 1
+        return removed
+
+
+@lru_cache(maxsize=1)
+def get_upload_sessions() -> UploadSessionStore:
+    """Get the upload session store configured in settings."""
+    return UploadSessionStore(
+        settings.UPLOAD_SESSION_DIR,
+        settings.UPLOAD_CHUNK_SIZE,
+        settings.UPLOAD_PART_SIZE,
+        settings.UPLOAD_SESSION_TTL,
+    )
+
@@ -0,0 +1,296 @@
+"""
+Rewards Engine.
+
+Maps a classified deposit (classifier label, weight, confidence) to the
+points earned and the CO2 saved.
+
+Rules live in the ``system_settings`` row ``reward_rules``, which admins
+edit through the Next.js ``/api/admin/settings`` route. Its value is a
+JSON object::
+
+    {
+        "default": {"base_points": 10, "points_per_kg": 40, "co2_per_kg": 1000,
+                    "min_points": 10, "max_points": 500},
+        "min_confidence": 0.5,
+        "categories": {
+            "mobile": {"points_per_kg": 150, "co2_per_kg": 6000,
+                       "labels": ["phone", "smartphone"]},
+            ...
+        }
+    }
+
+Category fields not given fall back to ``default``. Weights are in grams,
+CO2 is reported in grams. Predictions below ``min_confidence`` score as
+the default category. Without a ``reward_rules`` row the built-in
+``DEFAULT_REWARD_RULES`` apply.
+
+The JSON is compiled once into a dict from normalised label to a
+``Rule`` tuple, so scoring a deposit is one dict lookup and a few
+multiplications. The compiled table is cached per process; every
+``REWARD_RULES_CHECK_INTERVAL`` seconds the next caller re-reads the row
+and recompiles only if ``updated_at`` changed. ``invalidate_reward_rules``
+(or POST /api/deposits/admin/rewards/) forces a reload.
+
+``score_batch`` re-scores many transactions at once, vectorised with
+NumPy when it is installed.
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+from django.conf import settings
+
+from .repositories import SettingsRepository, get_repository
+from .supabase_client import SupabaseError
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised only without numpy
+    np = None
+
+
+logger = logging.getLogger(__name__)
+
+
+REWARD_RULES_KEY = "reward_rules"
+
+DEFAULT_CATEGORY = "other"
+
+# Placeholder factors until admins set real ones in system_settings
+DEFAULT_REWARD_RULES: Dict[str, Any] = {
+    "default": {
+        "base_points": 10,
+        "points_per_kg": 40,
+        "co2_per_kg": 1000,
+        "min_points": 10,
+        "max_points": 500,
+    },
+    "min_confidence": 0.5,
+    "categories": {
+        "battery": {"points_per_kg": 120, "co2_per_kg": 4000, "labels": ["batteries"]},
+        "keyboard": {"points_per_kg": 50, "co2_per_kg": 1500},
+        "microwave": {"points_per_kg": 30, "co2_per_kg": 1200},
+        "mobile": {"points_per_kg": 150, "co2_per_kg": 6000,
+                   "labels": ["phone", "smartphone", "mobile phone", "cell phone"]},
+        "mouse": {"points_per_kg": 50, "co2_per_kg": 1500},
+        "pcb": {"points_per_kg": 200, "co2_per_kg": 8000,
+                "labels": ["circuit board", "printed circuit board"]},
+        "player": {"points_per_kg": 60, "co2_per_kg": 2000, "labels": ["media player"]},
+        "printer": {"points_per_kg": 30, "co2_per_kg": 1200},
+        "television": {"points_per_kg": 35, "co2_per_kg": 1400, "labels": ["tv", "monitor"]},
+        "washing machine": {"points_per_kg": 15, "co2_per_kg": 600},
+        "laptop": {"points_per_kg": 120, "co2_per_kg": 5000, "labels": ["notebook"]},
+    },
+}
+
+
+class Rule(NamedTuple):
+    category: str
+    base_points: float
+    points_per_kg: float
+    co2_per_kg: float
+    min_points: float
+    max_points: float
+
+
+class Score(NamedTuple):
+    category: str
+    points: int
+    co2_saved: float
+
+
+def normalize_label(label: Optional[str]) -> str:
+    """Lower-case a classifier label and collapse ``_``/``-``/spaces."""
+    if not label:
+        return ""
+    return " ".join(label.replace("_", " ").replace("-", " ").lower().split())
+
+
+class CompiledRules:
+    """
+    A reward rule table compiled for dict lookups.
+    """
+
+    def __init__(self, rules: Dict[str, Any], version: Optional[str] = None):
+        defaults = {**DEFAULT_REWARD_RULES["default"], **(rules.get("default") or {})}
+        self.version = version
+        self.min_confidence = float(
+            rules.get("min_confidence", DEFAULT_REWARD_RULES["min_confidence"])
+        )
+        self.default = self._rule(DEFAULT_CATEGORY, defaults)
+        self.by_label: Dict[str, Rule] = {}
+        self.categories: List[Rule] = [self.default]
+        for name, fields in (rules.get("categories") or {}).items():
+            category = normalize_label(name)
+            rule = self._rule(category, {**defaults, **fields})
+            self.categories.append(rule)
+            for label in [name, *fields.get("labels", [])]:
+                self.by_label[normalize_label(label)] = rule
+
+    @staticmethod
+    def _rule(category: str, fields: Dict[str, Any]) -> Rule:
+        return Rule(
+            category=category,
+            base_points=float(fields["base_points"]),
+            points_per_kg=float(fields["points_per_kg"]),
+            co2_per_kg=float(fields["co2_per_kg"]),
+            min_points=float(fields["min_points"]),
+            max_points=float(fields["max_points"]),
+        )
+
+    def rule_for(self, label: Optional[str], confidence: Optional[float] = None) -> Rule:
+        if confidence is not None and confidence < self.min_confidence:
+            return self.default
+        return self.by_label.get(normalize_label(label), self.default)
+
+    def score(self, label: Optional[str], weight_grams: float,
+              confidence: Optional[float] = None) -> Score:
+        """Score one deposit."""
+        rule = self.rule_for(label, confidence)
+        weight_kg = max(weight_grams, 0) / 1000
+        points = rule.base_points + rule.points_per_kg * weight_kg
+        points = min(max(points, rule.min_points), rule.max_points)
+        return Score(rule.category, int(round(points)), round(rule.co2_per_kg * weight_kg, 2))
+
+    def score_batch(
+        self,
+        labels: Sequence[Optional[str]],
+        weights_grams: Sequence[float],
+        confidences: Optional[Sequence[Optional[float]]] = None,
+    ) -> Dict[str, List[Any]]:
+        """
+        Score many deposits at once.
+
+        Each distinct label is resolved to a rule once; the arithmetic
+        runs over whole columns (NumPy arrays when available).
+
+        Returns:
+            Columns ``category``, ``points`` and ``co2_saved``, aligned
+            with the inputs
+        """
+        count = len(labels)
+        if confidences is None:
+            confidences = [None] * count
+
+        # Resolve each distinct (label, below threshold) pair once
+        rule_ids: Dict[Any, int] = {}
+        rules: List[Rule] = []
+        index = []
+        for label, confidence in zip(labels, confidences):
+            low = confidence is not None and confidence < self.min_confidence
+            key = (label, low)
+            rule_id = rule_ids.get(key)
+            if rule_id is None:
+                rule_id = rule_ids[key] = len(rules)
+                rules.append(self.default if low else self.rule_for(label))
+            index.append(rule_id)
+
+        categories = [rules[rule_id].category for rule_id in index]
+        if np is not None:
+            table = np.array([rule[1:] for rule in rules], dtype=np.float64).reshape(-1, 5)
+            params = table[np.asarray(index, dtype=np.intp)]
+            weight_kg = np.maximum(np.asarray(weights_grams, dtype=np.float64), 0) / 1000
+            points = np.clip(params[:, 0] + params[:, 1] * weight_kg, params[:, 3], params[:, 4])
+            return {
+                "category": categories,
+                "points": np.rint(points).astype(np.int64).tolist(),
+                "co2_saved": np.round(params[:, 2] * weight_kg, 2).tolist(),
+            }
+
+        points_column = []
+        co2_column = []
+        for rule_id, weight in zip(index, weights_grams):
+            rule = rules[rule_id]
+            weight_kg = max(weight, 0) / 1000
+            points = min(max(rule.base_points + rule.points_per_kg * weight_kg,
+                             rule.min_points), rule.max_points)
+            points_column.append(int(round(points)))
+            co2_column.append(round(rule.co2_per_kg * weight_kg, 2))
+        return {"category": categories, "points": points_column, "co2_saved": co2_column}
+
+    def describe(self) -> Dict[str, Any]:
+        """Return the compiled table for display."""
+        return {
+            "version": self.version,
+            "min_confidence": self.min_confidence,
+            "categories": [rule._asdict() for rule in self.categories],
+            "labels": {label: rule.category for label, rule in self.by_label.items()},
+        }
+
+
+class RewardRulesCache:
+    """
+    Process-wide compiled rules, re-validated against ``updated_at``.
+    """
+
+    def __init__(self, check_interval: float):
+        self.check_interval = check_interval
+        self._rules: Optional[CompiledRules] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> CompiledRules:
+        if self._rules is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return self._rules
+        with self._lock:
+            if self._rules is None or time.monotonic() - self._checked_at >= self.check_interval:
+                self._refresh()
+            return self._rules
+
+    def _refresh(self) -> None:
+        try:
+            row = get_repository(SettingsRepository).get_setting(REWARD_RULES_KEY)
+        except SupabaseError as e:
+            if self._rules is None:
+                raise
+            # Keep serving the last good table; retry at the next interval
+            logger.warning("Could not re-check reward rules: %s", e)
+            self._checked_at = time.monotonic()
+            return
+
+        version = str(row["updated_at"]) if row else None
+        if self._rules is None or version != self._rules.version:
+            value = row["value"] if row and isinstance(row["value"], dict) else DEFAULT_REWARD_RULES
+            try:
+                self._rules = CompiledRules(value, version)
+            except (KeyError, TypeError, ValueError) as e:
+                if self._rules is None:
+                    raise SupabaseError(f"Invalid reward rules: {e}")
+                logger.error("Ignoring invalid reward rules (version %s): %s", version, e)
+            else:
+                logger.info("Compiled reward rules version %s", version)
+        self._checked_at = time.monotonic()
+
+    def invalidate(self) -> None:
+        """Force a re-check on the next ``get``."""
+        self._checked_at = 0.0
+
+
+_cache: Optional[RewardRulesCache] = None
+_cache_lock = threading.Lock()
+
+
+def _get_cache() -> RewardRulesCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = RewardRulesCache(settings.REWARD_RULES_CHECK_INTERVAL)
+    return _cache
+
+
+def get_reward_rules() -> CompiledRules:
+    """
+    Get the compiled reward rules.
+
+    Raises:
+        SupabaseError: If the rules have never been loaded and cannot be read
+    """
+    return _get_cache().get()
+
+
+def invalidate_reward_rules() -> None:
+    """Reload the rules from ``system_settings`` on next use."""
+    _get_cache().invalidate()
@@ -0,0 +1,324 @@
+"""
+Collection Route Planner.
+
+Plans pickup routes from a depot to the bins predicted to be full within
+a horizon, for vehicles with a fixed capacity.
+
+Prediction: a bin's fill rate comes from its fill history (slope since
+it was last emptied, see ``fill_history``); bins without history fall
+back to the admin stats heuristic, ``fill_level`` spread over the time
+since ``last_emptied_at``. A bin is collected if its predicted level at
+the end of the horizon reaches ``threshold``; its load is that predicted
+level, in percent of one bin, and vehicle capacity is given in full-bin
+equivalents.
+
+Routing (a capacitated vehicle routing heuristic):
+
+1. great-circle (haversine) distances between all stops, computed as
+   one vectorised NumPy matrix
+2. capacitated nearest-neighbour construction: each vehicle drives to
+   the nearest unvisited bin that still fits and returns to the depot
+   when none does
+3. local search per route until no move improves it: 2-opt (best
+   segment reversal, evaluated for all edge pairs at once) and Or-opt
+   (relocating runs of 1-3 stops, evaluated against all edges at once)
+
+Routes are near-optimal rather than optimal; a few hundred bins plan in
+well under a second, fast enough to re-plan interactively. Requires
+NumPy.
+"""
+
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from ..tracing import traced
+from .repositories import BinRepository, get_repository
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised only without numpy
+    np = None
+
+
+logger = logging.getLogger(__name__)
+
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Longest run of consecutive stops moved by Or-opt
+OR_OPT_MAX_SEGMENT = 3
+
+# Ignore improvements smaller than this (km) to avoid cycling on rounding
+_EPSILON = 1e-9
+
+
+class RoutingError(Exception):
+    """Custom exception for route planning failures."""
+    pass
+
+
+def haversine_matrix(latitudes: Sequence[float], longitudes: Sequence[float]):
+    """Pairwise great-circle distances in km."""
+    lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lon = np.radians(np.asarray(longitudes, dtype=np.float64))
+    dlat = lat[:, None] - lat[None, :]
+    dlon = lon[:, None] - lon[None, :]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def route_length(distances, tour: Sequence[int]) -> float:
+    tour = np.asarray(tour)
+    return float(distances[tour[:-1], tour[1:]].sum())
+
+
+def nearest_neighbor_routes(distances, demand, capacity: float) -> List[List[int]]:
+    """
+    Capacitated nearest-neighbour construction.
+
+    Node 0 is the depot; returns the bin nodes of each route in order.
+    """
+    count = len(demand)
+    unvisited = np.ones(count, dtype=bool)
+    unvisited[0] = False
+    routes = []
+    while unvisited.any():
+        route = []
+        load = 0.0
+        current = 0
+        while True:
+            candidates = unvisited & (demand <= capacity - load)
+            if not candidates.any():
+                break
+            nxt = int(np.argmin(np.where(candidates, distances[current], np.inf)))
+            route.append(nxt)
+            load += demand[nxt]
+            unvisited[nxt] = False
+            current = nxt
+        if not route:
+            raise RoutingError("A bin's load exceeds the vehicle capacity")
+        routes.append(route)
+    return routes
+
+
+def two_opt(distances, tour):
+    """
+    Apply the best improving 2-opt move until none is left.
+
+    ``tour`` is a closed node array starting and ending at the depot.
+    """
+    tour = np.array(tour)
+    improved = False
+    while len(tour) > 4:
+        a = tour[:-1]
+        b = tour[1:]
+        edge = distances[a, b]
+        # Reversing tour[i+1..j] replaces edges (a_i, b_i), (a_j, b_j)
+        # with (a_i, a_j), (b_i, b_j)
+        delta = distances[a[:, None], a[None, :]] + distances[b[:, None], b[None, :]]
+        delta -= edge[:, None] + edge[None, :]
+        delta = np.triu(delta, k=2)
+        i, j = np.unravel_index(np.argmin(delta), delta.shape)
+        if delta[i, j] >= -_EPSILON:
+            break
+        tour[i + 1:j + 1] = tour[i + 1:j + 1][::-1]
+        improved = True
+    return tour, improved
+
+
+def or_opt(distances, tour):
+    """
+    Relocate runs of 1-``OR_OPT_MAX_SEGMENT`` stops (optionally reversed)
+    to their best position while that shortens the tour.
+    """
+    tour = np.array(tour)
+    improved = False
+    moved = True
+    while moved:
+        moved = False
+        for length in range(1, OR_OPT_MAX_SEGMENT + 1):
+            start = 1
+            while start + length < len(tour):
+                end = start + length - 1
+                prev, first, last, nxt = tour[start - 1], tour[start], tour[end], tour[end + 1]
+                gain = distances[prev, first] + distances[last, nxt] - distances[prev, nxt]
+
+                rest = np.concatenate((tour[:start], tour[end + 1:]))
+                u = rest[:-1]
+                v = rest[1:]
+                base = distances[u, v]
+                forward = distances[u, first] + distances[last, v] - base
+                backward = distances[u, last] + distances[first, v] - base
+                # Re-inserting where it was removed is not a move
+                forward[start - 1] = backward[start - 1] = np.inf
+                best_f = int(np.argmin(forward))
+                best_b = int(np.argmin(backward))
+                if forward[best_f] <= backward[best_b]:
+                    position, cost, segment = best_f, forward[best_f], tour[start:end + 1]
+                else:
+                    position, cost, segment = best_b, backward[best_b], tour[start:end + 1][::-1]
+
+                if cost - gain < -_EPSILON:
+                    tour = np.concatenate((rest[:position + 1], segment, rest[position + 1:]))
+                    improved = moved = True
+                else:
+                    start += 1
+    return tour, improved
+
+
+def improve_route(distances, route: Sequence[int], max_rounds: int = 20) -> List[int]:
+    """Alternate 2-opt and Or-opt on one route; returns its bin nodes."""
+    tour = np.array([0, *route, 0])
+    for _ in range(max_rounds):
+        tour, reversed_ = two_opt(distances, tour)
+        tour, relocated = or_opt(distances, tour)
+        if not (reversed_ or relocated):
+            break
+    return tour[1:-1].tolist()
+
+
+@traced("routing.plan")
+def plan_routes(
+    depot: Tuple[float, float],
+    stops: List[Dict[str, Any]],
+    vehicle_capacity: float,
+    max_vehicles: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Plan capacitated pickup routes.
+
+    Args:
+        depot: ``(latitude, longitude)`` where every route starts and ends
+        stops: Dicts with ``latitude``, ``longitude`` and ``load``
+            (percent of one bin); other keys are passed through
+        vehicle_capacity: Capacity of one vehicle in full-bin equivalents
+        max_vehicles: Plan at most this many routes; the remaining stops
+            are returned in ``unserved``
+
+    Returns:
+        Dict with ``routes`` (stops in visiting order, load and distance
+        per route), ``unserved``, ``total_distance_km`` and ``planning_ms``
+
+    Raises:
+        RoutingError: If NumPy is missing or a stop cannot fit a vehicle
+    """
+    if np is None:
+        raise RoutingError("NumPy is required for route planning")
+    started = time.perf_counter()
+    capacity = vehicle_capacity * 100
+    if not stops:
+        return {"routes": [], "unserved": [], "total_distance_km": 0.0, "planning_ms": 0.0}
+
+    distances = haversine_matrix(
+        [depot[0], *(stop["latitude"] for stop in stops)],
+        [depot[1], *(stop["longitude"] for stop in stops)],
+    )
+    demand = np.array([0.0, *(stop["load"] for stop in stops)])
+    routes = nearest_neighbor_routes(distances, demand, capacity)
+
+    unserved: List[int] = []
+    if max_vehicles is not None and len(routes) > max_vehicles:
+        # Keep the fullest routes; the rest wait for the next run
+        routes.sort(key=lambda route: -demand[route].sum())
+        for route in routes[max_vehicles:]:
+            unserved.extend(route)
+        routes = routes[:max_vehicles]
+
+    planned = []
+    total = 0.0
+    for route in routes:
+        route = improve_route(distances, route)
+        length = route_length(distances, [0, *route, 0])
+        total += length
+        planned.append({
+            "stops": [stops[node - 1] for node in route],
+            "load": round(float(demand[route].sum()) / 100, 2),
+            "distance_km": round(length, 3),
+        })
+
+    return {
+        "routes": planned,
+        "unserved": [stops[node - 1] for node in unserved],
+        "total_distance_km": round(total, 3),
+        "planning_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+def predict_level(bin_row: Dict[str, Any], rate: Optional[float], now: datetime,
+                  horizon_hours: float) -> Tuple[float, float]:
+    """
+    Return ``(fill rate per hour, predicted level at the horizon)``.
+
+    Falls back to the admin stats heuristic when ``rate`` is None.
+    """
+    level = float(bin_row.get("fill_level") or 0)
+    if rate is None:
+        reset = bin_row.get("last_emptied_at") or bin_row.get("created_at")
+        reset_at = datetime.fromisoformat(reset) if isinstance(reset, str) else reset
+        hours = 1.0
+        if reset_at is not None:
+            if reset_at.tzinfo is None:
+                reset_at = reset_at.replace(tzinfo=timezone.utc)
+            hours = max(1.0, (now - reset_at).total_seconds() / 3600)
+        rate = max(level, 1.0) / hours
+    return rate, min(100.0, level + rate * horizon_hours)
+
+
+def plan_collection(
+    depot: Tuple[float, float],
+    horizon_hours: float,
+    threshold: float,
+    vehicle_capacity: float,
+    max_vehicles: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Plan routes to the active bins predicted to reach ``threshold``
+    percent within ``horizon_hours``.
+
+    Raises:
+        SupabaseError: If the bins cannot be read
+        RoutingError: If planning fails
+    """
+    from .fill_history import FillHistoryError, get_fill_history
+
+    if np is None:
+        raise RoutingError("NumPy is required for route planning")
+    bins = [
+        row for row in get_repository(BinRepository).iter_bins()
+        if row.get("status") == "active" and row.get("is_operational") is not False
+        and row.get("latitude") is not None and row.get("longitude") is not None
+    ]
+
+    now = datetime.now(timezone.utc)
+    try:
+        rates = get_fill_history().fill_rates([row["id"] for row in bins], now.timestamp())
+    except FillHistoryError as e:
+        logger.warning("Fill history unavailable, using fill levels only: %s", e)
+        rates = {}
+
+    stops = []
+    for row in bins:
+        rate, predicted = predict_level(row, rates.get(row["id"]), now, horizon_hours)
+        if predicted < threshold:
+            continue
+        stops.append({
+            "id": row["id"],
+            "bin_code": row.get("bin_code"),
+            "name": row.get("name"),
+            "latitude": float(row["latitude"]),
+            "longitude": float(row["longitude"]),
+            "fill_level": row.get("fill_level"),
+            "fill_rate_per_hour": round(rate, 3),
+            "predicted_level": round(predicted, 1),
+            "load": predicted,
+        })
+
+    plan = plan_routes(depot, stops, vehicle_capacity, max_vehicles)
+    plan["candidates"] = len(bins)
+    logger.info(
+        "Planned %d routes over %d bins (%.1f km) in %.1f ms",
+        len(plan["routes"]), len(stops), plan["total_distance_km"], plan["planning_ms"],
+    )
+    return plan
@@ -0,0 +1,256 @@
+"""
+Shared-Memory Cache.
+
+A small key/value cache in a memory-mapped file that every worker
+process on a host maps. A value one worker computed or fetched (a
+presigned URL, a user's ``users.id``, Clerk's JWKS) is then read by the
+other workers with a memory copy, instead of each worker signing,
+querying or fetching it again into its own per-process cache.
+
+Layout: a header followed by ``SHARED_CACHE_SLOTS`` fixed-size slots,
+grouped into buckets of ``_WAYS`` slots. A key lives in the bucket
+chosen by a stable hash of the key (``hash()`` is salted per process).
+Each slot holds a sequence number, a CRC, the key hash, the expiry time
+(wall clock, comparable across processes), and the key and value bytes.
+
+- Reads take no lock: the slot's sequence number is read before and
+  after copying it out, and the copy is used only if the number is the
+  same, even (no write in progress) and the CRC matches.
+- Writes lock the bucket's byte range with ``fcntl.lockf`` (plus a
+  thread lock, as POSIX record locks are per process), bump the sequence
+  to odd, write, and bump it to even. The victim is the key's own slot,
+  else an empty or expired slot, else the slot closest to expiry.
+
+Keys are only unique within one deployment (``user:<clerk id>`` means
+a different ``users.id`` against another database), so the default file
+name carries a hash of ``SUPABASE_URL`` and ``R2_BUCKET_NAME``: staging
+and production workers on one host map different files. An explicit
+``SHARED_CACHE_PATH`` must likewise differ per deployment.
+
+Entries larger than a slot are not cached. The cache is an optimization
+only: a miss, an eviction or a disabled cache just falls back to the
+source.
+"""
+
+import fcntl
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from typing import Optional, Tuple
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+_MAGIC = b"EWSHMC01"
+_HEADER = struct.Struct("<8sIII")  # magic, slots, slot size, ways
+_HEADER_SIZE = 64
+# seq, crc, key hash, expires at, key length, value length
+_SLOT = struct.Struct("<IIQdII")
+_SEQ = struct.Struct("<I")
+_WAYS = 4
+
+
+def _key_hash(key: bytes) -> int:
+    # Never 0, which marks an empty slot
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little") or 1
+
+
+def default_path() -> str:
+    """
+    A file in ``/dev/shm`` (RAM-backed) when available, else the temp
+    directory, named after the deployment's database and bucket.
+    """
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    deployment = f"{settings.SUPABASE_URL or ''}\0{settings.R2_BUCKET_NAME or ''}".encode()
+    namespace = hashlib.blake2b(deployment, digest_size=6).hexdigest()
+    return os.path.join(directory, f"ewaste-shared-cache-{namespace}")
+
+
+class SharedCache:
+    """
+    Fixed-size cache shared by the processes that open the same file.
+
+    Args:
+        path: Backing file; created (or replaced if its layout differs)
+        slots: Number of slots, rounded up to a multiple of ``_WAYS``
+        slot_size: Bytes per slot, including the slot header
+    """
+
+    def __init__(self, path: str, slots: int, slot_size: int):
+        self.path = path
+        self.slots = -(-slots // _WAYS) * _WAYS
+        self.slot_size = slot_size
+        self.buckets = self.slots // _WAYS
+        self.max_item = slot_size - _SLOT.size
+        self._size = _HEADER_SIZE + self.slots * slot_size
+        self._lock = threading.Lock()
+        self._fd = self._open()
+        self._map = mmap.mmap(self._fd, self._size, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+
+    def _header(self) -> bytes:
+        return _HEADER.pack(_MAGIC, self.slots, self.slot_size, _WAYS)
+
+    def _open(self) -> int:
+        while True:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                if os.fstat(fd).st_ino != os.stat(self.path).st_ino:
+                    # Replaced while we waited for the lock
+                    os.close(fd)
+                    continue
+                if os.fstat(fd).st_size == self._size and os.pread(fd, _HEADER.size, 0) == self._header():
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+                    return fd
+                # Another layout (or a new file): build a fresh file and
+                # swap it in, so processes still mapping the old one are
+                # unaffected
+                tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                new_fd = os.open(tmp_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+                os.ftruncate(new_fd, self._size)
+                os.pwrite(new_fd, self._header(), 0)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                os.close(fd)
+                raise
+            # Closing releases the lock on the old file
+            os.close(fd)
+            logger.info("Created shared cache %s (%d slots of %d bytes)",
+                        self.path, self.slots, self.slot_size)
+            return new_fd
+
+    def _offset(self, bucket: int, way: int) -> int:
+        return _HEADER_SIZE + (bucket * _WAYS + way) * self.slot_size
+
+    def _read(self, offset: int, key_hash: int, key: bytes) -> Optional[Tuple[bytes, float]]:
+        m = self._map
+        seq, crc, slot_hash, expires_at, key_len, value_len = _SLOT.unpack_from(m, offset)
+        if slot_hash != key_hash or seq & 1 or key_len + value_len > self.max_item:
+            return None
+        start = offset + _SLOT.size
+        data = m[start:start + key_len + value_len]
+        if _SEQ.unpack_from(m, offset)[0] != seq:
+            return None
+        if zlib.crc32(data, zlib.crc32(struct.pack("<Qd", slot_hash, expires_at))) != crc:
+            return None
+        if data[:key_len] != key or expires_at <= time.time():
+            return None
+        return data[key_len:], expires_at
+
+    def lookup(self, key: str) -> Optional[Tuple[bytes, float]]:
+        """Return ``(value, expires_at)`` for a live entry, or None."""
+        encoded = key.encode()
+        key_hash = _key_hash(encoded)
+        bucket = key_hash % self.buckets
+        for way in range(_WAYS):
+            entry = self._read(self._offset(bucket, way), key_hash, encoded)
+            if entry is not None:
+                return entry
+        return None
+
+    def get(self, key: str) -> Optional[bytes]:
+        entry = self.lookup(key)
+        return entry[0] if entry is not None else None
+
+    def set(self, key: str, value: bytes, ttl: float) -> bool:
+        """Store a value for ``ttl`` seconds; False if it does not fit a slot."""
+        return self._write(key, value, time.time() + ttl)
+
+    def delete(self, key: str) -> None:
+        self._write(key, None, 0.0)
+
+    def _write(self, key: str, value: Optional[bytes], expires_at: float) -> bool:
+        encoded = key.encode()
+        if value is not None and len(encoded) + len(value) > self.max_item:
+            return False
+        key_hash = _key_hash(encoded)
+        bucket = key_hash % self.buckets
+        start = self._offset(bucket, 0)
+        m = self._map
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, _WAYS * self.slot_size, start)
+            try:
+                now = time.time()
+                victim = None
+                victim_expiry = None
+                for way in range(_WAYS):
+                    offset = self._offset(bucket, way)
+                    _, _, slot_hash, slot_expiry, key_len, _ = _SLOT.unpack_from(m, offset)
+                    if slot_hash == key_hash and m[offset + _SLOT.size:offset + _SLOT.size + key_len] == encoded:
+                        victim = offset
+                        break
+                    if value is None:
+                        continue
+                    expiry = slot_expiry if slot_hash and slot_expiry > now else 0.0
+                    if victim_expiry is None or expiry < victim_expiry:
+                        victim, victim_expiry = offset, expiry
+                if victim is None:
+                    return True
+
+                seq = _SEQ.unpack_from(m, victim)[0]
+                _SEQ.pack_into(m, victim, (seq + 1) & 0xFFFFFFFF)
+                if value is None:
+                    _SLOT.pack_into(m, victim, (seq + 1) & 0xFFFFFFFF, 0, 0, 0.0, 0, 0)
+                else:
+                    data = encoded + value
+                    crc = zlib.crc32(data, zlib.crc32(struct.pack("<Qd", key_hash, expires_at)))
+                    m[victim + _SLOT.size:victim + _SLOT.size + len(data)] = data
+                    _SLOT.pack_into(m, victim, (seq + 1) & 0xFFFFFFFF, crc, key_hash, expires_at,
+                                    len(encoded), len(value))
+                _SEQ.pack_into(m, victim, (seq + 2) & 0xFFFFFFFF)
+                return True
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, _WAYS * self.slot_size, start)
+
+    def close(self) -> None:
+        self._map.close()
+        os.close(self._fd)
+
+
+_cache: Optional[SharedCache] = None
+_cache_lock = threading.Lock()
+_unavailable = False
+
+
+def get_shared_cache() -> Optional[SharedCache]:
+    """
+    Get this process's mapping of the host's shared cache, or None if it
+    is disabled or cannot be opened.
+    """
+    global _cache, _unavailable
+    if _cache is None and not _unavailable:
+        with _cache_lock:
+            if _cache is None and not _unavailable:
+                if not settings.SHARED_CACHE_ENABLED:
+                    _unavailable = True
+                    return None
+                try:
+                    _cache = SharedCache(
+                        settings.SHARED_CACHE_PATH or default_path(),
+                        settings.SHARED_CACHE_SLOTS,
+                        settings.SHARED_CACHE_SLOT_SIZE,
+                    )
+                except OSError as e:
+                    logger.warning("Shared cache unavailable: %s", e)
+                    _unavailable = True
+    return _cache
+
+
+def reset_after_fork() -> None:
+    """
+    Forget the parent's handle. The mapping itself is shared and would
+    work in the child, but the thread lock may be held by a dead thread.
+    """
+    global _cache, _cache_lock, _unavailable
+    _cache = None
+    _cache_lock = threading.Lock()
+    _unavailable = False
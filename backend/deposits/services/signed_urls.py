@@ -0,0 +1,238 @@
+"""
+Signed URL Service.
+
+Pre-signed URLs expire, so transactions are read with URLs generated at
+read time from their R2 object key (the URL stored at upload time is
+only kept for clients that read the table directly). Presigning is a
+local HMAC computation (no network call), so the main costs are client
+construction and repeated signing of the same key. This module reuses
+the cached R2 client and memoizes each URL until shortly before it
+expires.
+
+Behind the per-process cache, URLs are also shared between the workers
+on a host through the shared-memory cache, so every worker hands out
+the same URL for an image while it is fresh (and browsers can cache
+the image) instead of each signing its own.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple, Any
+
+from django.conf import settings
+
+from .r2_upload import get_r2_client, R2UploadError
+from .shared_cache import get_shared_cache
+from ..tracing import traced, get_current_span
+
+
+logger = logging.getLogger(__name__)
+
+
+class SignedURLCache:
+    """
+    Thread-safe LRU cache of pre-signed URLs keyed by object key.
+
+    Each entry is stored with the monotonic time after which it must no
+    longer be handed out. That deadline is the URL's real expiry minus a
+    safety margin, so clients always receive a URL with at least
+    ``margin`` seconds of validity left.
+    """
+
+    def __init__(self, max_entries: int, margin: int):
+        self.max_entries = max_entries
+        self.margin = margin
+        self._entries: "OrderedDict[Tuple[str, int], Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, object_key: str, expiration: int) -> Optional[str]:
+        now = time.monotonic()
+        cache_key = (object_key, expiration)
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is None:
+                return None
+            url, refresh_at = entry
+            if now >= refresh_at:
+                del self._entries[cache_key]
+                return None
+            self._entries.move_to_end(cache_key)
+            return url
+
+    def set(self, object_key: str, expiration: int, url: str, signed_at: float) -> None:
+        # Never cache a URL whose usable lifetime is shorter than the margin
+        lifetime = expiration - self.margin
+        if lifetime <= 0:
+            return
+        with self._lock:
+            self._entries[(object_key, expiration)] = (url, signed_at + lifetime)
+            self._entries.move_to_end((object_key, expiration))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_cache: Optional[SignedURLCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_url_cache() -> SignedURLCache:
+    """
+    Get the process-wide signed URL cache, creating it on first use.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SignedURLCache(
+                    max_entries=settings.R2_SIGNED_URL_CACHE_SIZE,
+                    margin=settings.R2_SIGNED_URL_REFRESH_MARGIN,
+                )
+    return _cache
+
+
+def _presign(client, bucket_name: str, object_key: str, expiration: int) -> str:
+    return client.generate_presigned_url(
+        'get_object',
+        Params={
+            'Bucket': bucket_name,
+            'Key': object_key,
+        },
+        ExpiresIn=expiration,
+    )
+
+
+def get_signed_url(object_key: str, expiration: Optional[int] = None) -> str:
+    """
+    Get a pre-signed URL for an object, reusing a cached one if still fresh.
+
+    Args:
+        object_key: The S3/R2 object key
+        expiration: URL expiration time in seconds (defaults to settings value)
+
+    Returns:
+        A pre-signed URL string
+
+    Raises:
+        R2UploadError: If URL generation fails
+    """
+    return get_signed_urls([object_key], expiration)[object_key]
+
+
+@traced("r2.presign_batch")
+def get_signed_urls(
+    object_keys: Iterable[str],
+    expiration: Optional[int] = None,
+) -> Dict[str, str]:
+    """
+    Sign a batch of object keys, e.g. for a list endpoint.
+
+    Duplicate keys are signed once, cached URLs are reused, and the
+    remaining keys are signed with a single client lookup.
+
+    Args:
+        object_keys: The S3/R2 object keys to sign
+        expiration: URL expiration time in seconds (defaults to settings value)
+
+    Returns:
+        Dict mapping each object key to its pre-signed URL
+
+    Raises:
+        R2UploadError: If URL generation fails
+    """
+    if expiration is None:
+        expiration = settings.R2_SIGNED_URL_EXPIRATION
+
+    cache = get_url_cache()
+    urls: Dict[str, str] = {}
+    missing: List[str] = []
+
+    for object_key in object_keys:
+        if object_key in urls:
+            continue
+        url = cache.get(object_key, expiration)
+        if url is None:
+            missing.append(object_key)
+            urls[object_key] = ""
+        else:
+            urls[object_key] = url
+
+    shared = get_shared_cache() if missing else None
+    if shared is not None:
+        unsigned = []
+        for object_key in missing:
+            entry = shared.lookup(f"url:{expiration}:{object_key}")
+            if entry is None:
+                unsigned.append(object_key)
+                continue
+            url, refresh_at = entry
+            urls[object_key] = url.decode()
+            # Local deadline: the same wall-clock refresh time
+            signed_at = time.monotonic() + (refresh_at - time.time()) - (expiration - cache.margin)
+            cache.set(object_key, expiration, urls[object_key], signed_at)
+        missing = unsigned
+
+    span = get_current_span()
+    span.set_attributes({"presign.keys": len(urls), "presign.cache_misses": len(missing)})
+    if not missing:
+        return urls
+
+    try:
+        client = get_r2_client()
+        bucket_name = settings.R2_BUCKET_NAME
+
+        if not bucket_name:
+            raise R2UploadError("R2_BUCKET_NAME is not configured")
+
+        signed_at = time.monotonic()
+        for object_key in missing:
+            url = _presign(client, bucket_name, object_key, expiration)
+            cache.set(object_key, expiration, url, signed_at)
+            if shared is not None and expiration > cache.margin:
+                shared.set(f"url:{expiration}:{object_key}", url.encode(), expiration - cache.margin)
+            urls[object_key] = url
+
+        return urls
+
+    except R2UploadError:
+        raise
+    except Exception as e:
+        logger.error("Failed to generate signed URLs: %s", e)
+        raise R2UploadError(f"Failed to generate signed URL: {str(e)}")
+
+
+def attach_signed_urls(
+    transactions: List[Dict[str, Any]],
+    expiration: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Add an ``image_url`` field to transaction rows from their object keys.
+
+    Rows without an ``r2_object_key`` are left untouched, so legacy rows
+    that still carry a stored ``image_url`` keep working.
+
+    Args:
+        transactions: Transaction dicts as returned by Supabase
+        expiration: URL expiration time in seconds (defaults to settings value)
+
+    Returns:
+        The same list, with ``image_url`` filled in place
+    """
+    keys = [tx['r2_object_key'] for tx in transactions if tx.get('r2_object_key')]
+    if not keys:
+        return transactions
+
+    urls = get_signed_urls(keys, expiration)
+    for tx in transactions:
+        object_key = tx.get('r2_object_key')
+        if object_key:
+            tx['image_url'] = urls[object_key]
+    return transactions
@@ -6,15 +6,21 @@ via the Supabase REST API (PostgREST).
 
 We use httpx for HTTP requests instead of the official supabase-py client
 to avoid build dependencies (pyroaring) that may fail on Windows.
+Request and response bodies are encoded/decoded with ``fast_json``
+directly from bytes.
 """
 
 import logging
-from typing import Optional, Dict, Any
+from functools import lru_cache
+from typing import Callable, Optional, Dict, Any, Iterator, List
 from datetime import datetime, timezone
 
 import httpx
 from django.conf import settings
 
+from ..fast_json import dumps, loads
+from ..tracing import traced, inject_trace_headers
+
 
 logger = logging.getLogger(__name__)
 
@@ -24,21 +30,40 @@ class SupabaseError(Exception):
     pass
 
 
+@lru_cache(maxsize=1)
+def get_http_client() -> httpx.Client:
+    """
+    Get a shared HTTP client for PostgREST requests.
+    
+    Reusing one client keeps TCP/TLS connections to Supabase alive
+    between requests instead of paying a handshake on every call.
+    httpx clients are safe to share between threads.
+    """
+    return httpx.Client(
+        timeout=settings.SUPABASE_HTTP_TIMEOUT,
+        limits=httpx.Limits(
+            max_connections=settings.SUPABASE_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.SUPABASE_HTTP_MAX_CONNECTIONS,
+        ),
+    )
+
+
 def get_supabase_headers() -> Dict[str, str]:
     """
     Get the headers required for Supabase REST API requests.
     
-    Uses the service role key for full database access.
+    Uses the service role key for full database access. The active
+    trace context is propagated via a ``traceparent`` header.
     """
     if not settings.SUPABASE_SERVICE_ROLE_KEY:
         raise SupabaseError("SUPABASE_SERVICE_ROLE_KEY is not configured")
     
-    return {
+    return inject_trace_headers({
         "apikey": settings.SUPABASE_SERVICE_ROLE_KEY,
         "Authorization": f"Bearer {settings.SUPABASE_SERVICE_ROLE_KEY}",
         "Content-Type": "application/json",
         "Prefer": "return=representation",  # Return the inserted/updated row
-    }
+    })
 
 
 def get_supabase_url(table: str) -> str:
@@ -52,6 +77,7 @@ def get_supabase_url(table: str) -> str:
     return f"{base_url}/rest/v1/{table}"
 
 
+@traced("supabase.get_user")
 def get_user_by_clerk_id(clerk_id: str) -> Optional[Dict[str, Any]]:
     """
     Find a Supabase user by their Clerk ID.
@@ -79,29 +105,30 @@ def get_user_by_clerk_id(clerk_id: str) -> Optional[Dict[str, Any]]:
             "select": "id,clerk_id",
         }
         
-        logger.info(f"Looking up user by clerk_id: {clerk_id}")
+        logger.info("Looking up user by clerk_id: %s", clerk_id)
         
-        with httpx.Client() as client:
-            response = client.get(url, headers=headers, params=params)
-            response.raise_for_status()
-            
-            users = response.json()
-            
-            if not users:
-                logger.warning(f"No user found with clerk_id: {clerk_id}")
-                return None
-            
-            logger.info(f"Found user: {users[0]['id']}")
-            return users[0]
+        client = get_http_client()
+        response = client.get(url, headers=headers, params=params)
+        response.raise_for_status()
+        
+        users = loads(response.content)
+        
+        if not users:
+            logger.warning("No user found with clerk_id: %s", clerk_id)
+            return None
             
+        logger.info("Found user: %s", users[0]['id'])
+        return users[0]
+        
     except httpx.HTTPStatusError as e:
-        logger.error(f"Supabase query failed: {e}")
+        logger.error("Supabase query failed: %s", e)
         raise SupabaseError(f"Failed to query users: {e.response.text}")
     except Exception as e:
-        logger.error(f"Unexpected error querying Supabase: {e}")
+        logger.error("Unexpected error querying Supabase: %s", e)
         raise SupabaseError(f"Failed to query users: {str(e)}")
 
 
+@traced("supabase.get_or_create_user")
 def create_user_if_not_exists(clerk_id: str) -> Dict[str, Any]:
     """
     Get or create a user by Clerk ID.
@@ -118,16 +145,11 @@ def create_user_if_not_exists(clerk_id: str) -> Dict[str, Any]:
     Raises:
         SupabaseError: If the operation fails
     """
-    print(f"\n[SUPABASE] create_user_if_not_exists called for: {clerk_id}")
-    
     # First try to find existing user
     user = get_user_by_clerk_id(clerk_id)
     if user:
-        print(f"[SUPABASE] Found existing user: {user['id']}")
         return user
     
-    print(f"[SUPABASE] No user found, creating new user...")
-    
     # Create new user if not found
     try:
         url = get_supabase_url("users")
@@ -137,29 +159,21 @@ def create_user_if_not_exists(clerk_id: str) -> Dict[str, Any]:
             "clerk_id": clerk_id,
         }
         
-        print(f"[SUPABASE] POST to: {url}")
-        print(f"[SUPABASE] Data: {data}")
+        logger.info("Creating new user for clerk_id: %s", clerk_id)
         
-        logger.info(f"Creating new user for clerk_id: {clerk_id}")
+        client = get_http_client()
+        response = client.post(url, headers=headers, content=dumps(data))
+        response.raise_for_status()
         
-        with httpx.Client() as client:
-            response = client.post(url, headers=headers, json=data)
-            print(f"[SUPABASE] Response status: {response.status_code}")
-            print(f"[SUPABASE] Response body: {response.text[:500] if response.text else 'empty'}")
-            
-            response.raise_for_status()
-            
-            users = response.json()
-            
-            if not users:
-                raise SupabaseError("User creation returned empty response")
-            
-            print(f"[SUPABASE] Created user: {users[0]}")
-            logger.info(f"Created new user: {users[0]['id']}")
-            return users[0]
+        users = loads(response.content)
+        
+        if not users:
+            raise SupabaseError("User creation returned empty response")
             
+        logger.info("Created new user: %s", users[0]['id'])
+        return users[0]
+        
     except httpx.HTTPStatusError as e:
-        print(f"[SUPABASE] HTTP Error: {e.response.status_code} - {e.response.text}")
         # Handle unique constraint violation (user created by another request)
         if e.response.status_code == 409:
             logger.info("User was created by another request, retrying lookup")
@@ -167,45 +181,31 @@ def create_user_if_not_exists(clerk_id: str) -> Dict[str, Any]:
             if user:
                 return user
         
-        logger.error(f"Failed to create user: {e}")
+        logger.error(
+            "Failed to create user: HTTP %s - %s",
+            e.response.status_code, e.response.text,
+        )
         raise SupabaseError(f"Failed to create user: {e.response.text}")
+    except SupabaseError:
+        raise
     except Exception as e:
-        print(f"[SUPABASE] Exception: {type(e).__name__}: {e}")
-        import traceback
-        print(f"[SUPABASE] Traceback: {traceback.format_exc()}")
-        logger.error(f"Unexpected error creating user: {e}")
+        logger.exception("Unexpected error creating user")
         raise SupabaseError(f"Failed to create user: {str(e)}")
 
 
-def insert_transaction(
-    user_id: str,
-    image_url: str,
-    r2_object_key: str,
-    status: str = "pending",
-    detected_confidence: Optional[float] = None,
-) -> Dict[str, Any]:
+@traced("supabase.insert_transactions")
+def insert_transactions(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """
-    Insert a new transaction record.
+    Insert many transaction rows with a single PostgREST array insert.
     
-    The transactions table has:
-    - id (UUID): Transaction ID (auto-generated)
-    - user_id (UUID, FK -> users.id): Foreign key to users table
-    - image_url (TEXT): URL to access the image (signed URL)
-    - detected_confidence (FLOAT, nullable): ML confidence score
-    - status (TEXT): Transaction status
-    - created_at (TIMESTAMP): When the transaction was created
-    
-    We also store r2_object_key in metadata for URL regeneration.
+    All rows must have the same keys (PostgREST requirement for bulk
+    inserts).
     
     Args:
-        user_id: Supabase user ID (UUID)
-        image_url: The signed URL for the uploaded image
-        r2_object_key: The R2 object key (for URL regeneration)
-        status: Transaction status (default: 'pending')
-        detected_confidence: Optional ML confidence score
+        rows: Transaction dicts as built by ``data_backend.build_transaction_row``
     
     Returns:
-        The inserted transaction record
+        The inserted transaction records, in the order returned by PostgREST
     
     Raises:
         SupabaseError: If the insert fails
@@ -214,41 +214,32 @@ def insert_transaction(
         url = get_supabase_url("transactions")
         headers = get_supabase_headers()
         
-        data = {
-            "user_id": user_id,
-            "image_url": image_url,
-            "status": status,
-            "created_at": datetime.now(timezone.utc).isoformat(),
-        }
+        logger.info("Inserting %d transactions", len(rows))
         
-        # Only include detected_confidence if provided
-        if detected_confidence is not None:
-            data["detected_confidence"] = detected_confidence
+        client = get_http_client()
+        response = client.post(url, headers=headers, content=dumps(rows))
+        response.raise_for_status()
         
-        logger.info(f"Inserting transaction for user: {user_id}")
+        transactions = loads(response.content)
+        
+        if len(transactions) != len(rows):
+            raise SupabaseError(
+                f"Bulk insert returned {len(transactions)} rows for {len(rows)} inserted"
+            )
+        
+        return transactions
         
-        with httpx.Client() as client:
-            response = client.post(url, headers=headers, json=data)
-            response.raise_for_status()
-            
-            transactions = response.json()
-            
-            if not transactions:
-                raise SupabaseError("Transaction insert returned empty response")
-            
-            transaction = transactions[0]
-            logger.info(f"Created transaction: {transaction['id']}")
-            
-            return transaction
-            
     except httpx.HTTPStatusError as e:
-        logger.error(f"Failed to insert transaction: {e}")
-        raise SupabaseError(f"Failed to insert transaction: {e.response.text}")
+        logger.error("Failed to insert transactions: %s", e)
+        raise SupabaseError(f"Failed to insert transactions: {e.response.text}")
+    except SupabaseError:
+        raise
     except Exception as e:
-        logger.error(f"Unexpected error inserting transaction: {e}")
-        raise SupabaseError(f"Failed to insert transaction: {str(e)}")
+        logger.error("Unexpected error inserting transactions: %s", e)
+        raise SupabaseError(f"Failed to insert transactions: {str(e)}")
 
 
+@traced("supabase.update_transaction")
 def update_transaction(
     transaction_id: str,
     **kwargs
@@ -259,11 +250,10 @@ def update_transaction(
     This is useful for:
     - Updating status after ML processing
     - Adding detected_confidence after inference
-    - Updating image_url with a fresh signed URL
     
     Args:
         transaction_id: The transaction UUID
-        **kwargs: Fields to update (status, detected_confidence, image_url)
+        **kwargs: Fields to update (status, detected_confidence)
     
     Returns:
         The updated transaction record, or None if not found
@@ -278,24 +268,376 @@ def update_transaction(
         # Filter by transaction ID
         params = {"id": f"eq.{transaction_id}"}
         
-        logger.info(f"Updating transaction: {transaction_id}")
+        logger.info("Updating transaction: %s", transaction_id)
         
-        with httpx.Client() as client:
-            response = client.patch(url, headers=headers, params=params, json=kwargs)
-            response.raise_for_status()
-            
-            transactions = response.json()
-            
-            if not transactions:
-                logger.warning(f"Transaction not found: {transaction_id}")
-                return None
-            
-            logger.info(f"Updated transaction: {transaction_id}")
-            return transactions[0]
+        client = get_http_client()
+        response = client.patch(url, headers=headers, params=params, content=dumps(kwargs))
+        response.raise_for_status()
+        
+        transactions = loads(response.content)
+        
+        if not transactions:
+            logger.warning("Transaction not found: %s", transaction_id)
+            return None
             
+        logger.info("Updated transaction: %s", transaction_id)
+        return transactions[0]
+        
     except httpx.HTTPStatusError as e:
-        logger.error(f"Failed to update transaction: {e}")
+        logger.error("Failed to update transaction: %s", e)
         raise SupabaseError(f"Failed to update transaction: {e.response.text}")
     except Exception as e:
-        logger.error(f"Unexpected error updating transaction: {e}")
+        logger.error("Unexpected error updating transaction: %s", e)
         raise SupabaseError(f"Failed to update transaction: {str(e)}")
+
+
+@traced("supabase.get_setting")
+def get_system_setting(key: str) -> Optional[Dict[str, Any]]:
+    """
+    Fetch a row of the ``system_settings`` table.
+    
+    The table has:
+    - key (TEXT, PK): Setting name
+    - value (JSONB): Setting value
+    - description (TEXT, nullable)
+    - updated_at (TIMESTAMP): Set by the admin settings route on upsert
+    
+    Returns:
+        Dict with 'key', 'value' and 'updated_at', or None if the setting
+        (or the table) does not exist
+    
+    Raises:
+        SupabaseError: If the query fails
+    """
+    try:
+        url = get_supabase_url("system_settings")
+        headers = get_supabase_headers()
+        params = {
+            "key": f"eq.{key}",
+            "select": "key,value,updated_at",
+        }
+        
+        client = get_http_client()
+        response = client.get(url, headers=headers, params=params)
+        if response.status_code == 404 and b"42P01" in response.content:
+            # undefined_table: settings were never created
+            return None
+        response.raise_for_status()
+        
+        settings_rows = loads(response.content)
+        return settings_rows[0] if settings_rows else None
+        
+    except httpx.HTTPStatusError as e:
+        logger.error("Failed to read setting %s: %s", key, e)
+        raise SupabaseError(f"Failed to read setting {key}: {e.response.text}")
+    except SupabaseError:
+        raise
+    except Exception as e:
+        logger.error("Unexpected error reading setting %s: %s", key, e)
+        raise SupabaseError(f"Failed to read setting {key}: {str(e)}")
+
+
+def fetch_page(
+    table: str,
+    select: str,
+    after_id: Optional[str] = None,
+    limit: int = 1000,
+    filters: Optional[Dict[str, str]] = None,
+    order: str = "id",
+) -> List[Dict[str, Any]]:
+    """
+    Fetch up to ``limit`` rows with ``id`` greater than ``after_id``, in
+    ``id`` order.
+    
+    Keyset pagination keeps every page an index range scan however deep
+    into the table it is. ``select`` must include ``id``.
+    
+    Args:
+        table: Table name
+        select: PostgREST column list
+        after_id: Last ``id`` of the previous page (None for the first page)
+        limit: Maximum rows to return
+        filters: Extra PostgREST filters, e.g. ``{"status": "eq.completed"}``
+        order: PostgREST ordering, for keysets other than ``id`` passed in
+            ``filters``
+    
+    Raises:
+        SupabaseError: If the request fails
+    """
+    params = {
+        **(filters or {}),
+        "select": select,
+        "order": order,
+        "limit": str(limit),
+    }
+    if after_id is not None:
+        params["id"] = f"gt.{after_id}"
+    
+    try:
+        client = get_http_client()
+        response = client.get(get_supabase_url(table), headers=get_supabase_headers(), params=params)
+        response.raise_for_status()
+        return loads(response.content)
+    except httpx.HTTPStatusError as e:
+        logger.error("Failed to read %s: %s", table, e)
+        raise SupabaseError(f"Failed to read {table}: {e.response.text}")
+    except SupabaseError:
+        raise
+    except Exception as e:
+        logger.error("Unexpected error reading %s: %s", table, e)
+        raise SupabaseError(f"Failed to read {table}: {str(e)}")
+
+
+def iter_rows(
+    table: str,
+    select: str,
+    filters: Optional[Dict[str, str]] = None,
+    page_size: int = 1000,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yield every row of a table matching ``filters``, a page at a time
+    (see ``fetch_page``).
+    
+    Raises:
+        SupabaseError: If a page request fails
+    """
+    last_id = None
+    while True:
+        rows = fetch_page(table, select, last_id, page_size, filters)
+        yield from rows
+        if len(rows) < page_size:
+            return
+        last_id = rows[-1]["id"]
+
+
+@traced("supabase.upsert_transactions")
+def upsert_transactions(rows: List[Dict[str, Any]]) -> int:
+    """
+    Write many existing transactions back with one PostgREST upsert.
+    
+    Rows are merged on ``id``. Postgres checks NOT NULL constraints
+    before resolving the conflict, so every row must carry the table's
+    required columns (``user_id``, ``r2_object_key``, ``status``), not
+    only the changed ones. All rows must have the same keys.
+    
+    Returns:
+        Number of rows written
+    
+    Raises:
+        SupabaseError: If the upsert fails
+    """
+    try:
+        url = get_supabase_url("transactions")
+        headers = {
+            **get_supabase_headers(),
+            "Prefer": "resolution=merge-duplicates,return=minimal",
+        }
+        
+        client = get_http_client()
+        response = client.post(url, headers=headers, params={"on_conflict": "id"},
+                               content=dumps(rows))
+        response.raise_for_status()
+        return len(rows)
+        
+    except httpx.HTTPStatusError as e:
+        logger.error("Failed to upsert transactions: %s", e)
+        raise SupabaseError(f"Failed to upsert transactions: {e.response.text}")
+    except SupabaseError:
+        raise
+    except Exception as e:
+        logger.error("Unexpected error upserting transactions: %s", e)
+        raise SupabaseError(f"Failed to upsert transactions: {str(e)}")
+
+
+@traced("supabase.update_bin_fill_levels")
+def update_bin_fill_levels(readings: List[Dict[str, Any]]) -> int:
+    """
+    Apply many bin readings with one read and one PostgREST upsert.
+    
+    PostgREST cannot update many rows to different values in a single
+    PATCH, and an upsert must carry the bins' required columns, so the
+    current rows are read first and written back merged. Readings not
+    newer than the bin's ``updated_at`` and unknown bins are skipped.
+    ``fill_level`` is stored as a whole percentage, as the admin routes do.
+    
+    Returns:
+        Number of bins updated
+    
+    Raises:
+        SupabaseError: If a request fails
+    """
+    if not readings:
+        return 0
+    try:
+        client = get_http_client()
+        headers = get_supabase_headers()
+        ids = ",".join(reading["id"] for reading in readings)
+        response = client.get(get_supabase_url("bins"), headers=headers,
+                              params={"select": "*", "id": f"in.({ids})"})
+        response.raise_for_status()
+        current = {row["id"]: row for row in loads(response.content)}
+        
+        rows = []
+        for reading in readings:
+            row = current.get(reading["id"])
+            if row is None:
+                continue
+            updated_at = row.get("updated_at")
+            if updated_at and datetime.fromisoformat(updated_at) >= reading["updated_at"]:
+                continue
+            rows.append({
+                **row,
+                "fill_level": round(reading["fill_level"]),
+                "updated_at": reading["updated_at"],
+            })
+        if not rows:
+            return 0
+        
+        response = client.post(
+            get_supabase_url("bins"),
+            headers={**headers, "Prefer": "resolution=merge-duplicates,return=minimal"},
+            params={"on_conflict": "id"},
+            content=dumps(rows),
+        )
+        response.raise_for_status()
+        return len(rows)
+        
+    except httpx.HTTPStatusError as e:
+        logger.error("Failed to update bin fill levels: %s", e)
+        raise SupabaseError(f"Failed to update bins: {e.response.text}")
+    except SupabaseError:
+        raise
+    except Exception as e:
+        logger.error("Unexpected error updating bin fill levels: %s", e)
+        raise SupabaseError(f"Failed to update bins: {str(e)}")
+
+
+@traced("supabase.get_user_stats")
+def get_user_stats(user_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Fetch a user's ``user_stats`` row (see ``user_stats``).
+    
+    Returns:
+        Dict with 'stats' and 'version', or None if the user has no row
+    
+    Raises:
+        SupabaseError: If the query fails
+    """
+    try:
+        client = get_http_client()
+        response = client.get(
+            get_supabase_url("user_stats"),
+            headers=get_supabase_headers(),
+            params={"user_id": f"eq.{user_id}", "select": "stats,version"},
+        )
+        response.raise_for_status()
+        rows = loads(response.content)
+        return rows[0] if rows else None
+        
+    except httpx.HTTPStatusError as e:
+        logger.error("Failed to read stats of user %s: %s", user_id, e)
+        raise SupabaseError(f"Failed to read user stats: {e.response.text}")
+    except SupabaseError:
+        raise
+    except Exception as e:
+        logger.error("Unexpected error reading stats of user %s: %s", user_id, e)
+        raise SupabaseError(f"Failed to read user stats: {str(e)}")
+
+
+@traced("supabase.update_user_stats")
+def update_user_stats(
+    user_id: str,
+    update: Callable[[Optional[Dict[str, Any]]], Dict[str, Any]],
+) -> Dict[str, Any]:
+    """
+    Read-modify-write a user's stats with optimistic concurrency.
+    
+    PostgREST cannot lock a row across requests, so the write is
+    conditional on the ``version`` that was read (or, for a new row, on
+    the insert not conflicting) and retried with fresh stats if another
+    writer got there first.
+    
+    Args:
+        user_id: Supabase user ID (UUID)
+        update: Maps the current stats (None if the user has none) to the
+            new stats; may be called more than once
+    
+    Returns:
+        The stats written
+    
+    Raises:
+        SupabaseError: If a request fails or every attempt conflicted
+    """
+    url = get_supabase_url("user_stats")
+    for _ in range(settings.USER_STATS_MAX_RETRIES):
+        current = get_user_stats(user_id)
+        stats = update(current["stats"] if current else None)
+        now = datetime.now(timezone.utc)
+        try:
+            client = get_http_client()
+            if current is None:
+                response = client.post(url, headers=get_supabase_headers(), content=dumps(
+                    {"user_id": user_id, "stats": stats, "version": 1, "updated_at": now}
+                ))
+                if response.status_code == 409:
+                    # Inserted concurrently
+                    continue
+                response.raise_for_status()
+                return stats
+            
+            params = {"user_id": f"eq.{user_id}", "version": f"eq.{current['version']}"}
+            response = client.patch(url, headers=get_supabase_headers(), params=params, content=dumps(
+                {"stats": stats, "version": current["version"] + 1, "updated_at": now}
+            ))
+            response.raise_for_status()
+            if loads(response.content):
+                return stats
+            
+        except httpx.HTTPStatusError as e:
+            logger.error("Failed to update stats of user %s: %s", user_id, e)
+            raise SupabaseError(f"Failed to update user stats: {e.response.text}")
+        except Exception as e:
+            logger.error("Unexpected error updating stats of user %s: %s", user_id, e)
+            raise SupabaseError(f"Failed to update user stats: {str(e)}")
+    raise SupabaseError(f"Stats of user {user_id} changed concurrently; gave up after retries")
+
+
+@traced("supabase.upsert_user_stats")
+def upsert_user_stats(stats_by_user: Dict[str, Dict[str, Any]]) -> int:
+    """
+    Write many users' stats with one PostgREST upsert, replacing
+    whatever they had.
+    
+    Returns:
+        Number of rows written
+    
+    Raises:
+        SupabaseError: If the upsert fails
+    """
+    if not stats_by_user:
+        return 0
+    now = datetime.now(timezone.utc)
+    # A fresh version makes writes that read the old stats retry
+    rows = [
+        {"user_id": user_id, "stats": stats, "version": int(now.timestamp() * 1000), "updated_at": now}
+        for user_id, stats in stats_by_user.items()
+    ]
+    try:
+        client = get_http_client()
+        response = client.post(
+            get_supabase_url("user_stats"),
+            headers={**get_supabase_headers(), "Prefer": "resolution=merge-duplicates,return=minimal"},
+            params={"on_conflict": "user_id"},
+            content=dumps(rows),
+        )
+        response.raise_for_status()
+        return len(rows)
+        
+    except httpx.HTTPStatusError as e:
+        logger.error("Failed to upsert user stats: %s", e)
+        raise SupabaseError(f"Failed to upsert user stats: {e.response.text}")
+    except SupabaseError:
+        raise
+    except Exception as e:
+        logger.error("Unexpected error upserting user stats: %s", e)
+        raise SupabaseError(f"Failed to upsert user stats: {str(e)}")
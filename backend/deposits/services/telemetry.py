@@ -0,0 +1,291 @@
+"""
+Bin Telemetry Ingestion.
+
+Smart bins post batches of fill-level readings to
+``POST /api/deposits/bins/telemetry/`` in one of two encodings:
+
+- NDJSON (``application/x-ndjson``), one reading per line::
+
+      {"bin_id": "<uuid>", "fill_level": 57.5, "ts": 1760000000.0}
+
+  ``ts`` is Unix seconds or an ISO 8601 string and defaults to the time
+  of receipt.
+- Binary (``application/octet-stream``), little-endian column arrays::
+
+      b"BTL1" | count (uint32) | count x bin id (16-byte UUID)
+              | count x ts (float64) | count x fill level (float32)
+
+Readings are coalesced in memory to the latest one per bin. Every
+``BIN_TELEMETRY_FLUSH_INTERVAL`` seconds a background thread appends the
+coalesced readings to the fill history (see ``fill_history``) and writes
+them to ``bins`` with one bulk update through the data backend, so the
+database sees one write per flush instead of one per reading. Readings
+that fail to reach the database are retried with the next flush (newer
+readings for the same bin win).
+"""
+
+import atexit
+import logging
+import struct
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from ..fast_json import loads
+from .repositories import BinRepository, get_repository
+
+
+logger = logging.getLogger(__name__)
+
+
+BINARY_MAGIC = b"BTL1"
+
+_HEADER = struct.Struct('<4sI')
+
+# Readings stamped further ahead than this (seconds) are rejected
+MAX_CLOCK_SKEW = 300
+
+Reading = Tuple[str, float, float]
+
+# Raw bin id (str or 16 bytes) -> canonical UUID string. Bins are few and
+# report repeatedly, so most ids are parsed once per process.
+_bin_ids: Dict[object, str] = {}
+_BIN_ID_CACHE_SIZE = 100000
+
+
+class TelemetryFormatError(Exception):
+    """Raised when a telemetry body cannot be decoded."""
+    pass
+
+
+def _bin_id(raw) -> str:
+    bin_id = _bin_ids.get(raw)
+    if bin_id is None:
+        bin_id = str(uuid.UUID(raw)) if isinstance(raw, str) else str(uuid.UUID(bytes=raw))
+        if len(_bin_ids) >= _BIN_ID_CACHE_SIZE:
+            _bin_ids.clear()
+        _bin_ids[raw] = bin_id
+    return bin_id
+
+
+def _validate(bin_id, timestamp, fill_level, now: float) -> Optional[Reading]:
+    try:
+        bin_id = _bin_id(bin_id)
+        fill_level = float(fill_level)
+        if timestamp is None:
+            timestamp = now
+        elif isinstance(timestamp, str):
+            parsed = datetime.fromisoformat(timestamp)
+            if parsed.tzinfo is None:
+                parsed = parsed.replace(tzinfo=timezone.utc)
+            timestamp = parsed.timestamp()
+        else:
+            timestamp = float(timestamp)
+    except (TypeError, ValueError):
+        return None
+    if fill_level != fill_level or timestamp > now + MAX_CLOCK_SKEW or timestamp <= 0:
+        return None
+    return bin_id, timestamp, min(max(fill_level, 0.0), 100.0)
+
+
+def parse_ndjson(body: bytes) -> Tuple[List[Reading], int]:
+    """
+    Decode an NDJSON telemetry body.
+
+    Returns:
+        Tuple of (valid readings, number of rejected lines)
+    """
+    lines = [line for line in body.splitlines() if line.strip()]
+    try:
+        # One decoder call for the whole batch; per line only if it is malformed
+        items = loads(b"[" + b",".join(lines) + b"]")
+    except ValueError:
+        items = []
+        for line in lines:
+            try:
+                items.append(loads(line))
+            except ValueError:
+                items.append(None)
+
+    now = time.time()
+    readings = []
+    for item in items:
+        reading = None
+        if isinstance(item, dict):
+            reading = _validate(item.get("bin_id"), item.get("ts"), item.get("fill_level"), now)
+        if reading is not None:
+            readings.append(reading)
+    return readings, len(items) - len(readings)
+
+
+def parse_binary(body: bytes) -> Tuple[List[Reading], int]:
+    """
+    Decode a binary telemetry body.
+
+    Returns:
+        Tuple of (valid readings, number of rejected readings)
+
+    Raises:
+        TelemetryFormatError: If the header or the array lengths are wrong
+    """
+    if len(body) < _HEADER.size:
+        raise TelemetryFormatError("Body too short")
+    magic, count = _HEADER.unpack_from(body)
+    if magic != BINARY_MAGIC:
+        raise TelemetryFormatError("Bad magic, expected BTL1")
+    if len(body) != _HEADER.size + count * 28:
+        raise TelemetryFormatError(f"Body length does not match {count} readings")
+
+    ids_at = _HEADER.size
+    ts_at = ids_at + 16 * count
+    fill_at = ts_at + 8 * count
+    timestamps = struct.unpack_from(f'<{count}d', body, ts_at)
+    fill_levels = struct.unpack_from(f'<{count}f', body, fill_at)
+
+    now = time.time()
+    readings = []
+    for i in range(count):
+        bin_id = body[ids_at + 16 * i:ids_at + 16 * (i + 1)]
+        reading = _validate(bin_id, timestamps[i], fill_levels[i], now)
+        if reading is not None:
+            readings.append(reading)
+    return readings, count - len(readings)
+
+
+class TelemetryBuffer:
+    """
+    Latest reading per bin, flushed periodically from a background thread.
+
+    Args:
+        interval: Seconds between flushes
+        name: Thread name, for debugging
+    """
+
+    def __init__(self, interval: float, name: str = 'bin-telemetry'):
+        self.interval = interval
+        self._latest: Dict[str, Tuple[float, float]] = {}
+        # Coalesced readings already in the history but not yet in ``bins``
+        self._retry: Dict[str, Tuple[float, float]] = {}
+        self._closed = False
+        self._cond = threading.Condition()
+
+        self.received = 0
+        self.flushes = 0
+        self.written = 0
+
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def add(self, readings: List[Reading]) -> None:
+        """Merge readings, keeping the newest one per bin."""
+        with self._cond:
+            latest = self._latest
+            for bin_id, timestamp, fill_level in readings:
+                current = latest.get(bin_id)
+                if current is None or timestamp >= current[0]:
+                    latest[bin_id] = (timestamp, fill_level)
+            self.received += len(readings)
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._latest) + len(self._retry)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if not self._closed:
+                    self._cond.wait(self.interval)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+
+    def flush(self) -> int:
+        """
+        Write the coalesced readings; returns the number of bins updated.
+        """
+        from .fill_history import get_fill_history
+
+        with self._cond:
+            latest, self._latest = self._latest, {}
+            retry, self._retry = self._retry, {}
+        if not latest and not retry:
+            return 0
+
+        if latest:
+            try:
+                get_fill_history().append(
+                    (bin_id, timestamp, fill_level)
+                    for bin_id, (timestamp, fill_level) in latest.items()
+                )
+            except OSError as e:
+                logger.error("Could not append %d readings to the fill history: %s", len(latest), e)
+
+        for bin_id, reading in latest.items():
+            if bin_id not in retry or reading[0] >= retry[bin_id][0]:
+                retry[bin_id] = reading
+        readings = [
+            {
+                "id": bin_id,
+                "fill_level": fill_level,
+                "updated_at": datetime.fromtimestamp(timestamp, timezone.utc),
+            }
+            for bin_id, (timestamp, fill_level) in retry.items()
+        ]
+        try:
+            updated = get_repository(BinRepository).update_bin_fill_levels(readings)
+        except Exception as e:
+            logger.error("Bin telemetry flush of %d bins failed: %s", len(readings), e)
+            with self._cond:
+                for bin_id, reading in retry.items():
+                    if bin_id not in self._retry or reading[0] >= self._retry[bin_id][0]:
+                        self._retry[bin_id] = reading
+            return 0
+
+        self.flushes += 1
+        self.written += updated
+        logger.debug("Flushed %d bin readings, %d bins updated", len(readings), updated)
+        return updated
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Stop the flush thread after one final flush."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "received": self.received,
+            "pending_bins": self.pending(),
+            "flushes": self.flushes,
+            "bins_updated": self.written,
+        }
+
+
+_buffer: Optional[TelemetryBuffer] = None
+_buffer_lock = threading.Lock()
+
+
+def get_telemetry_buffer() -> TelemetryBuffer:
+    """Get the process-wide telemetry buffer, creating it on first use."""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = TelemetryBuffer(settings.BIN_TELEMETRY_FLUSH_INTERVAL)
+                atexit.register(_buffer.close)
+    return _buffer
+
+
+def reset_after_fork() -> None:
+    """Forget the parent's buffer; its flush thread does not survive fork."""
+    global _buffer, _buffer_lock
+    _buffer = None
+    _buffer_lock = threading.Lock()
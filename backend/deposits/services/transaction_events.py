@@ -0,0 +1,352 @@
+"""
+Transaction Status Events.
+
+Pushes transaction changes (status, confidence, points) to the clients
+watching those transactions (see ``deposits/push.py``) so they do not
+have to poll.
+
+- ``publish_transaction_updates(rows)`` is called wherever a transaction
+  is updated (``DataBackend.update_transaction`` and
+  ``upsert_transactions``, used by ``PATCH
+  /api/deposits/admin/transactions/<id>/`` and ``rescore_transactions``).
+  It is safe from any thread or process. Changes written to the table by
+  other services are not published; they should go through that endpoint.
+- ``EventHub``: in-process pub/sub on the ASGI event loop, keyed by
+  transaction id. A subscriber keeps only the latest undelivered event
+  per transaction, so a slow or idle client costs a fixed amount of
+  memory however many updates it misses. One shared timer sends the
+  keep-alives, instead of a timer per connection.
+- ``SocketBroker``: carries events to the other worker processes on
+  this host, a local stand-in for a broker such as Redis pub/sub. Every
+  process with an event hub binds a Unix datagram socket in
+  ``TRANSACTION_EVENTS_SOCKET_DIR``; publishers send each batch to every
+  socket there. Delivery is best effort: a full or dead socket drops the
+  batch, and clients get the current state again when they resubscribe.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import threading
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from django.conf import settings
+
+from ..fast_json import dumps, loads
+
+
+logger = logging.getLogger(__name__)
+
+
+# Transaction columns carried by an event; ``user_id`` is used to check
+# ownership and is not sent to clients
+EVENT_FIELDS = (
+    "id", "user_id", "status", "item_type", "detected_confidence",
+    "points_earned", "co2_saved",
+)
+
+SOCKET_SUFFIX = ".sock"
+
+# Events per datagram, well under the default Unix socket buffer
+_BATCH_SIZE = 100
+_MAX_DATAGRAM = 256 * 1024
+
+
+def to_event(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Build an event from a transaction row."""
+    return {field: row.get(field) for field in EVENT_FIELDS}
+
+
+class Subscriber:
+    """
+    One connected client: its user, its transaction ids and the events
+    waiting to be sent (latest per transaction).
+    """
+
+    __slots__ = ("user_id", "ids", "pending", "notices", "ready", "ping", "closed")
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.ids: Set[str] = set()
+        self.pending: Dict[str, Dict[str, Any]] = {}
+        self.notices: deque = deque(maxlen=16)
+        self.ready = asyncio.Event()
+        self.ping = False
+        self.closed = False
+
+    def push(self, event: Dict[str, Any]) -> None:
+        self.pending[event["id"]] = event
+        self.ready.set()
+
+    def notify(self, notice: Dict[str, Any]) -> None:
+        """Queue a message that is not a transaction event (e.g. an error)."""
+        self.notices.append(notice)
+        self.ready.set()
+
+    def close(self) -> None:
+        self.closed = True
+        self.ready.set()
+
+    def take(self) -> List[Dict[str, Any]]:
+        """Return and clear the pending events; also clears ``ping``."""
+        events = list(self.pending.values())
+        self.pending.clear()
+        self.ping = False
+        self.ready.clear()
+        return events
+
+
+class EventHub:
+    """
+    Routes events to subscribers. All methods except
+    ``publish_threadsafe`` must run on the hub's event loop.
+
+    Args:
+        loop: The event loop serving the connections
+        heartbeat: Seconds between keep-alive flags on every subscriber
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, heartbeat: float):
+        self.loop = loop
+        self.heartbeat = heartbeat
+        self._subscribers: Set[Subscriber] = set()
+        self._by_id: Dict[str, Set[Subscriber]] = {}
+        self._receiver: Optional[socket.socket] = None
+        self._heartbeat_handle = loop.call_later(heartbeat, self._beat)
+
+        self.published = 0
+        self.delivered = 0
+
+    def register(self, subscriber: Subscriber) -> None:
+        self._subscribers.add(subscriber)
+
+    def unregister(self, subscriber: Subscriber) -> None:
+        self.unsubscribe(subscriber, list(subscriber.ids))
+        self._subscribers.discard(subscriber)
+
+    def subscribe(self, subscriber: Subscriber, ids: Iterable[str]) -> None:
+        for transaction_id in ids:
+            subscriber.ids.add(transaction_id)
+            self._by_id.setdefault(transaction_id, set()).add(subscriber)
+
+    def unsubscribe(self, subscriber: Subscriber, ids: Iterable[str]) -> None:
+        for transaction_id in ids:
+            subscriber.ids.discard(transaction_id)
+            watchers = self._by_id.get(transaction_id)
+            if watchers is not None:
+                watchers.discard(subscriber)
+                if not watchers:
+                    del self._by_id[transaction_id]
+
+    def dispatch(self, events: List[Dict[str, Any]]) -> None:
+        """Deliver events to the subscribers of their transactions."""
+        self.published += len(events)
+        for event in events:
+            for subscriber in self._by_id.get(event.get("id"), ()):
+                # Ids are not secret; only the owner sees a transaction
+                if event.get("user_id") == subscriber.user_id:
+                    subscriber.push(event)
+                    self.delivered += 1
+
+    def publish_threadsafe(self, events: List[Dict[str, Any]]) -> None:
+        self.loop.call_soon_threadsafe(self.dispatch, events)
+
+    def listen(self, broker: "SocketBroker") -> None:
+        """Receive events published by other processes."""
+        self._receiver = broker.bind()
+        self.loop.add_reader(self._receiver.fileno(), self._receive)
+
+    def _receive(self) -> None:
+        while True:
+            try:
+                data = self._receiver.recv(_MAX_DATAGRAM)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                logger.warning("Transaction event socket failed: %s", e)
+                return
+            try:
+                events = loads(data)
+            except ValueError:
+                logger.warning("Dropped malformed transaction event batch")
+                continue
+            self.dispatch(events)
+
+    def _beat(self) -> None:
+        for subscriber in self._subscribers:
+            subscriber.ping = True
+            subscriber.ready.set()
+        self._heartbeat_handle = self.loop.call_later(self.heartbeat, self._beat)
+
+    def close(self) -> None:
+        self._heartbeat_handle.cancel()
+        for subscriber in list(self._subscribers):
+            subscriber.close()
+        if self._receiver is not None:
+            self.loop.remove_reader(self._receiver.fileno())
+            self._receiver.close()
+            self._receiver = None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "connections": len(self._subscribers),
+            "transactions_watched": len(self._by_id),
+            "events_published": self.published,
+            "events_delivered": self.delivered,
+        }
+
+
+class SocketBroker:
+    """
+    Fan-out between the processes on this host through a directory of
+    Unix datagram sockets, one per process that receives events.
+
+    Args:
+        directory: Socket directory, shared by the workers of one deployment
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.path: Optional[str] = None
+        self._sender: Optional[socket.socket] = None
+        self._lock = threading.Lock()
+
+    def bind(self) -> socket.socket:
+        """Bind this process's receiving socket."""
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        path = os.path.join(self.directory, f"{os.getpid()}{SOCKET_SUFFIX}")
+        try:
+            # Left behind by an earlier process with the same pid
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        receiver = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        receiver.bind(path)
+        receiver.setblocking(False)
+        self.path = path
+        return receiver
+
+    def _get_sender(self) -> socket.socket:
+        if self._sender is None:
+            with self._lock:
+                if self._sender is None:
+                    sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+                    sender.setblocking(False)
+                    self._sender = sender
+        return self._sender
+
+    def send(self, events: List[Dict[str, Any]]) -> int:
+        """
+        Send events to every other process; returns the number of
+        datagrams delivered to socket buffers.
+        """
+        try:
+            peers = [
+                entry.path for entry in os.scandir(self.directory)
+                if entry.name.endswith(SOCKET_SUFFIX) and entry.path != self.path
+            ]
+        except FileNotFoundError:
+            return 0
+        if not peers:
+            return 0
+
+        payloads = [
+            dumps(events[start:start + _BATCH_SIZE])
+            for start in range(0, len(events), _BATCH_SIZE)
+        ]
+        sender = self._get_sender()
+        sent = 0
+        for peer in peers:
+            for payload in payloads:
+                try:
+                    sender.sendto(payload, peer)
+                    sent += 1
+                except (ConnectionRefusedError, FileNotFoundError):
+                    # Its process has exited
+                    try:
+                        os.unlink(peer)
+                    except OSError:
+                        pass
+                    break
+                except OSError as e:
+                    # Typically a full receive buffer; the batch is dropped
+                    logger.debug("Dropped transaction events for %s: %s", peer, e)
+        return sent
+
+    def close(self) -> None:
+        if self.path is not None:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+            self.path = None
+
+
+_hub: Optional[EventHub] = None
+_broker: Optional[SocketBroker] = None
+_lock = threading.Lock()
+
+
+def get_broker() -> SocketBroker:
+    global _broker
+    if _broker is None:
+        with _lock:
+            if _broker is None:
+                _broker = SocketBroker(settings.TRANSACTION_EVENTS_SOCKET_DIR)
+    return _broker
+
+
+def get_event_hub() -> EventHub:
+    """
+    Get the process-wide event hub, creating it on first use. Must be
+    called from the event loop serving connections.
+    """
+    global _hub
+    if _hub is None:
+        hub = EventHub(asyncio.get_running_loop(), settings.TRANSACTION_EVENTS_HEARTBEAT)
+        try:
+            hub.listen(get_broker())
+        except OSError as e:
+            logger.error("Transaction events from other workers unavailable: %s", e)
+        _hub = hub
+    return _hub
+
+
+def publish_transaction_updates(rows: List[Dict[str, Any]]) -> None:
+    """
+    Publish updated transaction rows to their subscribers in this and
+    every other process. Never raises.
+    """
+    events = [to_event(row) for row in rows if row]
+    if not events:
+        return
+    try:
+        hub = _hub
+        if hub is not None:
+            hub.publish_threadsafe(events)
+        get_broker().send(events)
+    except Exception as e:
+        logger.warning("Could not publish %d transaction events: %s", len(events), e)
+
+
+def close_event_hub() -> None:
+    """Close the hub and remove this process's socket (server shutdown)."""
+    global _hub
+    if _hub is not None:
+        _hub.close()
+        _hub = None
+    if _broker is not None:
+        _broker.close()
+
+
+def reset_after_fork() -> None:
+    """
+    Forget the parent's hub and broker without closing them; the socket
+    file belongs to the parent.
+    """
+    global _hub, _broker, _lock
+    _hub = None
+    _broker = None
+    _lock = threading.Lock()
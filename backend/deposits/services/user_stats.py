@@ -0,0 +1,374 @@
+"""
+Per-User Stats.
+
+The dashboard's numbers (totals, per-category counts, streaks and a
+30-day sparkline) are kept as materialized counters, one ``user_stats``
+row per user, instead of being computed from the user's transactions on
+every page load. A read is one primary key lookup however long the
+user's history is.
+
+The table has:
+
+- user_id (UUID, PK, FK -> users.id)
+- stats (JSONB): the counters below
+- version (BIGINT, default 0): changed on every write, for optimistic
+  concurrency over PostgREST
+- updated_at (TIMESTAMP)
+
+Counters are updated incrementally by the data backends whenever
+transactions are inserted or updated (``record_inserts`` and
+``record_updates``): each transaction contributes to the counters
+according to its state, and a write applies the difference between the
+row's contribution before and after. Only completed transactions count
+towards items, points, CO2, weight, categories, days and streaks; every
+transaction counts towards ``deposits`` and its status.
+
+Streaks are only extended incrementally. A change that would shorten a
+streak (a completed deposit on the streak's last day failing later, or
+a deposit completed out of order) is corrected by the next bulk rebuild
+(``python manage.py rebuild_user_stats``), which recomputes every
+user's counters from their transactions. Bulk writes that bypass the
+backends' insert/update methods (``rescore_transactions``) need a
+rebuild as well.
+
+Counter updates stay off the request path: the write only computes
+each user's delta and merges it into ``StatsQueue``, whose background
+thread applies the merged deltas every ``USER_STATS_FLUSH_INTERVAL``
+seconds, one read-modify-write per user. A user's counters may lag
+their transactions by up to that interval.
+
+Counter updates are best effort: a failed update is logged and retried
+with the next flush, and never fails the transaction write. Deltas
+still failing at shutdown are lost until the next rebuild.
+"""
+
+import atexit
+import logging
+import threading
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from django.conf import settings
+
+from ..tracing import traced
+from .repositories import UserStatsRepository, get_repository
+from .supabase_client import SupabaseError
+
+
+logger = logging.getLogger(__name__)
+
+
+# Transaction columns the counters depend on
+STATS_COLUMNS = ("user_id", "status", "item_type", "points_earned", "co2_saved", "weight", "created_at")
+
+# Days of per-day buckets kept for the sparkline
+SPARKLINE_DAYS = 30
+
+def empty_stats() -> Dict[str, Any]:
+    return {
+        "deposits": 0,
+        "items_recycled": 0,
+        "total_points": 0,
+        "total_co2_saved": 0.0,
+        "total_weight": 0.0,
+        "statuses": {},
+        "categories": {},
+        # ISO day -> [items, points], last SPARKLINE_DAYS days only
+        "days": {},
+        "last_active_day": None,
+        "current_streak": 0,
+        "longest_streak": 0,
+    }
+
+
+def _day(created_at: Any) -> date:
+    if isinstance(created_at, str):
+        created_at = datetime.fromisoformat(created_at)
+    return created_at.astimezone(timezone.utc).date()
+
+
+def contribution(row: Optional[Dict[str, Any]]) -> Counter:
+    """
+    What one transaction adds to its user's counters, as a Counter keyed
+    by ``(kind, name)``.
+    """
+    delta: Counter = Counter()
+    if row is None:
+        return delta
+    delta[("total", "deposits")] += 1
+    delta[("status", row.get("status") or "pending")] += 1
+    if row.get("status") != "completed":
+        return delta
+
+    points = row.get("points_earned") or 0
+    delta[("total", "items_recycled")] += 1
+    delta[("total", "total_points")] += points
+    delta[("total", "total_co2_saved")] += row.get("co2_saved") or 0
+    delta[("total", "total_weight")] += row.get("weight") or 0
+    delta[("category", row.get("item_type") or "unknown")] += 1
+    day = _day(row["created_at"]).isoformat()
+    delta[("day_items", day)] += 1
+    delta[("day_points", day)] += points
+    return delta
+
+
+def _add(counts: Dict[str, Any], name: str, amount: float) -> None:
+    value = counts.get(name, 0) + amount
+    if value:
+        counts[name] = value
+    else:
+        counts.pop(name, None)
+
+
+def apply_delta(stats: Optional[Dict[str, Any]], delta: Counter,
+                today: Optional[date] = None) -> Dict[str, Any]:
+    """
+    Return ``stats`` (None for a user without counters yet) with
+    ``delta`` added, days outside the sparkline window dropped and the
+    streak extended by newly active days.
+    """
+    today = today or datetime.now(timezone.utc).date()
+    stats = {**empty_stats(), **(stats or {})}
+    stats["statuses"] = dict(stats["statuses"])
+    stats["categories"] = dict(stats["categories"])
+    oldest = (today - timedelta(days=SPARKLINE_DAYS - 1)).isoformat()
+    days = {day: list(bucket) for day, bucket in stats["days"].items() if day >= oldest}
+
+    active = set()
+    for (kind, name), amount in delta.items():
+        if not amount:
+            continue
+        if kind == "total":
+            stats[name] += amount
+        elif kind == "status":
+            _add(stats["statuses"], name, amount)
+        elif kind == "category":
+            _add(stats["categories"], name, amount)
+        elif kind == "day_items":
+            if amount > 0:
+                active.add(name)
+            if name >= oldest:
+                bucket = days.setdefault(name, [0, 0])
+                bucket[0] += amount
+        elif kind == "day_points" and name >= oldest:
+            bucket = days.setdefault(name, [0, 0])
+            bucket[1] += amount
+    stats["days"] = {day: bucket for day, bucket in sorted(days.items()) if bucket[0] > 0}
+
+    for day in sorted(active):
+        last = stats["last_active_day"]
+        if last is not None and day <= last:
+            continue
+        follows = last is not None and date.fromisoformat(day) - date.fromisoformat(last) == timedelta(days=1)
+        stats["current_streak"] = stats["current_streak"] + 1 if follows else 1
+        stats["last_active_day"] = day
+        stats["longest_streak"] = max(stats["longest_streak"], stats["current_streak"])
+    return stats
+
+
+def summarize(stats: Optional[Dict[str, Any]], today: Optional[date] = None) -> Dict[str, Any]:
+    """
+    The API view of a user's counters: totals, breakdowns, streaks as of
+    ``today`` and one sparkline bucket per day of the window, oldest first.
+    """
+    today = today or datetime.now(timezone.utc).date()
+    stats = {**empty_stats(), **(stats or {})}
+    last = stats["last_active_day"]
+    # A streak is still current on the day after its last active day
+    current = stats["current_streak"] if last and last >= (today - timedelta(days=1)).isoformat() else 0
+
+    sparkline = []
+    for offset in range(SPARKLINE_DAYS - 1, -1, -1):
+        day = (today - timedelta(days=offset)).isoformat()
+        items, points = stats["days"].get(day, (0, 0))
+        sparkline.append({"day": day, "items": items, "points": points})
+
+    return {
+        "deposits": stats["deposits"],
+        "items_recycled": stats["items_recycled"],
+        "total_points": stats["total_points"],
+        "total_co2_saved": round(stats["total_co2_saved"], 3),
+        "total_weight": round(stats["total_weight"], 3),
+        "statuses": stats["statuses"],
+        "categories": dict(sorted(stats["categories"].items(), key=lambda item: -item[1])),
+        "current_streak": current,
+        "longest_streak": stats["longest_streak"],
+        "last_active_day": last,
+        "sparkline": sparkline,
+    }
+
+
+def changes_to_deltas(
+    changes: Iterable[Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]],
+) -> Dict[str, Counter]:
+    """
+    Net counter delta per user of ``(before, after)`` row changes; users
+    whose counters do not change are left out.
+    """
+    deltas: Dict[str, Counter] = defaultdict(Counter)
+    for before, after in changes:
+        for row, sign in ((after, 1), (before, -1)):
+            if row is None or row.get("user_id") is None:
+                continue
+            delta = deltas[str(row["user_id"])]
+            for key, amount in contribution(row).items():
+                delta[key] += sign * amount
+    return {user_id: delta for user_id, delta in deltas.items() if any(delta.values())}
+
+
+def _merge(pending: Dict[str, Counter], deltas: Dict[str, Counter]) -> None:
+    for user_id, delta in deltas.items():
+        current = pending.get(user_id)
+        if current is None:
+            pending[user_id] = Counter(delta)
+        else:
+            for key, amount in delta.items():
+                current[key] += amount
+
+
+class StatsQueue:
+    """
+    Counter deltas merged per user, applied periodically from a
+    background thread.
+
+    Deltas add up, so any number of writes for a user between two
+    flushes cost one counter update.
+
+    Args:
+        interval: Seconds between flushes
+        name: Thread name, for debugging
+    """
+
+    def __init__(self, interval: float, name: str = 'user-stats'):
+        self.interval = interval
+        self._pending: Dict[str, Counter] = {}
+        self._closed = False
+        self._cond = threading.Condition()
+
+        self.flushes = 0
+        self.written = 0
+        self.failed = 0
+
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def add(self, deltas: Dict[str, Counter]) -> None:
+        """Merge per-user deltas into the pending ones."""
+        if not deltas:
+            return
+        with self._cond:
+            _merge(self._pending, deltas)
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if not self._closed:
+                    self._cond.wait(self.interval)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+
+    def flush(self) -> int:
+        """
+        Apply the pending deltas; returns the number of users updated.
+
+        A user whose update fails keeps the delta pending for the next
+        flush, merged with anything recorded since.
+        """
+        with self._cond:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        repository = get_repository(UserStatsRepository)
+        failed: Dict[str, Counter] = {}
+        for user_id, delta in pending.items():
+            if not any(delta.values()):
+                continue
+            try:
+                repository.update_user_stats(user_id, lambda stats, delta=delta: apply_delta(stats, delta))
+            except SupabaseError as e:
+                logger.warning("Could not update stats of user %s: %s", user_id, e)
+                failed[user_id] = delta
+        if failed:
+            with self._cond:
+                _merge(self._pending, failed)
+
+        updated = len(pending) - len(failed)
+        self.flushes += 1
+        self.written += updated
+        self.failed += len(failed)
+        return updated
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Stop the flush thread after one final flush."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout)
+        if self.pending():
+            logger.error("Dropped stats deltas of %d users on shutdown", self.pending())
+
+
+_queue: Optional[StatsQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_stats_queue() -> StatsQueue:
+    """Get the process-wide stats queue, creating it on first use."""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = StatsQueue(settings.USER_STATS_FLUSH_INTERVAL)
+                atexit.register(_queue.close)
+    return _queue
+
+
+def reset_after_fork() -> None:
+    """Forget the parent's queue; its flush thread does not survive fork."""
+    global _queue, _queue_lock
+    _queue = None
+    _queue_lock = threading.Lock()
+
+
+def _record(changes: Iterable[Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]]) -> None:
+    if not settings.USER_STATS_ENABLED:
+        return
+    deltas = changes_to_deltas(changes)
+    if deltas:
+        get_stats_queue().add(deltas)
+
+
+@traced("user_stats.record_inserts")
+def record_inserts(rows: Iterable[Dict[str, Any]]) -> None:
+    """Count newly inserted transactions."""
+    _record((None, row) for row in rows)
+
+
+@traced("user_stats.record_updates")
+def record_updates(changes: Iterable[Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]]) -> None:
+    """Apply transaction updates, given as ``(before, after)`` rows."""
+    _record(changes)
+
+
+def build_all(rows: Iterable[Dict[str, Any]], today: Optional[date] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Compute every user's counters from their full transaction history.
+
+    Starting from empty counters every active day is new and applied in
+    order, so unlike the incremental path the streaks are exact.
+    """
+    deltas: Dict[str, Counter] = defaultdict(Counter)
+    for row in rows:
+        if row.get("user_id") is not None:
+            deltas[str(row["user_id"])].update(contribution(row))
+    return {user_id: apply_delta(None, delta, today) for user_id, delta in deltas.items()}
@@ -0,0 +1,246 @@
+"""
+Write-Behind Buffer for Transaction Inserts.
+
+During collection drives hundreds of deposits can arrive per second, and
+each one used to make its own PostgREST insert. With
+``TRANSACTION_WRITE_BUFFER_ENABLED`` rows from all requests in a worker
+are accumulated here and written as one array insert when
+``TRANSACTION_WRITE_BUFFER_MAX_BATCH`` rows are waiting or the oldest row
+has waited ``TRANSACTION_WRITE_BUFFER_MAX_DELAY_MS``. Each request blocks
+on a future that resolves to its own inserted row. Batches are written
+through the configured data backend (see ``data_backend``).
+
+Rows are never dropped on shutdown: ``close()`` (registered with
+``atexit``) stops accepting rows and flushes everything still pending.
+"""
+
+import atexit
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class BufferClosedError(Exception):
+    """Raised when submitting to a buffer that is shutting down."""
+    pass
+
+
+class WriteBuffer:
+    """
+    Accumulates rows and flushes them in batches from a background thread.
+
+    Args:
+        flush_fn: Called with a list of rows; returns the written rows.
+            Each returned row must carry the ``id`` of its input row.
+        max_batch: Flush as soon as this many rows are pending
+        max_delay: Flush when the oldest pending row is this old (seconds)
+        name: Thread name, for debugging
+    """
+
+    def __init__(self, flush_fn: Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]],
+                 max_batch: int, max_delay: float, name: str = 'write-buffer'):
+        self.flush_fn = flush_fn
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+
+        # (row, future, enqueue time), oldest first
+        self._pending: List[Tuple[Dict[str, Any], Future, float]] = []
+        self._closed = False
+        self._cond = threading.Condition()
+
+        self.batches = 0
+        self.rows = 0
+
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, row: Dict[str, Any]) -> Future:
+        """
+        Queue a row for insertion.
+
+        Returns:
+            A future resolving to the inserted row
+
+        Raises:
+            BufferClosedError: If the buffer is shutting down
+        """
+        future: Future = Future()
+        with self._cond:
+            if self._closed:
+                raise BufferClosedError("Write buffer is closed")
+            self._pending.append((row, future, time.monotonic()))
+            # Wake the flush thread to start the delay timer for a new
+            # batch, or to flush a full one
+            if len(self._pending) == 1 or len(self._pending) >= self.max_batch:
+                self._cond.notify()
+        return future
+
+    def withdraw(self, future: Future) -> bool:
+        """
+        Remove a row that is still waiting to be written.
+
+        Returns:
+            True if the row was withdrawn and will never be written;
+            False if it is already part of a batch being written
+        """
+        with self._cond:
+            for index, (_, pending, _) in enumerate(self._pending):
+                if pending is future:
+                    del self._pending[index]
+                    future.cancel()
+                    return True
+        return False
+
+    def _take_batch(self) -> List[Tuple[Dict[str, Any], Future]]:
+        batch = [(row, future) for row, future, _ in self._pending[:self.max_batch]]
+        del self._pending[:self.max_batch]
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed and not self._pending:
+                        return
+                    if len(self._pending) >= self.max_batch or (self._closed and self._pending):
+                        break
+                    if not self._pending:
+                        self._cond.wait()
+                        continue
+                    # Rows left over from a full batch keep their own age
+                    remaining = self._pending[0][2] + self.max_delay - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._take_batch()
+            self._write(batch)
+
+    def _write(self, batch: List[Tuple[Dict[str, Any], Future]]) -> None:
+        rows = [row for row, _ in batch]
+        try:
+            written = self.flush_fn(rows)
+        except Exception as e:
+            logger.error("Write buffer flush of %d rows failed: %s", len(rows), e)
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        by_id = {str(row['id']): row for row in written}
+        for row, future in batch:
+            result = by_id.get(str(row['id']))
+            if result is None:
+                future.set_exception(KeyError(f"Row {row['id']} missing from insert response"))
+            else:
+                future.set_result(result)
+
+        self.batches += 1
+        self.rows += len(rows)
+        logger.debug("Flushed %d rows", len(rows))
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """
+        Stop accepting rows and flush everything still pending.
+
+        Blocks until the flush thread has drained the buffer.
+        """
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.error("Write buffer did not drain within %ss", timeout)
+        else:
+            logger.info("Write buffer drained: %d rows in %d batches", self.rows, self.batches)
+
+
+_buffer: Optional[WriteBuffer] = None
+_buffer_lock = threading.Lock()
+
+
+def get_write_buffer() -> WriteBuffer:
+    """Get the process-wide transaction write buffer, creating it on first use."""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                from .data_backend import get_data_backend
+
+                _buffer = WriteBuffer(
+                    flush_fn=get_data_backend().insert_transactions,
+                    max_batch=settings.TRANSACTION_WRITE_BUFFER_MAX_BATCH,
+                    max_delay=settings.TRANSACTION_WRITE_BUFFER_MAX_DELAY_MS / 1000,
+                    name='transaction-write-buffer',
+                )
+                atexit.register(_buffer.close)
+    return _buffer
+
+
+def insert_buffered(row: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Insert a transaction row through the write-behind buffer.
+
+    The ID is assigned here so the caller's row can be matched in the
+    batched response regardless of row order. Blocks until the batch
+    containing the row has been written.
+
+    A row still queued after ``TRANSACTION_WRITE_BUFFER_RESULT_TIMEOUT``
+    is withdrawn and the insert fails, so a row is never written after
+    its caller reported failure (and e.g. deleted the image). A row
+    already in a batch being written is waited for instead.
+
+    Raises:
+        SupabaseError: If the insert fails
+    """
+    from .data_backend import get_data_backend
+    from .supabase_client import SupabaseError
+
+    row["id"] = str(uuid.uuid4())
+    # Bulk inserts need identical keys on every row
+    row.setdefault("detected_confidence", None)
+    buffer = get_write_buffer()
+    try:
+        future = buffer.submit(row)
+    except BufferClosedError:
+        # Shutting down: write this row directly instead
+        return get_data_backend().insert_transactions([row])[0]
+
+    try:
+        try:
+            return future.result(timeout=settings.TRANSACTION_WRITE_BUFFER_RESULT_TIMEOUT)
+        except FutureTimeoutError:
+            if buffer.withdraw(future):
+                raise SupabaseError("Transaction insert timed out in the write buffer")
+            logger.warning("Buffered insert of %s is still being written; waiting for it", row["id"])
+            return future.result()
+    except SupabaseError:
+        raise
+    except Exception as e:
+        logger.error("Buffered transaction insert failed: %s", e)
+        raise SupabaseError(f"Failed to insert transaction: {str(e)}")
+
+
+def drain_write_buffer(timeout: Optional[float] = None) -> None:
+    """
+    Flush and close the write buffer, if one was created.
+
+    Also usable as (part of) a gunicorn ``worker_exit`` hook.
+    """
+    if _buffer is not None:
+        _buffer.close(timeout)
+
+
+def reset_after_fork() -> None:
+    """Forget the parent's buffer; its flush thread does not survive fork."""
+    global _buffer, _buffer_lock
+    _buffer = None
+    _buffer_lock = threading.Lock()
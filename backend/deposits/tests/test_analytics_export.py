@@ -0,0 +1,178 @@
+import fcntl
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+import pyarrow as pa
+from django.test import SimpleTestCase
+
+from deposits.services.analytics_export import (
+    MANIFEST, NULL_PARTITION, AnalyticsExporter, AnalyticsExportError, _to_datetime, infer_schema,
+    read_table,
+)
+from deposits.services.supabase_client import SupabaseError
+
+
+START = datetime(2026, 10, 17, 22, 0, tzinfo=timezone.utc)
+
+
+def at(minutes):
+    return (START + timedelta(minutes=minutes)).isoformat()
+
+
+class FakeRepository:
+    """Keyset-paginated reads of in-memory tables, like PostgREST returns them."""
+
+    def __init__(self):
+        self.tables = {"transactions": {}, "bins": {}, "users": {}}
+        self.reads = []
+        self.fail_after = None
+
+    def save(self, table, row_id, updated, **values):
+        row = self.tables[table].setdefault(row_id, {"id": row_id})
+        row.update(values, updated_at=at(updated))
+
+    def fetch_changed_rows(self, table, after, limit):
+        self.reads.append((table, after, limit))
+        if self.fail_after is not None and len(self.reads) > self.fail_after:
+            raise SupabaseError("connection reset")
+        key = lambda row: (_to_datetime(row["updated_at"]), row["id"])  # noqa: E731
+        rows = sorted(self.tables[table].values(), key=key)
+        if after is not None:
+            rows = [row for row in rows if key(row) > (_to_datetime(after[0]), after[1])]
+        return [dict(row) for row in rows[:limit]]
+
+
+class AnalyticsExporterTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.repository = FakeRepository()
+        self.exporter = AnalyticsExporter(self.directory, self.repository, page_size=2, overlap=60)
+        for number in range(5):
+            # Created either side of midnight UTC
+            self.repository.save("transactions", f"t{number}", number, user_id="u1", points_earned=10,
+                                 created_at=at(number * 60), status="completed")
+
+    def rows(self, table="transactions"):
+        exported = read_table(self.directory, table).to_pylist()
+        return {row["id"]: row for row in exported}
+
+    def test_first_export_partitions_by_day(self):
+        result = self.exporter.export("transactions")
+        self.assertEqual((result["rows"], result["partitions"]), (5, 2))
+        self.assertEqual(result["watermark"], [_to_datetime(at(4)).isoformat(), "t4"])
+        self.assertEqual(sorted(os.listdir(os.path.join(self.directory, "transactions"))),
+                         ["date=2026-10-17", "date=2026-10-18"])
+        rows = self.rows()
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows["t0"]["created_at"], START)
+        self.assertEqual(rows["t3"]["points_earned"], 10)
+
+    def test_incremental_run_replaces_changed_rows(self):
+        self.exporter.export("transactions")
+        self.repository.save("transactions", "t1", 120, status="failed", points_earned=0)
+        self.repository.save("transactions", "t9", 121, user_id="u2", points_earned=5,
+                             created_at=at(121), status="pending")
+        self.repository.reads.clear()
+
+        result = self.exporter.export("transactions")
+        # Starts one overlap (60s) before the watermark, not from the beginning
+        since = _to_datetime(at(4)) - timedelta(seconds=60)
+        self.assertEqual(self.repository.reads[0][1][0], since.isoformat())
+        # t3 and t4 again (inside the overlap), then the changed t1 and new t9
+        self.assertEqual(result["rows"], 4)
+        rows = self.rows()
+        self.assertEqual(len(rows), 6)
+        self.assertEqual((rows["t1"]["status"], rows["t1"]["points_earned"]), ("failed", 0))
+
+        # Nothing new: the overlap is read again and merges without duplicates
+        self.exporter.export("transactions")
+        self.assertEqual(len(read_table(self.directory, "transactions")), 6)
+
+    def test_late_commit_inside_the_overlap_is_picked_up(self):
+        self.exporter.export("transactions")
+        # Committed after the run, stamped before its watermark
+        self.repository.save("transactions", "t-late", 3.5, created_at=at(3.5), status="completed")
+        self.exporter.export("transactions")
+        self.assertIn("t-late", self.rows())
+
+    def test_small_buffer_merges_in_several_passes(self):
+        exporter = AnalyticsExporter(self.directory, self.repository, page_size=1, buffer_rows=2)
+        self.repository.save("transactions", "t2", 10, status="failed")
+        self.assertEqual(exporter.export("transactions")["rows"], 5)
+        rows = self.rows()
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows["t2"]["status"], "failed")
+
+    def test_schema_changes_rewrite_existing_files(self):
+        self.exporter.export("transactions")
+        self.repository.save("transactions", "t7", 200, created_at=at(200), points_earned=2.5,
+                             metadata={"source": "kiosk"})
+        self.exporter.export("transactions")
+
+        table = read_table(self.directory, "transactions")
+        self.assertEqual(table.schema.field("points_earned").type, pa.float64())
+        self.assertEqual(table.schema.field("metadata").type, pa.string())
+        rows = {row["id"]: row for row in table.to_pylist()}
+        self.assertEqual((rows["t0"]["points_earned"], rows["t0"]["metadata"]), (10.0, None))
+        self.assertEqual(rows["t7"]["metadata"], '{"source":"kiosk"}')
+
+    def test_interrupted_run_keeps_the_watermark(self):
+        self.exporter.export("transactions")
+        with open(os.path.join(self.directory, MANIFEST), "rb") as f:
+            manifest = f.read()
+        self.repository.save("transactions", "t8", 100, created_at=at(100))
+        self.repository.save("transactions", "t9", 101, created_at=at(101))
+        self.repository.reads.clear()
+        self.repository.fail_after = 1
+        with self.assertRaises(SupabaseError):
+            self.exporter.export("transactions")
+        with open(os.path.join(self.directory, MANIFEST), "rb") as f:
+            self.assertEqual(f.read(), manifest)
+
+        self.repository.fail_after = None
+        self.exporter.export("transactions")
+        self.assertEqual(len(self.rows()), 7)
+
+    def test_full_export_drops_deleted_rows(self):
+        self.exporter.export("transactions")
+        del self.repository.tables["transactions"]["t2"]
+        self.repository.save("transactions", "t-null", 50, created_at=None)
+        result = self.exporter.export("transactions", full=True)
+        self.assertEqual(result["rows"], 5)
+        self.assertEqual(sorted(self.rows()), ["t-null", "t0", "t1", "t3", "t4"])
+        self.assertIn(f"date={NULL_PARTITION}", os.listdir(os.path.join(self.directory, "transactions")))
+        self.assertEqual([name for name in os.listdir(self.directory) if name.endswith((".tmp", ".old"))], [])
+
+    def test_one_export_at_a_time(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, ".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            with self.assertRaisesMessage(AnalyticsExportError, "Another export"):
+                self.exporter.export("transactions")
+        with self.assertRaisesMessage(AnalyticsExportError, "Unknown table"):
+            self.exporter.export("sessions")
+        with self.assertRaises(AnalyticsExportError):
+            read_table(self.directory, "bins")
+
+
+class InferSchemaTests(SimpleTestCase):
+    def test_types(self):
+        schema = infer_schema([
+            {"id": "a", "n": 1, "ts": "2026-10-18T08:00:00+00:00", "day": "2026-10-18", "ok": True,
+             "tags": [1, 2], "empty": None},
+            {"id": "b", "n": 2.5, "ts": "2026-10-18 09:00:00Z", "day": None, "ok": False,
+             "tags": [1.5], "empty": None},
+        ])
+        self.assertEqual(dict(zip(schema.names, schema.types)), {
+            "id": pa.string(), "n": pa.float64(), "ts": pa.timestamp("us", tz="UTC"), "day": pa.date32(),
+            "ok": pa.bool_(), "tags": pa.list_(pa.float64()), "empty": pa.null(),
+        })
+
+    def test_existing_columns_keep_their_position_and_widen(self):
+        schema = infer_schema([{"id": "a", "n": 1}])
+        widened = infer_schema([{"extra": 1, "n": "many", "id": "b"}], schema)
+        self.assertEqual(widened.names, ["id", "n", "extra"])
+        self.assertEqual(widened.field("n").type, pa.string())
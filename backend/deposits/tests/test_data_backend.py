@@ -0,0 +1,30 @@
+from django.test import SimpleTestCase
+
+from deposits.services.data_backend import align_rows, build_transaction_row
+
+
+class BuildTransactionRowTests(SimpleTestCase):
+    def test_optional_columns_left_out_when_unset(self):
+        row = build_transaction_row("u1", "deposits/a.png")
+        self.assertNotIn("near_duplicate", row)
+        self.assertNotIn("detected_confidence", row)
+        self.assertEqual(row["status"], "pending")
+
+    def test_near_duplicate_included_when_matched(self):
+        match = {"object_key": "deposits/b.png", "distance": 3}
+        row = build_transaction_row("u1", "deposits/a.png", near_duplicate=match)
+        self.assertEqual(row["near_duplicate"], match)
+
+
+class AlignRowsTests(SimpleTestCase):
+    def test_uniform_rows_returned_as_is(self):
+        rows = [build_transaction_row("u1", "a"), build_transaction_row("u2", "b")]
+        self.assertIs(align_rows(rows), rows)
+
+    def test_missing_columns_filled_with_none(self):
+        match = {"object_key": "a", "distance": 1}
+        rows = [build_transaction_row("u1", "a"), build_transaction_row("u2", "b", near_duplicate=match)]
+        aligned = align_rows(rows)
+        self.assertEqual([list(row) for row in aligned], [list(aligned[0])] * 2)
+        self.assertIsNone(aligned[0]["near_duplicate"])
+        self.assertEqual(aligned[1]["near_duplicate"], match)
@@ -0,0 +1,132 @@
+import os
+import tempfile
+import uuid
+from datetime import date, timedelta
+
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+
+from deposits.services.fill_history import RECORD, FillHistoryStore, downsample, segment_name
+
+
+BIN_A = str(uuid.uuid4())
+BIN_B = str(uuid.uuid4())
+
+TODAY = date(2026, 10, 19)
+
+
+def day_start(day):
+    return (day - date(1970, 1, 1)).days * 86400.0
+
+
+def days_ago(days, hours=0.0):
+    return day_start(TODAY - timedelta(days=days)) + hours * 3600
+
+
+@override_settings(BIN_FILL_HISTORY_RAW_DAYS=7, BIN_FILL_HISTORY_DOWNSAMPLE_SECONDS=3600,
+                   BIN_FILL_HISTORY_RETENTION_DAYS=30)
+class FillHistoryStoreTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.store = FillHistoryStore(directory.name)
+
+    def series(self, bin_id, start, end, **kwargs):
+        ts, fill = self.store.query(bin_id, start, end, **kwargs)
+        return list(zip(ts.tolist(), fill.tolist()))
+
+    def test_append_splits_readings_by_day(self):
+        written = self.store.append([
+            (BIN_A, days_ago(3, 23), 30.0),
+            (BIN_B, days_ago(3, 1), 5.0),
+            (BIN_A, days_ago(2, 1), 40.0),
+            (BIN_A, days_ago(3, 2), 20.0),
+        ])
+        self.assertEqual(written, 4)
+        self.assertEqual(self.store.days(), [TODAY - timedelta(days=3), TODAY - timedelta(days=2)])
+        # End is exclusive and other bins are left out
+        self.assertEqual(self.series(BIN_A, days_ago(3), days_ago(2, 1)),
+                         [(days_ago(3, 2), 20.0), (days_ago(3, 23), 30.0)])
+        self.assertEqual(self.series(BIN_B, days_ago(10), days_ago(0)), [(days_ago(3, 1), 5.0)])
+
+    def test_out_of_order_appends_are_read_in_time_order(self):
+        self.store.append([(BIN_A, days_ago(1, 5), 50.0)])
+        self.store.append([(BIN_A, days_ago(1, 2), 20.0)])
+        self.assertEqual([ts for ts, _ in self.series(BIN_A, days_ago(1), days_ago(0))],
+                         [days_ago(1, 2), days_ago(1, 5)])
+
+    def test_record_being_written_is_ignored(self):
+        self.store.append([(BIN_A, days_ago(1, 1), 10.0)])
+        with open(os.path.join(self.store.path, segment_name(days_ago(1))), 'ab') as f:
+            f.write(RECORD.pack(uuid.UUID(BIN_A).bytes, days_ago(1, 2), 20.0)[:10])
+        self.assertEqual(self.series(BIN_A, days_ago(1), days_ago(0)), [(days_ago(1, 1), 10.0)])
+
+    def test_compaction_keeps_every_reading_and_merges_late_ones(self):
+        readings = [(bin_id, days_ago(3, hour), float(hour))
+                    for hour in range(0, 24, 3) for bin_id in (BIN_A, BIN_B)]
+        self.store.append(readings)
+        before = self.series(BIN_A, days_ago(4), days_ago(0))
+        result = self.store.compact(today=TODAY)
+        self.assertEqual(result, {"compacted": 1, "downsampled": 0, "deleted": 0})
+        self.assertFalse(os.path.exists(os.path.join(self.store.path, segment_name(days_ago(3)))))
+        self.assertEqual(self.series(BIN_A, days_ago(4), days_ago(0)), before)
+
+        # A late reading lands in a new raw segment, is read with the columns, then merged
+        self.store.append([(BIN_A, days_ago(3, 1.5), 99.0)])
+        merged = sorted(before + [(days_ago(3, 1.5), 99.0)])
+        self.assertEqual(self.series(BIN_A, days_ago(4), days_ago(0)), merged)
+        self.assertEqual(self.store.compact(today=TODAY)["compacted"], 1)
+        self.assertEqual(self.series(BIN_A, days_ago(4), days_ago(0)), merged)
+        self.assertEqual(len(self.series(BIN_B, days_ago(4), days_ago(0))), 8)
+
+    def test_recent_days_are_not_compacted(self):
+        self.store.append([(BIN_A, days_ago(1, 1), 10.0), (BIN_A, days_ago(0, 1), 10.0)])
+        self.assertEqual(self.store.compact(today=TODAY), {"compacted": 0, "downsampled": 0, "deleted": 0})
+
+    def test_old_days_are_downsampled_then_deleted(self):
+        minutes = [days_ago(10, minute / 60) for minute in range(0, 120, 10)]
+        self.store.append([(BIN_A, ts, float(i)) for i, ts in enumerate(minutes)])
+        self.store.append([(BIN_A, days_ago(40, 1), 10.0)])
+        result = self.store.compact(today=TODAY)
+        self.assertEqual(result, {"compacted": 1, "downsampled": 1, "deleted": 1})
+        # The last reading of each hour
+        self.assertEqual(self.series(BIN_A, days_ago(50), days_ago(0)),
+                         [(days_ago(10, 0), 5.0), (days_ago(10, 1), 11.0)])
+        self.assertEqual(self.store.days(), [TODAY - timedelta(days=10)])
+        # Already at the configured step, so nothing to do
+        self.assertEqual(self.store.compact(today=TODAY), {"compacted": 0, "downsampled": 0, "deleted": 0})
+
+    def test_query_downsamples(self):
+        self.store.append([(BIN_A, days_ago(1, hour / 4), float(hour)) for hour in range(8)])
+        ts, fill = self.store.query(BIN_A, days_ago(1), days_ago(0), step=3600, agg='max')
+        self.assertEqual(list(zip(ts.tolist(), fill.tolist())), [(days_ago(1, 0), 3.0), (days_ago(1, 1), 7.0)])
+
+    def test_fill_rate_starts_after_the_last_emptying(self):
+        now = days_ago(0, 12)
+        readings = [(BIN_A, days_ago(1, hour), 60.0 + hour) for hour in range(6)]
+        readings += [(BIN_A, days_ago(1, 6 + hour), 2.0 * hour) for hour in range(6)]
+        readings += [(BIN_B, days_ago(1, 1), 10.0)]
+        self.store.append(readings)
+        self.assertAlmostEqual(self.store.fill_rate(BIN_A, now), 2.0, places=4)
+        self.assertIsNone(self.store.fill_rate(BIN_B, now))
+
+        # The batch form reads each day once and agrees, before and after compaction
+        rates = self.store.fill_rates([BIN_A, BIN_B, str(uuid.uuid4())], now)
+        self.assertEqual(list(rates), [BIN_A])
+        self.assertAlmostEqual(rates[BIN_A], 2.0, places=4)
+        self.store.compact(today=TODAY + timedelta(days=1))
+        self.assertAlmostEqual(self.store.fill_rates([BIN_A], now)[BIN_A], 2.0, places=4)
+        self.assertAlmostEqual(self.store.fill_rate(BIN_A, now), 2.0, places=4)
+
+
+class DownsampleTests(SimpleTestCase):
+    def test_aggregates(self):
+        ts = np.array([0.0, 10.0, 20.0, 60.0, 70.0])
+        fill = np.array([1.0, 5.0, 3.0, 8.0, 2.0], dtype=np.float32)
+        expected = {'mean': [3.0, 5.0], 'min': [1.0, 2.0], 'max': [5.0, 8.0], 'last': [3.0, 2.0]}
+        for agg, levels in expected.items():
+            buckets, values = downsample(ts, fill, 60, agg)
+            self.assertEqual(buckets.tolist(), [0.0, 60.0])
+            self.assertEqual(values.tolist(), levels, agg)
+        with self.assertRaises(ValueError):
+            downsample(ts, fill, 60, 'median')
@@ -0,0 +1,189 @@
+import io
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+from PIL import Image
+
+from deposits.services import image_cache
+from deposits.services.image_cache import ByteLRU, DiskTier, ImageCache
+from deposits.services.r2_upload import R2ObjectNotFound
+
+
+def jpeg(size=(400, 300)):
+    out = io.BytesIO()
+    Image.new('RGB', size, (200, 30, 30)).save(out, 'JPEG')
+    return out.getvalue()
+
+
+class FakeR2:
+    """Object store whose fetches can be held until released."""
+
+    def __init__(self, objects):
+        self.objects = objects
+        self.calls = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, object_key):
+        self.calls.append(object_key)
+        self.started.set()
+        self.release.wait(5)
+        if object_key not in self.objects:
+            raise R2ObjectNotFound(object_key)
+        return self.objects[object_key]
+
+
+class ByteLRUTests(SimpleTestCase):
+    def test_evicts_least_recently_used_by_bytes(self):
+        lru = ByteLRU(10)
+        lru.put("a", b"aaaa")
+        lru.put("b", b"bbbb")
+        lru.get("a")
+        self.assertEqual(lru.put("c", b"cccc"), 1)
+        self.assertEqual((lru.get("a"), lru.get("b"), lru.get("c")), (b"aaaa", None, b"cccc"))
+        self.assertEqual(lru.size, 8)
+
+    def test_oversized_and_replaced_values(self):
+        lru = ByteLRU(10)
+        self.assertEqual(lru.put("big", b"x" * 11), 0)
+        self.assertIsNone(lru.get("big"))
+        lru.put("a", b"aaaa")
+        lru.put("a", b"aa")
+        self.assertEqual((len(lru), lru.size), (1, 2))
+
+
+class DiskTierTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def read(self, tier, object_key):
+        cached = tier.open(object_key)
+        if cached is None:
+            return None
+        f, size = cached
+        with f:
+            data = f.read()
+        self.assertEqual(len(data), size)
+        return data
+
+    def test_put_open_and_lru_eviction(self):
+        tier = DiskTier(self.directory, 10)
+        tier.put("deposits/a.jpg", b"aaaa")
+        tier.put("deposits/b.jpg", b"bbbb")
+        self.read(tier, "deposits/a.jpg")
+        self.assertEqual(tier.put("deposits/c.jpg", b"cccc"), 1)
+        self.assertIsNone(self.read(tier, "deposits/b.jpg"))
+        self.assertEqual(self.read(tier, "deposits/a.jpg"), b"aaaa")
+        self.assertEqual((len(tier), tier.size), (2, 8))
+        self.assertEqual(tier.put("deposits/big.jpg", b"x" * 11), 0)
+        self.assertIsNone(self.read(tier, "deposits/big.jpg"))
+
+    def test_workers_share_the_directory(self):
+        first = DiskTier(self.directory, 10)
+        second = DiskTier(self.directory, 10)
+        first.put("a", b"aaaa")
+        first.put("b", b"bbbb")
+        self.assertEqual(self.read(second, "a"), b"aaaa")
+
+        # The second worker does not know about b until it overflows and rescans
+        second.put("c", b"cccc")
+        self.assertEqual(second.size, 8)
+        second.put("d", b"dddd")
+        self.assertEqual(second.size, 8)
+
+        # b was never used and a was last used before c and d were written
+        self.assertEqual([self.read(first, key) for key in "abcd"], [None, None, b"cccc", b"dddd"])
+        self.assertEqual(first.size, 8)
+
+    def test_rescan_skips_temporary_files(self):
+        tier = DiskTier(self.directory, 100)
+        tier.put("a", b"aaaa")
+        with open(tier.path("a") + ".123.456.tmp", 'wb') as f:
+            f.write(b"partial")
+        rescanned = DiskTier(self.directory, 100)
+        self.assertEqual((len(rescanned), rescanned.size), (1, 4))
+
+
+class ImageCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.image = jpeg()
+        self.r2 = FakeR2({"deposits/a.jpg": self.image, "deposits/big.jpg": b"x" * 4096})
+        patcher = mock.patch.object(image_cache, "get_object_bytes", self.r2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache = ImageCache(directory.name, disk_bytes=len(self.image) + 100,
+                                memory_bytes=1024 * 1024, thumbnail_size=64)
+
+    def open(self, object_key):
+        f, size = self.cache.open(object_key)
+        with f:
+            return f.read()
+
+    def test_read_through_disk_tier(self):
+        self.assertEqual(self.open("deposits/a.jpg"), self.image)
+        self.assertEqual(self.open("deposits/a.jpg"), self.image)
+        self.assertEqual(self.r2.calls, ["deposits/a.jpg"])
+        stats = self.cache.stats()
+        self.assertEqual((stats["disk_hits"], stats["disk_misses"], stats["r2_bytes"]),
+                         (1, 1, len(self.image)))
+        self.assertEqual(stats["disk_hit_rate"], 0.5)
+
+    def test_object_too_large_for_disk_is_served_from_memory(self):
+        f, size = self.cache.open("deposits/big.jpg")
+        self.assertIsInstance(f, io.BytesIO)
+        self.assertEqual(size, 4096)
+        with self.cache.read("deposits/big.jpg") as mapped:
+            self.assertEqual(mapped[:], b"x" * 4096)
+        self.assertEqual(len(self.r2.calls), 2)
+
+    def test_concurrent_misses_share_one_fetch(self):
+        self.r2.release.clear()
+        results = []
+
+        def reader():
+            results.append(self.open("deposits/a.jpg"))
+
+        threads = [threading.Thread(target=reader) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        self.assertTrue(self.r2.started.wait(5))
+        # Let the other readers reach the in-flight fetch before it finishes
+        time.sleep(0.05)
+        self.r2.release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(results, [self.image] * 8)
+        self.assertEqual(self.r2.calls, ["deposits/a.jpg"])
+        self.assertEqual(self.cache.stats()["disk_hits"], 7)
+        self.assertEqual(self.cache._inflight, {})
+
+    def test_failed_fetch_is_not_shared(self):
+        with self.assertRaises(R2ObjectNotFound):
+            self.cache.open("deposits/missing.jpg")
+        self.assertEqual(self.cache._inflight, {})
+        # The next reader fetches again instead of waiting forever
+        with self.assertRaises(R2ObjectNotFound):
+            self.cache.open("deposits/missing.jpg")
+        self.assertEqual(len(self.r2.calls), 2)
+
+    def test_read_maps_the_cached_file(self):
+        with self.cache.read("deposits/a.jpg") as mapped:
+            self.assertEqual(mapped[:], self.image)
+
+    def test_thumbnail_memory_tier(self):
+        thumbnail = self.cache.thumbnail("deposits/a.jpg")
+        with Image.open(io.BytesIO(thumbnail)) as image:
+            self.assertEqual((image.format, max(image.size)), ("JPEG", 64))
+        self.assertIs(self.cache.thumbnail("deposits/a.jpg"), thumbnail)
+        stats = self.cache.stats()
+        self.assertEqual((stats["memory_hits"], stats["memory_misses"], stats["memory_entries"]), (1, 1, 1))
+        self.assertEqual(self.r2.calls, ["deposits/a.jpg"])
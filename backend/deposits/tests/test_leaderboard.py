@@ -0,0 +1,125 @@
+import random
+from datetime import date, datetime, timezone
+
+from django.test import SimpleTestCase
+
+from deposits.services import leaderboard
+from deposits.services.leaderboard import IndexableSkipList, Leaderboard, LeaderboardService
+
+
+class IndexableSkipListTests(SimpleTestCase):
+    def test_matches_sorted_list(self):
+        rng = random.Random(7)
+        skiplist = IndexableSkipList()
+        expected = []
+        for _ in range(2000):
+            key = rng.randrange(500)
+            if key in expected and rng.random() < 0.5:
+                skiplist.remove(key)
+                expected.remove(key)
+            else:
+                skiplist.insert(key)
+                expected.append(key)
+                expected.sort()
+        self.assertEqual(len(skiplist), len(expected))
+        self.assertEqual(list(skiplist.islice(0, len(skiplist))), expected)
+        for index in range(0, len(expected), 37):
+            self.assertEqual(skiplist.node_at(index).key, expected[index])
+            self.assertEqual(skiplist.bisect_left(expected[index]), expected.index(expected[index]))
+        self.assertEqual(list(skiplist.islice(10, 20)), expected[10:20])
+
+    def test_from_sorted(self):
+        skiplist = IndexableSkipList.from_sorted(range(0, 100, 2))
+        self.assertEqual(len(skiplist), 50)
+        self.assertEqual(skiplist.bisect_left(51), 26)
+        skiplist.insert(51)
+        self.assertEqual(list(skiplist.islice(25, 28)), [50, 51, 52])
+
+
+class LeaderboardTests(SimpleTestCase):
+    def setUp(self):
+        self.board = Leaderboard({"a": 50, "b": 30, "c": 30, "d": 10, "e": 0})
+
+    def test_rank_ties_share_a_rank(self):
+        self.assertEqual(self.board.rank("a"), 1)
+        self.assertEqual(self.board.rank("b"), 2)
+        self.assertEqual(self.board.rank("c"), 2)
+        self.assertEqual(self.board.rank("d"), 4)
+        self.assertIsNone(self.board.rank("missing"))
+
+    def test_add_points_moves_user(self):
+        self.assertEqual(self.board.add_points("d", 45), 55)
+        self.assertEqual(self.board.rank("d"), 1)
+        self.assertEqual(self.board.rank("a"), 2)
+        self.board.discard("d")
+        self.assertIsNone(self.board.points("d"))
+        self.assertEqual(len(self.board), 4)
+
+    def test_top(self):
+        top = self.board.top(3)
+        self.assertEqual([entry["rank"] for entry in top], [1, 2, 2])
+        self.assertEqual(top[0]["user_id"], "a")
+        self.assertEqual({entry["user_id"] for entry in top[1:]}, {"b", "c"})
+
+    def test_around(self):
+        around = self.board.around("d", 1)
+        self.assertEqual([entry["points"] for entry in around], [30, 10, 0])
+        self.assertEqual(around[1], {"rank": 4, "user_id": "d", "points": 10})
+        self.assertEqual([entry["user_id"] for entry in self.board.around("a", 1)][0], "a")
+        self.assertEqual(self.board.around("missing", 2), [])
+
+
+class RecordTransactionChangesTests(SimpleTestCase):
+    def setUp(self):
+        self.service = LeaderboardService()
+        today = datetime.now(timezone.utc).date()
+        self.service.rebuild([{"id": "u1", "clerk_id": "c1"}], [("u1", 10)], [("u1", today, 10)], today)
+        leaderboard._service = self.service
+
+    def tearDown(self):
+        leaderboard._service = None
+
+    def test_completion_adds_points(self):
+        pending = {"user_id": "u1", "status": "pending", "points_earned": 0,
+                   "created_at": datetime.now(timezone.utc).isoformat()}
+        completed = dict(pending, status="completed", points_earned=5)
+        leaderboard.record_transaction_changes([(pending, completed)])
+        for window in ("all", "week", "month"):
+            self.assertEqual(self.service.board(window).points("u1"), 15)
+
+        leaderboard.record_transaction_changes([(completed, dict(completed, status="failed"))])
+        self.assertEqual(self.service.board("all").points("u1"), 10)
+
+    def test_old_transaction_only_counts_all_time(self):
+        old = {"user_id": "u1", "status": "completed", "points_earned": 5,
+               "created_at": datetime(2000, 1, 3, tzinfo=timezone.utc)}
+        leaderboard.record_transaction_changes([(None, old)])
+        self.assertEqual(self.service.board("all").points("u1"), 15)
+        self.assertEqual(self.service.board("week").points("u1"), 10)
+        self.assertNotIn(("week", date(2000, 1, 3)), self.service.boards)
+
+    def test_rebuild_after_update_keeps_points(self):
+        now = datetime.now(timezone.utc)
+        pending = {"user_id": "u1", "status": "pending", "points_earned": 0, "created_at": now}
+        completed = dict(pending, status="completed", points_earned=5)
+        leaderboard.record_transaction_changes([(pending, completed)])
+
+        # The next snapshot sees the completed transaction in its rollups;
+        # users.total_points (not written by Django) plays no part
+        self.service.rebuild([{"id": "u1", "clerk_id": "c1", "total_points": 10}],
+                             [("u1", 15)], [("u1", now.date(), 15)], now.date())
+        for window in ("all", "week", "month"):
+            self.assertEqual(self.service.board(window).points("u1"), 15)
+
+    def test_rebuild_ranks_users_without_completed_points(self):
+        today = datetime.now(timezone.utc).date()
+        self.service.rebuild([{"id": "u1", "clerk_id": "c1"}, {"id": "u2", "clerk_id": "c2"}],
+                             [("u1", 10)], [("u1", today, 10)], today)
+        self.assertEqual(self.service.board("all").rank("u2"), 2)
+        self.assertEqual(self.service.user_ids, {"c1": "u1", "c2": "u2"})
+
+    def test_ignored_until_loaded(self):
+        leaderboard._service = LeaderboardService()
+        leaderboard.record_transaction_changes(
+            [(None, {"user_id": "u1", "status": "completed", "points_earned": 5})])
+        self.assertIsNone(leaderboard._service.board("all").points("u1"))
@@ -0,0 +1,154 @@
+import asyncio
+import json
+import tempfile
+import uuid
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from deposits import push
+from deposits.services import transaction_events
+from deposits.services.transaction_events import EventHub, Subscriber, publish_transaction_updates
+
+
+MINE = str(uuid.uuid4())
+OTHER = str(uuid.uuid4())
+THEIRS = str(uuid.uuid4())
+
+
+def row(transaction_id, status, user_id="u1", points=0):
+    return {"id": transaction_id, "user_id": user_id, "status": status, "points_earned": points,
+            "item_type": "mobile", "detected_confidence": 0.9, "co2_saved": 0, "r2_object_key": "k"}
+
+
+class EventHubTests(SimpleTestCase):
+    async def test_events_only_reach_the_owner(self):
+        hub = EventHub(asyncio.get_running_loop(), heartbeat=3600)
+        self.addCleanup(hub.close)
+        owner, snooper = Subscriber("u1"), Subscriber("u2")
+        for subscriber in (owner, snooper):
+            hub.register(subscriber)
+            # Transaction ids are not secret; u2 watches u1's transaction
+            hub.subscribe(subscriber, [MINE])
+
+        hub.dispatch([transaction_events.to_event(row(MINE, "completed"))])
+        self.assertEqual([event["status"] for event in owner.take()], ["completed"])
+        self.assertEqual(snooper.take(), [])
+        self.assertEqual(hub.stats()["events_delivered"], 1)
+
+    async def test_latest_event_per_transaction_is_kept(self):
+        hub = EventHub(asyncio.get_running_loop(), heartbeat=3600)
+        self.addCleanup(hub.close)
+        subscriber = Subscriber("u1")
+        hub.register(subscriber)
+        hub.subscribe(subscriber, [MINE, OTHER])
+        hub.dispatch([transaction_events.to_event(row(MINE, "pending")),
+                      transaction_events.to_event(row(OTHER, "pending")),
+                      transaction_events.to_event(row(MINE, "completed"))])
+        self.assertEqual({event["id"]: event["status"] for event in subscriber.take()},
+                         {MINE: "completed", OTHER: "pending"})
+
+        hub.unregister(subscriber)
+        hub.dispatch([transaction_events.to_event(row(MINE, "failed"))])
+        self.assertEqual(subscriber.take(), [])
+        self.assertEqual(hub.stats()["transactions_watched"], 0)
+
+    def test_snapshot_skips_other_users_rows(self):
+        backend = mock.Mock()
+        backend.get_transactions.return_value = [row(MINE, "pending"), row(THEIRS, "completed", "u2")]
+        with mock.patch("deposits.services.data_backend.get_data_backend", return_value=backend):
+            self.assertEqual([event["id"] for event in push._snapshot("u1", [MINE, THEIRS])], [MINE])
+            self.assertEqual(push._snapshot(None, [MINE]), [])
+
+
+class ServeEventsTests(SimpleTestCase):
+    """Server-sent events against a fake ASGI client."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        patcher = override_settings(TRANSACTION_EVENTS_SOCKET_DIR=directory.name,
+                                    TRANSACTION_EVENTS_HEARTBEAT=3600)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+        transaction_events.reset_after_fork()
+        self.addCleanup(transaction_events.reset_after_fork)
+        patcher = mock.patch.object(push, "_authenticate", return_value="u1")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def stream(self, snapshot, ids, initial, after_snapshot, total):
+        """
+        Connect, let ``snapshot`` serve the current state, wait for
+        ``initial`` events, publish ``after_snapshot`` rows, and return
+        the first ``total`` transaction events received.
+        """
+        received = asyncio.Queue()
+        requests = asyncio.Queue()
+
+        async def send(message):
+            await received.put(message)
+
+        scope = {"type": "http", "method": "GET", "path": push.SSE_PATH, "headers": [],
+                 "query_string": f"ids={','.join(ids)}".encode()}
+        with mock.patch.object(push, "_snapshot", snapshot):
+            server = asyncio.ensure_future(push.serve_events(scope, requests.get, send))
+            start = await asyncio.wait_for(received.get(), 5)
+            self.assertEqual(start["status"], 200)
+            await asyncio.wait_for(received.get(), 5)  # retry: line
+
+            events = []
+
+            async def read(count):
+                while len(events) < count:
+                    message = await asyncio.wait_for(received.get(), 5)
+                    for chunk in message["body"].split(b"\n\n"):
+                        if chunk.startswith(b"event: transaction"):
+                            events.append(json.loads(chunk.split(b"data: ", 1)[1]))
+
+            await read(initial)
+            publish_transaction_updates(after_snapshot)
+            await read(total)
+            # Nothing else is queued for the client
+            await asyncio.sleep(0.05)
+            self.assertTrue(received.empty())
+            await requests.put({"type": "http.disconnect"})
+            await asyncio.wait_for(server, 5)
+        transaction_events.close_event_hub()
+        return events
+
+    async def test_snapshot_then_live_events_without_gaps_or_duplicates(self):
+        def snapshot(user_id, ids):
+            # MINE completes while its current state is being read
+            publish_transaction_updates([row(MINE, "completed", points=40)])
+            return [transaction_events.to_event(row(MINE, "pending")),
+                    transaction_events.to_event(row(OTHER, "pending"))]
+
+        events = await self.stream(snapshot, [MINE, OTHER], 2, [row(OTHER, "failed")], 3)
+        self.assertEqual([(event["id"], event["status"]) for event in events],
+                         [(MINE, "completed"), (OTHER, "pending"), (OTHER, "failed")])
+        self.assertEqual(events[0]["points_earned"], 40)
+        self.assertTrue(all("user_id" not in event for event in events))
+
+    async def test_other_users_events_are_not_streamed(self):
+        def snapshot(user_id, ids):
+            return [transaction_events.to_event(row(MINE, "pending"))]
+
+        # u2's update for THEIRS is published first and must not arrive
+        events = await self.stream(snapshot, [MINE, THEIRS], 1,
+                                   [row(THEIRS, "completed", "u2"), row(MINE, "completed")], 2)
+        self.assertEqual([(event["id"], event["status"]) for event in events],
+                         [(MINE, "pending"), (MINE, "completed")])
+
+    async def test_invalid_ids_are_rejected(self):
+        received = []
+
+        async def send(message):
+            received.append(message)
+
+        scope = {"type": "http", "method": "GET", "path": push.SSE_PATH, "headers": [],
+                 "query_string": b"ids=not-a-uuid"}
+        await push.serve_events(scope, asyncio.Queue().get, send)
+        transaction_events.close_event_hub()
+        self.assertEqual(received[0]["status"], 400)
+        self.assertEqual(json.loads(received[1]["body"])["error"], "Invalid subscription")
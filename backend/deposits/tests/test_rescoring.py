@@ -0,0 +1,123 @@
+import json
+import os
+import tempfile
+from concurrent.futures import Future
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import SimpleTestCase
+
+from deposits.management.commands import rescore_transactions
+from deposits.services import rescoring
+from deposits.services.rewards import DEFAULT_REWARD_RULES, CompiledRules
+
+
+RULES = CompiledRules(DEFAULT_REWARD_RULES, "v1")
+
+
+def transaction(number, status="completed", item_type="mobile", points=0):
+    return {
+        "id": f"{number:08d}-0000-0000-0000-000000000000", "user_id": "u1",
+        "r2_object_key": f"deposits/{number}.png", "status": status, "item_type": item_type,
+        "detected_confidence": 0.9, "weight": 200, "points_earned": points, "co2_saved": 0,
+    }
+
+
+class InlineExecutor:
+    """Runs submitted chunks in the test process, like a one-worker pool."""
+
+    def __init__(self, initializer, initargs, **kwargs):
+        initializer(*initargs)
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+    def shutdown(self, cancel_futures=False):
+        pass
+
+
+class FakeBackend:
+    def __init__(self, rows):
+        self.rows = rows
+        self.fetches = []
+        self.upserts = []
+
+    def fetch_transactions(self, after_id, limit, status=None):
+        self.fetches.append((after_id, limit, status))
+        rows = [row for row in self.rows if (after_id is None or row["id"] > after_id)
+                and (status is None or row["status"] == status)]
+        return [dict(row) for row in rows[:limit]]
+
+    def upsert_transactions(self, rows):
+        self.upserts.append(rows)
+        return len(rows)
+
+
+@mock.patch.object(rescoring, "_inference", "none")
+@mock.patch.object(rescoring, "_rules", RULES)
+class RescoreChunkTests(SimpleTestCase):
+    def test_only_completed_rows_are_rescored(self):
+        rows = [transaction(1), transaction(2, status="pending"), transaction(3, status="failed")]
+        changed, failures = rescoring.rescore_chunk(rows)
+        self.assertEqual(failures, 0)
+        self.assertEqual([row["id"] for row in changed], [rows[0]["id"]])
+        self.assertEqual(changed[0]["points_earned"], RULES.score("mobile", 200, 0.9).points)
+        self.assertEqual(set(changed[0]), set(rescoring.WRITE_COLUMNS))
+
+    def test_unchanged_rows_are_not_written(self):
+        score = RULES.score("mobile", 200, 0.9)
+        row = dict(transaction(1), points_earned=score.points, co2_saved=score.co2_saved)
+        self.assertEqual(rescoring.rescore_chunk([row]), ([], 0))
+
+    def test_chunk_without_completed_rows(self):
+        self.assertEqual(rescoring.rescore_chunk([transaction(1, status="pending")]), ([], 0))
+
+
+# The inline pool runs init_worker here; the patches restore its globals
+@mock.patch.object(rescoring, "_inference", "none")
+@mock.patch.object(rescoring, "_rules", None)
+@mock.patch.object(rescore_transactions, "ProcessPoolExecutor", InlineExecutor)
+@mock.patch.object(rescore_transactions, "get_reward_rules", return_value=RULES)
+class RescoreCommandTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.checkpoint = os.path.join(directory.name, "checkpoint.json")
+        statuses = ["completed", "pending", "completed", "failed", "completed"] * 5
+        self.backend = FakeBackend([transaction(i, status) for i, status in enumerate(statuses)])
+        patcher = mock.patch.object(rescore_transactions, "get_data_backend", return_value=self.backend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_command(self, *args):
+        call_command("rescore_transactions", "--workers", "1", "--checkpoint", self.checkpoint,
+                     *args, stdout=StringIO())
+        with open(self.checkpoint) as f:
+            return json.load(f)
+
+    def test_reads_completed_rows_in_chunks(self, get_reward_rules):
+        state = self.run_command("--chunk-size", "4")
+        completed = [row for row in self.backend.rows if row["status"] == "completed"]
+        self.assertTrue(all(status == "completed" for _, _, status in self.backend.fetches))
+        # 15 completed rows: chunks of 4, 4, 4, 3, then an empty read
+        self.assertEqual([limit for _, limit, _ in self.backend.fetches], [4] * 5)
+        # Chunks finish (and are written) in any order
+        self.assertEqual(sorted(len(rows) for rows in self.backend.upserts), [3, 4, 4, 4])
+        written = sorted(row["id"] for rows in self.backend.upserts for row in rows)
+        self.assertEqual(written, [row["id"] for row in completed])
+        self.assertEqual((state["rows"], state["changed"], state["finished"]), (15, 15, True))
+        self.assertEqual(state["last_id"], completed[-1]["id"])
+
+    def test_limit_stops_resumably(self, get_reward_rules):
+        state = self.run_command("--chunk-size", "4", "--limit", "6")
+        self.assertEqual([limit for _, limit, _ in self.backend.fetches], [4, 2])
+        self.assertEqual((state["rows"], state["finished"]), (6, False))
+
+        self.backend.fetches.clear()
+        state = self.run_command("--chunk-size", "4")
+        self.assertEqual(self.backend.fetches[0][0], [row for row in self.backend.rows
+                                                      if row["status"] == "completed"][5]["id"])
+        self.assertEqual((state["rows"], state["finished"]), (15, True))
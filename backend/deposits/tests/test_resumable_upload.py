@@ -0,0 +1,37 @@
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from deposits.services import r2_upload
+from deposits.services.resumable_upload import UploadSessionError, UploadSessionStore
+
+
+@mock.patch.object(r2_upload, "put_object")
+class UploadSessionFinishTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.store = UploadSessionStore(directory.name, 1024, 5 * 1024 * 1024, 3600)
+        self.upload_id = self.store.create("user", "a.png", 10)["upload_id"]
+        self.store.write_chunk(self.upload_id, "user", 0, b"0123456789")
+
+    def test_concurrent_finish_is_refused(self, put_object):
+        state, data = self.store.finish(self.upload_id, "user")
+        self.assertEqual((state["status"], data), ("finalizing", b"0123456789"))
+        with self.assertRaises(UploadSessionError):
+            self.store.finish(self.upload_id, "user")
+        put_object.assert_called_once()
+
+    def test_retry_after_release_keeps_transaction(self, put_object):
+        first, _ = self.store.finish(self.upload_id, "user")
+        self.store.release(self.upload_id, "user")
+        second, data = self.store.finish(self.upload_id, "user")
+        self.assertEqual(second["transaction_id"], first["transaction_id"])
+        self.assertEqual((second["attempts"], data), (2, b"0123456789"))
+        put_object.assert_called_once()
+
+        self.store.mark_complete(self.upload_id, "user", {"transaction_id": first["transaction_id"]})
+        state, data = self.store.finish(self.upload_id, "user")
+        self.assertIsNone(data)
+        self.assertEqual(state["result"], {"transaction_id": first["transaction_id"]})
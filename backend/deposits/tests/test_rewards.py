@@ -0,0 +1,127 @@
+from datetime import datetime, timezone
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from deposits.services import rewards
+from deposits.services.rewards import DEFAULT_REWARD_RULES, CompiledRules, RewardRulesCache
+from deposits.services.supabase_client import SupabaseError
+
+
+RULES = {
+    "default": {"base_points": 5, "points_per_kg": 20, "max_points": 100},
+    "min_confidence": 0.6,
+    "categories": {
+        "Mobile": {"points_per_kg": 150, "co2_per_kg": 6000, "labels": ["cell-phone", "smart_phone"]},
+        "laptop": {"base_points": 50, "points_per_kg": 80, "min_points": 60},
+    },
+}
+
+DEPOSITS = [
+    # label, grams, confidence
+    ("mobile", 180, 0.9),
+    ("Cell Phone", 180, None),
+    ("smart-phone", 2500, 0.95),
+    ("mobile", 180, 0.3),
+    ("laptop", 0, 0.8),
+    ("laptop", 2200, 0.61),
+    ("toaster", 900, 0.99),
+    (None, 100, None),
+    ("", -50, 0.7),
+    ("laptop", 10 ** 6, 0.9),
+]
+
+
+class CompiledRulesTests(SimpleTestCase):
+    def setUp(self):
+        self.rules = CompiledRules(RULES, "v1")
+
+    def test_labels_and_fallbacks(self):
+        self.assertEqual(self.rules.rule_for("CELL_PHONE").category, "mobile")
+        self.assertEqual(self.rules.rule_for("mobile", 0.59).category, "other")
+        self.assertEqual(self.rules.rule_for("unknown").category, "other")
+        laptop = self.rules.rule_for("laptop")
+        # Fields not given come from this table's default, then the built-in one
+        self.assertEqual((laptop.max_points, laptop.co2_per_kg), (100, 1000))
+
+    def test_score_clamps_points(self):
+        self.assertEqual(self.rules.score("laptop", 0, 0.9).points, 60)
+        self.assertEqual(self.rules.score("laptop", 10 ** 6, 0.9).points, 100)
+        self.assertEqual(self.rules.score("mobile", 200, 0.9), ("mobile", 35, 1200.0))
+
+    def assert_batch_matches_score(self):
+        labels, weights, confidences = zip(*DEPOSITS)
+        batch = self.rules.score_batch(labels, weights, confidences)
+        expected = [self.rules.score(*deposit) for deposit in DEPOSITS]
+        self.assertEqual(batch["category"], [score.category for score in expected])
+        self.assertEqual(batch["points"], [score.points for score in expected])
+        self.assertEqual(batch["co2_saved"], [score.co2_saved for score in expected])
+
+    def test_batch_matches_score(self):
+        self.assert_batch_matches_score()
+
+    def test_batch_matches_score_without_numpy(self):
+        with mock.patch.object(rewards, "np", None):
+            self.assert_batch_matches_score()
+
+    def test_batch_without_confidences(self):
+        batch = self.rules.score_batch(["mobile", "laptop"], [100, 100])
+        self.assertEqual(batch["points"], [self.rules.score("mobile", 100).points,
+                                           self.rules.score("laptop", 100).points])
+
+
+class RewardRulesCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.row = {"key": "reward_rules", "value": RULES,
+                    "updated_at": datetime(2026, 1, 1, tzinfo=timezone.utc)}
+        self.repository = mock.Mock()
+        self.repository.get_setting.side_effect = lambda key: self.row
+        patcher = mock.patch.object(rewards, "get_repository", return_value=self.repository)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache = RewardRulesCache(check_interval=3600)
+
+    def test_compiled_once_per_version(self):
+        rules = self.cache.get()
+        self.assertEqual(rules.version, str(self.row["updated_at"]))
+        self.assertIs(self.cache.get(), rules)
+        self.assertEqual(self.repository.get_setting.call_count, 1)
+
+        # Re-checked, but the same version is not recompiled
+        self.cache.invalidate()
+        self.assertIs(self.cache.get(), rules)
+        self.assertEqual(self.repository.get_setting.call_count, 2)
+
+    def test_new_updated_at_recompiles(self):
+        rules = self.cache.get()
+        self.row = {**self.row, "value": {"categories": {}},
+                    "updated_at": datetime(2026, 1, 2, tzinfo=timezone.utc)}
+        self.cache.invalidate()
+        updated = self.cache.get()
+        self.assertIsNot(updated, rules)
+        self.assertEqual(updated.version, str(self.row["updated_at"]))
+        self.assertEqual(updated.rule_for("mobile").category, "other")
+
+    def test_missing_row_uses_built_in_rules(self):
+        self.row = None
+        rules = self.cache.get()
+        self.assertIsNone(rules.version)
+        self.assertEqual(len(rules.categories), len(DEFAULT_REWARD_RULES["categories"]) + 1)
+
+    def test_read_failure_keeps_last_rules(self):
+        rules = self.cache.get()
+        self.repository.get_setting.side_effect = SupabaseError("down")
+        self.cache.invalidate()
+        self.assertIs(self.cache.get(), rules)
+
+    def test_read_failure_without_rules_raises(self):
+        self.repository.get_setting.side_effect = SupabaseError("down")
+        with self.assertRaises(SupabaseError):
+            self.cache.get()
+
+    def test_invalid_rules_are_ignored(self):
+        rules = self.cache.get()
+        self.row = {**self.row, "value": {"default": {"base_points": "many"}},
+                    "updated_at": datetime(2026, 1, 2, tzinfo=timezone.utc)}
+        self.cache.invalidate()
+        self.assertIs(self.cache.get(), rules)
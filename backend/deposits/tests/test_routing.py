@@ -0,0 +1,165 @@
+import itertools
+import math
+import random
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from deposits.services import routing
+from deposits.services.fill_history import FillHistoryError
+from deposits.services.routing import (
+    RoutingError, haversine_matrix, improve_route, nearest_neighbor_routes, or_opt, plan_collection,
+    plan_routes, predict_level, route_length, two_opt,
+)
+
+
+DEPOT = (12.97, 77.59)
+
+
+def grid_distances(points):
+    """Euclidean distances, which the heuristics do not care about being km."""
+    points = np.asarray(points, dtype=np.float64)
+    return np.sqrt(((points[:, None, :] - points[None, :, :]) ** 2).sum(axis=2))
+
+
+def stop(number, latitude, longitude, load=50.0):
+    return {"id": f"bin-{number}", "latitude": latitude, "longitude": longitude, "load": load}
+
+
+class HeuristicTests(SimpleTestCase):
+    def test_haversine(self):
+        distances = haversine_matrix([0.0, 1.0, 0.0], [0.0, 0.0, 180.0])
+        self.assertAlmostEqual(distances[0, 1], 111.195, places=2)
+        self.assertAlmostEqual(distances[0, 2], math.pi * routing.EARTH_RADIUS_KM, places=6)
+        np.testing.assert_allclose(distances, distances.T)
+        np.testing.assert_array_equal(np.diag(distances), 0.0)
+
+    def test_nearest_neighbour_respects_capacity(self):
+        distances = grid_distances([(0, 0), (1, 0), (2, 0), (3, 0), (-1, 0)])
+        demand = np.array([0.0, 60.0, 30.0, 50.0, 40.0])
+        routes = nearest_neighbor_routes(distances, demand, 100.0)
+        self.assertEqual(routes, [[1, 2], [4, 3]])
+        self.assertTrue(all(demand[route].sum() <= 100.0 for route in routes))
+
+        with self.assertRaises(RoutingError):
+            nearest_neighbor_routes(distances, demand, 55.0)
+
+    def test_two_opt_removes_a_crossing(self):
+        distances = grid_distances([(0, 0), (0, 1), (1, 1), (1, 0)])
+        # 0 -> 2 -> 1 -> 3 -> 0 crosses itself
+        tour, improved = two_opt(distances, [0, 2, 1, 3, 0])
+        self.assertTrue(improved)
+        self.assertAlmostEqual(route_length(distances, tour), 4.0)
+        self.assertEqual(two_opt(distances, tour)[1], False)
+
+    def test_or_opt_relocates_a_stray_stop(self):
+        distances = grid_distances([(0, 0), (1, 0), (2, 0), (3, 0), (4, 0)])
+        tour, improved = or_opt(distances, [0, 1, 4, 2, 3, 0])
+        self.assertTrue(improved)
+        self.assertAlmostEqual(route_length(distances, tour), 8.0)
+
+    def test_improved_route_is_never_longer_and_near_optimal(self):
+        rng = random.Random(7)
+        for _ in range(20):
+            points = [(rng.random(), rng.random()) for _ in range(8)]
+            distances = grid_distances(points)
+            demand = np.array([0.0] + [1.0] * 7)
+            route = nearest_neighbor_routes(distances, demand, 100.0)[0]
+            improved = improve_route(distances, route)
+            self.assertEqual(sorted(improved), list(range(1, 8)))
+
+            length = route_length(distances, [0, *improved, 0])
+            optimum = min(route_length(distances, [0, *order, 0])
+                          for order in itertools.permutations(range(1, 8)))
+            self.assertLessEqual(length, route_length(distances, [0, *route, 0]) + 1e-9)
+            self.assertLessEqual(length, optimum * 1.1)
+
+
+class PlanRoutesTests(SimpleTestCase):
+    def setUp(self):
+        rng = random.Random(3)
+        self.stops = [stop(i, DEPOT[0] + rng.uniform(-0.05, 0.05), DEPOT[1] + rng.uniform(-0.05, 0.05),
+                           load=rng.uniform(40, 100)) for i in range(30)]
+
+    def test_every_stop_is_served_once_within_capacity(self):
+        plan = plan_routes(DEPOT, self.stops, vehicle_capacity=4)
+        served = [s["id"] for route in plan["routes"] for s in route["stops"]]
+        self.assertEqual(sorted(served), sorted(s["id"] for s in self.stops))
+        self.assertEqual(plan["unserved"], [])
+        for route in plan["routes"]:
+            self.assertLessEqual(route["load"], 4)
+            self.assertAlmostEqual(route["load"], sum(s["load"] for s in route["stops"]) / 100, places=1)
+        self.assertAlmostEqual(plan["total_distance_km"],
+                               sum(route["distance_km"] for route in plan["routes"]), places=2)
+
+    def test_max_vehicles_keeps_the_fullest_routes(self):
+        everything = plan_routes(DEPOT, self.stops, vehicle_capacity=4)
+        plan = plan_routes(DEPOT, self.stops, vehicle_capacity=4, max_vehicles=2)
+        self.assertEqual(len(plan["routes"]), 2)
+        served = sum(len(route["stops"]) for route in plan["routes"])
+        self.assertEqual(served + len(plan["unserved"]), len(self.stops))
+        fullest = sorted((route["load"] for route in everything["routes"]), reverse=True)[:2]
+        self.assertEqual(sorted(route["load"] for route in plan["routes"]), sorted(fullest))
+
+    def test_stop_over_capacity_and_no_stops(self):
+        with self.assertRaises(RoutingError):
+            plan_routes(DEPOT, [stop(1, *DEPOT, load=150)], vehicle_capacity=1)
+        self.assertEqual(plan_routes(DEPOT, [], vehicle_capacity=1)["routes"], [])
+
+    def test_without_numpy(self):
+        with mock.patch.object(routing, "np", None), self.assertRaises(RoutingError):
+            plan_routes(DEPOT, self.stops, vehicle_capacity=4)
+
+
+class PlanCollectionTests(SimpleTestCase):
+    def setUp(self):
+        self.now = datetime.now(timezone.utc)
+        self.bins = [
+            # Filling at 5 points an hour per its history
+            {"id": "a", "status": "active", "latitude": 12.98, "longitude": 77.6, "fill_level": 60},
+            # No history: 40 points over 40 hours since emptied
+            {"id": "b", "status": "active", "latitude": 12.96, "longitude": 77.58, "fill_level": 40,
+             "last_emptied_at": (self.now - timedelta(hours=40)).isoformat()},
+            {"id": "c", "status": "active", "latitude": 12.99, "longitude": 77.57, "fill_level": 95,
+             "is_operational": False},
+            {"id": "d", "status": "maintenance", "latitude": 12.99, "longitude": 77.57, "fill_level": 95},
+            {"id": "e", "status": "active", "latitude": None, "longitude": 77.57, "fill_level": 95},
+        ]
+        repository = mock.Mock()
+        repository.iter_bins.side_effect = lambda: iter(self.bins)
+        self.history = mock.Mock()
+        self.history.fill_rates.return_value = {"a": 5.0}
+        for patcher in (mock.patch.object(routing, "get_repository", return_value=repository),
+                        mock.patch("deposits.services.fill_history.get_fill_history",
+                                   return_value=self.history)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_predicted_bins_are_collected(self):
+        plan = plan_collection(DEPOT, horizon_hours=8, threshold=80, vehicle_capacity=2)
+        self.assertEqual(plan["candidates"], 2)
+        self.assertEqual(self.history.fill_rates.call_args[0][0], ["a", "b"])
+        stops = {s["id"]: s for route in plan["routes"] for s in route["stops"]}
+        # a reaches 100, b only 48
+        self.assertEqual(list(stops), ["a"])
+        self.assertEqual((stops["a"]["fill_rate_per_hour"], stops["a"]["predicted_level"]), (5.0, 100.0))
+
+        plan = plan_collection(DEPOT, horizon_hours=48, threshold=80, vehicle_capacity=2)
+        self.assertEqual(sorted(s["id"] for route in plan["routes"] for s in route["stops"]), ["a", "b"])
+
+    def test_missing_history_falls_back_to_fill_levels(self):
+        self.history.fill_rates.side_effect = FillHistoryError("NumPy is required")
+        with self.assertLogs(routing.logger, "WARNING"):
+            plan = plan_collection(DEPOT, horizon_hours=8, threshold=60, vehicle_capacity=2)
+        # a has no reset time, so its whole level counts as one hour of filling
+        self.assertEqual([s["id"] for route in plan["routes"] for s in route["stops"]], ["a"])
+
+    def test_predict_level(self):
+        self.assertEqual(predict_level({"fill_level": 50}, 10.0, self.now, 2), (10.0, 70.0))
+        self.assertEqual(predict_level({"fill_level": 50}, 10.0, self.now, 10)[1], 100.0)
+        emptied = {"fill_level": 30, "last_emptied_at": self.now - timedelta(hours=10)}
+        self.assertEqual(predict_level(emptied, None, self.now, 5), (3.0, 45.0))
+        # Empty and never reported: at least one point an hour
+        self.assertEqual(predict_level({"fill_level": None}, None, self.now, 5), (1.0, 5.0))
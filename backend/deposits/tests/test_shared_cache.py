@@ -0,0 +1,132 @@
+import multiprocessing
+import os
+import tempfile
+import time
+
+from django.test import SimpleTestCase, override_settings
+
+from deposits.services import shared_cache
+from deposits.services.shared_cache import _SEQ, _SLOT, SharedCache, _key_hash, default_path
+
+
+def _write_alternating(path, until):
+    cache = SharedCache(path, 4, 1024)
+    values = (b"a" * 900, b"b" * 900)
+    count = 0
+    while time.time() < until:
+        cache.set("key", values[count % 2], 60)
+        count += 1
+    cache.close()
+
+
+class SharedCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "cache")
+
+    def open(self, slots=4, slot_size=256):
+        cache = SharedCache(self.path, slots, slot_size)
+        self.addCleanup(cache.close)
+        return cache
+
+    def test_set_get_delete(self):
+        cache = self.open()
+        self.assertTrue(cache.set("k", b"value", 60))
+        self.assertEqual(cache.get("k"), b"value")
+        self.assertEqual(self.open().get("k"), b"value")
+        cache.delete("k")
+        self.assertIsNone(cache.get("k"))
+
+    def test_expired_and_oversized_entries(self):
+        cache = self.open()
+        cache.set("old", b"value", -1)
+        self.assertIsNone(cache.get("old"))
+        self.assertFalse(cache.set("big", b"x" * cache.max_item, 60))
+        self.assertIsNone(cache.get("big"))
+
+    def test_eviction_prefers_expired_then_closest_to_expiry(self):
+        # Four slots make one bucket, so every key competes for it
+        cache = self.open()
+        for key, ttl in (("a", 300), ("b", 30), ("c", 100), ("d", 200)):
+            cache.set(key, key.encode(), ttl)
+        cache.set("e", b"e", 60)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual([cache.get(key) for key in "acde"], [b"a", b"c", b"d", b"e"])
+
+        cache.set("c", b"c", -1)
+        cache.set("f", b"f", 10)
+        self.assertEqual([cache.get(key) for key in "adef"], [b"a", b"d", b"e", b"f"])
+
+    def test_overwrite_keeps_one_slot(self):
+        cache = self.open()
+        for ttl in (10, 20, 30, 40, 50):
+            cache.set("k", str(ttl).encode(), ttl)
+        cache.set("other", b"o", 60)
+        self.assertEqual((cache.get("k"), cache.get("other")), (b"50", b"o"))
+
+    def test_read_skips_slot_being_written_or_corrupt(self):
+        cache = self.open()
+        cache.set("k", b"value", 60)
+        offset = next(cache._offset(0, way) for way in range(4)
+                      if _SLOT.unpack_from(cache._map, cache._offset(0, way))[2] == _key_hash(b"k"))
+        seq = _SEQ.unpack_from(cache._map, offset)[0]
+
+        _SEQ.pack_into(cache._map, offset, seq + 1)
+        self.assertIsNone(cache.get("k"))
+        _SEQ.pack_into(cache._map, offset, seq)
+        self.assertEqual(cache.get("k"), b"value")
+
+        value_at = offset + _SLOT.size + 1
+        cache._map[value_at:value_at + 1] = b"X"
+        self.assertIsNone(cache.get("k"))
+
+    def test_concurrent_writer_never_yields_torn_values(self):
+        cache = self.open(slot_size=1024)
+        writer = multiprocessing.get_context("fork").Process(
+            target=_write_alternating, args=(self.path, time.time() + 0.5))
+        writer.start()
+        self.addCleanup(writer.join)
+        reads = 0
+        while writer.is_alive():
+            value = cache.get("key")
+            if value is not None:
+                reads += 1
+                self.assertIn(value, (b"a" * 900, b"b" * 900))
+        self.assertGreater(reads, 0)
+
+    def test_layout_change_replaces_file(self):
+        small = self.open(slots=4)
+        small.set("k", b"value", 60)
+        large = self.open(slots=8)
+        self.assertEqual(large.slots, 8)
+        self.assertIsNone(large.get("k"))
+        # Processes still mapping the old file are unaffected
+        self.assertEqual(small.get("k"), b"value")
+
+
+class GetSharedCacheTests(SimpleTestCase):
+    def setUp(self):
+        shared_cache.reset_after_fork()
+        self.addCleanup(shared_cache.reset_after_fork)
+
+    @override_settings(SHARED_CACHE_ENABLED=False)
+    def test_disabled(self):
+        self.assertIsNone(shared_cache.get_shared_cache())
+
+    @override_settings(SHARED_CACHE_ENABLED=True, SHARED_CACHE_PATH="/nonexistent/dir/cache")
+    def test_falls_back_when_file_cannot_be_created(self):
+        with self.assertLogs(shared_cache.logger, "WARNING"):
+            self.assertIsNone(shared_cache.get_shared_cache())
+        # Not retried on every call
+        self.assertIsNone(shared_cache.get_shared_cache())
+
+    def test_default_path_is_per_deployment(self):
+        with override_settings(SUPABASE_URL="https://prod.supabase.co", R2_BUCKET_NAME="deposits"):
+            production = default_path()
+        with override_settings(SUPABASE_URL="https://staging.supabase.co", R2_BUCKET_NAME="deposits"):
+            staging = default_path()
+        with override_settings(SUPABASE_URL="https://prod.supabase.co", R2_BUCKET_NAME="deposits-test"):
+            other_bucket = default_path()
+        self.assertEqual(len({production, staging, other_bucket}), 3)
+        self.assertEqual(os.path.dirname(production), os.path.dirname(staging))
@@ -0,0 +1,146 @@
+import json
+import struct
+import time
+import uuid
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from deposits.services import telemetry
+from deposits.services.telemetry import (
+    BINARY_MAGIC, MAX_CLOCK_SKEW, TelemetryBuffer, TelemetryFormatError, parse_binary, parse_ndjson,
+)
+
+
+BIN_A = str(uuid.uuid4())
+BIN_B = str(uuid.uuid4())
+
+
+def binary_body(readings, magic=BINARY_MAGIC, count=None):
+    ids, timestamps, fill_levels = zip(*readings)
+    n = len(readings)
+    return (struct.pack('<4sI', magic, n if count is None else count)
+            + b"".join(uuid.UUID(bin_id).bytes for bin_id in ids)
+            + struct.pack(f'<{n}d', *timestamps) + struct.pack(f'<{n}f', *fill_levels))
+
+
+def ndjson_body(*items):
+    return b"\n".join(item if isinstance(item, bytes) else json.dumps(item).encode() for item in items)
+
+
+class ParseBinaryTests(SimpleTestCase):
+    def test_round_trip(self):
+        now = time.time()
+        readings, rejected = parse_binary(binary_body([(BIN_A, now, 57.5), (BIN_B, now - 60, 140.0)]))
+        self.assertEqual(rejected, 0)
+        self.assertEqual(readings, [(BIN_A, now, 57.5), (BIN_B, now - 60, 100.0)])
+
+    def test_bad_magic(self):
+        with self.assertRaisesMessage(TelemetryFormatError, "Bad magic"):
+            parse_binary(binary_body([(BIN_A, time.time(), 1.0)], magic=b"BTL2"))
+        with self.assertRaises(TelemetryFormatError):
+            parse_binary(b"BTL")
+
+    def test_length_mismatch(self):
+        body = binary_body([(BIN_A, time.time(), 1.0)])
+        for broken in (body[:-1], body + b"\0", binary_body([(BIN_A, time.time(), 1.0)], count=2)):
+            with self.assertRaisesMessage(TelemetryFormatError, "does not match"):
+                parse_binary(broken)
+
+    def test_clock_skew_and_nan_are_rejected(self):
+        now = time.time()
+        readings, rejected = parse_binary(binary_body([
+            (BIN_A, now + MAX_CLOCK_SKEW + 60, 10.0),
+            (BIN_A, now + MAX_CLOCK_SKEW - 60, 20.0),
+            (BIN_B, now, float("nan")),
+            (BIN_B, 0.0, 30.0),
+        ]))
+        self.assertEqual(rejected, 3)
+        self.assertEqual(readings, [(BIN_A, now + MAX_CLOCK_SKEW - 60, 20.0)])
+
+
+class ParseNdjsonTests(SimpleTestCase):
+    def test_timestamps(self):
+        before = time.time()
+        readings, rejected = parse_ndjson(ndjson_body(
+            {"bin_id": BIN_A, "fill_level": 10, "ts": 1760000000},
+            {"bin_id": BIN_B, "fill_level": 20, "ts": "2025-10-09T08:53:20"},
+            {"bin_id": BIN_B, "fill_level": 30},
+        ))
+        self.assertEqual(rejected, 0)
+        self.assertEqual(readings[:2], [(BIN_A, 1760000000.0, 10.0), (BIN_B, 1760000000.0, 20.0)])
+        self.assertGreaterEqual(readings[2][1], before)
+
+    def test_malformed_lines_mixed_with_good_ones(self):
+        now = time.time()
+        readings, rejected = parse_ndjson(ndjson_body(
+            {"bin_id": BIN_A, "fill_level": 10, "ts": now},
+            b"{not json",
+            {"bin_id": "not-a-uuid", "fill_level": 10},
+            b"",
+            [BIN_A, 10],
+            {"bin_id": BIN_B, "fill_level": "NaN", "ts": now},
+            {"bin_id": BIN_B, "fill_level": 20, "ts": now + MAX_CLOCK_SKEW + 60},
+            {"bin_id": BIN_B, "fill_level": -5, "ts": now},
+        ))
+        # Blank lines are skipped, not counted
+        self.assertEqual(rejected, 5)
+        self.assertEqual(readings, [(BIN_A, now, 10.0), (BIN_B, now, 0.0)])
+
+
+class TelemetryBufferTests(SimpleTestCase):
+    def setUp(self):
+        self.repository = mock.Mock()
+        self.repository.update_bin_fill_levels.side_effect = lambda readings: len(readings)
+        self.history = mock.Mock()
+        for patcher in (mock.patch.object(telemetry, "get_repository", return_value=self.repository),
+                        mock.patch("deposits.services.fill_history.get_fill_history",
+                                   return_value=self.history)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.buffer = TelemetryBuffer(interval=3600)
+        self.addCleanup(self.buffer.close, 5)
+
+    def written(self, call=-1):
+        readings = self.repository.update_bin_fill_levels.call_args_list[call][0][0]
+        return {reading["id"]: (reading["updated_at"].timestamp(), reading["fill_level"])
+                for reading in readings}
+
+    def test_latest_reading_per_bin_is_flushed(self):
+        self.buffer.add([(BIN_A, 10.0, 1.0), (BIN_A, 30.0, 3.0), (BIN_A, 20.0, 2.0), (BIN_B, 5.0, 9.0)])
+        self.assertEqual(self.buffer.pending(), 2)
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(self.written(), {BIN_A: (30.0, 3.0), BIN_B: (5.0, 9.0)})
+        self.assertEqual(self.buffer.pending(), 0)
+        self.assertEqual(self.buffer.flush(), 0)
+        self.assertEqual(self.repository.update_bin_fill_levels.call_count, 1)
+
+    def test_failed_flush_is_retried_and_newer_readings_win(self):
+        self.buffer.add([(BIN_A, 10.0, 1.0), (BIN_B, 10.0, 1.0)])
+        self.repository.update_bin_fill_levels.side_effect = RuntimeError("database down")
+        with self.assertLogs(telemetry.logger, "ERROR"):
+            self.assertEqual(self.buffer.flush(), 0)
+        self.assertEqual(self.buffer.pending(), 2)
+
+        # An older reading for A loses to the one waiting for retry; B's newer one wins
+        self.buffer.add([(BIN_A, 5.0, 7.0), (BIN_B, 20.0, 2.0)])
+        self.repository.update_bin_fill_levels.side_effect = lambda readings: len(readings)
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(self.written(), {BIN_A: (10.0, 1.0), BIN_B: (20.0, 2.0)})
+        self.assertEqual(self.buffer.pending(), 0)
+
+        # Retried readings were already appended to the history once
+        appended = [sorted(call[0][0]) for call in self.history.append.call_args_list]
+        self.assertEqual(appended, [sorted([(BIN_A, 10.0, 1.0), (BIN_B, 10.0, 1.0)]),
+                                    sorted([(BIN_A, 5.0, 7.0), (BIN_B, 20.0, 2.0)])])
+
+    def test_history_failure_does_not_block_the_update(self):
+        self.history.append.side_effect = OSError("disk full")
+        self.buffer.add([(BIN_A, 10.0, 1.0)])
+        with self.assertLogs(telemetry.logger, "ERROR"):
+            self.assertEqual(self.buffer.flush(), 1)
+
+    def test_close_flushes_pending_readings(self):
+        self.buffer.add([(BIN_A, 10.0, 1.0)])
+        self.buffer.close(5)
+        self.assertEqual(self.written(), {BIN_A: (10.0, 1.0)})
@@ -0,0 +1,184 @@
+import hashlib
+from unittest import mock
+
+from django.core.files.uploadedfile import InMemoryUploadedFile, SimpleUploadedFile, TemporaryUploadedFile
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.test.client import encode_multipart
+from django.urls import resolve, reverse
+
+from deposits import upload_limits
+from deposits.upload_limits import BodyTooLarge, NotAnImage, TooManyFiles, UploadGuard
+
+
+BOUNDARY = "BoUnDaRyStRiNg"
+MULTIPART = f"multipart/form-data; boundary={BOUNDARY}"
+PNG = b"\x89PNG\r\n\x1a\n"
+
+
+def image(name="photo.png", size=1024, head=PNG):
+    return SimpleUploadedFile(name, head + b"\0" * (size - len(head)), content_type="image/png")
+
+
+def multipart(data):
+    return encode_multipart(BOUNDARY, data)
+
+
+class FakeDjango:
+    """Reads the whole body like Django's ASGI handler, then answers 200."""
+
+    def __init__(self):
+        self.calls = 0
+        self.body = b""
+        self.disconnected = False
+
+    async def __call__(self, scope, receive, send):
+        self.calls += 1
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                self.disconnected = True
+                return
+            self.body += message.get("body", b"")
+            if not message.get("more_body", False):
+                break
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+
+# Images up to 4KB (plus 1KB of multipart framing) on the upload routes
+@mock.patch.object(upload_limits, "MAX_IMAGE_SIZE", 4096)
+@override_settings(UPLOAD_MULTIPART_OVERHEAD=1024, REQUEST_BODY_MAX_SIZE=1000)
+class UploadGuardTests(SimpleTestCase):
+    def setUp(self):
+        upload_limits.reset_after_fork()
+        self.addCleanup(upload_limits.reset_after_fork)
+        self.django = FakeDjango()
+
+    async def request(self, path, body, content_type=MULTIPART, declared=True, chunk_size=512):
+        """
+        Send ``body`` in ``chunk_size`` pieces through the guard; returns
+        the response status and how many pieces the client got to send.
+        """
+        headers = [(b"content-type", content_type.encode())]
+        if declared:
+            headers.append((b"content-length", str(len(body)).encode()))
+        chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)]
+        sent = 0
+
+        async def receive():
+            nonlocal sent
+            sent += 1
+            return {"type": "http.request", "body": chunks[sent - 1], "more_body": sent < len(chunks)}
+
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {"type": "http", "method": "POST", "path": path, "headers": headers}
+        await UploadGuard(self.django)(scope, receive, send)
+        return messages[0]["status"], sent
+
+    async def test_image_within_limits_passes_through(self):
+        body = multipart({"image": image(size=3000)})
+        status, sent = await self.request(reverse("deposits:upload"), body)
+        self.assertEqual(status, 200)
+        self.assertEqual(self.django.body, body)
+
+    async def test_declared_length_over_limit(self):
+        body = multipart({"image": image(size=6000)})
+        status, sent = await self.request(reverse("deposits:upload"), body)
+        self.assertEqual((status, sent, self.django.calls), (413, 0, 0))
+        stats = upload_limits.get_upload_stats().stats()
+        self.assertEqual(stats["rejected"], {"too_large": 1})
+        self.assertEqual(stats["rejected_bytes_unread"], len(body))
+
+    async def test_chunked_body_over_limit_is_cut_off_mid_stream(self):
+        body = multipart({"image": image(size=20000)})
+        status, sent = await self.request(reverse("deposits:upload"), body, declared=False)
+        self.assertEqual(status, 413)
+        self.assertTrue(self.django.disconnected)
+        # Cut off at the first piece over 4KB + 1KB, not at the end of the body
+        self.assertEqual(sent, (4096 + 1024) // 512 + 1)
+        self.assertEqual(upload_limits.get_upload_stats().stats()["rejected_bytes_read"], sent * 512)
+
+    async def test_chunked_body_over_limit_on_other_routes(self):
+        status, sent = await self.request(reverse("deposits:bin-telemetry"), b"{}\n" * 1000,
+                                          "application/x-ndjson", declared=False)
+        self.assertEqual((status, sent), (413, 2))
+
+    async def test_first_chunk_not_an_image(self):
+        body = multipart({"image": image(name="notes.txt", size=3000, head=b"plain text, honest")})
+        status, sent = await self.request(reverse("deposits:upload"), body)
+        self.assertEqual((status, sent), (415, 1))
+        self.assertTrue(self.django.disconnected)
+        self.assertEqual(upload_limits.get_upload_stats().stats()["rejected"], {"not_image": 1})
+
+    async def test_image_route_requires_multipart(self):
+        status, sent = await self.request(reverse("deposits:upload"), PNG, "image/png")
+        self.assertEqual((status, sent, self.django.calls), (415, 0, 0))
+
+
+@mock.patch.object(upload_limits, "MAX_IMAGE_SIZE", 200 * 1024)
+@override_settings(UPLOAD_MULTIPART_OVERHEAD=1024, BATCH_UPLOAD_MAX_IMAGES=3,
+                   FILE_UPLOAD_MAX_MEMORY_SIZE=100 * 1024, UPLOAD_MEMORY_BUDGET=100 * 1024)
+class ImageUploadHandlerTests(SimpleTestCase):
+    def setUp(self):
+        upload_limits.reset_after_fork()
+        self.addCleanup(upload_limits.reset_after_fork)
+
+    def parse(self, view_name, data, content_length=None):
+        """Parse a multipart POST the way a WSGI worker would; returns request.FILES."""
+        path = reverse(view_name)
+        request = RequestFactory().post(path, data)
+        request.resolver_match = resolve(path)
+        if content_length is not None:
+            request.META["CONTENT_LENGTH"] = str(content_length)
+        self.handler = request.upload_handlers[0]
+        self.addCleanup(request.close)
+        return request.FILES
+
+    def test_files_carry_their_sha256(self):
+        files = self.parse("deposits:upload", {"image": image(size=5000)})
+        uploaded = files["image"]
+        self.assertEqual(uploaded.sha256, hashlib.sha256(image(size=5000).read()).digest())
+        self.assertEqual(upload_limits.get_upload_stats().stats()["accepted_files"], 1)
+
+    def test_declared_length_over_limit(self):
+        with self.assertRaises(BodyTooLarge):
+            self.parse("deposits:upload", {"image": image()}, content_length=10 ** 6)
+        self.assertEqual(self.handler.received, 0)
+
+    def test_file_over_limit_mid_stream(self):
+        # The batch body limit fits this file; the per-file limit does not
+        with self.assertRaises(BodyTooLarge):
+            self.parse("deposits:upload-batch", {"images": image(size=400 * 1024)})
+        # Rejected at the first 64KB chunk past 200KB, with the spool closed
+        self.assertGreater(self.handler.received, 200 * 1024)
+        self.assertLessEqual(self.handler.received, (200 + 64) * 1024)
+        self.assertEqual(self.handler.spooled, [])
+
+    def test_first_chunk_not_an_image(self):
+        with self.assertRaises(NotAnImage):
+            self.parse("deposits:upload", {"image": image(size=150 * 1024, head=b"MZ executable")})
+        self.assertLessEqual(self.handler.received, 64 * 1024)
+
+    def test_too_many_files(self):
+        with self.assertRaises(TooManyFiles):
+            self.parse("deposits:upload", {"image": [image("a.png"), image("b.png")]})
+        images = [image(f"{i}.png") for i in range(4)]
+        with self.assertRaises(TooManyFiles):
+            self.parse("deposits:upload-batch", {"images": images})
+        self.assertEqual(upload_limits.get_upload_stats().stats()["rejected"], {"too_many_files": 2})
+
+    def test_small_files_stay_in_memory_within_budget(self):
+        files = self.parse("deposits:upload-batch", {"images": [
+            image("small.png", 60 * 1024),
+            image("over_budget.png", 60 * 1024),
+            image("large.png", 120 * 1024),
+        ]}).getlist("images")
+        self.assertEqual([type(uploaded) for uploaded in files],
+                         [InMemoryUploadedFile, TemporaryUploadedFile, TemporaryUploadedFile])
+        for uploaded, size in zip(files, (60, 60, 120)):
+            self.assertEqual(uploaded.size, size * 1024)
+            self.assertEqual(uploaded.read(), image(size=size * 1024).read())
@@ -0,0 +1,181 @@
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from deposits.services import user_stats
+from deposits.services.supabase_client import SupabaseError
+from deposits.services.user_stats import (
+    SPARKLINE_DAYS,
+    StatsQueue,
+    apply_delta,
+    build_all,
+    changes_to_deltas,
+    contribution,
+    summarize,
+)
+
+
+TODAY = date(2026, 3, 10)
+
+
+def deposit(day, status="completed", points=10, item_type="Mobile", user_id="u1", hour=12):
+    return {
+        "user_id": user_id, "status": status, "item_type": item_type, "points_earned": points,
+        "co2_saved": 0.5, "weight": 0.2,
+        "created_at": datetime.combine(day, datetime.min.time(), timezone.utc) + timedelta(hours=hour),
+    }
+
+
+class FakeStatsRepository:
+    def __init__(self, fail=()):
+        self.stats = {}
+        self.fail = set(fail)
+        self.calls = []
+
+    def update_user_stats(self, user_id, update):
+        self.calls.append(user_id)
+        if user_id in self.fail:
+            raise SupabaseError("conflict")
+        self.stats[user_id] = update(self.stats.get(user_id))
+        return self.stats[user_id]
+
+
+class ApplyDeltaTests(SimpleTestCase):
+    def test_completed_deposit_counts(self):
+        stats = apply_delta(None, contribution(deposit(TODAY)), TODAY)
+        self.assertEqual((stats["deposits"], stats["items_recycled"], stats["total_points"]), (1, 1, 10))
+        self.assertEqual(stats["statuses"], {"completed": 1})
+        self.assertEqual(stats["categories"], {"Mobile": 1})
+        self.assertEqual(stats["days"], {TODAY.isoformat(): [1, 10]})
+
+    def test_pending_deposit_only_counts_status(self):
+        stats = apply_delta(None, contribution(deposit(TODAY, status="pending")), TODAY)
+        self.assertEqual((stats["deposits"], stats["items_recycled"]), (1, 0))
+        self.assertEqual(stats["statuses"], {"pending": 1})
+        self.assertEqual(stats["days"], {})
+
+    def test_failing_a_completed_deposit_reverts_it(self):
+        completed = deposit(TODAY)
+        stats = build_all([completed], TODAY)["u1"]
+        deltas = changes_to_deltas([(completed, dict(completed, status="failed"))])
+        stats = apply_delta(stats, deltas["u1"], TODAY)
+        self.assertEqual((stats["deposits"], stats["items_recycled"], stats["total_points"]), (1, 0, 0))
+        self.assertEqual(stats["statuses"], {"failed": 1})
+        self.assertEqual((stats["categories"], stats["days"]), ({}, {}))
+
+    def test_unchanged_rows_have_no_delta(self):
+        row = deposit(TODAY)
+        self.assertEqual(changes_to_deltas([(row, dict(row))]), {})
+
+    def test_merged_deltas_match_applying_one_by_one(self):
+        changes = [
+            (None, deposit(TODAY - timedelta(days=1))),
+            (None, deposit(TODAY, item_type="Laptop", points=25)),
+            (deposit(TODAY, status="pending"), deposit(TODAY, points=5)),
+        ]
+        one_by_one = None
+        for change in changes:
+            one_by_one = apply_delta(one_by_one, changes_to_deltas([change])["u1"], TODAY)
+        merged = apply_delta(None, changes_to_deltas(changes)["u1"], TODAY)
+        self.assertEqual(summarize(merged, TODAY), summarize(one_by_one, TODAY))
+        self.assertEqual(merged["current_streak"], 2)
+
+
+class StreakTests(SimpleTestCase):
+    def test_consecutive_days_extend_and_gaps_reset(self):
+        days = [TODAY - timedelta(days=offset) for offset in (6, 5, 4, 2, 1)]
+        stats = build_all([deposit(day) for day in days], TODAY)["u1"]
+        self.assertEqual((stats["current_streak"], stats["longest_streak"]), (2, 3))
+        self.assertEqual(stats["last_active_day"], days[-1].isoformat())
+
+    def test_second_deposit_on_same_day_keeps_streak(self):
+        stats = build_all([deposit(TODAY - timedelta(days=1)), deposit(TODAY)], TODAY)["u1"]
+        stats = apply_delta(stats, contribution(deposit(TODAY, hour=20)), TODAY)
+        self.assertEqual(stats["current_streak"], 2)
+        self.assertEqual(stats["days"][TODAY.isoformat()], [2, 20])
+
+    def test_out_of_order_day_does_not_extend(self):
+        stats = build_all([deposit(TODAY)], TODAY)["u1"]
+        stats = apply_delta(stats, contribution(deposit(TODAY - timedelta(days=1))), TODAY)
+        self.assertEqual(stats["current_streak"], 1)
+        self.assertEqual(stats["last_active_day"], TODAY.isoformat())
+
+    def test_day_is_the_utc_day(self):
+        late = dict(deposit(TODAY), created_at=datetime(2026, 3, 9, 23, 30, tzinfo=timezone(timedelta(hours=-5))))
+        stats = apply_delta(None, contribution(late), TODAY)
+        self.assertEqual(list(stats["days"]), [TODAY.isoformat()])
+
+    def test_summary_streak_expires_after_a_missed_day(self):
+        stats = build_all([deposit(TODAY - timedelta(days=1)), deposit(TODAY)], TODAY)["u1"]
+        self.assertEqual(summarize(stats, TODAY)["current_streak"], 2)
+        self.assertEqual(summarize(stats, TODAY + timedelta(days=1))["current_streak"], 2)
+        summary = summarize(stats, TODAY + timedelta(days=2))
+        self.assertEqual((summary["current_streak"], summary["longest_streak"]), (0, 2))
+
+
+class SparklineTests(SimpleTestCase):
+    def test_days_outside_the_window_are_dropped(self):
+        oldest = TODAY - timedelta(days=SPARKLINE_DAYS - 1)
+        rows = [deposit(oldest - timedelta(days=1)), deposit(oldest), deposit(TODAY)]
+        stats = build_all(rows, TODAY)["u1"]
+        self.assertEqual(list(stats["days"]), [oldest.isoformat(), TODAY.isoformat()])
+        self.assertEqual(stats["items_recycled"], 3)
+
+        # A day later the oldest bucket falls out as well
+        stats = apply_delta(stats, Counter(), TODAY + timedelta(days=1))
+        self.assertEqual(list(stats["days"]), [TODAY.isoformat()])
+
+    def test_summary_has_one_bucket_per_day(self):
+        stats = build_all([deposit(TODAY - timedelta(days=3)), deposit(TODAY)], TODAY)["u1"]
+        sparkline = summarize(stats, TODAY)["sparkline"]
+        self.assertEqual(len(sparkline), SPARKLINE_DAYS)
+        self.assertEqual(sparkline[-1], {"day": TODAY.isoformat(), "items": 1, "points": 10})
+        self.assertEqual(sparkline[-4]["items"], 1)
+        self.assertEqual(sum(bucket["items"] for bucket in sparkline), 2)
+
+
+class StatsQueueTests(SimpleTestCase):
+    def setUp(self):
+        self.repository = FakeStatsRepository()
+        patcher = mock.patch.object(user_stats, "get_repository", return_value=self.repository)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.queue = StatsQueue(interval=3600)
+        self.addCleanup(self.queue.close)
+
+    def test_deltas_of_a_user_are_merged(self):
+        self.queue.add(changes_to_deltas([(None, deposit(TODAY))]))
+        self.queue.add(changes_to_deltas([(None, deposit(TODAY, user_id="u2"))]))
+        self.queue.add(changes_to_deltas([(None, deposit(TODAY, points=5))]))
+        self.assertEqual(self.queue.pending(), 2)
+
+        self.assertEqual(self.queue.flush(), 2)
+        self.assertEqual(sorted(self.repository.calls), ["u1", "u2"])
+        self.assertEqual(self.repository.stats["u1"]["total_points"], 15)
+        self.assertEqual(self.queue.pending(), 0)
+
+    def test_failed_update_is_retried_with_later_deltas(self):
+        self.repository.fail.add("u1")
+        self.queue.add(changes_to_deltas([(None, deposit(TODAY))]))
+        self.assertEqual(self.queue.flush(), 0)
+        self.assertEqual(self.queue.pending(), 1)
+
+        self.repository.fail.clear()
+        self.queue.add(changes_to_deltas([(None, deposit(TODAY, points=5))]))
+        self.assertEqual(self.queue.flush(), 1)
+        self.assertEqual(self.repository.stats["u1"]["deposits"], 2)
+        self.assertEqual(self.repository.stats["u1"]["total_points"], 15)
+
+    def test_close_flushes_pending_deltas(self):
+        self.queue.add(changes_to_deltas([(None, deposit(TODAY))]))
+        self.queue.close()
+        self.assertEqual(self.repository.stats["u1"]["deposits"], 1)
+
+    @mock.patch.object(user_stats, "get_stats_queue")
+    def test_record_inserts_only_queues(self, get_stats_queue):
+        with self.settings(USER_STATS_ENABLED=True):
+            user_stats.record_inserts([deposit(TODAY)])
+        get_stats_queue.return_value.add.assert_called_once()
+        self.assertEqual(self.repository.calls, [])
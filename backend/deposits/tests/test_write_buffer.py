@@ -0,0 +1,159 @@
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from deposits.services import write_buffer
+from deposits.services.supabase_client import SupabaseError
+from deposits.services.write_buffer import BufferClosedError, WriteBuffer
+
+
+class FakeFlush:
+    """Records batches; can block a flush until released, or fail it."""
+
+    def __init__(self):
+        self.batches = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+        self.error = None
+
+    def __call__(self, rows):
+        self.batches.append([row["id"] for row in rows])
+        self.started.set()
+        self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return [dict(row, stored=True) for row in reversed(rows)]
+
+
+class WriteBufferTests(SimpleTestCase):
+    def setUp(self):
+        self.flush = FakeFlush()
+
+    def make_buffer(self, max_batch=3, max_delay=60):
+        buffer = WriteBuffer(self.flush, max_batch=max_batch, max_delay=max_delay)
+        self.addCleanup(buffer.close, 5)
+        return buffer
+
+    def test_full_batch_flushes_and_matches_rows_by_id(self):
+        buffer = self.make_buffer()
+        futures = [buffer.submit({"id": str(i)}) for i in range(3)]
+        self.assertEqual([future.result(5)["id"] for future in futures], ["0", "1", "2"])
+        self.assertTrue(all(future.result()["stored"] for future in futures))
+        self.assertEqual((buffer.batches, buffer.rows), (1, 3))
+
+    def test_partial_batch_flushes_after_delay(self):
+        buffer = self.make_buffer(max_delay=0.01)
+        self.assertEqual(buffer.submit({"id": "a"}).result(5)["id"], "a")
+
+    def test_flush_failure_fails_every_row_of_the_batch(self):
+        self.flush.error = SupabaseError("insert failed")
+        buffer = self.make_buffer(max_batch=2)
+        futures = [buffer.submit({"id": "a"}), buffer.submit({"id": "b"})]
+        for future in futures:
+            with self.assertRaises(SupabaseError):
+                future.result(5)
+        self.assertEqual(buffer.rows, 0)
+
+        # The buffer keeps working after a failed batch
+        self.flush.error = None
+        futures = [buffer.submit({"id": "c"}), buffer.submit({"id": "d"})]
+        self.assertEqual([future.result(5)["id"] for future in futures], ["c", "d"])
+
+    def test_row_missing_from_response(self):
+        buffer = WriteBuffer(lambda rows: rows[:1], max_batch=2, max_delay=60)
+        self.addCleanup(buffer.close, 5)
+        first, second = buffer.submit({"id": "a"}), buffer.submit({"id": "b"})
+        self.assertEqual(first.result(5)["id"], "a")
+        with self.assertRaises(KeyError):
+            second.result(5)
+
+    def test_withdraw_only_while_queued(self):
+        self.flush.release.clear()
+        buffer = self.make_buffer(max_batch=1)
+        in_flight = buffer.submit({"id": "a"})
+        self.assertTrue(self.flush.started.wait(5))
+        queued = buffer.submit({"id": "b"})
+
+        self.assertFalse(buffer.withdraw(in_flight))
+        self.assertTrue(buffer.withdraw(queued))
+        self.assertTrue(queued.cancelled())
+
+        self.flush.release.set()
+        self.assertEqual(in_flight.result(5)["id"], "a")
+        self.assertEqual(self.flush.batches, [["a"]])
+
+    def test_close_flushes_pending_rows_and_refuses_new_ones(self):
+        buffer = self.make_buffer(max_batch=10)
+        futures = [buffer.submit({"id": str(i)}) for i in range(4)]
+        buffer.close(5)
+        self.assertEqual([future.result(0)["id"] for future in futures], ["0", "1", "2", "3"])
+        with self.assertRaises(BufferClosedError):
+            buffer.submit({"id": "late"})
+
+    def test_close_while_flush_in_flight_drains_the_rest(self):
+        self.flush.release.clear()
+        buffer = self.make_buffer(max_batch=2)
+        first = [buffer.submit({"id": "a"}), buffer.submit({"id": "b"})]
+        self.assertTrue(self.flush.started.wait(5))
+        rest = [buffer.submit({"id": "c"}), buffer.submit({"id": "d"}), buffer.submit({"id": "e"})]
+
+        closer = threading.Thread(target=buffer.close, args=(5,))
+        closer.start()
+        self.flush.release.set()
+        closer.join(5)
+        self.assertFalse(closer.is_alive())
+        self.assertEqual(self.flush.batches, [["a", "b"], ["c", "d"], ["e"]])
+        self.assertTrue(all(future.done() for future in first + rest))
+
+
+@override_settings(TRANSACTION_WRITE_BUFFER_RESULT_TIMEOUT=0.05,
+                   TRANSACTION_WRITE_BUFFER_MAX_BATCH=1,
+                   TRANSACTION_WRITE_BUFFER_MAX_DELAY_MS=0)
+class InsertBufferedTests(SimpleTestCase):
+    def setUp(self):
+        self.flush = FakeFlush()
+        self.backend = mock.Mock()
+        self.backend.insert_transactions.side_effect = self.flush
+        patcher = mock.patch("deposits.services.data_backend.get_data_backend", return_value=self.backend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        write_buffer.reset_after_fork()
+        self.addCleanup(write_buffer.reset_after_fork)
+        self.addCleanup(write_buffer.drain_write_buffer, 5)
+
+    def test_assigns_id_and_returns_stored_row(self):
+        row = write_buffer.insert_buffered({"user_id": "u1"})
+        self.assertTrue(row["stored"])
+        self.assertIsNone(row["detected_confidence"])
+        self.assertEqual(self.flush.batches, [[row["id"]]])
+
+    def test_timeout_while_queued_withdraws_the_row(self):
+        self.flush.release.clear()
+        threading.Thread(target=write_buffer.insert_buffered, args=({"user_id": "u1"},)).start()
+        self.assertTrue(self.flush.started.wait(5))
+
+        # The flush thread is busy, so this row times out in the queue
+        with self.assertRaises(SupabaseError):
+            write_buffer.insert_buffered({"user_id": "u2"})
+        self.flush.release.set()
+        write_buffer.drain_write_buffer(5)
+        self.assertEqual(len(self.flush.batches), 1)
+
+    def test_timeout_while_in_flight_waits_for_the_write(self):
+        self.flush.release.clear()
+        threading.Timer(0.2, self.flush.release.set).start()
+        row = write_buffer.insert_buffered({"user_id": "u1"})
+        self.assertTrue(row["stored"])
+
+    def test_flush_failure_raises_supabase_error(self):
+        self.flush.error = RuntimeError("connection reset")
+        with self.assertRaises(SupabaseError):
+            write_buffer.insert_buffered({"user_id": "u1"})
+
+    def test_closed_buffer_inserts_directly(self):
+        write_buffer.get_write_buffer().close(5)
+        row = write_buffer.insert_buffered({"user_id": "u1"})
+        self.assertTrue(row["stored"])
+        self.assertEqual(self.backend.insert_transactions.call_count, 1)
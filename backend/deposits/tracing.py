@@ -0,0 +1,467 @@
+"""
+Lightweight request tracing for the Deposits API.
+
+Provides a small subset of the OpenTelemetry tracing API
+(``get_tracer().start_as_current_span(...)``, ``span.set_attribute``,
+``span.record_exception``) so that per-stage timings of an upload (JWKS
+fetch, R2 PUT, presign, user lookup/creation, insert) can be recorded
+without pulling in the OpenTelemetry SDK.
+
+Tracing is off by default and the no-op tracer costs one attribute
+lookup per traced call. When enabled, root spans are sampled at
+``TRACING_SAMPLE_RATE`` (or follow an incoming W3C ``traceparent``
+header), and finished spans are exported in batches from a background
+thread to either a JSON-lines file or an OTLP/HTTP collector on
+localhost.
+"""
+
+import atexit
+import contextvars
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+_TRACEPARENT_RE = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+
+class SpanContext:
+    """Identifiers carried across process boundaries."""
+
+    __slots__ = ('trace_id', 'span_id', 'sampled')
+
+    def __init__(self, trace_id: str, span_id: str, sampled: bool):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.sampled = sampled
+
+    def to_traceparent(self) -> str:
+        flags = '01' if self.sampled else '00'
+        return f"00-{self.trace_id}-{self.span_id}-{flags}"
+
+    @classmethod
+    def from_traceparent(cls, header: Optional[str]) -> Optional['SpanContext']:
+        if not header:
+            return None
+        match = _TRACEPARENT_RE.match(header.strip().lower())
+        if not match:
+            return None
+        trace_id, span_id, flags = match.groups()
+        return cls(trace_id, span_id, bool(int(flags, 16) & 1))
+
+
+def _new_id(nbytes: int) -> str:
+    return f"{random.getrandbits(nbytes * 8):0{nbytes * 2}x}"
+
+
+class NonRecordingSpan:
+    """
+    Span that records nothing.
+
+    Used when tracing is disabled or the trace was not sampled. It still
+    carries its context so the trace ID propagates to upstream services.
+    """
+
+    is_recording = False
+
+    def __init__(self, context: Optional[SpanContext] = None):
+        self.context = context
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_attributes(self, attributes: Dict[str, Any]) -> None:
+        pass
+
+    def record_exception(self, exc: BaseException) -> None:
+        pass
+
+    def set_status(self, status: str, description: Optional[str] = None) -> None:
+        pass
+
+
+INVALID_SPAN = NonRecordingSpan()
+
+
+class Span:
+    """A timed, recorded operation within a trace."""
+
+    is_recording = True
+
+    __slots__ = (
+        'name', 'context', 'parent_id', 'start_ns', 'end_ns',
+        'attributes', 'status', 'status_description', 'events',
+    )
+
+    def __init__(self, name: str, context: SpanContext, parent_id: Optional[str]):
+        self.name = name
+        self.context = context
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = {}
+        self.status = 'UNSET'
+        self.status_description: Optional[str] = None
+        self.events: List[Dict[str, Any]] = []
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_attributes(self, attributes: Dict[str, Any]) -> None:
+        self.attributes.update(attributes)
+
+    def record_exception(self, exc: BaseException) -> None:
+        self.events.append({
+            "name": "exception",
+            "time_ns": time.time_ns(),
+            "attributes": {
+                "exception.type": type(exc).__name__,
+                "exception.message": str(exc),
+            },
+        })
+
+    def set_status(self, status: str, description: Optional[str] = None) -> None:
+        self.status = status
+        self.status_description = description
+
+    def end(self) -> None:
+        self.end_ns = time.time_ns()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.context.trace_id,
+            "span_id": self.context.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": (self.end_ns - self.start_ns) / 1e6 if self.end_ns else None,
+            "attributes": self.attributes,
+            "status": self.status,
+            "status_description": self.status_description,
+            "events": self.events,
+        }
+
+
+_current_span: contextvars.ContextVar[Any] = contextvars.ContextVar(
+    'current_span', default=INVALID_SPAN
+)
+
+
+def get_current_span():
+    """Return the active span, or a non-recording placeholder."""
+    return _current_span.get()
+
+
+class FileSpanExporter:
+    """Append finished spans to a JSON-lines file."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def export(self, spans: List[Span]) -> None:
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for span in spans:
+                f.write(json.dumps(span.to_dict(), default=str))
+                f.write('\n')
+
+
+class OTLPHTTPSpanExporter:
+    """
+    Send finished spans to an OTLP/HTTP collector as JSON.
+
+    Intended for a collector or agent running on localhost, so export
+    latency stays off the critical path and inside the host.
+    """
+
+    def __init__(self, endpoint: str, service_name: str = 'deposits-api'):
+        self.endpoint = endpoint
+        self.service_name = service_name
+
+    def _encode(self, spans: List[Span]) -> Dict[str, Any]:
+        def attr(key, value):
+            if isinstance(value, bool):
+                return {"key": key, "value": {"boolValue": value}}
+            if isinstance(value, int):
+                return {"key": key, "value": {"intValue": str(value)}}
+            if isinstance(value, float):
+                return {"key": key, "value": {"doubleValue": value}}
+            return {"key": key, "value": {"stringValue": str(value)}}
+
+        status_codes = {'UNSET': 0, 'OK': 1, 'ERROR': 2}
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [attr("service.name", self.service_name)]},
+                "scopeSpans": [{
+                    "scope": {"name": "deposits.tracing"},
+                    "spans": [
+                        {
+                            "traceId": span.context.trace_id,
+                            "spanId": span.context.span_id,
+                            "parentSpanId": span.parent_id or "",
+                            "name": span.name,
+                            "kind": 1,
+                            "startTimeUnixNano": str(span.start_ns),
+                            "endTimeUnixNano": str(span.end_ns),
+                            "attributes": [attr(k, v) for k, v in span.attributes.items()],
+                            "events": [
+                                {
+                                    "name": event["name"],
+                                    "timeUnixNano": str(event["time_ns"]),
+                                    "attributes": [
+                                        attr(k, v) for k, v in event["attributes"].items()
+                                    ],
+                                }
+                                for event in span.events
+                            ],
+                            "status": {
+                                "code": status_codes.get(span.status, 0),
+                                "message": span.status_description or "",
+                            },
+                        }
+                        for span in spans
+                    ],
+                }],
+            }],
+        }
+
+    def export(self, spans: List[Span]) -> None:
+        import httpx
+
+        response = httpx.post(self.endpoint, json=self._encode(spans), timeout=2.0)
+        response.raise_for_status()
+
+
+class BatchSpanProcessor:
+    """
+    Buffer finished spans and export them from a background thread.
+
+    Spans are flushed when ``max_batch`` are waiting or every
+    ``interval`` seconds. The buffer is bounded; spans are dropped rather
+    than blocking a request when the exporter falls behind.
+    """
+
+    def __init__(self, exporter, max_queue: int = 4096, max_batch: int = 256,
+                 interval: float = 2.0):
+        self.exporter = exporter
+        self.max_queue = max_queue
+        self.max_batch = max_batch
+        self.interval = interval
+        self._queue: "queue.SimpleQueue[Optional[Span]]" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._start()
+        atexit.register(self.shutdown)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._start)
+
+    def _start(self) -> None:
+        self._thread = threading.Thread(
+            target=self._run, name='span-exporter', daemon=True
+        )
+        self._thread.start()
+
+    def on_end(self, span: Span) -> None:
+        if self._queue.qsize() < self.max_queue:
+            self._queue.put_nowait(span)
+
+    def _run(self) -> None:
+        batch: List[Span] = []
+        deadline = time.monotonic() + self.interval
+        while True:
+            timeout = max(0.0, deadline - time.monotonic())
+            try:
+                span = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                span = ...
+            if span is None:
+                self._export(batch)
+                return
+            if span is not ...:
+                batch.append(span)
+            if len(batch) >= self.max_batch or time.monotonic() >= deadline:
+                self._export(batch)
+                batch = []
+                deadline = time.monotonic() + self.interval
+
+    def _export(self, batch: List[Span]) -> None:
+        if not batch:
+            return
+        try:
+            self.exporter.export(batch)
+        except Exception as e:
+            logger.warning("Span export failed (%d spans dropped): %s", len(batch), e)
+
+    def shutdown(self) -> None:
+        """Flush buffered spans and stop the export thread."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put_nowait(None)
+            self._thread.join(timeout=5.0)
+
+
+class Tracer:
+    """
+    Recording tracer with parent-based ratio sampling.
+
+    New traces are sampled with probability ``sample_rate``; spans with a
+    parent (local or from an incoming ``traceparent``) follow the
+    parent's decision so traces are never partially recorded.
+    """
+
+    enabled = True
+
+    def __init__(self, processor: BatchSpanProcessor, sample_rate: float):
+        self.processor = processor
+        self.sample_rate = sample_rate
+
+    def _should_sample(self) -> bool:
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    @contextmanager
+    def start_as_current_span(
+        self,
+        name: str,
+        attributes: Optional[Dict[str, Any]] = None,
+        context: Optional[SpanContext] = None,
+    ) -> Iterator[Any]:
+        """
+        Start a span, make it current for the duration of the block.
+
+        Args:
+            name: Span name, e.g. ``"r2.put_object"``
+            attributes: Initial span attributes
+            context: Remote parent context (from ``traceparent``); defaults
+                to the currently active span
+        """
+        if context is None:
+            parent = _current_span.get()
+            context = parent.context
+        if context is None:
+            trace_id, parent_id, sampled = _new_id(16), None, self._should_sample()
+        else:
+            trace_id, parent_id, sampled = context.trace_id, context.span_id, context.sampled
+
+        span_context = SpanContext(trace_id, _new_id(8), sampled)
+        if not sampled:
+            token = _current_span.set(NonRecordingSpan(span_context))
+            try:
+                yield _current_span.get()
+            finally:
+                _current_span.reset(token)
+            return
+
+        span = Span(name, span_context, parent_id)
+        if attributes:
+            span.attributes.update(attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as exc:
+            span.record_exception(exc)
+            span.set_status('ERROR', str(exc))
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+            self.processor.on_end(span)
+
+
+class NoOpTracer:
+    """Tracer used when tracing is disabled."""
+
+    enabled = False
+
+    @contextmanager
+    def start_as_current_span(self, name: str, attributes=None, context=None):
+        yield INVALID_SPAN
+
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer():
+    """
+    Get the process-wide tracer configured from settings.
+
+    ``TRACING_EXPORTER`` selects ``none`` (default), ``file`` or ``otlp``.
+    """
+    global _tracer
+    if _tracer is not None:
+        return _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = _build_tracer()
+    return _tracer
+
+
+def _build_tracer():
+    exporter_name = settings.TRACING_EXPORTER
+    if exporter_name == 'file':
+        exporter = FileSpanExporter(settings.TRACING_FILE_PATH)
+    elif exporter_name == 'otlp':
+        exporter = OTLPHTTPSpanExporter(settings.TRACING_OTLP_ENDPOINT)
+    else:
+        return NoOpTracer()
+    return Tracer(BatchSpanProcessor(exporter), settings.TRACING_SAMPLE_RATE)
+
+
+def traced(name: Optional[str] = None, **attributes) -> Callable:
+    """
+    Decorator that runs a function inside a span.
+
+    Args:
+        name: Span name (defaults to ``module.function``)
+        **attributes: Static attributes added to every span
+    """
+    def decorator(func: Callable) -> Callable:
+        span_name = name or f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            tracer = get_tracer()
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            with tracer.start_as_current_span(span_name, attributes or None):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def inject_trace_headers(headers: Dict[str, str]) -> Dict[str, str]:
+    """
+    Add a W3C ``traceparent`` header for the active span, if any.
+
+    Returns the same dict for convenient chaining.
+    """
+    context = _current_span.get().context
+    if context is not None:
+        headers['traceparent'] = context.to_traceparent()
+    return headers
+
+
+def _inject_boto_headers(request, **kwargs) -> None:
+    # Added after signing, so the signature is unaffected
+    context = _current_span.get().context
+    if context is not None:
+        request.headers['traceparent'] = context.to_traceparent()
+
+
+def instrument_boto_client(client) -> None:
+    """Propagate the active trace to every request made by a boto3 client."""
+    client.meta.events.register('before-send', _inject_boto_headers)
+
@@ -0,0 +1,467 @@
+"""
+Request body limits and streaming upload handling.
+
+Uploads are checked as they arrive, not after Django has received,
+parsed and spooled the whole body and the serializer has looked at the
+result:
+
+- Every route has a ``RouteLimit`` (``route_limit``). The image routes
+  allow ``MAX_IMAGE_SIZE`` per file plus ``UPLOAD_MULTIPART_OVERHEAD``
+  for the multipart framing (the batch route ``BATCH_UPLOAD_MAX_IMAGES``
+  times that), the resumable chunk route one chunk, and
+  every other route ``REQUEST_BODY_MAX_SIZE``. A declared
+  ``Content-Length`` over the limit, or an image route body that is not
+  ``multipart/form-data``, is rejected before any of it is read.
+- ``UploadGuard`` sits in front of Django in ``core/asgi.py``, because
+  Django's ASGI handler buffers the whole body before any middleware
+  runs. It counts the bytes as they are received and finds the first
+  file of an image upload in the stream; the request is cut off at the
+  first chunk over the limit or showing a file that is not an image.
+- ``ImageUploadHandler`` (``FILE_UPLOAD_HANDLERS``) checks each file
+  inside Django's multipart parser, which under WSGI reads the body from
+  the socket as it parses: size and count limits, image magic bytes in
+  the first chunk, and a SHA-256 computed as the file streams (used as
+  the R2 upload checksum). It keeps files up to
+  ``FILE_UPLOAD_MAX_MEMORY_SIZE`` in memory while the request's files
+  fit ``UPLOAD_MEMORY_BUDGET``, and spools the rest to temporary files.
+- ``UploadLimitMiddleware`` (``deposits/middleware.py``) applies the
+  header checks under WSGI.
+
+Rejections answer 413 (too large, too many files) or 415 (not multipart,
+not an image). Under ASGI the connection is then closed, so the client
+stops sending; gunicorn's WSGI workers read and discard the rest of a
+rejected body, which costs bandwidth but no parsing, hashing or storage.
+What was rejected, the bytes read before and left unread after each
+rejection, and the CPU time spent on rejected bodies are counted per
+worker (``GET /api/deposits/admin/uploads/``).
+"""
+
+import hashlib
+import io
+import logging
+import threading
+import time
+from typing import Any, Dict, NamedTuple, Optional
+
+from django.conf import settings
+from django.core.files.uploadedfile import InMemoryUploadedFile, TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from django.urls import Resolver404, resolve
+from django.utils.http import parse_header_parameters
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .fast_json import dumps
+from .serializers import MAX_IMAGE_SIZE
+
+
+logger = logging.getLogger(__name__)
+
+
+BODY_METHODS = frozenset({"POST", "PUT", "PATCH"})
+
+# Bytes needed to recognize every allowed image format
+SNIFF_BYTES = 12
+
+# How far into a body UploadGuard looks for the first file part
+SCAN_BYTES = 64 * 1024
+
+
+def is_image(head: bytes) -> bool:
+    """Whether a file's first bytes are a JPEG, PNG, GIF or WebP signature."""
+    return (
+        head.startswith((b"\xff\xd8\xff", b"\x89PNG\r\n\x1a\n", b"GIF87a", b"GIF89a"))
+        or (head[:4] == b"RIFF" and head[8:12] == b"WEBP")
+    )
+
+
+class RouteLimit(NamedTuple):
+    """
+    Body limits of one route: bytes per body and per file, files per
+    request (None for no limit), and whether the files must be images
+    sent as ``multipart/form-data``.
+    """
+
+    body: int
+    file: int
+    files: Optional[int] = None
+    images: bool = False
+
+
+def route_limit(view_name: Optional[str]) -> RouteLimit:
+    """The limits for a URL name (``namespace:name``), or the default."""
+    overhead = settings.UPLOAD_MULTIPART_OVERHEAD
+    if view_name in ("deposits:upload", "deposits:test-upload"):
+        return RouteLimit(MAX_IMAGE_SIZE + overhead, MAX_IMAGE_SIZE, files=1, images=True)
+    if view_name == "deposits:upload-batch":
+        count = settings.BATCH_UPLOAD_MAX_IMAGES
+        return RouteLimit(count * (MAX_IMAGE_SIZE + overhead), MAX_IMAGE_SIZE, files=count, images=True)
+    if view_name == "deposits:resumable-upload-chunk":
+        return RouteLimit(settings.UPLOAD_CHUNK_SIZE, settings.UPLOAD_CHUNK_SIZE)
+    return RouteLimit(settings.REQUEST_BODY_MAX_SIZE, settings.REQUEST_BODY_MAX_SIZE)
+
+
+def limit_for_path(path: str) -> RouteLimit:
+    try:
+        return route_limit(resolve(path).view_name)
+    except Resolver404:
+        return route_limit(None)
+
+
+class UploadRejected(APIException):
+    """A request body refused by its route's limits."""
+
+    error = "Upload rejected"
+
+    def as_body(self) -> Dict[str, Any]:
+        return {"success": False, "error": self.error, "detail": str(self.detail)}
+
+
+class BodyTooLarge(UploadRejected):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_code = "too_large"
+    default_detail = "The request body is too large."
+    error = "Request body too large"
+
+
+class TooManyFiles(UploadRejected):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_code = "too_many_files"
+    default_detail = "Too many files in one request."
+    error = "Too many files"
+
+
+class UnsupportedBody(UploadRejected):
+    status_code = status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+    default_code = "unsupported_type"
+    default_detail = "Send images as multipart/form-data."
+    error = "Unsupported content type"
+
+
+class NotAnImage(UploadRejected):
+    status_code = status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+    default_code = "not_image"
+    default_detail = "The uploaded file is not an image."
+    error = "Not an image"
+
+
+def _megabytes(size: int) -> str:
+    return f"{size / (1024 * 1024):g}MB"
+
+
+def check_headers(limit: RouteLimit, content_type: str,
+                  content_length: Optional[int]) -> Optional[UploadRejected]:
+    """The rejection a request earns from its headers alone, if any."""
+    if content_length is not None and content_length > limit.body:
+        return BodyTooLarge(
+            f"Request body is {content_length} bytes; this endpoint accepts at most {limit.body}."
+        )
+    if limit.images and parse_header_parameters(content_type or "")[0] != "multipart/form-data":
+        return UnsupportedBody("Send images as multipart/form-data.")
+    return None
+
+
+def parse_content_length(value: Any) -> Optional[int]:
+    try:
+        length = int(value)
+    except (TypeError, ValueError):
+        return None
+    return length if length >= 0 else None
+
+
+class UploadStats:
+    """
+    Counters of accepted and rejected upload bodies in this process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.accepted_files = 0
+        self.accepted_bytes = 0
+        self.rejected: Dict[str, int] = {}
+        self.rejected_bytes_read = 0
+        self.rejected_bytes_unread = 0
+        self.rejected_cpu_seconds = 0.0
+
+    def record_accepted(self, files: int, size: int) -> None:
+        with self._lock:
+            self.accepted_files += files
+            self.accepted_bytes += size
+
+    def record_rejected(self, rejection: UploadRejected, read: int,
+                        declared: Optional[int], cpu_seconds: float = 0.0) -> None:
+        """
+        Count a rejection after ``read`` body bytes of ``declared`` (the
+        Content-Length, when known).
+        """
+        with self._lock:
+            self.rejected[rejection.default_code] = self.rejected.get(rejection.default_code, 0) + 1
+            self.rejected_bytes_read += read
+            if declared is not None:
+                self.rejected_bytes_unread += max(declared - read, 0)
+            self.rejected_cpu_seconds += cpu_seconds
+        logger.info(
+            "Rejected upload (%s) after %d of %s bytes: %s",
+            rejection.default_code, read, declared if declared is not None else "?", rejection.detail,
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "accepted_files": self.accepted_files,
+                "accepted_bytes": self.accepted_bytes,
+                "rejected": dict(self.rejected),
+                "rejected_bytes_read": self.rejected_bytes_read,
+                "rejected_bytes_unread": self.rejected_bytes_unread,
+                "rejected_cpu_ms": round(self.rejected_cpu_seconds * 1000, 3),
+            }
+
+
+_stats: Optional[UploadStats] = None
+_stats_lock = threading.Lock()
+
+
+def get_upload_stats() -> UploadStats:
+    global _stats
+    if _stats is None:
+        with _stats_lock:
+            if _stats is None:
+                _stats = UploadStats()
+    return _stats
+
+
+def reset_after_fork() -> None:
+    """Start the worker's counters from zero, with a fresh lock."""
+    global _stats, _stats_lock
+    _stats = None
+    _stats_lock = threading.Lock()
+
+
+class ImageUploadHandler(FileUploadHandler):
+    """
+    Multipart file handler enforcing the route's limits per chunk.
+
+    Replaces Django's memory and temporary file handlers. Each completed
+    file carries the SHA-256 of its content as ``sha256``.
+    """
+
+    chunk_size = 64 * 1024
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        match = getattr(self.request, "resolver_match", None)
+        self.limit = route_limit(match.view_name if match else None)
+        self.declared = content_length
+        self.started = time.thread_time()
+        self.received = 0
+        self.files = 0
+        self.in_memory = 0
+        self.spooled = []
+        if content_length > self.limit.body:
+            self._reject(BodyTooLarge(
+                f"Request body is {content_length} bytes; this endpoint accepts at most {self.limit.body}."
+            ))
+        return None
+
+    def _reject(self, rejection: UploadRejected):
+        get_upload_stats().record_rejected(
+            rejection, self.received, self.declared, time.thread_time() - self.started
+        )
+        self._close_spooled()
+        raise rejection
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.files += 1
+        if self.limit.files is not None and self.files > self.limit.files:
+            self._reject(TooManyFiles(f"Send at most {self.limit.files} file(s) per request."))
+        self.head = b""
+        self.sha256 = hashlib.sha256()
+        self.buffer = io.BytesIO()
+        self.spool = None
+        self.file_size = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        self.file_size += len(raw_data)
+        if self.file_size > self.limit.file:
+            self._reject(BodyTooLarge(
+                f"{self.file_name} is too large. Maximum size is {_megabytes(self.limit.file)}."
+            ))
+        if self.limit.images and len(self.head) < SNIFF_BYTES:
+            self.head += raw_data[:SNIFF_BYTES - len(self.head)]
+            if len(self.head) == SNIFF_BYTES and not is_image(self.head):
+                self._reject(NotAnImage(f"{self.file_name} is not a JPEG, PNG, GIF or WebP image."))
+        self.sha256.update(raw_data)
+
+        if self.spool is None and (
+            self.file_size > settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+            or self.in_memory + self.file_size > settings.UPLOAD_MEMORY_BUDGET
+        ):
+            self.spool = TemporaryUploadedFile(
+                self.file_name, self.content_type, 0, self.charset, self.content_type_extra
+            )
+            self.spooled.append(self.spool)
+            self.spool.write(self.buffer.getbuffer())
+            self.buffer = None
+        (self.spool or self.buffer).write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if self.limit.images and file_size and not is_image(self.head):
+            self._reject(NotAnImage(f"{self.file_name} is not a JPEG, PNG, GIF or WebP image."))
+        if self.spool is not None:
+            uploaded = self.spool
+            uploaded.flush()
+            uploaded.seek(0)
+            uploaded.size = file_size
+        else:
+            self.in_memory += file_size
+            self.buffer.seek(0)
+            uploaded = InMemoryUploadedFile(
+                file=self.buffer,
+                field_name=self.field_name,
+                name=self.file_name,
+                content_type=self.content_type,
+                size=file_size,
+                charset=self.charset,
+                content_type_extra=self.content_type_extra,
+            )
+        uploaded.sha256 = self.sha256.digest()
+        return uploaded
+
+    def upload_complete(self):
+        if self.files:
+            get_upload_stats().record_accepted(self.files, self.received)
+
+    def upload_interrupted(self):
+        self._close_spooled()
+
+    def _close_spooled(self):
+        for spool in self.spooled:
+            spool.close()
+        self.spooled = []
+
+
+def _first_file_head(prefix: bytes, boundary: bytes) -> Optional[bytes]:
+    """
+    The first bytes (up to ``SNIFF_BYTES``) of the first file part in the
+    start of a multipart body, or None if ``prefix`` does not reach them.
+    """
+    delimiter = b"--" + boundary
+    position = 0
+    while True:
+        start = prefix.find(delimiter, position)
+        if start < 0:
+            return None
+        headers_end = prefix.find(b"\r\n\r\n", start)
+        if headers_end < 0:
+            return None
+        body_start = headers_end + 4
+        if b"filename=" in prefix[start:headers_end].lower():
+            end = prefix.find(b"\r\n" + delimiter, body_start)
+            if end < 0:
+                if len(prefix) - body_start < SNIFF_BYTES:
+                    return None
+                end = body_start + SNIFF_BYTES
+            return prefix[body_start:min(end, body_start + SNIFF_BYTES)]
+        position = body_start
+
+
+class _BodyScanner:
+    """Counts an ASGI request body and sniffs its first file."""
+
+    def __init__(self, limit: RouteLimit, boundary: Optional[bytes]):
+        self.limit = limit
+        self.boundary = boundary
+        self.received = 0
+        self.prefix = b"" if limit.images and boundary else None
+
+    def feed(self, data: bytes) -> Optional[UploadRejected]:
+        self.received += len(data)
+        if self.received > self.limit.body:
+            return BodyTooLarge(f"Request body exceeds {self.limit.body} bytes.")
+        if self.prefix is not None:
+            self.prefix += data[:SCAN_BYTES - len(self.prefix)]
+            head = _first_file_head(self.prefix, self.boundary)
+            if head is not None:
+                # Empty files are left to the serializer
+                self.prefix = None
+                if head and not is_image(head):
+                    return NotAnImage("The uploaded file is not a JPEG, PNG, GIF or WebP image.")
+            elif len(self.prefix) >= SCAN_BYTES:
+                self.prefix = None
+        return None
+
+
+class UploadGuard:
+    """
+    ASGI application enforcing request body limits in front of
+    ``application`` (Django), before and while the body is received.
+    """
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in BODY_METHODS:
+            return await self.application(scope, receive, send)
+
+        limit = limit_for_path(scope["path"])
+        headers = dict(scope["headers"])
+        content_type = headers.get(b"content-type", b"").decode("latin-1")
+        declared = parse_content_length(headers.get(b"content-length"))
+        rejection = check_headers(limit, content_type, declared)
+        if rejection is not None:
+            get_upload_stats().record_rejected(rejection, 0, declared)
+            return await self._send_rejection(send, rejection, headers)
+
+        boundary = None
+        if limit.images:
+            boundary = parse_header_parameters(content_type)[1].get("boundary", "").encode("latin-1") or None
+        elif declared is not None:
+            # The server stops at the declared length, which is in bounds
+            return await self.application(scope, receive, send)
+
+        scanner = _BodyScanner(limit, boundary)
+        rejected = None
+
+        async def guarded_receive():
+            nonlocal rejected
+            message = await receive()
+            if rejected is None and message["type"] == "http.request":
+                rejected = scanner.feed(message.get("body", b""))
+                if rejected is not None:
+                    # Django stops reading and sends nothing
+                    return {"type": "http.disconnect"}
+            return message
+
+        await self.application(scope, guarded_receive, send)
+        if rejected is not None:
+            get_upload_stats().record_rejected(rejected, scanner.received, declared)
+            await self._send_rejection(send, rejected, headers)
+
+    @staticmethod
+    async def _send_rejection(send, rejection: UploadRejected, request_headers):
+        body = dumps(rejection.as_body())
+        headers = [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            # Stop the client sending the rest of the body
+            (b"connection", b"close"),
+        ]
+        # Django's CORS middleware never sees this response; without the
+        # headers the browser would hide the error from the frontend
+        origin = request_headers.get(b"origin", b"").decode("latin-1")
+        if origin in settings.CORS_ALLOWED_ORIGINS:
+            headers += [
+                (b"access-control-allow-origin", origin.encode("latin-1")),
+                (b"access-control-allow-credentials", b"true"),
+                (b"access-control-expose-headers", b"x-request-id, traceparent"),
+                (b"vary", b"origin"),
+            ]
+        await send({
+            "type": "http.response.start",
+            "status": rejection.status_code,
+            "headers": headers,
+        })
+        await send({"type": "http.response.body", "body": body})
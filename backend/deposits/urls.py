@@ -3,14 +3,58 @@ URL routing for the Deposits API.
 """
 
 from django.urls import path
-from .views import DepositUploadView, HealthCheckView, DebugConfigView, TestUploadView
+from .views import (
+    DepositUploadView,
+    BatchUploadView,
+    ResumableUploadView,
+    ResumableUploadDetailView,
+    ResumableUploadChunkView,
+    ResumableUploadCompleteView,
+    HealthCheckView,
+    ReadinessView,
+    DebugConfigView,
+    TestUploadView,
+    ProfilerView,
+    LeaderboardView,
+    LeaderboardMeView,
+    RewardRulesView,
+    BinTelemetryView,
+    BinFillHistoryView,
+    CollectionRoutesView,
+    DepositImageView,
+    ImageCacheStatsView,
+    UploadStatsView,
+    TransactionReviewView,
+    UserStatsView,
+    UserTransactionsView,
+)
 
 
 app_name = 'deposits'
 
 urlpatterns = [
     path('upload/', DepositUploadView.as_view(), name='upload'),
+    path('upload/batch/', BatchUploadView.as_view(), name='upload-batch'),
+    path('uploads/', ResumableUploadView.as_view(), name='resumable-upload'),
+    path('uploads/<str:upload_id>/', ResumableUploadDetailView.as_view(), name='resumable-upload-detail'),
+    path('uploads/<str:upload_id>/chunks/<int:index>/', ResumableUploadChunkView.as_view(), name='resumable-upload-chunk'),
+    path('uploads/<str:upload_id>/complete/', ResumableUploadCompleteView.as_view(), name='resumable-upload-complete'),
     path('health/', HealthCheckView.as_view(), name='health'),
+    path('health/live/', HealthCheckView.as_view(), name='health-live'),
+    path('health/ready/', ReadinessView.as_view(), name='health-ready'),
     path('debug/', DebugConfigView.as_view(), name='debug'),
     path('test-upload/', TestUploadView.as_view(), name='test-upload'),
+    path('leaderboard/', LeaderboardView.as_view(), name='leaderboard'),
+    path('leaderboard/me/', LeaderboardMeView.as_view(), name='leaderboard-me'),
+    path('stats/me/', UserStatsView.as_view(), name='user-stats'),
+    path('transactions/me/', UserTransactionsView.as_view(), name='user-transactions'),
+    path('images/<path:object_key>', DepositImageView.as_view(), name='deposit-image'),
+    path('bins/telemetry/', BinTelemetryView.as_view(), name='bin-telemetry'),
+    path('bins/<uuid:bin_id>/history/', BinFillHistoryView.as_view(), name='bin-fill-history'),
+    path('admin/profiler/', ProfilerView.as_view(), name='admin-profiler'),
+    path('admin/rewards/', RewardRulesView.as_view(), name='admin-rewards'),
+    path('admin/routes/', CollectionRoutesView.as_view(), name='admin-routes'),
+    path('admin/image-cache/', ImageCacheStatsView.as_view(), name='admin-image-cache'),
+    path('admin/uploads/', UploadStatsView.as_view(), name='admin-uploads'),
+    path('admin/transactions/<uuid:transaction_id>/', TransactionReviewView.as_view(), name='admin-transaction'),
 ]
@@ -0,0 +1,48 @@
+"""
+Deposits API Views.
+
+One module per feature; the views are re-exported here for urls.py.
+"""
+
+from .bins import BinFillHistoryView, BinTelemetryView, CollectionRoutesView
+from .debug import DebugConfigView, ProfilerView, TestUploadView
+from .health import HealthCheckView, ReadinessView
+from .images import DepositImageView, ImageCacheStatsView
+from .leaderboard import LeaderboardMeView, LeaderboardView
+from .resumable import (
+    ResumableUploadChunkView,
+    ResumableUploadCompleteView,
+    ResumableUploadDetailView,
+    ResumableUploadView,
+)
+from .rewards import RewardRulesView
+from .stats import UserStatsView
+from .transactions import TransactionReviewView, UserTransactionsView
+from .uploads import BatchUploadView, DepositUploadView, UploadStatsView
+
+
+__all__ = [
+    "BatchUploadView",
+    "BinFillHistoryView",
+    "BinTelemetryView",
+    "CollectionRoutesView",
+    "DebugConfigView",
+    "DepositImageView",
+    "DepositUploadView",
+    "HealthCheckView",
+    "ImageCacheStatsView",
+    "LeaderboardMeView",
+    "LeaderboardView",
+    "ProfilerView",
+    "ReadinessView",
+    "ResumableUploadChunkView",
+    "ResumableUploadCompleteView",
+    "ResumableUploadDetailView",
+    "ResumableUploadView",
+    "RewardRulesView",
+    "TestUploadView",
+    "TransactionReviewView",
+    "UploadStatsView",
+    "UserStatsView",
+    "UserTransactionsView",
+]
@@ -0,0 +1,202 @@
+"""
+Bin endpoints: telemetry ingest, fill history and collection routes.
+"""
+
+import logging
+import time
+from django.conf import settings
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+
+from ..permissions import IsAdmin, HasBinTelemetryToken
+from ..serializers import (
+    FillHistoryQuerySerializer,
+    RoutePlanRequestSerializer,
+)
+from ..services.fill_history import FillHistoryError, get_fill_history, iter_series
+from ..services.routing import RoutingError, plan_collection
+from ..services.supabase_client import SupabaseError
+from ..services.telemetry import (
+    TelemetryFormatError,
+    get_telemetry_buffer,
+    parse_binary,
+    parse_ndjson,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+class BinTelemetryView(APIView):
+    """
+    POST /api/deposits/bins/telemetry/
+    
+    Batched fill-level readings from smart bins, as NDJSON
+    (``application/x-ndjson``) or binary column arrays
+    (``application/octet-stream``); see services/telemetry.py for both
+    formats. Readings are coalesced per bin and written to ``bins`` in
+    bulk every ``BIN_TELEMETRY_FLUSH_INTERVAL`` seconds, so the response
+    only acknowledges receipt. Bodies are limited to
+    ``REQUEST_BODY_MAX_SIZE``.
+    
+    Authenticated with a device token, not a Clerk session.
+    """
+    
+    authentication_classes = []
+    permission_classes = [HasBinTelemetryToken]
+    
+    parsers = {
+        'application/x-ndjson': parse_ndjson,
+        'application/octet-stream': parse_binary,
+    }
+    
+    def post(self, request):
+        parse = self.parsers.get(request.content_type.split(';')[0].strip().lower())
+        if parse is None:
+            return Response(
+                {
+                    "success": False,
+                    "error": "Unsupported content type",
+                    "detail": f"Use one of: {', '.join(self.parsers)}",
+                },
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            )
+        
+        try:
+            readings, rejected = parse(request.body)
+        except TelemetryFormatError as e:
+            return Response(
+                {
+                    "success": False,
+                    "error": "Invalid telemetry body",
+                    "detail": str(e),
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        
+        get_telemetry_buffer().add(readings)
+        if rejected:
+            logger.warning("Rejected %d of %d bin readings", rejected, len(readings) + rejected)
+        return Response(
+            {"success": True, "accepted": len(readings), "rejected": rejected},
+            status=status.HTTP_202_ACCEPTED,
+        )
+
+
+class BinFillHistoryView(APIView):
+    """
+    GET /api/deposits/bins/<bin_id>/history/?days=30&step=3600&agg=mean
+    
+    Admin-only fill curve of one bin from the local fill history (see
+    services/fill_history.py), downsampled to ``step``-second buckets,
+    plus the current fill rate since the bin was last emptied. Answered
+    without querying Supabase.
+    """
+    
+    permission_classes = [IsAdmin]
+    
+    def get(self, request, bin_id):
+        serializer = FillHistoryQuerySerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(
+                {
+                    "success": False,
+                    "error": "Invalid request",
+                    "detail": serializer.errors,
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        params = serializer.validated_data
+        
+        store = get_fill_history()
+        now = time.time()
+        try:
+            ts, fill = store.query(
+                str(bin_id), now - params['days'] * 86400, now,
+                step=params['step'] or None, agg=params['agg'],
+            )
+            rate = store.fill_rate(str(bin_id), now)
+        except FillHistoryError as e:
+            return Response(
+                {
+                    "success": False,
+                    "error": "Fill history unavailable",
+                    "detail": str(e),
+                },
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+        
+        return Response({
+            "success": True,
+            "bin_id": str(bin_id),
+            "step": params['step'],
+            "agg": params['agg'],
+            "fill_rate_per_hour": round(rate, 3) if rate is not None else None,
+            "points": list(iter_series(ts, fill)),
+        })
+
+
+class CollectionRoutesView(APIView):
+    """
+    POST /api/deposits/admin/routes/
+    
+    Admin-only pickup route plan for the bins predicted to reach
+    ``threshold`` percent within ``horizon_hours`` (see
+    services/routing.py). Planning is stateless and takes well under a
+    second for a few hundred bins, so admins can re-plan with different
+    parameters interactively.
+    """
+    
+    permission_classes = [IsAdmin]
+    
+    def post(self, request):
+        serializer = RoutePlanRequestSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                {
+                    "success": False,
+                    "error": "Invalid request",
+                    "detail": serializer.errors,
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        params = serializer.validated_data
+        depot = (
+            params.get('depot_latitude', settings.ROUTE_DEPOT_LATITUDE),
+            params.get('depot_longitude', settings.ROUTE_DEPOT_LONGITUDE),
+        )
+        
+        try:
+            plan = plan_collection(
+                depot,
+                horizon_hours=params['horizon_hours'],
+                threshold=params['threshold'],
+                vehicle_capacity=params.get('vehicle_capacity', settings.ROUTE_VEHICLE_CAPACITY),
+                max_vehicles=params.get('vehicles'),
+            )
+        except SupabaseError as e:
+            logger.error("Route planning could not read bins: %s", e)
+            return Response(
+                {
+                    "success": False,
+                    "error": "Database operation failed",
+                    "detail": str(e),
+                },
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+        except RoutingError as e:
+            return Response(
+                {
+                    "success": False,
+                    "error": "Route planning failed",
+                    "detail": str(e),
+                },
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+        
+        return Response({
+            "success": True,
+            "depot": {"latitude": depot[0], "longitude": depot[1]},
+            **plan,
+        })
@@ -0,0 +1,191 @@
+"""
+Debugging and profiling endpoints.
+"""
+
+import logging
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+
+from ..permissions import IsAdmin
+from ..profiling import get_profiler
+from ..serializers import ProfilerControlSerializer
+from ..health import get_monitor
+
+
+logger = logging.getLogger(__name__)
+
+
+class DebugConfigView(APIView):
+    """
+    GET /api/deposits/debug/
+    
+    Debug endpoint to test configuration (no auth). Remove in production!
+    """
+    
+    permission_classes = []
+    authentication_classes = []
+    
+    def get(self, request):
+        result = {
+            "r2_configured": False,
+            "r2_test": None,
+            "supabase_configured": False,
+            "clerk_configured": False,
+            "errors": []
+        }
+        
+        # Check R2 config
+        try:
+            result["r2_access_key"] = bool(settings.R2_ACCESS_KEY_ID)
+            result["r2_secret_key"] = bool(settings.R2_SECRET_ACCESS_KEY)
+            result["r2_bucket"] = settings.R2_BUCKET_NAME
+            result["r2_endpoint"] = settings.R2_ENDPOINT_URL
+            
+            if all([settings.R2_ACCESS_KEY_ID, settings.R2_SECRET_ACCESS_KEY, 
+                   settings.R2_BUCKET_NAME, settings.R2_ENDPOINT_URL]):
+                result["r2_configured"] = True
+                
+                # Report the cached R2 probe instead of calling head_bucket
+                monitor = get_monitor()
+                monitor.ensure_started()
+                probe = monitor.snapshot()["probes"].get("r2")
+                if probe is None or probe["last_checked"] is None:
+                    result["r2_test"] = "PENDING - probe has not run yet"
+                elif probe["healthy"]:
+                    result["r2_test"] = "SUCCESS - bucket accessible"
+                else:
+                    result["r2_test"] = f"FAILED: {probe['error']}"
+                    result["errors"].append(f"R2: {probe['error']}")
+        except Exception as e:
+            result["errors"].append(f"R2 config error: {str(e)}")
+        
+        # Check Supabase config
+        try:
+            result["supabase_url"] = bool(settings.SUPABASE_URL)
+            result["supabase_key"] = bool(settings.SUPABASE_SERVICE_ROLE_KEY)
+            result["supabase_configured"] = bool(settings.SUPABASE_URL and settings.SUPABASE_SERVICE_ROLE_KEY)
+        except Exception as e:
+            result["errors"].append(f"Supabase config error: {str(e)}")
+        
+        # Check Clerk config
+        try:
+            result["clerk_jwks_url"] = settings.CLERK_JWKS_URL
+            result["clerk_configured"] = bool(settings.CLERK_JWKS_URL)
+        except Exception as e:
+            result["errors"].append(f"Clerk config error: {str(e)}")
+        
+        return Response(result)
+
+
+class TestUploadView(APIView):
+    """
+    POST /api/deposits/test-upload/
+    
+    Test upload endpoint (NO AUTH). Tests R2 upload directly.
+    Remove in production!
+    """
+    
+    permission_classes = []
+    authentication_classes = []
+    
+    def post(self, request):
+        import traceback
+        from ..services.r2_upload import upload_image_to_r2, R2UploadError
+        
+        # Check if image was sent
+        if 'image' not in request.FILES:
+            return Response({
+                "success": False,
+                "error": "No image file provided",
+                "hint": "Send a POST with form-data containing 'image' field"
+            }, status=400)
+        
+        try:
+            image = request.FILES['image']
+            image_data = image.read()
+            original_filename = image.name
+            
+            logger.debug("Test upload received: %s, size: %d bytes", original_filename, len(image_data))
+            
+            # Try to upload to R2 with a test user ID
+            object_key, signed_url = upload_image_to_r2(
+                file_data=image_data,
+                original_filename=original_filename,
+                clerk_user_id="test_user_123",
+            )
+            
+            logger.info("Test upload succeeded: %s", object_key)
+            
+            return Response({
+                "success": True,
+                "message": "Test upload successful!",
+                "object_key": object_key,
+                "signed_url": signed_url[:100] + "..." if len(signed_url) > 100 else signed_url,
+            })
+            
+        except R2UploadError as e:
+            logger.error("Test upload R2 error: %s", e)
+            return Response({
+                "success": False,
+                "error": f"R2 upload failed: {str(e)}",
+                "traceback": traceback.format_exc()
+            }, status=500)
+        except Exception as e:
+            logger.exception("Unexpected error during test upload")
+            return Response({
+                "success": False,
+                "error": f"Unexpected error: {str(e)}",
+                "type": type(e).__name__,
+                "traceback": traceback.format_exc()
+            }, status=500)
+
+
+class ProfilerView(APIView):
+    """
+    GET/POST /api/deposits/admin/profiler/
+    
+    Admin-only control of the sampling profiler.
+    
+    GET returns the profiler status, or the collected samples as
+    collapsed stacks (text/plain) with ``?export=collapsed``.
+    POST ``{"action": "start", "fraction": 0.1, "duration": 60}`` opens a
+    profiling window; ``stop`` closes it and ``reset`` clears samples.
+    """
+    
+    permission_classes = [IsAdmin]
+    
+    def get(self, request):
+        profiler = get_profiler()
+        if request.query_params.get('export') == 'collapsed':
+            return HttpResponse(profiler.collapsed(), content_type='text/plain; charset=utf-8')
+        return Response({"success": True, "profiler": profiler.status()})
+    
+    def post(self, request):
+        serializer = ProfilerControlSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                {
+                    "success": False,
+                    "error": "Invalid request",
+                    "detail": serializer.errors,
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        
+        data = serializer.validated_data
+        profiler = get_profiler()
+        action = data['action']
+        if action == 'start':
+            profiler.start(
+                fraction=data['fraction'],
+                duration=data.get('duration') or settings.PROFILER_MAX_DURATION,
+            )
+        elif action == 'stop':
+            profiler.stop()
+        else:
+            profiler.reset()
+        
+        return Response({"success": True, "profiler": profiler.status()})
@@ -0,0 +1,57 @@
+"""
+Health check endpoints for load balancers and orchestrators.
+"""
+
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+
+from ..health import get_monitor
+from ..warmup import get_warmup_state
+
+
+class HealthCheckView(APIView):
+    """
+    GET /api/deposits/health/
+    GET /api/deposits/health/live/
+    
+    Liveness check (no authentication required). Returns ok whenever the
+    process can serve requests; it never touches upstream services.
+    """
+    
+    permission_classes = []  # No auth required
+    authentication_classes = []  # Skip auth entirely
+    
+    def get(self, request):
+        return Response({"status": "ok", "service": "deposits-api"})
+
+
+class ReadinessView(APIView):
+    """
+    GET /api/deposits/health/ready/
+    
+    Readiness check (no authentication required). Returns 200 when the
+    worker has warmed up and the cached R2, PostgREST and JWKS probes are
+    healthy, 503 otherwise. Probe results are refreshed in the background
+    (see deposits/health.py), so polling this costs no upstream calls.
+    """
+    
+    permission_classes = []
+    authentication_classes = []
+    
+    def get(self, request):
+        monitor = get_monitor()
+        monitor.ensure_started()
+        result = monitor.snapshot()
+        warmup = get_warmup_state()
+        ready = result["ready"] and warmup["ready"]
+        return Response(
+            {
+                "status": "ready" if ready else "unavailable",
+                "service": "deposits-api",
+                "ready": ready,
+                "probes": result["probes"],
+                "warmup": warmup,
+            },
+            status=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+        )
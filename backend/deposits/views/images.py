@@ -0,0 +1,111 @@
+"""
+Deposit image endpoints: images served through the image cache.
+"""
+
+import logging
+import os
+from django.http import FileResponse, HttpResponse
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+
+from ..permissions import IsAdmin
+from ..services.r2_upload import (
+    R2ObjectNotFound,
+    R2UploadError,
+    get_content_type,
+)
+from ..services.image_cache import get_image_cache
+
+
+logger = logging.getLogger(__name__)
+
+
+class DepositImageView(APIView):
+    """
+    GET /api/deposits/images/<object_key>?variant=original|thumbnail
+    
+    A deposit image read through the tiered image cache (see
+    services/image_cache.py) instead of a presigned R2 URL, for admin
+    review and inference workers. Originals are streamed from the disk
+    tier with ``FileResponse`` (sendfile under WSGI); thumbnails come
+    from the memory tier.
+    
+    Users may read their own deposits; admins may read any.
+    """
+    
+    def get(self, request, object_key):
+        clerk_user_id = request.user.clerk_user_id
+        own = object_key.startswith(f"deposits/{clerk_user_id}/")
+        if not own and not IsAdmin().has_permission(request, self):
+            return Response(
+                {
+                    "success": False,
+                    "error": "Image not found",
+                    "detail": object_key,
+                },
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        variant = request.query_params.get('variant', 'original')
+        if variant not in ('original', 'thumbnail'):
+            return Response(
+                {
+                    "success": False,
+                    "error": "Invalid request",
+                    "detail": {"variant": ["Must be 'original' or 'thumbnail'."]},
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        
+        cache = get_image_cache()
+        try:
+            if variant == 'thumbnail':
+                response = HttpResponse(cache.thumbnail(object_key), content_type='image/jpeg')
+            else:
+                f, size = cache.open(object_key)
+                response = FileResponse(f, content_type=get_content_type(object_key))
+                response['Content-Length'] = size
+        except R2ObjectNotFound:
+            return Response(
+                {
+                    "success": False,
+                    "error": "Image not found",
+                    "detail": object_key,
+                },
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        except R2UploadError as e:
+            return Response(
+                {
+                    "success": False,
+                    "error": "Image fetch failed",
+                    "detail": str(e),
+                },
+                status=status.HTTP_502_BAD_GATEWAY,
+            )
+        except OSError as e:
+            logger.warning("Could not build thumbnail of %s: %s", object_key, e)
+            return Response(
+                {
+                    "success": False,
+                    "error": "Image could not be decoded",
+                    "detail": str(e),
+                },
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        # Object keys are immutable
+        response['Cache-Control'] = 'private, max-age=86400, immutable'
+        return response
+
+
+class ImageCacheStatsView(APIView):
+    """
+    GET /api/deposits/admin/image-cache/
+    
+    Hit rates, sizes and eviction counts of this worker's image cache.
+    """
+    
+    permission_classes = [IsAdmin]
+    
+    def get(self, request):
+        return Response({"success": True, "pid": os.getpid(), **get_image_cache().stats()})
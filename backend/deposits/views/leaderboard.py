@@ -0,0 +1,108 @@
+"""
+Leaderboard endpoints; see services/leaderboard.py.
+"""
+
+import logging
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+
+from ..serializers import LeaderboardQuerySerializer
+from ..services.leaderboard import get_leaderboard
+from ..services.supabase_client import SupabaseError
+
+
+logger = logging.getLogger(__name__)
+
+
+def _leaderboard_query(request):
+    """
+    Validate leaderboard query parameters and load the boards.
+    
+    Returns (validated_data, service, None) or (None, None, error_response).
+    """
+    serializer = LeaderboardQuerySerializer(data=request.query_params)
+    if not serializer.is_valid():
+        return None, None, Response(
+            {
+                "success": False,
+                "error": "Invalid request",
+                "detail": serializer.errors,
+            },
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    
+    service = get_leaderboard()
+    try:
+        service.ensure_fresh()
+    except SupabaseError as e:
+        logger.error("Leaderboard load failed: %s", e)
+        return None, None, Response(
+            {
+                "success": False,
+                "error": "Leaderboard unavailable",
+                "detail": str(e),
+            },
+            status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        )
+    return serializer.validated_data, service, None
+
+
+class LeaderboardView(APIView):
+    """
+    GET /api/deposits/leaderboard/?window=all|week|month&limit=10
+    
+    Top users by points, served from the in-memory ranked index
+    (see services/leaderboard.py).
+    """
+    
+    def get(self, request):
+        params, service, error = _leaderboard_query(request)
+        if error is not None:
+            return error
+        
+        board = service.board(params['window'])
+        return Response({
+            "success": True,
+            "window": params['window'],
+            "total_users": len(board),
+            "entries": service.entries_with_names(board.top(params['limit'])),
+        })
+
+
+class LeaderboardMeView(APIView):
+    """
+    GET /api/deposits/leaderboard/me/?window=all|week|month&radius=5
+    
+    The authenticated user's rank and the users ranked around them.
+    """
+    
+    def get(self, request):
+        params, service, error = _leaderboard_query(request)
+        if error is not None:
+            return error
+        
+        try:
+            user_id = service.resolve_user(request.user.clerk_user_id)
+        except SupabaseError as e:
+            logger.error("Leaderboard user lookup failed: %s", e)
+            return Response(
+                {
+                    "success": False,
+                    "error": "Leaderboard unavailable",
+                    "detail": str(e),
+                },
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+        
+        board = service.board(params['window'])
+        return Response({
+            "success": True,
+            "window": params['window'],
+            "total_users": len(board),
+            "rank": board.rank(user_id) if user_id is not None else None,
+            "points": (board.points(user_id) or 0) if user_id is not None else 0,
+            "entries": service.entries_with_names(
+                board.around(user_id, params['radius']) if user_id is not None else []
+            ),
+        })
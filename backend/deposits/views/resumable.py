@@ -0,0 +1,206 @@
+"""
+Resumable (chunked) upload endpoints; see services/resumable_upload.py.
+"""
+
+import io
+import logging
+from PIL import Image
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+
+from ..serializers import ResumableUploadCreateSerializer
+from ..tracing import traced
+from ..services.r2_upload import R2UploadError
+from ..services.data_backend import get_data_backend
+from ..services.resumable_upload import (
+    InvalidUploadError,
+    UploadSessionError,
+    UploadSessionNotFound,
+    get_upload_sessions,
+)
+from ..services.signed_urls import get_signed_url
+from ..services.supabase_client import SupabaseError
+from .uploads import _check_near_duplicate, _create_deposit_transaction
+
+
+logger = logging.getLogger(__name__)
+
+
+class ResumableUploadView(APIView):
+    """
+    POST /api/deposits/uploads/
+    
+    Start a resumable upload (see services/resumable_upload.py). Body:
+    ``{"filename": "...", "size": <bytes>}``. The response carries the
+    ``upload_id``, ``chunk_size`` and ``chunk_count``; the client then
+    PUTs each chunk to ``uploads/<upload_id>/chunks/<index>/`` and POSTs
+    ``uploads/<upload_id>/complete/``.
+    """
+    
+    def post(self, request):
+        serializer = ResumableUploadCreateSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                {
+                    "success": False,
+                    "error": "Invalid request",
+                    "detail": serializer.errors,
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        session = get_upload_sessions().create(
+            request.user.clerk_user_id,
+            serializer.validated_data['filename'],
+            serializer.validated_data['size'],
+        )
+        return Response({"success": True, **session}, status=status.HTTP_201_CREATED)
+
+
+def _upload_session_error(e):
+    if isinstance(e, UploadSessionNotFound):
+        return Response(
+            {"success": False, "error": "Upload not found", "detail": str(e)},
+            status=status.HTTP_404_NOT_FOUND,
+        )
+    return Response(
+        {"success": False, "error": "Invalid upload request", "detail": str(e)},
+        status=status.HTTP_409_CONFLICT,
+    )
+
+
+class ResumableUploadDetailView(APIView):
+    """
+    GET /api/deposits/uploads/<upload_id>/
+    DELETE /api/deposits/uploads/<upload_id>/
+    
+    GET returns the session, including the ``missing`` chunk indexes to
+    resend after a reconnect. DELETE cancels it.
+    """
+    
+    def get(self, request, upload_id):
+        try:
+            session = get_upload_sessions().get(upload_id, request.user.clerk_user_id)
+        except UploadSessionError as e:
+            return _upload_session_error(e)
+        return Response({"success": True, **session})
+    
+    def delete(self, request, upload_id):
+        try:
+            get_upload_sessions().abort(upload_id, request.user.clerk_user_id)
+        except UploadSessionError as e:
+            return _upload_session_error(e)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ResumableUploadChunkView(APIView):
+    """
+    PUT /api/deposits/uploads/<upload_id>/chunks/<index>/
+    
+    One chunk as the raw request body (``application/octet-stream``).
+    Every chunk is ``chunk_size`` bytes except the last. Resending a
+    chunk is harmless, so clients retry a chunk until it is acknowledged.
+    """
+    
+    def put(self, request, upload_id, index):
+        try:
+            session = get_upload_sessions().write_chunk(
+                upload_id, request.user.clerk_user_id, index, request.body
+            )
+        except UploadSessionError as e:
+            if not isinstance(e, UploadSessionNotFound):
+                return Response(
+                    {"success": False, "error": "Invalid chunk", "detail": str(e)},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            return _upload_session_error(e)
+        return Response({"success": True, **session})
+
+
+class ResumableUploadCompleteView(APIView):
+    """
+    POST /api/deposits/uploads/<upload_id>/complete/
+    
+    Finish a resumable upload once every chunk has arrived: the image is
+    stored in R2 and a pending transaction is created, with the same
+    response as ``POST /api/deposits/upload/``. Repeating the call after
+    a lost response or a failure returns the same transaction; a call
+    made while another is still completing the upload gets 409.
+    """
+    
+    @traced("deposits.upload_complete")
+    def post(self, request, upload_id):
+        clerk_user_id = request.user.clerk_user_id
+        sessions = get_upload_sessions()
+        try:
+            state, image_data = sessions.finish(upload_id, clerk_user_id, validate=_is_image)
+        except InvalidUploadError as e:
+            return Response(
+                {
+                    "success": False,
+                    "error": "Invalid request",
+                    "detail": {"image": [str(e)]},
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        except UploadSessionError as e:
+            return _upload_session_error(e)
+        except R2UploadError as e:
+            logger.error("R2 upload failed: %s", e)
+            return Response(
+                {
+                    "success": False,
+                    "error": "Image upload failed",
+                    "detail": str(e),
+                },
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+        if image_data is None:
+            return Response(state["result"], status=status.HTTP_201_CREATED)
+        
+        r2_object_key = state["object_key"]
+        transaction_id = state["transaction_id"]
+        try:
+            signed_url = get_signed_url(r2_object_key)
+            # An earlier call may have written the transaction before failing
+            existing = state["attempts"] > 1 and get_data_backend().get_transactions([transaction_id])
+            if existing:
+                result = {
+                    "success": True,
+                    "message": "Image uploaded successfully",
+                    "image_url": signed_url,
+                    "transaction_id": transaction_id,
+                    "status": existing[0]["status"],
+                    "near_duplicate": None,
+                }
+            else:
+                image_hash, near_duplicate = _check_near_duplicate(image_data, clerk_user_id)
+                result = _create_deposit_transaction(
+                    clerk_user_id, r2_object_key, signed_url, image_hash, near_duplicate,
+                    transaction_id=transaction_id,
+                )
+        except (SupabaseError, R2UploadError) as e:
+            # The R2 object is kept for the retry; the insert may have
+            # been written even though it failed here
+            sessions.release(upload_id, clerk_user_id)
+            logger.error("Completing upload %s failed: %s", upload_id, e)
+            return Response(
+                {
+                    "success": False,
+                    "error": "Database operation failed",
+                    "detail": str(e),
+                },
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+        sessions.mark_complete(upload_id, clerk_user_id, result)
+        return Response(result, status=status.HTTP_201_CREATED)
+
+
+def _is_image(image_data):
+    """Same check as ``ImageField``: Pillow can identify and verify it."""
+    try:
+        with Image.open(io.BytesIO(image_data)) as image:
+            image.verify()
+    except Exception:
+        return False
+    return True
@@ -0,0 +1,50 @@
+"""
+Reward rules admin endpoint; see services/rewards.py.
+"""
+
+import logging
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+
+from ..permissions import IsAdmin
+from ..services.rewards import get_reward_rules, invalidate_reward_rules
+from ..services.supabase_client import SupabaseError
+
+
+logger = logging.getLogger(__name__)
+
+
+class RewardRulesView(APIView):
+    """
+    GET/POST /api/deposits/admin/rewards/
+    
+    Admin-only view of the compiled reward rules (see
+    services/rewards.py). POST reloads them from ``system_settings``
+    immediately instead of at the next periodic check; call it after
+    editing ``reward_rules``.
+    """
+    
+    permission_classes = [IsAdmin]
+    
+    def get(self, request):
+        return self._respond()
+    
+    def post(self, request):
+        invalidate_reward_rules()
+        return self._respond()
+    
+    def _respond(self):
+        try:
+            rules = get_reward_rules()
+        except SupabaseError as e:
+            logger.error("Reward rules unavailable: %s", e)
+            return Response(
+                {
+                    "success": False,
+                    "error": "Reward rules unavailable",
+                    "detail": str(e),
+                },
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+        return Response({"success": True, "rules": rules.describe()})
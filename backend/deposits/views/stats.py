@@ -0,0 +1,68 @@
+"""
+Per-user statistics endpoint; see services/user_stats.py.
+"""
+
+import logging
+from django.conf import settings
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+
+from ..services.repositories import UserStatsRepository, get_repository
+from ..services.leaderboard import get_leaderboard
+from ..services.supabase_client import SupabaseError
+from ..services.user_stats import summarize
+
+
+logger = logging.getLogger(__name__)
+
+
+class UserStatsView(APIView):
+    """
+    GET /api/deposits/stats/me/
+    
+    The authenticated user's dashboard stats: totals, per-category and
+    per-status counts, streaks, a 30-day sparkline and all-time rank.
+    Served from the materialized per-user counters (see
+    services/user_stats.py), so the cost does not grow with history.
+    """
+    
+    def get(self, request):
+        if not settings.USER_STATS_ENABLED:
+            return Response(
+                {
+                    "success": False,
+                    "error": "User stats unavailable",
+                    "detail": "USER_STATS_ENABLED is off",
+                },
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+        
+        service = get_leaderboard()
+        try:
+            user_id = service.resolve_user(request.user.clerk_user_id)
+            stats = (
+                get_repository(UserStatsRepository).get_user_stats(user_id)
+                if user_id is not None else None
+            )
+        except SupabaseError as e:
+            logger.error("User stats lookup failed: %s", e)
+            return Response(
+                {
+                    "success": False,
+                    "error": "User stats unavailable",
+                    "detail": str(e),
+                },
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+        
+        rank = None
+        try:
+            service.ensure_fresh()
+            if user_id is not None:
+                rank = service.board('all').rank(user_id)
+        except SupabaseError as e:
+            # Stats are still useful without the rank
+            logger.warning("Leaderboard load failed: %s", e)
+        
+        return Response({"success": True, "stats": {**summarize(stats), "rank": rank}})
@@ -0,0 +1,126 @@
+"""
+Transaction endpoints: a user's own transactions and the admin review.
+"""
+
+import logging
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+
+from ..permissions import IsAdmin
+from ..serializers import (
+    TransactionListQuerySerializer,
+    TransactionReviewSerializer,
+)
+from ..services.r2_upload import R2UploadError
+from ..services.data_backend import get_data_backend
+from ..services.signed_urls import attach_signed_urls
+from ..services.supabase_client import SupabaseError
+
+
+logger = logging.getLogger(__name__)
+
+
+class TransactionReviewView(APIView):
+    """
+    PATCH /api/deposits/admin/transactions/<transaction_id>/
+    
+    Set a transaction's status (and optionally ``points_earned``,
+    ``item_type``, ``co2_saved``), e.g. after reviewing a deposit flagged
+    ``near_duplicate``. Going through ``DataBackend.update_transaction``
+    pushes the change to clients watching the transaction and updates
+    the user's stats and the leaderboards; changes written to the table
+    directly are not pushed.
+    """
+    
+    permission_classes = [IsAdmin]
+    
+    def patch(self, request, transaction_id):
+        serializer = TransactionReviewSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                {
+                    "success": False,
+                    "error": "Invalid request",
+                    "detail": serializer.errors,
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        
+        try:
+            transaction = get_data_backend().update_transaction(
+                str(transaction_id), **serializer.validated_data
+            )
+        except SupabaseError as e:
+            logger.error("Transaction update failed: %s", e)
+            return Response(
+                {
+                    "success": False,
+                    "error": "Database operation failed",
+                    "detail": str(e),
+                },
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+        if transaction is None:
+            return Response(
+                {
+                    "success": False,
+                    "error": "Transaction not found",
+                    "detail": str(transaction_id),
+                },
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        
+        logger.info(
+            "Transaction %s set to %s", transaction_id, transaction['status'],
+            extra={"clerk_user_id": request.user.clerk_user_id},
+        )
+        return Response({"success": True, "transaction": transaction})
+
+
+class UserTransactionsView(APIView):
+    """
+    GET /api/deposits/transactions/me/?limit=20
+    
+    The authenticated user's most recent transactions, newest first, with
+    ``image_url`` signed on read from each row's R2 object key (stored
+    URLs expire).
+    """
+    
+    def get(self, request):
+        serializer = TransactionListQuerySerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(
+                {
+                    "success": False,
+                    "error": "Invalid request",
+                    "detail": serializer.errors,
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        
+        backend = get_data_backend()
+        try:
+            user_id = backend.get_user_id(request.user.clerk_user_id)
+            transactions = (
+                backend.list_user_transactions(user_id, serializer.validated_data['limit'])
+                if user_id is not None else []
+            )
+        except SupabaseError as e:
+            logger.error("Transaction list failed: %s", e)
+            return Response(
+                {
+                    "success": False,
+                    "error": "Transactions unavailable",
+                    "detail": str(e),
+                },
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+        
+        try:
+            attach_signed_urls(transactions)
+        except R2UploadError as e:
+            # The stored URLs are still returned; they may have expired
+            logger.warning("Could not sign transaction images: %s", e)
+        
+        return Response({"success": True, "transactions": transactions})
@@ -0,0 +1,445 @@
+"""
+Deposit upload endpoints: single and batch uploads, and the upload
+guard's counters.
+"""
+
+import logging
+import os
+import uuid
+from django.conf import settings
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+
+from ..permissions import IsAdmin
+from ..serializers import UploadRequestSerializer
+from ..tracing import traced
+from ..upload_limits import get_upload_stats
+from ..services.r2_upload import (
+    R2UploadError,
+    delete_image_from_r2,
+    upload_image_to_r2,
+)
+from ..services.batch_upload import map_concurrently
+from ..services.data_backend import build_transaction_row, get_data_backend
+from ..services.duplicates import describe_match, get_duplicate_detector
+from ..services.image_hash import ImageHashError, dhash
+from ..services.supabase_client import SupabaseError
+
+
+logger = logging.getLogger(__name__)
+
+
+class DepositUploadView(APIView):
+    """
+    POST /api/deposits/upload/
+    
+    Upload an e-waste image and create a transaction record.
+    
+    This endpoint:
+    1. Authenticates the user via Clerk JWT
+    2. Validates the uploaded image
+    3. Uploads the image to Cloudflare R2
+    4. Creates/finds the user in Supabase
+    5. Creates a transaction record with pending status
+    6. Returns the image URL and transaction ID
+    
+    Images that look like a near-duplicate of an earlier deposit (see
+    services/duplicates.py) are accepted but flagged in ``near_duplicate``,
+    both in the response and on the transaction row.
+    
+    Bodies over the size limit or files that are not images are rejected
+    with 413/415 while they stream in, before the view runs (see
+    upload_limits.py).
+    
+    The image URL is a signed URL suitable for ML model inference. It is
+    stored with the transaction but expires; GET transactions/me/ re-signs
+    from the R2 object key.
+    """
+    
+    # TEMPORARY: Disable auth for debugging
+    permission_classes = []  # Was: [IsAuthenticated]
+    authentication_classes = []  # Skip auth
+    
+    def dispatch(self, request, *args, **kwargs):
+        """Override dispatch to catch ALL exceptions and return JSON."""
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        except Exception as e:
+            import traceback
+            logger.exception("Unhandled exception in deposit upload")
+            return Response(
+                {
+                    "success": False,
+                    "error": "Internal server error",
+                    "detail": str(e),
+                    "traceback": traceback.format_exc(),
+                },
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+    
+    @traced("deposits.upload")
+    def post(self, request):
+        """
+        Handle image upload and transaction creation.
+        """
+        # TEMPORARY: Use test user ID since auth is disabled
+        # Get the authenticated Clerk user from the request
+        # This is set by ClerkJWTAuthentication
+        if hasattr(request, 'user') and hasattr(request.user, 'clerk_user_id'):
+            clerk_user_id = request.user.clerk_user_id
+        else:
+            # Fallback for testing
+            clerk_user_id = "test_user_from_frontend"
+            logger.debug("Using test user ID: %s", clerk_user_id)
+        
+        logger.info("Processing upload for user: %s", clerk_user_id)
+        
+        # Validate the request
+        serializer = UploadRequestSerializer(data=request.data)
+        if not serializer.is_valid():
+            logger.warning("Invalid upload request: %s", serializer.errors)
+            return Response(
+                {
+                    "success": False,
+                    "error": "Invalid request",
+                    "detail": serializer.errors,
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        
+        image = serializer.validated_data['image']
+        image_data = image.read()
+        original_filename = image.name
+        
+        image_hash, near_duplicate = _check_near_duplicate(image_data, clerk_user_id)
+        
+        # Track the R2 object key for cleanup on failure
+        r2_object_key = None
+        
+        try:
+            # Step 1: Upload image to Cloudflare R2
+            logger.debug("Uploading image to R2: %s", original_filename)
+            r2_object_key, signed_url = upload_image_to_r2(
+                file_data=image_data,
+                original_filename=original_filename,
+                clerk_user_id=clerk_user_id,
+                checksum_sha256=getattr(image, 'sha256', None),
+            )
+            logger.debug("Image uploaded successfully: %s", r2_object_key)
+            
+            # Steps 2-3: Find or create the user and create the transaction
+            return Response(
+                _create_deposit_transaction(
+                    clerk_user_id, r2_object_key, signed_url, image_hash, near_duplicate
+                ),
+                status=status.HTTP_201_CREATED,
+            )
+            
+        except R2UploadError as e:
+            logger.error("R2 upload failed: %s", e)
+            return Response(
+                {
+                    "success": False,
+                    "error": "Image upload failed",
+                    "detail": str(e),
+                },
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+            
+        except SupabaseError as e:
+            # If Supabase fails after R2 upload, cleanup the R2 object
+            if r2_object_key:
+                logger.info("Cleaning up R2 object after Supabase failure: %s", r2_object_key)
+                delete_image_from_r2(r2_object_key)
+            
+            logger.error("Supabase operation failed: %s", e)
+            return Response(
+                {
+                    "success": False,
+                    "error": "Database operation failed",
+                    "detail": str(e),
+                },
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+            
+        except Exception as e:
+            # Cleanup R2 on any unexpected error
+            if r2_object_key:
+                logger.info("Cleaning up R2 object after error: %s", r2_object_key)
+                delete_image_from_r2(r2_object_key)
+            
+            logger.exception("Unexpected error during upload")
+            return Response(
+                {
+                    "success": False,
+                    "error": "An unexpected error occurred",
+                    "detail": str(e),
+                },
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+def _create_deposit_transaction(clerk_user_id, r2_object_key, signed_url, image_hash, near_duplicate,
+                                transaction_id=None):
+    """
+    Create the pending transaction for an image stored in R2.
+    
+    A ``transaction_id`` chosen by the caller is inserted directly rather
+    than through the write buffer, so the caller knows whether it exists.
+    
+    Returns:
+        The upload response body
+    
+    Raises:
+        SupabaseError: If the user or transaction cannot be written
+    """
+    # Find or create user in Supabase
+    logger.debug("Looking up/creating Supabase user for: %s", clerk_user_id)
+    backend = get_data_backend()
+    supabase_user_id = backend.get_user_id(clerk_user_id, create=True)
+    logger.debug("Supabase user ID: %s", supabase_user_id)
+    
+    # Create transaction record, flagged for review if it looks reused
+    logger.debug("Creating transaction record")
+    if transaction_id is None:
+        transaction = backend.insert_transaction(
+            user_id=supabase_user_id,
+            r2_object_key=r2_object_key,
+            status="pending",
+            image_url=signed_url,
+            near_duplicate=describe_match(near_duplicate),
+        )
+    else:
+        row = build_transaction_row(
+            supabase_user_id, r2_object_key, image_url=signed_url,
+            near_duplicate=describe_match(near_duplicate),
+        )
+        row["id"] = transaction_id
+        transaction = backend.insert_transaction_row(row)
+    
+    logger.info(
+        "Transaction created: %s", transaction['id'],
+        extra={"clerk_user_id": clerk_user_id, "r2_object_key": r2_object_key},
+    )
+    _record_image_hash(image_hash, clerk_user_id, r2_object_key)
+    
+    return {
+        "success": True,
+        "message": "Image uploaded successfully",
+        "image_url": signed_url,
+        "transaction_id": transaction['id'],
+        "status": "pending",
+        "near_duplicate": describe_match(near_duplicate),
+    }
+
+
+def _check_near_duplicate(image_data, clerk_user_id):
+    """
+    Hash an upload and look it up in the near-duplicate index.
+    
+    Detection never fails an upload: undecodable images and index errors
+    are logged and treated as "no match".
+    
+    Returns:
+        Tuple of (image hash or None, Match or None)
+    """
+    if not settings.DUPLICATE_DETECTION_ENABLED:
+        return None, None
+    try:
+        image_hash = dhash(image_data)
+    except ImageHashError as e:
+        logger.warning("Skipping duplicate check: %s", e)
+        return None, None
+    try:
+        match = get_duplicate_detector().check(image_hash, clerk_user_id)
+    except OSError as e:
+        logger.warning("Duplicate index unavailable: %s", e)
+        return image_hash, None
+    if match is not None:
+        logger.warning(
+            "Near-duplicate upload (%s, distance %d) of %s",
+            match.scope, match.distance, match.object_key,
+            extra={"clerk_user_id": clerk_user_id},
+        )
+    return image_hash, match
+
+
+def _record_image_hash(image_hash, clerk_user_id, object_key):
+    if image_hash is None:
+        return
+    try:
+        get_duplicate_detector().record(image_hash, clerk_user_id, object_key)
+    except OSError as e:
+        logger.warning("Could not record image hash for %s: %s", object_key, e)
+
+
+class BatchUploadView(APIView):
+    """
+    POST /api/deposits/upload/batch/
+    
+    Upload up to ``BATCH_UPLOAD_MAX_IMAGES`` e-waste images in one
+    multipart request, all in ``images`` fields.
+    
+    Each image is validated like a single upload. An image over the size
+    limit, a file that is not an image, or too many files fail the whole
+    request with 413/415 while it streams in (see upload_limits.py);
+    other invalid images fail individually. Valid images are
+    hashed and uploaded to R2 concurrently on a shared, bounded pool
+    (see services/batch_upload.py). The user is resolved once, and all
+    transactions are created with one array insert.
+    
+    Results are per image, in request order, each either a transaction
+    (as returned by ``upload/``) or an error. The status is 201 if every
+    image succeeded and 207 if only some did. If none did, it is 400
+    when all were invalid and 500 otherwise.
+    """
+    
+    @traced("deposits.upload_batch")
+    def post(self, request):
+        clerk_user_id = request.user.clerk_user_id
+        images = request.FILES.getlist('images')
+        if not images or len(images) > settings.BATCH_UPLOAD_MAX_IMAGES:
+            return Response(
+                {
+                    "success": False,
+                    "error": "Invalid request",
+                    "detail": {"images": [
+                        f"Send between 1 and {settings.BATCH_UPLOAD_MAX_IMAGES} images."
+                    ]},
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        
+        results = [None] * len(images)
+        valid = []
+        for index, image in enumerate(images):
+            serializer = UploadRequestSerializer(data={'image': image})
+            if serializer.is_valid():
+                valid.append(index)
+            else:
+                results[index] = _batch_error(
+                    index, image.name, "Invalid request", serializer.errors, status.HTTP_400_BAD_REQUEST
+                )
+        
+        # Hash and upload concurrently
+        uploads = map_concurrently(
+            _upload_batch_image,
+            [(images[index], clerk_user_id) for index in valid],
+        )
+        uploaded = []
+        for index, (upload, error) in zip(valid, uploads):
+            if error is None:
+                uploaded.append((index, upload))
+            elif isinstance(error, R2UploadError):
+                logger.error("R2 upload failed: %s", error)
+                results[index] = _batch_error(index, images[index].name, "Image upload failed", str(error), status.HTTP_500_INTERNAL_SERVER_ERROR)
+            else:
+                logger.error("Batch image upload failed", exc_info=error)
+                results[index] = _batch_error(
+                    index, images[index].name, "An unexpected error occurred", str(error),
+                    status.HTTP_500_INTERNAL_SERVER_ERROR,
+                )
+        
+        if uploaded:
+            try:
+                backend = get_data_backend()
+                supabase_user_id = backend.get_user_id(clerk_user_id, create=True)
+                rows = []
+                for _, (r2_object_key, signed_url, _, near_duplicate) in uploaded:
+                    row = build_transaction_row(
+                        supabase_user_id, r2_object_key, image_url=signed_url,
+                        near_duplicate=describe_match(near_duplicate),
+                    )
+                    # Client-assigned IDs match rows to inserted transactions
+                    row["id"] = str(uuid.uuid4())
+                    rows.append(row)
+                transactions = {
+                    transaction['id']: transaction
+                    for transaction in backend.insert_transactions(rows)
+                }
+            except SupabaseError as e:
+                logger.error("Supabase operation failed: %s", e)
+                for index, (r2_object_key, _, _, _) in uploaded:
+                    logger.info("Cleaning up R2 object after Supabase failure: %s", r2_object_key)
+                    delete_image_from_r2(r2_object_key)
+                    results[index] = _batch_error(
+                        index, images[index].name, "Database operation failed", str(e),
+                        status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    )
+            else:
+                for (index, (r2_object_key, signed_url, image_hash, near_duplicate)), row in zip(uploaded, rows):
+                    transaction_id = transactions[row["id"]]['id']
+                    _record_image_hash(image_hash, clerk_user_id, r2_object_key)
+                    results[index] = {
+                        "index": index,
+                        "filename": images[index].name,
+                        "success": True,
+                        "image_url": signed_url,
+                        "transaction_id": transaction_id,
+                        "status": "pending",
+                        "near_duplicate": describe_match(near_duplicate),
+                    }
+                logger.info(
+                    "Batch of %d transactions created", len(uploaded),
+                    extra={"clerk_user_id": clerk_user_id},
+                )
+        
+        failures = [result.pop("status_code") for result in results if not result["success"]]
+        succeeded = len(results) - len(failures)
+        if not failures:
+            response_status = status.HTTP_201_CREATED
+        elif succeeded:
+            response_status = status.HTTP_207_MULTI_STATUS
+        elif all(code == status.HTTP_400_BAD_REQUEST for code in failures):
+            response_status = status.HTTP_400_BAD_REQUEST
+        else:
+            response_status = status.HTTP_500_INTERNAL_SERVER_ERROR
+        return Response(
+            {
+                "success": not failures,
+                "uploaded": succeeded,
+                "failed": len(results) - succeeded,
+                "results": results,
+            },
+            status=response_status,
+        )
+
+
+def _upload_batch_image(image, clerk_user_id):
+    """Hash one batch image and upload it to R2 (runs on the upload pool)."""
+    image_data = image.read()
+    image_hash, near_duplicate = _check_near_duplicate(image_data, clerk_user_id)
+    r2_object_key, signed_url = upload_image_to_r2(
+        file_data=image_data,
+        original_filename=image.name,
+        clerk_user_id=clerk_user_id,
+        checksum_sha256=getattr(image, 'sha256', None),
+    )
+    return r2_object_key, signed_url, image_hash, near_duplicate
+
+
+def _batch_error(index, filename, error, detail, status_code):
+    return {
+        "index": index,
+        "filename": filename,
+        "success": False,
+        "error": error,
+        "detail": detail,
+        "status_code": status_code,
+    }
+
+
+class UploadStatsView(APIView):
+    """
+    GET /api/deposits/admin/uploads/
+    
+    Accepted and rejected upload bodies in this worker: rejections by
+    reason, the bytes read before each rejection and the declared bytes
+    left unread, and the CPU time spent on them (see upload_limits.py).
+    """
+    
+    permission_classes = [IsAdmin]
+    
+    def get(self, request):
+        return Response({"success": True, "pid": os.getpid(), **get_upload_stats().stats()})
@@ -0,0 +1,260 @@
+"""
+Worker warm-up.
+
+The first upload on a fresh worker used to pay for building the boto3
+client, creating the ``PyJWKClient`` and fetching JWKS, a TLS handshake
+to Supabase and loading Pillow's image plugins. ``warm_up()`` does that
+work ahead of time, in the worker process, and records per-step results
+that the readiness endpoint reports.
+
+``WARMUP_MODE`` controls when it runs:
+
+- ``off``: never (default for the development profile)
+- ``ready``: in a background thread once the server entry point
+  (``core/wsgi.py`` or ``core/asgi.py``) has loaded the application
+- ``post_fork``: from the gunicorn ``post_fork`` hook, so resources are
+  created in each worker after fork and never shared with the master
+  when the app is preloaded. ``core/serve.py`` installs the hook; with
+  another gunicorn config add::
+
+      from deposits.warmup import post_fork  # noqa: F401
+
+Only the server entry points start it: management commands
+(``rescore_transactions``, ``export_analytics``, ``check``...) set Django
+up without them and never warm up.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+_state: Dict[str, Any] = {"status": "pending", "steps": {}}
+_state_lock = threading.Lock()
+_started = False
+
+# Set by the gunicorn hook when Django is not loaded yet (no preload)
+_post_fork_requested = False
+
+
+def _warm_r2() -> None:
+    from .services.r2_upload import get_r2_client
+
+    client = get_r2_client()
+    # Loads the signer and endpoint resolver (local work)...
+    client.generate_presigned_url(
+        'get_object',
+        Params={'Bucket': settings.R2_BUCKET_NAME, 'Key': 'warmup'},
+        ExpiresIn=60,
+    )
+    # ...and opens a pooled TLS connection to R2
+    client.head_bucket(Bucket=settings.R2_BUCKET_NAME)
+
+
+def _warm_jwks() -> None:
+    from .authentication import get_jwks_client
+
+    # Fetches and caches the signing keys
+    get_jwks_client().get_signing_keys()
+
+
+def _warm_supabase() -> None:
+    from .services.supabase_client import (
+        get_http_client,
+        get_supabase_headers,
+        get_supabase_url,
+    )
+
+    # Opens a keep-alive connection in the shared client's pool
+    response = get_http_client().get(
+        get_supabase_url("users"),
+        headers=get_supabase_headers(),
+        params={"select": "id", "limit": "1"},
+    )
+    response.raise_for_status()
+
+
+def _warm_data_backend() -> None:
+    from .services.data_backend import get_data_backend
+
+    # Opens the direct Postgres pool; a no-op for PostgREST
+    get_data_backend().warm_up()
+
+
+def _warm_leaderboard() -> None:
+    from .services.leaderboard import get_leaderboard
+
+    # Loads the ranked boards from a bulk snapshot
+    get_leaderboard().ensure_fresh()
+
+
+def _warm_rewards() -> None:
+    from .services.rewards import get_reward_rules
+
+    # Reads and compiles the reward rule table
+    get_reward_rules()
+
+
+def _warm_duplicates() -> None:
+    from .services.duplicates import get_duplicate_detector
+
+    # Loads the near-duplicate index file into the BK-trees
+    if settings.DUPLICATE_DETECTION_ENABLED:
+        get_duplicate_detector().sync()
+
+
+def _warm_pillow() -> None:
+    from PIL import Image
+
+    # Registers all format plugins up front instead of on first decode
+    Image.init()
+
+
+STEPS: List[Tuple[str, Callable[[], None]]] = [
+    ("pillow", _warm_pillow),
+    ("r2", _warm_r2),
+    ("jwks", _warm_jwks),
+    ("supabase", _warm_supabase),
+    ("data_backend", _warm_data_backend),
+    ("leaderboard", _warm_leaderboard),
+    ("rewards", _warm_rewards),
+    ("duplicates", _warm_duplicates),
+]
+
+
+def warm_up() -> Dict[str, Any]:
+    """
+    Run every warm-up step and record the results.
+
+    Steps are independent: a failing step is logged and reported, and
+    the rest still run. Returns a snapshot of the warm-up state.
+    """
+    with _state_lock:
+        _state["status"] = "running"
+        _state["started_at"] = time.time()
+
+    failed = False
+    for name, step in STEPS:
+        start = time.perf_counter()
+        try:
+            step()
+            result = {"ok": True}
+        except Exception as e:
+            failed = True
+            result = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+            logger.warning("Warm-up step %s failed: %s", name, e)
+        result["ms"] = round((time.perf_counter() - start) * 1000, 1)
+        with _state_lock:
+            _state["steps"][name] = result
+
+    with _state_lock:
+        _state["status"] = "degraded" if failed else "complete"
+        _state["finished_at"] = time.time()
+    logger.info("Warm-up %s in pid %s", _state["status"], os.getpid())
+
+    # Start readiness probes now that the clients exist
+    from .health import get_monitor
+    get_monitor().ensure_started()
+    return get_warmup_state()
+
+
+def start_server_warm_up() -> None:
+    """
+    Start the warm-up if ``WARMUP_MODE`` asks for it; called by the
+    server entry points once the application is loaded.
+    """
+    if settings.WARMUP_MODE == 'ready' or _post_fork_requested:
+        start_warm_up()
+
+
+def start_warm_up() -> None:
+    """Run ``warm_up()`` once per process in a background thread."""
+    global _started
+    with _state_lock:
+        if _started:
+            return
+        _started = True
+    threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+
+
+def get_warmup_state() -> Dict[str, Any]:
+    """Return a copy of the warm-up state for the health endpoint."""
+    with _state_lock:
+        state = dict(_state)
+        state["steps"] = dict(_state["steps"])
+    if settings.WARMUP_MODE == 'off' and not _started:
+        state["status"] = "disabled"
+    state["ready"] = state["status"] in ("complete", "degraded", "disabled")
+    return state
+
+
+def reset_after_fork() -> None:
+    """
+    Drop per-process resources inherited from a parent process.
+
+    Clients built before fork (e.g. with gunicorn ``preload_app``) would
+    share sockets and locks between workers; each worker rebuilds its own.
+    """
+    global _started, _state_lock
+    from .authentication import get_jwks_client
+    from .health import reset_monitor
+    from . import upload_limits
+    from .services.r2_upload import get_r2_client
+    from .services.supabase_client import get_http_client
+    from .services import (
+        batch_upload,
+        data_backend,
+        duplicates,
+        image_cache,
+        leaderboard,
+        shared_cache,
+        telemetry,
+        transaction_events,
+        user_stats,
+        write_buffer,
+    )
+
+    get_r2_client.cache_clear()
+    get_jwks_client.cache_clear()
+    get_http_client.cache_clear()
+    reset_monitor()
+    write_buffer.reset_after_fork()
+    batch_upload.reset_after_fork()
+    data_backend.reset_after_fork()
+    leaderboard.reset_after_fork()
+    duplicates.reset_after_fork()
+    image_cache.reset_after_fork()
+    shared_cache.reset_after_fork()
+    telemetry.reset_after_fork()
+    transaction_events.reset_after_fork()
+    upload_limits.reset_after_fork()
+    user_stats.reset_after_fork()
+
+    _state_lock = threading.Lock()
+    _started = False
+    _state.clear()
+    _state.update({"status": "pending", "steps": {}})
+
+
+def post_fork(server, worker) -> None:
+    """
+    gunicorn ``post_fork`` hook: warm up the new worker.
+
+    With ``preload_app`` the application is already loaded and warm-up
+    starts immediately; otherwise it is deferred to
+    ``start_server_warm_up()``, which runs when the worker loads it.
+    """
+    global _post_fork_requested
+    from django.apps import apps
+
+    if apps.ready:
+        start_warm_up()
+    else:
+        _post_fork_requested = True
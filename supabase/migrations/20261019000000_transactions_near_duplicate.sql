@@ -0,0 +1,8 @@
+-- Near-duplicate match found at upload time (backend/deposits/services/duplicates.py).
+-- Only flagged deposits carry it, so the partial index stays small and lets
+-- reviewers list them.
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS near_duplicate jsonb;
+
+CREATE INDEX IF NOT EXISTS idx_transactions_near_duplicate
+    ON transactions (created_at DESC)
+    WHERE near_duplicate IS NOT NULL;